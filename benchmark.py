@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+"""
+ChopImg - ベンチマークスクリプト
+
+合成画像を決定的に生成し、split_image_by_size / split_image_by_count の
+スループット、メモリ使用量、工程ごとの処理時間を計測します。
+結果はJSONで出力でき、リリース間で比較できます。
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+import PIL
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from core import split_image_by_size, split_image_by_count
+from create_test_image import create_test_image, parse_image_size
+from profiling import SplitStats
+
+
+# 既定の計測条件
+DEFAULT_SIZES = ['4k']
+DEFAULT_FORMATS = ['png', 'jpg', 'webp']
+DEFAULT_TILE_SIZES = [256, 512]
+DEFAULT_OVERLAPS = [0, 32]
+DEFAULT_WORKERS = [1, 4]
+DEFAULT_GRID = (8, 8)
+
+# タイルサービスの比較（--service）で実行するジョブ数の既定値
+DEFAULT_SERVICE_JOBS = 16
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """
+    現在のプロセスのピークRSS（MB）を取得します。
+
+    Returns:
+        ピークRSS（取得できない場合はNone）
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト単位、それ以外はキロバイト単位
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def _directory_size(path: str) -> int:
+    """ディレクトリ内のファイルサイズの合計を返します。"""
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def run_case(case: dict) -> dict:
+    """
+    1つの計測条件でベンチマークを実行します。
+
+    工程ごとの内訳はprofiling.SplitStatsで記録します（複数ワーカーの場合は全ワーカーの合計）。
+
+    Args:
+        case: 計測条件（image, function, format, tile_size, overlap, workers, grid）
+
+    Returns:
+        計測条件に計測結果を加えた辞書
+    """
+    output_dir = tempfile.mkdtemp(prefix="chopimg_bench_")
+    try:
+        with Image.open(case['image']) as img:
+            width, height = img.size
+            bands = len(img.getbands())
+
+        stats = SplitStats()
+        options = dict(
+            output_dir=output_dir,
+            format=case['format'],
+            overlap=case['overlap'],
+            workers=case['workers'],
+            stats=stats
+        )
+        start = time.perf_counter()
+        if case['function'] == 'count':
+            output_files = split_image_by_count(case['image'], tuple(case['grid']), **options)
+        else:
+            output_files = split_image_by_size(case['image'], (case['tile_size'], case['tile_size']), **options)
+        wall = time.perf_counter() - start
+        peak_rss = _peak_rss_mb()
+        output_bytes = _directory_size(output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    input_mb = width * height * bands / 1e6
+    result = dict(case)
+    result.update({
+        'image_size': [width, height],
+        'tiles': len(output_files),
+        'wall_seconds': round(wall, 4),
+        'tiles_per_sec': round(len(output_files) / wall, 2) if wall else None,
+        'input_mb_per_sec': round(input_mb / wall, 2) if wall else None,
+        'output_bytes': output_bytes,
+        'output_mb_per_sec': round(output_bytes / 1e6 / wall, 2) if wall else None,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        'stages': {name: round(stage['seconds'], 4) for name, stage in stats.to_dict()['stages'].items()},
+    })
+    return result
+
+
+def _run_isolated(case: dict) -> dict:
+    """
+    計測条件を新しいプロセスで実行し、ピークRSSが他の条件の影響を受けないようにします。
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case,))
+
+
+def _service_job(image: str, tile_size: int, format: str) -> dict:
+    """タイルサービスの1ジョブと同じように、タイルをメモリ上に分割して返します。"""
+    tiles = {}
+    split_image_by_size(image, (tile_size, tile_size), format=format, sink=tiles)
+    return tiles
+
+
+def run_service_case(case: dict) -> dict:
+    """
+    タイルサービスと同じように複数の分割ジョブを同時に実行し、スレッドプールとプロセスプールを比較します。
+
+    各ジョブは入力画像をデコードし、タイルをメモリ上にエンコードして返します（プロセスプールでは
+    タイルを呼び出し元のプロセスに転送する時間を含みます）。プロセスの起動時間は含みません。
+
+    Args:
+        case: 計測条件（image, pool, workers, jobs, tile_size, format）。poolはthreadまたはprocess
+
+    Returns:
+        計測条件に計測結果を加えた辞書
+    """
+    if case['pool'] == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=case['workers'], mp_context=multiprocessing.get_context('spawn')
+        )
+        # ワーカープロセスを起動しておく（常駐するサービスでは起動時間は1回だけ）
+        for future in [executor.submit(time.sleep, 0) for _ in range(case['workers'])]:
+            future.result()
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=case['workers'])
+
+    with executor:
+        start = time.perf_counter()
+        futures = [executor.submit(_service_job, case['image'], case['tile_size'], case['format'])
+                   for _ in range(case['jobs'])]
+        output_bytes = sum(len(data) for future in futures for data in future.result().values())
+        wall = time.perf_counter() - start
+
+    result = dict(case)
+    result.update({
+        'wall_seconds': round(wall, 4),
+        'jobs_per_sec': round(case['jobs'] / wall, 2) if wall else None,
+        'output_bytes': output_bytes,
+    })
+    return result
+
+
+def build_cases(images: List[str], functions: List[str], formats: List[str], tile_sizes: List[int],
+                overlaps: List[int], workers: List[int], grid=DEFAULT_GRID) -> List[dict]:
+    """
+    計測条件の組み合わせを作成します。
+
+    Args:
+        images: 入力画像のパスのリスト
+        functions: 計測する関数 (size, count)
+        formats: 出力フォーマットのリスト
+        tile_sizes: タイルの一辺の長さのリスト（sizeの場合）
+        overlaps: オーバーラップサイズのリスト
+        workers: ワーカー数のリスト
+        grid: 分割数 (行数, 列数)（countの場合）
+
+    Returns:
+        計測条件のリスト
+    """
+    cases = []
+    for image, function, format, overlap, worker_count in itertools.product(
+        images, functions, formats, overlaps, workers
+    ):
+        case = {
+            'image': image,
+            'function': function,
+            'format': format,
+            'overlap': overlap,
+            'workers': worker_count,
+        }
+        if function == 'count':
+            cases.append(dict(case, grid=list(grid)))
+        else:
+            cases.extend(dict(case, tile_size=tile_size) for tile_size in tile_sizes if tile_size > overlap)
+    return cases
+
+
+def compare_results(previous: dict, current: dict) -> List[str]:
+    """
+    2つのベンチマーク結果のスループットを比較します。
+
+    Args:
+        previous: 以前の結果
+        current: 今回の結果
+
+    Returns:
+        比較結果の行のリスト
+    """
+    def key(case):
+        return (os.path.basename(case['image']), case['function'], case['format'], case.get('tile_size'),
+                case['overlap'], case['workers'])
+
+    previous_cases = {key(case): case for case in previous['cases']}
+    lines = []
+    for case in current['cases']:
+        before = previous_cases.get(key(case))
+        if before and before['tiles_per_sec'] and case['tiles_per_sec']:
+            ratio = case['tiles_per_sec'] / before['tiles_per_sec']
+            lines.append(f"{_describe(case)}: {before['tiles_per_sec']} -> {case['tiles_per_sec']} tiles/s ({ratio:.2f}x)")
+    return lines
+
+
+def _describe(case: dict) -> str:
+    """計測条件を1行で表します。"""
+    if case['function'] == 'count':
+        shape = f"count {case['grid'][0]}x{case['grid'][1]}"
+    else:
+        shape = f"size {case['tile_size']}"
+    return (f"{os.path.basename(case['image'])} {shape} {case['format']} "
+            f"overlap={case['overlap']} workers={case['workers']}")
+
+
+def _split_list(value: str, item_type=str) -> list:
+    """カンマ区切りの文字列をリストに変換します。"""
+    return [item_type(item) for item in value.split(',') if item]
+
+
+def _report(results: List[dict]) -> dict:
+    """計測結果に実行環境の情報を加えた辞書を作成します。"""
+    return {
+        'chopimg_version': __import__('cli').__version__,
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': results,
+    }
+
+
+def _write_report(report: dict, json_path: Optional[str]) -> None:
+    """計測結果をJSONファイルに書き出します（json_pathがNoneの場合は何もしない）。"""
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        sys.stdout.write(f"結果を書き出しました: {os.path.abspath(json_path)}\n")
+
+
+def _run_service(parsed_args: argparse.Namespace, images: List[str]) -> int:
+    """
+    タイルサービスのジョブの同時実行を、PNGの出力でスレッドプールとプロセスプールについて計測します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数（workers, tile_sizes, service_jobs, jsonを使用）
+        images: 入力画像のパスのリスト
+
+    Returns:
+        終了コード
+    """
+    results = []
+    for image, worker_count, tile_size, pool in itertools.product(
+        images, _split_list(parsed_args.workers, int), _split_list(parsed_args.tile_sizes, int), ('thread', 'process')
+    ):
+        result = run_service_case({'image': image, 'pool': pool, 'workers': worker_count,
+                                   'jobs': parsed_args.service_jobs, 'tile_size': tile_size, 'format': 'png'})
+        results.append(result)
+        sys.stdout.write(
+            f"{os.path.basename(image)} size {tile_size} png {pool} pool workers={worker_count}: "
+            f"{result['jobs']} jobs, {result['wall_seconds']:.2f}s, {result['jobs_per_sec']} jobs/s\n"
+        )
+    _write_report(_report(results), parsed_args.json)
+    return 0
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """
+    メイン関数。コマンドライン引数を解析し、ベンチマークを実行します。
+
+    Args:
+        args: コマンドライン引数のリスト（Noneの場合はsys.argvを使用）
+
+    Returns:
+        終了コード
+    """
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="ChopImgの分割処理のベンチマーク",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="入力画像のサイズ（4k, 16k, 40k, WIDTHxHEIGHT）")
+    parser.add_argument("--pattern", default="photo", help="入力画像の模様（grid, photo）")
+    parser.add_argument("--functions", default="size,count", help="計測する関数（size, count）")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS), help="出力フォーマット")
+    parser.add_argument("--tile-sizes", default=",".join(map(str, DEFAULT_TILE_SIZES)), help="タイルの一辺の長さ")
+    parser.add_argument("--overlaps", default=",".join(map(str, DEFAULT_OVERLAPS)), help="オーバーラップサイズ")
+    parser.add_argument("--workers", default=",".join(map(str, DEFAULT_WORKERS)), help="ワーカー数")
+    parser.add_argument("--data-dir", default="bench_data", help="生成した入力画像の保存先")
+    parser.add_argument("--json", help="結果を書き出すJSONファイル")
+    parser.add_argument("--compare", help="比較対象の以前の結果（JSONファイル）")
+    parser.add_argument("--no-isolate", action="store_true", help="計測条件ごとにプロセスを分けない")
+    parser.add_argument("--service", action="store_true",
+                        help="分割の代わりに、タイルサービスのジョブの同時実行をスレッドプールとプロセスプールで比較する")
+    parser.add_argument("--service-jobs", default=DEFAULT_SERVICE_JOBS, type=int, help="--serviceで実行するジョブ数")
+    parsed_args = parser.parse_args(args)
+
+    # 入力画像を生成（同じ条件なら同じ画像になるため既存のものを再利用）
+    os.makedirs(parsed_args.data_dir, exist_ok=True)
+    images = []
+    for size_str in _split_list(parsed_args.sizes):
+        size = parse_image_size(size_str)
+        path = os.path.join(parsed_args.data_dir, f"{parsed_args.pattern}_{size[0]}x{size[1]}.png")
+        if not os.path.isfile(path):
+            create_test_image(path, size, pattern=parsed_args.pattern)
+        images.append(path)
+
+    if parsed_args.service:
+        return _run_service(parsed_args, images)
+
+    cases = build_cases(
+        images,
+        _split_list(parsed_args.functions),
+        _split_list(parsed_args.formats),
+        _split_list(parsed_args.tile_sizes, int),
+        _split_list(parsed_args.overlaps, int),
+        _split_list(parsed_args.workers, int)
+    )
+
+    results = []
+    for case in cases:
+        result = run_case(case) if parsed_args.no_isolate else _run_isolated(case)
+        results.append(result)
+        stages = " ".join(f"{name}={seconds:.2f}s" for name, seconds in result['stages'].items())
+        sys.stdout.write(
+            f"{_describe(result)}: {result['tiles']} tiles, {result['wall_seconds']:.2f}s, "
+            f"{result['tiles_per_sec']} tiles/s, {result['input_mb_per_sec']} MB/s, "
+            f"peak RSS {result['peak_rss_mb']} MB [{stages}]\n"
+        )
+
+    report = _report(results)
+    _write_report(report, parsed_args.json)
+
+    if parsed_args.compare:
+        with open(parsed_args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        for line in compare_results(previous, report):
+            sys.stdout.write(line + "\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,9 +7,29 @@ echo.
 pyinstaller --onefile ^
             --name chopimg ^
             --hidden-import core ^
+            --hidden-import streaming ^
+            --hidden-import container ^
+            --hidden-import profiling ^
+            --hidden-import encoder ^
+            --hidden-import jpegcrop ^
+            --hidden-import tiffsource ^
+            --hidden-import rawsource ^
+            --hidden-import sink ^
+            --hidden-import sourcecache ^
+            --hidden-import server ^
             --hidden-import PIL ^
             --hidden-import PIL.Image ^
             --add-data "core.py;." ^
+            --add-data "streaming.py;." ^
+            --add-data "container.py;." ^
+            --add-data "profiling.py;." ^
+            --add-data "encoder.py;." ^
+            --add-data "jpegcrop.py;." ^
+            --add-data "tiffsource.py;." ^
+            --add-data "rawsource.py;." ^
+            --add-data "sink.py;." ^
+            --add-data "sourcecache.py;." ^
+            --add-data "server.py;." ^
             --exclude-module numpy ^
             --exclude-module pandas ^
             --exclude-module matplotlib ^
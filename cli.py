@@ -5,16 +5,32 @@ ChopImg - コマンドラインインターフェース
 """
 
 import argparse
+import contextlib
+import glob
 import sys
 import os
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
+
+from PIL import Image
 
 # バージョン情報を直接定義
 __version__ = '0.1.0'
 
+# ディレクトリ指定時に入力として扱う拡張子
+INPUT_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.tif', '.tiff', '.bmp', '.ppm')
+
 # core モジュールを絶対インポートに変更
 import core
-from core import split_image_by_size, split_image_by_count, get_image_info
+from container import CONTAINER_FORMATS
+from sink import SINK_TYPES, STDOUT_PATH, open_sink
+from profiling import SplitStats
+from encoder import PNG_FILTERS
+from streaming import SCALES
+from core import (
+    split_image_by_size, split_image_by_count, split_image_frames, split_image_pyramid, split_image_quadtree, split_images,
+    get_image_info,
+    PYRAMID_LAYOUTS, OVERLAP_MODES, QUADTREE_CRITERIA
+)
 
 
 def parse_size(size_str: str) -> Tuple[int, int]:
@@ -37,6 +53,58 @@ def parse_size(size_str: str) -> Tuple[int, int]:
         raise ValueError(f"サイズの形式が正しくありません: {size_str}。'WIDTHxHEIGHT'形式で指定してください。")
 
 
+def parse_region(region_str: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    'LEFT,TOP,RIGHT,BOTTOM'形式の文字列をタプルに変換します。
+
+    Args:
+        region_str: 'LEFT,TOP,RIGHT,BOTTOM'形式の範囲文字列（未指定の場合はNone）
+
+    Returns:
+        (left, top, right, bottom)のタプル（未指定の場合はNone）
+
+    Raises:
+        ValueError: 形式が正しくない場合
+    """
+    if region_str is None:
+        return None
+    try:
+        left, top, right, bottom = (int(value) for value in region_str.split(','))
+    except ValueError:
+        raise ValueError(f"範囲の形式が正しくありません: {region_str}。'LEFT,TOP,RIGHT,BOTTOM'形式で指定してください。")
+    if left < 0 or top < 0 or left >= right or top >= bottom:
+        raise ValueError(f"範囲は0 <= LEFT < RIGHT、0 <= TOP < BOTTOM で指定してください: {region_str}")
+    return (left, top, right, bottom)
+
+
+def parse_frames(frames_str: Optional[str]) -> Union[str, Tuple[int, int], None]:
+    """
+    'all'、'N-M'または'N'形式の文字列を分割するフレームの指定に変換します。
+
+    Args:
+        frames_str: 'all'、'N-M'または'N'形式のフレーム文字列（未指定の場合はNone）
+
+    Returns:
+        'all'、または(最初, 最後)のタプル（未指定の場合はNone）
+
+    Raises:
+        ValueError: 形式が正しくない場合
+    """
+    if frames_str is None:
+        return None
+    if frames_str == 'all':
+        return 'all'
+    try:
+        first, separator, last = frames_str.partition('-')
+        first = int(first)
+        last = int(last) if separator else first
+    except ValueError:
+        raise ValueError(f"フレームの形式が正しくありません: {frames_str}。'all'、'N-M'または'N'形式で指定してください。")
+    if first < 0 or first > last:
+        raise ValueError(f"フレームは0 <= N <= M で指定してください: {frames_str}")
+    return (first, last)
+
+
 def validate_format(format_str: str) -> str:
     """
     出力フォーマットが有効かどうかを検証します。
@@ -78,6 +146,105 @@ def validate_quality(quality: int) -> int:
     return quality
 
 
+def validate_jobs(jobs: int) -> int:
+    """
+    並列ジョブ数が有効かどうかを検証します。
+
+    Args:
+        jobs: 並列ジョブ数（0の場合はCPU数）
+
+    Returns:
+        検証済みの並列ジョブ数
+
+    Raises:
+        ValueError: 並列ジョブ数が負の場合
+    """
+    if jobs < 0:
+        raise ValueError(f"並列ジョブ数は0以上である必要があります: {jobs}")
+
+    return jobs
+
+
+def validate_png_level(level_str: Optional[str]) -> Union[int, str, None]:
+    """
+    PNGの圧縮レベルが有効かどうかを検証します。
+
+    Args:
+        level_str: 圧縮レベルの文字列（0-9またはauto）
+
+    Returns:
+        検証済みの圧縮レベル（autoの場合は'auto'、未指定の場合はNone）
+
+    Raises:
+        ValueError: 圧縮レベルが無効な場合
+    """
+    if level_str is None:
+        return None
+    if level_str.lower() == 'auto':
+        return 'auto'
+    if not level_str.isdigit() or not 0 <= int(level_str) <= 9:
+        raise ValueError(f"PNGの圧縮レベルは0から9またはautoで指定してください: {level_str}")
+
+    return int(level_str)
+
+
+def _has_glob_pattern(path: str) -> bool:
+    """パスにワイルドカードが含まれているかどうかを判定します。"""
+    return any(char in path for char in "*?[")
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """
+    マニフェストファイルから入力パスを読み込みます。
+
+    1行に1つのパス（ディレクトリやワイルドカードも可）を記述します。
+    空行と「#」で始まる行は無視します。
+
+    Args:
+        manifest_path: マニフェストファイルのパス
+
+    Returns:
+        入力パスのリスト
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def collect_input_files(inputs: List[str], manifest: Optional[str] = None) -> List[str]:
+    """
+    入力指定（ファイル、ディレクトリ、ワイルドカード、マニフェスト）を展開します。
+
+    存在しないファイルはそのまま残し、処理時にエラーとして報告します。
+
+    Args:
+        inputs: コマンドラインで指定された入力のリスト
+        manifest: マニフェストファイルのパス
+
+    Returns:
+        重複を除いた入力画像ファイルのパスのリスト
+    """
+    entries = list(inputs)
+    if manifest:
+        entries.extend(read_manifest(manifest))
+
+    input_files = []
+    for entry in entries:
+        if os.path.isdir(entry):
+            # ディレクトリ直下の画像ファイルを追加
+            input_files.extend(
+                os.path.join(entry, name) for name in sorted(os.listdir(entry))
+                if name.lower().endswith(INPUT_EXTENSIONS) and os.path.isfile(os.path.join(entry, name))
+            )
+        elif _has_glob_pattern(entry):
+            input_files.extend(path for path in sorted(glob.glob(entry, recursive=True)) if os.path.isfile(path))
+        else:
+            input_files.append(entry)
+
+    # 順序を保ったまま重複を除く
+    return list(dict.fromkeys(input_files))
+
+
 def main(args: Optional[List[str]] = None) -> int:
     """
     メイン関数。コマンドライン引数を解析し、画像分割を実行します。
@@ -91,6 +258,11 @@ def main(args: Optional[List[str]] = None) -> int:
     if args is None:
         args = sys.argv[1:]
 
+    # chopimg serve はタイルサービスとして起動（serverはcliを参照するため、ここで読み込む）
+    if args and args[0] == 'serve':
+        import server
+        return server.main(args[1:])
+
     parser = argparse.ArgumentParser(
         prog="chopimg",
         description="大きな画像ファイルを指定サイズに分割するツール",
@@ -98,8 +270,16 @@ def main(args: Optional[List[str]] = None) -> int:
     )
 
     parser.add_argument(
-        "input_file",
-        help="入力画像ファイルのパス"
+        "input_files",
+        help="入力画像ファイルのパス（複数指定、ディレクトリ、ワイルドカードも可）",
+        nargs="*",
+        metavar="input_file"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="入力パスを1行に1つずつ記述したファイル",
+        type=str,
+        metavar="FILE"
     )
 
     size_group = parser.add_mutually_exclusive_group()
@@ -124,7 +304,7 @@ def main(args: Optional[List[str]] = None) -> int:
     )
     parser.add_argument(
         "-o", "--output",
-        help="出力ディレクトリ",
+        help="出力ディレクトリ（--sink tarの場合はtarファイルのパス。-で標準出力にtar形式で出力）",
         default=".",
         type=str
     )
@@ -140,12 +320,171 @@ def main(args: Optional[List[str]] = None) -> int:
         default=90,
         type=int
     )
+    parser.add_argument(
+        "--png-level",
+        help="PNGの圧縮レベル（0-9、autoで数個のタイルから速度とサイズの釣り合う設定を自動で選ぶ）",
+        type=str,
+        metavar="LEVEL"
+    )
+    parser.add_argument(
+        "--png-optimize",
+        help="PNGをoptimize（圧縮レベル9）で保存する（--png-level未指定時の既定）",
+        dest="png_optimize",
+        action="store_true",
+        default=None
+    )
+    parser.add_argument(
+        "--no-png-optimize",
+        help="PNGをoptimizeなしで保存する",
+        dest="png_optimize",
+        action="store_false"
+    )
+    parser.add_argument(
+        "--png-filter",
+        help="PNGの行フィルタ（adaptive: 行ごとに選択, none: フィルタなしで高速）",
+        default="adaptive",
+        choices=PNG_FILTERS
+    )
+    parser.add_argument(
+        "--jpeg-lossless",
+        help="JPEG画像をJPEGで出力する場合に、MCUの境界に揃ったタイルを再エンコードせずに切り出す。"
+             "再エンコードによる画質の劣化を避けるためのオプションで、高速化にはならない"
+             "（処理は再エンコードより遅くなる）",
+        action="store_true"
+    )
     parser.add_argument(
         "-ol", "--overlap",
         help="オーバーラップサイズ（ピクセル）",
         default=0,
         type=int
     )
+    parser.add_argument(
+        "--overlap-mode",
+        help="オーバーラップの扱い（crop: タイルごとに切り出す, shared: 重ならない部分だけを書き出し、"
+             "タイルを組み立てるためのマニフェストを出力）",
+        default="crop",
+        choices=OVERLAP_MODES
+    )
+    parser.add_argument(
+        "--frames",
+        help="複数ページのTIFFやアニメーションGIFの分割するフレーム（all, N-M, N。0始まり）",
+        type=str
+    )
+    parser.add_argument(
+        "--frame-jobs",
+        help="--framesを指定した場合に同時に分割するフレームの数（0でCPU数）",
+        default=1,
+        type=int
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        help="タイルのエンコードに使用する並列ジョブ数（0でCPU数）",
+        default=1,
+        type=int
+    )
+    parser.add_argument(
+        "--file-jobs",
+        help="複数の画像を処理する場合に同時に処理する画像の数（0でCPU数）",
+        default=1,
+        type=int
+    )
+    parser.add_argument(
+        "--write-queue",
+        help="書き込み待ちのタイル数の上限。指定するとエンコードとファイルの書き込みを別のスレッドで並行して行う（0で無効）",
+        default=0,
+        type=int,
+        metavar="N"
+    )
+    parser.add_argument(
+        "--fsync",
+        help="すべてのタイルを書き込んだ後に、まとめてディスクに同期する",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--stream",
+        help="タイル1行分ずつデコードしてメモリ使用量を抑える",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--region",
+        help="指定した範囲（元画像の座標）に重なるタイルだけを出力し、その部分だけをデコードする",
+        type=str,
+        metavar="LEFT,TOP,RIGHT,BOTTOM"
+    )
+    parser.add_argument(
+        "--scale",
+        help="画像を1/SCALEに縮小してデコードしてから分割する（JPEGはDCTスケーリングで高速にデコード）",
+        default=1,
+        type=int,
+        choices=SCALES
+    )
+    parser.add_argument(
+        "--max-pixels",
+        help="入力画像の画素数の上限（解凍爆弾の検査。0で無効。省略時はPillowの既定値）",
+        type=int,
+        metavar="N"
+    )
+    parser.add_argument(
+        "--skip-blank",
+        help="単色または完全に透明なタイルを保存しない",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--dedupe",
+        help="同一内容のタイルを1回だけ保存する",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--cache",
+        help="前回の分割結果を再利用し、変更されたタイルだけを再生成する",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--container",
+        help="タイルを1つのファイルにまとめて書き出す（zip: 無圧縮ZIP, mbtiles: SQLite）",
+        choices=list(CONTAINER_FORMATS)
+    )
+    parser.add_argument(
+        "--sink",
+        help="タイルの出力先（dir: 出力ディレクトリにファイルとして, tar: -oのパスにtar形式で。"
+             "省略時は-o -の場合にtar、それ以外はdir）",
+        choices=SINK_TYPES
+    )
+    parser.add_argument(
+        "--pyramid",
+        help="ズーム用のタイルピラミッドを作成（--sizeは正方形、省略時は256x256）",
+        choices=PYRAMID_LAYOUTS
+    )
+    parser.add_argument(
+        "--quadtree",
+        help="内容の変化が大きい部分だけを最小のタイルサイズ（ピクセル）まで4分割する"
+             "（--sizeは最大のタイルサイズで正方形、省略時は512x512）",
+        type=int,
+        metavar="MIN_SIZE"
+    )
+    parser.add_argument(
+        "--quadtree-threshold",
+        help="四分木分割でタイルを分割するしきい値（varianceは輝度の標準偏差、edgesはエッジの画素の割合（%）。"
+             "省略時はvarianceで10、edgesで1）",
+        type=float
+    )
+    parser.add_argument(
+        "--quadtree-criterion",
+        help="四分木分割の判定基準（variance: 輝度の標準偏差, edges: エッジの画素の割合）",
+        default="variance",
+        choices=list(QUADTREE_CRITERIA)
+    )
+    parser.add_argument(
+        "--profile",
+        help="工程ごとの処理時間、遅いタイル、スループット（PNGでは使用した圧縮設定）を表示する",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--profile-json",
+        help="計測結果をJSONファイルに書き出す（--profileを含む）",
+        type=str,
+        metavar="PATH"
+    )
     parser.add_argument(
         "-i", "--info",
         help="画像情報のみを表示",
@@ -161,6 +500,70 @@ def main(args: Optional[List[str]] = None) -> int:
     # 引数を解析
     parsed_args = parser.parse_args(args)
 
+    if parsed_args.max_pixels is not None and parsed_args.max_pixels < 0:
+        sys.stderr.write("エラー: 画素数の上限（--max-pixels）は0以上である必要があります")
+        return 1
+
+    # 画素数の上限はImage.openとタイル化TIFF・メモリマップの読み込みで共通のため、
+    # 実行中だけImage.MAX_IMAGE_PIXELSに設定し、終了後に元に戻す
+    max_image_pixels = Image.MAX_IMAGE_PIXELS
+    if parsed_args.max_pixels is not None:
+        Image.MAX_IMAGE_PIXELS = parsed_args.max_pixels or None
+    try:
+        return _main(parsed_args)
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_image_pixels
+
+
+def _main(parsed_args: argparse.Namespace) -> int:
+    """
+    出力先を開き、解析済みのコマンドライン引数に従って画像を処理します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        終了コード
+    """
+    # tarの出力先は標準出力をメッセージの出力先に切り替える前に開く
+    try:
+        parsed_args.output_sink = _open_output_sink(parsed_args)
+    except (ValueError, OSError) as e:
+        sys.stderr.write(f"エラー: {str(e)}")
+        return 1
+
+    try:
+        # 標準出力にtarを書き出す場合は、メッセージを標準エラー出力に表示
+        if parsed_args.output == STDOUT_PATH:
+            with contextlib.redirect_stdout(sys.stderr):
+                return _run(parsed_args)
+        return _run(parsed_args)
+    finally:
+        if parsed_args.output_sink is not None:
+            parsed_args.output_sink.close()
+
+
+def _run(parsed_args: argparse.Namespace) -> int:
+    """
+    解析済みのコマンドライン引数に従って画像を処理します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        終了コード
+    """
+    if not parsed_args.input_files and not parsed_args.manifest:
+        sys.stderr.write("エラー: 入力ファイルまたはマニフェスト（--manifest）を指定してください。")
+        return 1
+
+    # 複数の入力、ディレクトリ、ワイルドカード、マニフェストの場合はバッチ処理
+    if (len(parsed_args.input_files) != 1 or parsed_args.manifest
+            or os.path.isdir(parsed_args.input_files[0]) or _has_glob_pattern(parsed_args.input_files[0])):
+        return _run_batch(parsed_args)
+
+    parsed_args.input_file = parsed_args.input_files[0]
+
     # 入力ファイルが存在するか確認
     if not os.path.isfile(parsed_args.input_file):
         sys.stderr.write(f"エラー: 入力ファイルが見つかりません: {parsed_args.input_file}")
@@ -176,11 +579,37 @@ def main(args: Optional[List[str]] = None) -> int:
             sys.stdout.write(f"モード: {info['mode']}\n")
             return 0
 
-        # フォーマットを検証
-        format_str = validate_format(parsed_args.format)
-        
-        # 画質を検証
-        quality = validate_quality(parsed_args.quality)
+        # ピラミッドを作成する場合
+        if parsed_args.pyramid:
+            tile_size, pyramid_options = _pyramid_options(parsed_args)
+            output_files = split_image_pyramid(
+                image_path=parsed_args.input_file,
+                prefix=parsed_args.prefix,
+                tile_size=tile_size[0],
+                layout=parsed_args.pyramid,
+                **pyramid_options
+            )
+            sys.stdout.write(f"{len(output_files)}個のタイルからなるピラミッドを作成しました。\n")
+            _write_output_location(parsed_args)
+            _write_report(parsed_args, pyramid_options['stats'])
+            return 0
+
+        # 四分木分割する場合
+        if parsed_args.quadtree is not None:
+            tile_size, quadtree_options = _quadtree_options(parsed_args)
+            output_files = split_image_quadtree(
+                image_path=parsed_args.input_file,
+                prefix=parsed_args.prefix,
+                max_tile_size=tile_size[0],
+                **quadtree_options
+            )
+            sys.stdout.write(f"画像を内容に応じて{len(output_files)}個のタイルに分割しました。\n")
+            _write_output_location(parsed_args)
+            _write_report(parsed_args, quadtree_options['stats'])
+            return 0
+
+        # 分割オプションを検証
+        split_options = _split_options(parsed_args)
 
         # サイズまたは分割数が指定されていない場合はエラー
         if not parsed_args.size and not parsed_args.count:
@@ -188,33 +617,39 @@ def main(args: Optional[List[str]] = None) -> int:
             return 1
 
         # 分割を実行
-        if parsed_args.size:
+        frames = parse_frames(parsed_args.frames)
+        if frames is not None:
+            output_files = split_image_frames(
+                image_path=parsed_args.input_file,
+                tile_size=parse_size(parsed_args.size) if parsed_args.size else None,
+                grid_size=parse_size(parsed_args.count) if parsed_args.count else None,
+                frames=frames,
+                prefix=parsed_args.prefix,
+                frame_workers=validate_jobs(parsed_args.frame_jobs),
+                **split_options
+            )
+        elif parsed_args.size:
             tile_size = parse_size(parsed_args.size)
             output_files = split_image_by_size(
                 image_path=parsed_args.input_file,
                 tile_size=tile_size,
-                output_dir=parsed_args.output,
                 prefix=parsed_args.prefix,
-                format=format_str,
-                quality=quality,
-                overlap=parsed_args.overlap
+                **split_options
             )
         else:  # parsed_args.count
             grid_size = parse_size(parsed_args.count)
             output_files = split_image_by_count(
                 image_path=parsed_args.input_file,
                 grid_size=grid_size,
-                output_dir=parsed_args.output,
                 prefix=parsed_args.prefix,
-                format=format_str,
-                quality=quality,
-                overlap=parsed_args.overlap
+                **split_options
             )
 
         # 結果を表示
         sys.stdout.write(f"画像を{len(output_files)}個のタイルに分割しました。\n")
-        sys.stdout.write(f"出力ディレクトリ: {os.path.abspath(parsed_args.output)}\n")
-        
+        _write_output_location(parsed_args)
+        _write_report(parsed_args, split_options['stats'])
+
         return 0
 
     except ValueError as e:
@@ -225,5 +660,359 @@ def main(args: Optional[List[str]] = None) -> int:
         return 1
 
 
+def _open_output_sink(parsed_args: argparse.Namespace):
+    """
+    コマンドライン引数からタイルの出力先を開きます。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        tar形式の出力先（ディレクトリに書き出す場合、画像情報のみを表示する場合はNone）
+
+    Raises:
+        ValueError: 標準出力（-o -）にディレクトリ（--sink dir）を指定した場合
+        OSError: tarファイルを作成できない場合
+    """
+    # ディレクトリは分割関数がoutput_dirに書き出す
+    if parsed_args.info or (parsed_args.sink in (None, 'dir') and parsed_args.output != STDOUT_PATH):
+        return None
+    return open_sink(parsed_args.sink, parsed_args.output)
+
+
+def _write_output_location(parsed_args: argparse.Namespace) -> None:
+    """
+    タイルの出力先を表示します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+    """
+    if parsed_args.output_sink is None:
+        sys.stdout.write(f"出力ディレクトリ: {os.path.abspath(parsed_args.output)}\n")
+    elif parsed_args.output == STDOUT_PATH:
+        sys.stdout.write("出力先: 標準出力（tar）\n")
+    else:
+        sys.stdout.write(f"出力先: {os.path.abspath(parsed_args.output)}（tar）\n")
+
+
+def _split_options(parsed_args: argparse.Namespace) -> dict:
+    """
+    コマンドライン引数から分割関数に渡すオプションを組み立てます。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        分割関数に渡すキーワード引数の辞書
+
+    Raises:
+        ValueError: オプションの値が無効な場合
+    """
+    return {
+        'output_dir': parsed_args.output,
+        'format': validate_format(parsed_args.format),
+        'quality': validate_quality(parsed_args.quality),
+        'overlap': parsed_args.overlap,
+        'overlap_mode': parsed_args.overlap_mode,
+        'workers': validate_jobs(parsed_args.jobs),
+        'stream': parsed_args.stream,
+        'skip_blank': parsed_args.skip_blank,
+        'dedupe': parsed_args.dedupe,
+        'cache': parsed_args.cache,
+        'container': parsed_args.container,
+        'stats': _profile_stats(parsed_args),
+        'jpeg_lossless': parsed_args.jpeg_lossless,
+        'scale': parsed_args.scale,
+        'region': parse_region(parsed_args.region),
+        'write_queue': parsed_args.write_queue,
+        'fsync': parsed_args.fsync,
+        'sink': parsed_args.output_sink,
+        **_png_options(parsed_args),
+    }
+
+
+def _pyramid_options(parsed_args: argparse.Namespace) -> Tuple[Tuple[int, int], dict]:
+    """
+    コマンドライン引数からピラミッド作成のタイルサイズとオプションを組み立てます。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        (タイルサイズ, split_image_pyramidに渡すキーワード引数の辞書)のタプル
+
+    Raises:
+        ValueError: オプションの値が無効な場合
+    """
+    if parsed_args.count:
+        raise ValueError("ピラミッド出力では分割数（--count）は指定できません")
+    if parsed_args.scale != 1:
+        raise ValueError("ピラミッド出力では縮小（--scale）は指定できません")
+    if parsed_args.region:
+        raise ValueError("ピラミッド出力では範囲（--region）は指定できません")
+    if parsed_args.output_sink is not None:
+        raise ValueError("ピラミッド出力ではtar形式の出力先（--sink tar）は指定できません")
+    if parsed_args.overlap_mode != 'crop':
+        raise ValueError("ピラミッド出力ではオーバーラップの扱い（--overlap-mode）は指定できません")
+    if parsed_args.quadtree is not None:
+        raise ValueError("ピラミッド出力と四分木分割（--quadtree）は同時に指定できません")
+    if parsed_args.frames:
+        raise ValueError("ピラミッド出力ではフレーム（--frames）は指定できません")
+
+    tile_size = parse_size(parsed_args.size) if parsed_args.size else (256, 256)
+    if tile_size[0] != tile_size[1]:
+        raise ValueError(f"ピラミッド出力では正方形のサイズを指定してください: {parsed_args.size}")
+
+    return tile_size, {
+        'output_dir': parsed_args.output,
+        'format': validate_format(parsed_args.format),
+        'quality': validate_quality(parsed_args.quality),
+        'overlap': parsed_args.overlap,
+        'workers': validate_jobs(parsed_args.jobs),
+        'stats': _profile_stats(parsed_args),
+        'write_queue': parsed_args.write_queue,
+        'fsync': parsed_args.fsync,
+        **_png_options(parsed_args),
+    }
+
+
+def _quadtree_options(parsed_args: argparse.Namespace) -> Tuple[Tuple[int, int], dict]:
+    """
+    コマンドライン引数から四分木分割の最大のタイルサイズとオプションを組み立てます。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        (最大のタイルサイズ, split_image_quadtreeに渡すキーワード引数の辞書)のタプル
+
+    Raises:
+        ValueError: オプションの値が無効な場合
+    """
+    if parsed_args.count:
+        raise ValueError("四分木分割では分割数（--count）は指定できません")
+    if parsed_args.overlap:
+        raise ValueError("四分木分割ではオーバーラップ（--overlap）は指定できません")
+    if parsed_args.scale != 1:
+        raise ValueError("四分木分割では縮小（--scale）は指定できません")
+    if parsed_args.region:
+        raise ValueError("四分木分割では範囲（--region）は指定できません")
+    if parsed_args.frames:
+        raise ValueError("四分木分割ではフレーム（--frames）は指定できません")
+    if parsed_args.output_sink is not None:
+        raise ValueError("四分木分割ではtar形式の出力先（--sink tar）は指定できません")
+
+    tile_size = parse_size(parsed_args.size) if parsed_args.size else (512, 512)
+    if tile_size[0] != tile_size[1]:
+        raise ValueError(f"四分木分割では正方形のサイズを指定してください: {parsed_args.size}")
+
+    return tile_size, {
+        'output_dir': parsed_args.output,
+        'min_tile_size': parsed_args.quadtree,
+        'threshold': parsed_args.quadtree_threshold,
+        'criterion': parsed_args.quadtree_criterion,
+        'format': validate_format(parsed_args.format),
+        'quality': validate_quality(parsed_args.quality),
+        'workers': validate_jobs(parsed_args.jobs),
+        'stats': _profile_stats(parsed_args),
+        'write_queue': parsed_args.write_queue,
+        'fsync': parsed_args.fsync,
+        **_png_options(parsed_args),
+    }
+
+
+def _png_options(parsed_args: argparse.Namespace) -> dict:
+    """
+    コマンドライン引数からPNGの圧縮設定のオプションを組み立てます。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        分割関数に渡すキーワード引数の辞書
+
+    Raises:
+        ValueError: 圧縮レベルが無効な場合
+    """
+    return {
+        'png_level': validate_png_level(parsed_args.png_level),
+        'png_optimize': parsed_args.png_optimize,
+        'png_filter': parsed_args.png_filter,
+    }
+
+
+def _profile_stats(parsed_args: argparse.Namespace) -> Optional[SplitStats]:
+    """
+    計測用のオブジェクトを作成します。
+
+    --profileまたは--profile-jsonが指定されている場合だけ作成します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        計測用のオブジェクト（計測しない場合はNone）
+    """
+    if parsed_args.profile or parsed_args.profile_json:
+        return SplitStats()
+    return None
+
+
+def _write_report(parsed_args: argparse.Namespace, stats: Optional[SplitStats]) -> None:
+    """
+    計測結果と、PNGで出力した場合は使用した圧縮設定を表示します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+        stats: 計測結果（Noneの場合は何もしない）
+    """
+    if stats is None:
+        return
+
+    png = stats.settings.get('png')
+    if png is not None:
+        elapsed = stats.elapsed
+        output_bytes = stats.to_dict()['output_bytes']
+        sys.stdout.write(
+            f"PNG設定: 圧縮レベル {png['level']}, optimize {'あり' if png['optimize'] else 'なし'}, "
+            f"行フィルタ {png['filter']}{'（自動選択）' if png['auto'] else ''}, "
+            f"出力 {output_bytes / 1e6 / elapsed if elapsed else 0.0:.2f} MB/秒\n"
+        )
+
+    _write_profile(stats, parsed_args.profile_json)
+
+
+def _write_profile(stats: Optional[SplitStats], json_path: Optional[str] = None) -> None:
+    """
+    工程ごとの処理時間の内訳、遅いタイル、スループットを表示します。
+
+    ワーカーを複数使用した場合、各工程の時間はすべてのワーカーの合計です。
+
+    Args:
+        stats: 計測結果（Noneの場合は何もしない）
+        json_path: 計測結果を書き出すJSONファイルのパス
+    """
+    if stats is None:
+        return
+
+    profile = stats.to_dict()
+    total_seconds = sum(stage['seconds'] for stage in profile['stages'].values())
+
+    sys.stdout.write("工程別の処理時間:\n")
+    for name, stage in profile['stages'].items():
+        share = stage['seconds'] / total_seconds * 100 if total_seconds else 0.0
+        sys.stdout.write(
+            f"  {name:<8}{stage['seconds']:9.3f}秒 {share:5.1f}% {stage['count']:8d}回 {stage['bytes'] / 1e6:10.2f} MB\n"
+        )
+
+    elapsed = profile['elapsed']
+    input_rate = profile['input_bytes'] / 1e6 / elapsed if elapsed else 0.0
+    output_rate = profile['output_bytes'] / 1e6 / elapsed if elapsed else 0.0
+    sys.stdout.write(
+        f"スループット: {profile['tiles']}個のタイル / {elapsed:.2f}秒 "
+        f"({profile['tiles_per_sec']:.1f}タイル/秒, 入力 {input_rate:.2f} MB/秒, 出力 {output_rate:.2f} MB/秒)\n"
+    )
+
+    if profile['slowest_tiles']:
+        sys.stdout.write("遅いタイル:\n")
+        for tile in profile['slowest_tiles']:
+            sys.stdout.write(f"  {tile['name']}: {tile['seconds'] * 1000:.1f}ミリ秒 ({tile['bytes'] / 1024:.1f} KB)\n")
+
+    if json_path:
+        stats.write_json(json_path)
+        sys.stdout.write(f"計測結果を書き出しました: {os.path.abspath(json_path)}\n")
+
+
+def _run_batch(parsed_args: argparse.Namespace) -> int:
+    """
+    複数の画像をまとめて処理し、画像ごとの結果を表示します。
+
+    Args:
+        parsed_args: 解析済みのコマンドライン引数
+
+    Returns:
+        終了コード（失敗した画像がある場合は1）
+    """
+    try:
+        input_files = collect_input_files(parsed_args.input_files, parsed_args.manifest)
+        if not input_files:
+            sys.stderr.write("エラー: 処理対象の画像ファイルが見つかりません。")
+            return 1
+
+        # 画像情報のみを表示する場合
+        if parsed_args.info:
+            failed = 0
+            for input_file in input_files:
+                try:
+                    info = get_image_info(input_file)
+                except Exception as e:
+                    failed += 1
+                    sys.stderr.write(f"エラー: {input_file}: {str(e)}\n")
+                    continue
+                sys.stdout.write(
+                    f"{info['path']}: {info['format']} {info['size'][0]}x{info['size'][1]}ピクセル {info['mode']}\n"
+                )
+            return 1 if failed else 0
+
+        # 各オプションを検証
+        file_jobs = validate_jobs(parsed_args.file_jobs)
+        if parsed_args.pyramid:
+            tile_size, split_options = _pyramid_options(parsed_args)
+            grid_size = None
+        elif parsed_args.quadtree is not None:
+            tile_size, split_options = _quadtree_options(parsed_args)
+            grid_size = None
+        else:
+            split_options = _split_options(parsed_args)
+
+            # サイズまたは分割数が指定されていない場合はエラー
+            if not parsed_args.size and not parsed_args.count:
+                sys.stderr.write("エラー: サイズ（--size）または分割数（--count）のいずれかを指定してください。")
+                return 1
+
+            tile_size = parse_size(parsed_args.size) if parsed_args.size else None
+            grid_size = parse_size(parsed_args.count) if parsed_args.count else None
+            if parsed_args.frames:
+                split_options['frame_workers'] = validate_jobs(parsed_args.frame_jobs)
+
+        results = split_images(
+            image_paths=input_files,
+            tile_size=tile_size,
+            grid_size=grid_size,
+            prefix=parsed_args.prefix,
+            file_workers=file_jobs,
+            pyramid=parsed_args.pyramid,
+            quadtree=parsed_args.quadtree is not None,
+            frames=parse_frames(parsed_args.frames),
+            **split_options
+        )
+
+    except ValueError as e:
+        sys.stderr.write(f"エラー: {str(e)}")
+        return 1
+    except Exception as e:
+        sys.stderr.write(f"予期しないエラーが発生しました: {str(e)}")
+        return 1
+
+    # 画像ごとの結果を表示
+    failed = [result for result in results if result['error']]
+    total_tiles = sum(len(result['output_files']) for result in results)
+    for result in results:
+        if result['error']:
+            sys.stdout.write(f"失敗: {result['path']}: {result['error']}\n")
+        else:
+            sys.stdout.write(
+                f"成功: {result['path']}: {len(result['output_files'])}個のタイル ({result['elapsed']:.2f}秒)\n"
+            )
+
+    sys.stdout.write(
+        f"{len(results) - len(failed)}/{len(results)}個の画像を{total_tiles}個のタイルに分割しました。\n"
+    )
+    _write_output_location(parsed_args)
+    _write_report(parsed_args, split_options['stats'])
+
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
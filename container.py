@@ -0,0 +1,312 @@
+"""
+ChopImg - タイルコンテナモジュール
+
+大量のタイルを1つのファイル（無圧縮ZIP、MBTiles形式のSQLite）にまとめて
+書き出し、行・列を指定して読み出す機能を提供します。
+"""
+
+import io
+import os
+import re
+import sqlite3
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+from PIL import Image
+
+
+# 使用できるコンテナ形式と拡張子
+CONTAINER_FORMATS = {'zip': 'zip', 'mbtiles': 'mbtiles'}
+
+# SQLiteにまとめて書き込むタイル数
+SQLITE_BATCH_SIZE = 256
+
+# ZIPのメンバー名から行・列を取り出すパターン
+ZIP_MEMBER_PATTERN = re.compile(r"_(\d+)_(\d+)\.\w+$")
+
+
+class ZipTileWriter:
+    """
+    タイルを無圧縮のZIPファイルにまとめて書き出すクラス
+
+    エンコード済みのタイルは既に圧縮されているため、ZIP側では圧縮しません。
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, str]] = None):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+        if metadata:
+            self._zip.comment = "\n".join(f"{key}={value}" for key, value in metadata.items()).encode('utf-8')
+
+    def add(self, name: str, data: bytes, row: int, col: int) -> None:
+        """
+        タイルを追加します。
+
+        Args:
+            name: タイル名
+            data: エンコード済みのタイルデータ
+            row: 行番号
+            col: 列番号
+        """
+        self._zip.writestr(name, data)
+
+    def close(self) -> None:
+        """ZIPファイルを閉じます。"""
+        self._zip.close()
+
+
+class SqliteTileWriter:
+    """
+    タイルをMBTiles形式のSQLiteファイルにまとめて書き出すクラス
+
+    タイルは(行, 列)をキーとしてtilesテーブルに格納し、一定数ごとにまとめて書き込みます。
+    MBTilesの規約（TMS）に合わせ、tile_rowには下から数えた行番号を格納し、
+    読み出し用に行数をmetadataのrowsに記録します。
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, str]] = None, rows: Optional[int] = None):
+        if rows is None or rows <= 0:
+            raise ValueError(f"MBTilesに書き出すにはタイルの行数が必要です: {rows}")
+        self.path = path
+        self.rows = rows
+        if os.path.exists(path):
+            os.remove(path)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute("CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT)")
+        self._connection.execute(
+            "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, "
+            "tile_name TEXT, tile_data BLOB, PRIMARY KEY (zoom_level, tile_column, tile_row))"
+        )
+        self._connection.executemany(
+            "INSERT INTO metadata VALUES (?, ?)", list({**(metadata or {}), 'rows': str(rows)}.items())
+        )
+        self._batch: List[Tuple[int, int, int, str, bytes]] = []
+
+    def add(self, name: str, data: bytes, row: int, col: int) -> None:
+        """
+        タイルを追加します。
+
+        Args:
+            name: タイル名
+            data: エンコード済みのタイルデータ
+            row: 行番号
+            col: 列番号
+        """
+        self._batch.append((0, col, self.rows - 1 - row, name, data))
+        if len(self._batch) >= SQLITE_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._connection.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)", self._batch)
+        self._batch = []
+
+    def close(self) -> None:
+        """未書き込みのタイルを書き込み、SQLiteファイルを閉じます。"""
+        try:
+            if self._batch:
+                self._flush()
+            self._connection.commit()
+        finally:
+            self._connection.close()
+
+
+class ZipTileReader:
+    """無圧縮のZIPファイルからタイルを読み出すクラス"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'r')
+        self._index = {}
+        for name in self._zip.namelist():
+            match = ZIP_MEMBER_PATTERN.search(name)
+            if match:
+                self._index[(int(match.group(1)), int(match.group(2)))] = name
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        """書き出し時に記録したメタデータ"""
+        lines = self._zip.comment.decode('utf-8').splitlines()
+        return dict(line.split("=", 1) for line in lines if "=" in line)
+
+    def positions(self) -> List[Tuple[int, int]]:
+        """格納されているタイルの(行, 列)のリストを返します。"""
+        return sorted(self._index)
+
+    def get(self, row: int, col: int) -> bytes:
+        """
+        タイルのエンコード済みデータを読み出します。
+
+        Args:
+            row: 行番号
+            col: 列番号
+
+        Returns:
+            エンコード済みのタイルデータ
+
+        Raises:
+            KeyError: タイルが存在しない場合
+        """
+        return self._zip.read(self._index[(row, col)])
+
+    def close(self) -> None:
+        """ZIPファイルを閉じます。"""
+        self._zip.close()
+
+
+class SqliteTileReader:
+    """MBTiles形式のSQLiteファイルからタイルを読み出すクラス"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        # tile_rowは下から数えた行番号のため、記録した行数で上からの行番号に変換する
+        self._rows = int(self.metadata['rows'])
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        """書き出し時に記録したメタデータ"""
+        return dict(self._connection.execute("SELECT name, value FROM metadata"))
+
+    def positions(self) -> List[Tuple[int, int]]:
+        """格納されているタイルの(行, 列)のリストを返します。"""
+        return [
+            (self._rows - 1 - tile_row, tile_column)
+            for tile_row, tile_column in self._connection.execute(
+                "SELECT tile_row, tile_column FROM tiles WHERE zoom_level = 0 ORDER BY tile_row DESC, tile_column"
+            )
+        ]
+
+    def get(self, row: int, col: int) -> bytes:
+        """
+        タイルのエンコード済みデータを読み出します。
+
+        Args:
+            row: 行番号
+            col: 列番号
+
+        Returns:
+            エンコード済みのタイルデータ
+
+        Raises:
+            KeyError: タイルが存在しない場合
+        """
+        result = self._connection.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = 0 AND tile_column = ? AND tile_row = ?",
+            (col, self._rows - 1 - row)
+        ).fetchone()
+        if result is None:
+            raise KeyError((row, col))
+        return result[0]
+
+    def close(self) -> None:
+        """SQLiteファイルを閉じます。"""
+        self._connection.close()
+
+
+class TileContainer:
+    """
+    タイルコンテナを読み出すクラス
+
+    open_tile_containerで作成し、行・列を指定してタイルをランダムアクセスで読み出します。
+    """
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    @property
+    def path(self) -> str:
+        """コンテナファイルのパス"""
+        return self._reader.path
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        """書き出し時に記録したメタデータ"""
+        return self._reader.metadata
+
+    def positions(self) -> List[Tuple[int, int]]:
+        """格納されているタイルの(行, 列)のリストを返します。"""
+        return self._reader.positions()
+
+    def get(self, row: int, col: int) -> bytes:
+        """指定した行・列のタイルのエンコード済みデータを返します。"""
+        return self._reader.get(row, col)
+
+    def get_image(self, row: int, col: int) -> Image.Image:
+        """
+        指定した行・列のタイルをデコードして返します。
+
+        Args:
+            row: 行番号
+            col: 列番号
+
+        Returns:
+            タイル画像
+        """
+        tile = Image.open(io.BytesIO(self.get(row, col)))
+        tile.load()
+        return tile
+
+    def __iter__(self) -> Iterator[Tuple[int, int, bytes]]:
+        for row, col in self.positions():
+            yield row, col, self.get(row, col)
+
+    def close(self) -> None:
+        """コンテナファイルを閉じます。"""
+        self._reader.close()
+
+    def __enter__(self) -> "TileContainer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def open_container_writer(path: str, container_format: str, metadata: Optional[Dict[str, str]] = None,
+                          rows: Optional[int] = None):
+    """
+    タイルコンテナの書き出し用オブジェクトを作成します。
+
+    Args:
+        path: コンテナファイルのパス
+        container_format: コンテナ形式 (zip, mbtiles)
+        metadata: コンテナに記録するメタデータ
+        rows: タイルグリッドの行数（mbtilesで行番号を下から数えるために使用）
+
+    Returns:
+        add(name, data, row, col)とclose()を持つ書き出し用オブジェクト
+
+    Raises:
+        ValueError: コンテナ形式が無効な場合、mbtilesで行数を指定しない場合
+    """
+    if container_format == 'zip':
+        return ZipTileWriter(path, metadata)
+    if container_format == 'mbtiles':
+        return SqliteTileWriter(path, metadata, rows)
+    raise ValueError(
+        f"無効なコンテナ形式: {container_format}。有効なコンテナ形式: {', '.join(CONTAINER_FORMATS)}"
+    )
+
+
+def open_tile_container(path: str) -> TileContainer:
+    """
+    タイルコンテナを読み出し用に開きます。
+
+    Args:
+        path: コンテナファイルのパス（ZIPまたはMBTiles形式のSQLite）
+
+    Returns:
+        タイルコンテナ
+
+    Raises:
+        ValueError: コンテナ形式を判別できない場合
+    """
+    if zipfile.is_zipfile(path):
+        return TileContainer(ZipTileReader(path))
+
+    with open(path, 'rb') as f:
+        header = f.read(16)
+    if header == b"SQLite format 3\x00":
+        return TileContainer(SqliteTileReader(path))
+
+    raise ValueError(f"タイルコンテナの形式を判別できません: {path}")
@@ -5,92 +5,1825 @@ ChopImg - コア機能モジュール
 """
 
 import os
+import io
+import json
+import hashlib
 import datetime
-from typing import Tuple, List, Optional
-from PIL import Image
+import time
+import collections
+import contextlib
+import concurrent.futures
+from typing import Tuple, List, Optional, Iterator, Union
+from PIL import Image, ImageFilter, ImageOps, ImageStat
 
+from streaming import SCALES, draft_scale, open_band_reader, reduce_image, scaled_size
+from container import CONTAINER_FORMATS, open_container_writer, open_tile_container
+from profiling import SplitStats, image_nbytes
+from encoder import PNG_FILTERS, choose_png_options, open_tile_encoder
+from jpegcrop import open_jpeg_cropper
+from tiffsource import open_tiled_tiff
+from rawsource import open_mapped_raster
+from sink import DirectorySink, as_sink
+from sourcecache import SourceCache
 
-def split_image_by_size(
+# ピラミッド出力で使用できるレイアウト
+PYRAMID_LAYOUTS = ('dzi', 'xyz')
+
+# オーバーラップの扱い（crop: タイルごとに切り出す, shared: 重ならない部分だけを切り出して共有する）
+OVERLAP_MODES = ('crop', 'shared')
+
+# 四分木分割でタイルを分割するかどうかの判定基準と、しきい値の既定値
+# （variance: 輝度の標準偏差, edges: エッジの画素の割合（%））
+QUADTREE_CRITERIA = {'variance': 10.0, 'edges': 1.0}
+
+# 四分木分割でエッジとみなす輝度の変化の大きさ
+QUADTREE_EDGE_LEVEL = 32
+
+# 書き込みキューを使用する場合と、ディスクに同期する場合のファイル操作のスレッド数の上限
+WRITE_WORKERS = 8
+
+# get_tileで画像全体をデコードした場合に、デコード済みの画像を保持するキャッシュ
+_source_cache = SourceCache()
+
+
+def _get_save_options(format: str, quality: int, png_level: Union[int, str, None] = None,
+                      png_optimize: Optional[bool] = None) -> Tuple[str, dict]:
+    """
+    出力フォーマットに応じた保存オプションを組み立てます。
+
+    Args:
+        format: 出力フォーマット (png, jpg, webp)
+        quality: 画像品質 (0-100)
+        png_level: PNGの圧縮レベル (0-9)。Noneの場合はoptimizeのみ
+        png_optimize: PNGをoptimize（圧縮レベル9）で保存するかどうか。
+            Noneの場合は圧縮レベルを指定しなかったときだけoptimizeを使用
+
+    Returns:
+        (Pillowに渡すフォーマット名, 保存オプション)のタプル
+    """
+    format_lower = format.lower()
+    save_options = {}
+    if format_lower in ['jpg', 'jpeg']:
+        save_options['quality'] = quality
+        save_options['optimize'] = True
+        format_lower = 'jpeg'
+    elif format_lower == 'webp':
+        save_options['quality'] = quality
+    elif format_lower == 'png':
+        save_options['optimize'] = png_optimize if png_optimize is not None else not isinstance(png_level, int)
+        if isinstance(png_level, int):
+            save_options['compress_level'] = png_level
+
+    return format_lower.upper(), save_options
+
+
+def _validate_png_options(png_level: Union[int, str, None], png_filter: str) -> None:
+    """
+    PNGの圧縮設定を検証します。
+
+    Args:
+        png_level: PNGの圧縮レベル (0-9, auto, None)
+        png_filter: PNGの行フィルタ (adaptive, none)
+
+    Raises:
+        ValueError: 圧縮レベルまたは行フィルタが不正な場合
+    """
+    if png_level is not None and png_level != 'auto' and (
+            isinstance(png_level, bool) or not isinstance(png_level, int) or not 0 <= png_level <= 9):
+        raise ValueError(f"PNGの圧縮レベルは0から9またはautoである必要があります: {png_level}")
+    if png_filter not in PNG_FILTERS:
+        raise ValueError(f"無効なPNGの行フィルタ: {png_filter}。有効な行フィルタ: {', '.join(PNG_FILTERS)}")
+
+
+def _validate_scale(scale: int) -> None:
+    """
+    縮小の倍率を検証します。
+
+    Args:
+        scale: 縮小の倍率
+
+    Raises:
+        ValueError: 倍率が1, 2, 4, 8のいずれでもない場合
+    """
+    if scale not in SCALES or isinstance(scale, bool):
+        raise ValueError(f"縮小の倍率は{', '.join(map(str, SCALES))}のいずれかである必要があります: {scale}")
+
+
+def _validate_write_queue(write_queue: int) -> None:
+    """
+    書き込みキューの長さを検証します。
+
+    Args:
+        write_queue: 書き込み待ちのタイル数の上限（0で書き込みキューを使用しない）
+
+    Raises:
+        ValueError: 書き込みキューの長さが負の場合
+    """
+    if write_queue < 0:
+        raise ValueError(f"書き込みキューの長さは0以上である必要があります: {write_queue}")
+
+
+def _resolve_workers(workers: int) -> int:
+    """
+    ワーカー数を解決します。
+
+    Args:
+        workers: ワーカー数 (0の場合はCPU数)
+
+    Returns:
+        実際に使用するワーカー数
+
+    Raises:
+        ValueError: ワーカー数が負の場合
+    """
+    if workers < 0:
+        raise ValueError(f"ワーカー数は0以上である必要があります: {workers}")
+    if workers == 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+class _TileWriter:
+    """
+    タイルの保存を逐次またはスレッドプールで実行するクラス
+
+    Pillowのエンコーダ（PNG/JPEG/WebP）はエンコード中にGILを解放するため、
+    スレッドプールでもコア数に応じてスループットが向上します。
+    未完了のタイル数はワーカー数の2倍までに制限し、クロップ済みタイルが
+    メモリに溜まり続けないようにします。
+
+    コンテナ（またはsink.MemorySinkなどの出力先）を指定した場合は、ワーカーでメモリ上に
+    エンコードしたタイルを登録順にコンテナへ書き込みます。
+
+    statsを指定した場合は、エンコードと書き込みを分けて処理時間を記録します。
+
+    submitに元画像とタイルの範囲（box）を渡した場合は、_RegionEncoderで
+    クロップせずに元画像の範囲から直接エンコードします。png_filterとpng_autoは
+    _RegionEncoderに渡します。
+
+    jpeg_cropper（jpegcrop.JpegCropper、tiffsource.TiledTiff）を指定した場合、
+    再エンコードせずに切り出せる範囲のタイルは元画像を使用せずに切り出します（元画像はNoneでも構いません）。
+
+    write_queueを指定した場合（コンテナ以外）は、タイルをメモリ上にエンコードし、ファイルへの書き込みは
+    別のスレッドプールで行います。エンコードは書き込みの完了を待たずに次のタイルに進み、書き込み待ちの
+    タイルがwrite_queue個に達した場合は、最も古い書き込みが完了するまで待機します。
+    fsyncを指定した場合は、タイルごとではなく、すべてのタイルを書き込んだ後にまとめてディスクに同期します。
+    """
+
+    def __init__(self, workers: int = 1, container=None, stats: Optional[SplitStats] = None,
+                 png_filter: str = 'adaptive', png_auto: bool = False, jpeg_cropper=None,
+                 write_queue: int = 0, fsync: bool = False):
+        _validate_write_queue(write_queue)
+        self.workers = _resolve_workers(workers)
+        self.container = container
+        self.stats = stats
+        self.png_filter = png_filter
+        self.png_auto = png_auto
+        self.jpeg_cropper = jpeg_cropper
+        self.write_queue = write_queue
+        self.fsync = fsync and container is None
+        self._region_encoder = None
+        self._executor = None
+        self._write_executor = None
+        self._pending = collections.deque()
+        self._writes = collections.deque()
+        self._written: List[str] = []
+        if self.workers > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        if write_queue > 0 and container is None:
+            self._write_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(write_queue, WRITE_WORKERS)
+            )
+
+    def submit(self, tile: Image.Image, output_path: str, save_format: str, save_options: dict,
+               position: Optional[Tuple[int, int]] = None, box: Optional[Tuple[int, int, int, int]] = None,
+               crop_box: Optional[Tuple[int, int, int, int]] = None) -> None:
+        """
+        タイルの保存を登録します。
+
+        Args:
+            tile: 保存するタイル画像（boxを指定した場合はデコード済みの元画像）
+            output_path: 出力ファイルのパス（コンテナの場合はコンテナ内のタイル名）
+            save_format: Pillowに渡すフォーマット名
+            save_options: 保存オプション
+            position: タイルの(行, 列)（コンテナの場合に使用）
+            box: 元画像の中のタイルの範囲 (左, 上, 右, 下)
+            crop_box: jpeg_cropperに渡す画像全体の中のタイルの範囲（Noneの場合はbox）
+        """
+        if crop_box is None:
+            crop_box = box
+        if box is None:
+            encode, encode_args = _encode_tile, (tile, save_format, save_options)
+        elif self.jpeg_cropper is not None and self.jpeg_cropper.can_crop(crop_box):
+            encode, encode_args, tile = self.jpeg_cropper.crop, (crop_box,), None
+        else:
+            if self._region_encoder is None:
+                self._region_encoder = _RegionEncoder(
+                    save_format, save_options, self.stats, self.png_filter, self.png_auto
+                )
+            encode, encode_args, cropped = self._region_encoder.prepare(tile, box)
+            tile = cropped
+            # PNGの自動設定で選ばれた保存オプション
+            save_options = self._region_encoder.save_options
+
+        if self.fsync:
+            self._written.append(output_path)
+
+        if self.container is not None or self._write_executor is not None:
+            # コンテナと書き込みキューの場合はメモリ上にエンコードし、_completeで書き込む
+            function, args, kwargs = _encode_measured, (encode, encode_args, self.stats), {}
+        elif tile is None or self.stats is not None:
+            function, args, kwargs = _save_encoded, (encode, encode_args, output_path, self.stats), {}
+        else:
+            function, args, kwargs = tile.save, (output_path,), dict(format=save_format, **save_options)
+
+        if self._executor is None:
+            self._complete(function(*args, **kwargs), output_path, position)
+            return
+
+        while len(self._pending) >= self.workers * 2:
+            self._complete_pending()
+        self._pending.append((self._executor.submit(function, *args, **kwargs), output_path, position))
+
+    def _complete(self, result, output_path: str, position: Optional[Tuple[int, int]]) -> None:
+        if self._write_executor is not None:
+            self._write_behind(result, output_path)
+            return
+        if self.container is None:
+            return
+        row, col = position
+        data, encode_seconds = result
+        start = time.perf_counter()
+        self.container.add(output_path, data, row, col)
+        if self.stats is not None:
+            write_seconds = time.perf_counter() - start
+            self.stats.record('write', write_seconds, len(data))
+            self.stats.record_tile(output_path, encode_seconds + write_seconds, len(data))
+
+    def _write_behind(self, result, output_path: str) -> None:
+        data, encode_seconds = result
+        # 書き込み待ちがキューの長さに達した場合は、最も古い書き込みの完了を待つ
+        while len(self._writes) >= self.write_queue:
+            self._writes.popleft().result()
+        self._writes.append(self._write_executor.submit(_write_file, data, output_path, encode_seconds, self.stats))
+
+    def _complete_pending(self) -> None:
+        future, output_path, position = self._pending.popleft()
+        self._complete(future.result(), output_path, position)
+
+    def close(self) -> None:
+        """未完了の保存をすべて待機し、ディスクへの同期を行い、スレッドプールを終了します。"""
+        try:
+            while self._pending:
+                self._complete_pending()
+            while self._writes:
+                self._writes.popleft().result()
+            if self._written:
+                _fsync_files(self._written, self.stats)
+                self._written = []
+        finally:
+            for future, _, _ in self._pending:
+                future.cancel()
+            self._pending.clear()
+            for future in self._writes:
+                future.cancel()
+            self._writes.clear()
+            for executor in (self._executor, self._write_executor):
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            self._executor = None
+            self._write_executor = None
+
+    def __enter__(self) -> "_TileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _tile_grid(
+    image_size: Tuple[int, int],
+    tile_size: Optional[Tuple[int, int]],
+    overlap: int = 0,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Tuple[int, int]:
+    """
+    タイルグリッドの行数・列数を計算します。
+
+    Args:
+        image_size: 画像サイズ (幅, 高さ)
+        tile_size: 分割サイズ (幅, 高さ)。grid_sizeを指定した場合は使用しない
+        overlap: オーバーラップサイズ (ピクセル)
+        grid_size: 分割数 (行数, 列数)。指定した場合は画像をちょうどこの行数・列数に分割する
+
+    Returns:
+        (行数, 列数)のタプル
+
+    Raises:
+        ValueError: タイルサイズや分割数、オーバーラップが不正な場合
+    """
+    img_width, img_height = image_size
+
+    if grid_size is not None:
+        rows, cols = grid_size
+        if overlap < 0 or not 0 < rows <= img_height or not 0 < cols <= img_width:
+            raise ValueError(
+                f"分割数は1以上かつ画像サイズ以下、オーバーラップは0以上である必要があります: "
+                f"分割数 {rows}x{cols}, 画像サイズ {img_width}x{img_height}, オーバーラップ {overlap}"
+            )
+        return rows, cols
+
+    tile_width, tile_height = tile_size
+
+    # 行と列の数を計算
+    effective_tile_width = tile_width - overlap
+    effective_tile_height = tile_height - overlap
+    if overlap < 0 or effective_tile_width <= 0 or effective_tile_height <= 0:
+        raise ValueError(
+            f"オーバーラップは0以上かつタイルサイズより小さい必要があります: "
+            f"タイルサイズ {tile_width}x{tile_height}, オーバーラップ {overlap}"
+        )
+
+    # 最後のタイルが小さすぎる場合に調整するための計算
+    cols = (img_width + effective_tile_width - 1) // effective_tile_width
+    rows = (img_height + effective_tile_height - 1) // effective_tile_height
+
+    return rows, cols
+
+
+def _tile_box(
+    row: int,
+    col: int,
+    image_size: Tuple[int, int],
+    tile_size: Optional[Tuple[int, int]],
+    overlap: int = 0,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Tuple[int, int, int, int]:
+    """
+    指定した行・列のタイルの範囲を計算します。
+
+    grid_sizeを指定した場合は、画像の幅と高さを分割数で割った余りを各タイルに1ピクセルずつ
+    配分し、タイルの大きさの差が1ピクセル以内になるように分割します。
+    オーバーラップはタイルの右と下に広げます。
+
+    Args:
+        row: 行番号
+        col: 列番号
+        image_size: 画像サイズ (幅, 高さ)
+        tile_size: 分割サイズ (幅, 高さ)。grid_sizeを指定した場合は使用しない
+        overlap: オーバーラップサイズ (ピクセル)
+        grid_size: 分割数 (行数, 列数)
+
+    Returns:
+        タイルの範囲 (左, 上, 右, 下)
+    """
+    img_width, img_height = image_size
+
+    if grid_size is not None:
+        rows, cols = grid_size
+        left = col * img_width // cols
+        upper = row * img_height // rows
+        right = min((col + 1) * img_width // cols + overlap, img_width)
+        lower = min((row + 1) * img_height // rows + overlap, img_height)
+        return left, upper, right, lower
+
+    tile_width, tile_height = tile_size
+
+    # タイルの左上の座標を計算
+    left = col * (tile_width - overlap)
+    upper = row * (tile_height - overlap)
+
+    # タイルの右下の座標を計算（画像の境界を超えないように）
+    right = min(left + tile_width, img_width)
+    lower = min(upper + tile_height, img_height)
+
+    return left, upper, right, lower
+
+
+def _validate_region(region: Optional[Tuple[int, int, int, int]]) -> None:
+    """
+    切り出す範囲を検証します。
+
+    Args:
+        region: 範囲 (左, 上, 右, 下)。Noneの場合は画像全体
+
+    Raises:
+        ValueError: 範囲が4つの整数でない場合、または左上が右下より右下にある場合
+    """
+    if region is None:
+        return
+    if len(region) != 4 or not all(isinstance(value, int) and not isinstance(value, bool) for value in region):
+        raise ValueError(f"範囲は4つの整数 (左, 上, 右, 下) で指定してください: {region}")
+    left, top, right, bottom = region
+    if left < 0 or top < 0 or left >= right or top >= bottom:
+        raise ValueError(f"範囲は0 <= 左 < 右、0 <= 上 < 下 である必要があります: {region}")
+
+
+def _scale_region(region: Optional[Tuple[int, int, int, int]], scale: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    元の画像の座標で指定した範囲を、1/scaleに縮小した画像の座標に変換します（範囲を含むよう外側に丸めます）。
+
+    Args:
+        region: 範囲 (左, 上, 右, 下)。Noneの場合は画像全体
+        scale: 縮小の倍率
+
+    Returns:
+        縮小後の画像の座標での範囲（regionがNoneの場合はNone）
+    """
+    if region is None:
+        return None
+    left, top, right, bottom = region
+    return left // scale, top // scale, -(-right // scale), -(-bottom // scale)
+
+
+def _region_tiles(
+    image_size: Tuple[int, int],
+    tile_size: Tuple[int, int],
+    overlap: int = 0,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Tuple[List[int], List[int]]:
+    """
+    範囲に重なるタイルの行番号と列番号を求めます。
+
+    タイルの範囲は画像全体を分割した場合と同じで、範囲の外側にはみ出すタイルも含みます。
+
+    Args:
+        image_size: 画像サイズ (幅, 高さ)
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        region: 範囲 (左, 上, 右, 下)。Noneの場合は画像全体
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+
+    Returns:
+        (行番号のリスト, 列番号のリスト)のタプル
+
+    Raises:
+        ValueError: タイルサイズや分割数、オーバーラップが不正な場合、範囲が画像と重ならない場合
+    """
+    rows, cols = _tile_grid(image_size, tile_size, overlap, grid_size)
+    if region is None:
+        return list(range(rows)), list(range(cols))
+
+    left, top, right, bottom = region
+    if left >= image_size[0] or top >= image_size[1]:
+        raise ValueError(f"範囲が画像と重なっていません: 範囲 {region}, 画像サイズ {image_size[0]}x{image_size[1]}")
+
+    row_list = []
+    for row in range(rows):
+        _, upper, _, lower = _tile_box(row, 0, image_size, tile_size, overlap, grid_size)
+        if upper < bottom and lower > top:
+            row_list.append(row)
+    col_list = []
+    for col in range(cols):
+        tile_left, _, tile_right, _ = _tile_box(0, col, image_size, tile_size, overlap, grid_size)
+        if tile_left < right and tile_right > left:
+            col_list.append(col)
+    return row_list, col_list
+
+
+def _encode_tile(tile: Image.Image, save_format: str, save_options: dict) -> bytes:
+    """
+    タイルをメモリ上でエンコードします。
+
+    Args:
+        tile: エンコードするタイル画像
+        save_format: Pillowに渡すフォーマット名
+        save_options: 保存オプション
+
+    Returns:
+        エンコードされたバイト列
+    """
+    buffer = io.BytesIO()
+    tile.save(buffer, format=save_format, **save_options)
+    return buffer.getvalue()
+
+
+class _RegionEncoder:
+    """
+    元画像の中のタイルの範囲をエンコードする方法を決定するクラス
+
+    最初のタイルで高速エンコーダ（encoder.open_tile_encoder）を1回だけ作成し、
+    以降のタイルはクロップせずに元画像の範囲から直接エンコードします
+    （ピラミッドの縮小などで元画像のモードが変わった場合は作成し直します）。
+    高速エンコーダを使用できないフォーマットでは、クロップしてImage.saveでエンコードします。
+
+    png_autoを指定した場合は、最初のタイルの時点で元画像から数個のタイルを
+    エンコードしてPNGの圧縮設定を選びます（encoder.choose_png_options）。
+    PNGの場合は、実際に使用した設定をstatsのsettings['png']に記録します。
+    """
+
+    def __init__(self, save_format: str, save_options: dict, stats: Optional[SplitStats] = None,
+                 png_filter: str = 'adaptive', png_auto: bool = False):
+        self.save_format = save_format
+        self.save_options = save_options
+        self.stats = stats
+        self.png_filter = png_filter
+        self.png_auto = png_auto and save_format == 'PNG'
+        self._encoder = None
+        self._mode = None
+
+    def prepare(self, source: Image.Image, box: Tuple[int, int, int, int]) -> Tuple[object, tuple, Optional[Image.Image]]:
+        """
+        タイルをエンコードする関数と引数を返します。
+
+        Args:
+            source: デコード済みの元画像
+            box: 元画像の中のタイルの範囲 (左, 上, 右, 下)
+
+        Returns:
+            (エンコード関数, 引数, クロップしたタイル画像)のタプル。
+            高速エンコーダを使用する場合、クロップしたタイル画像はNone
+        """
+        if source.mode != self._mode:
+            self._open(source, box)
+        if self._encoder is not None:
+            return self._encoder.encode, (source, box), None
+
+        tile = _crop_tile(source, box, self.stats)
+        return _encode_tile, (tile, self.save_format, self.save_options), tile
+
+    def _open(self, source: Image.Image, box: Tuple[int, int, int, int]) -> None:
+        if self.png_auto and self._mode is None:
+            self.save_options, self.png_filter = choose_png_options(source, (box[2] - box[0], box[3] - box[1]))
+        self._encoder = open_tile_encoder(source, self.save_format, self.save_options, self.png_filter)
+        self._mode = source.mode
+
+        if self.stats is not None and self.save_format == 'PNG':
+            optimize = bool(self.save_options.get('optimize'))
+            level = self.save_options.get('compress_level', -1)
+            self.stats.settings['png'] = {
+                'level': 9 if optimize else (level if level >= 0 else 6),
+                'optimize': optimize,
+                # 高速エンコーダを使用できない場合はImage.saveの行フィルタ（adaptive）になる
+                'filter': self.png_filter if self._encoder is not None else 'adaptive',
+                'auto': self.png_auto
+            }
+
+
+def _crop_tile(source: Image.Image, box: Tuple[int, int, int, int], stats: Optional[SplitStats] = None) -> Image.Image:
+    """
+    元画像からタイルをクロップし、処理時間を記録します。
+
+    Args:
+        source: クロップ元の画像
+        box: クロップする範囲 (左, 上, 右, 下)
+        stats: 処理時間の記録先
+
+    Returns:
+        タイル画像
+    """
+    start = time.perf_counter()
+    tile = source.crop(box)
+    if stats is not None:
+        stats.record('crop', time.perf_counter() - start, image_nbytes(tile))
+    return tile
+
+
+def _encode_measured(encode, encode_args: tuple, stats: Optional[SplitStats] = None) -> Tuple[bytes, float]:
+    """
+    タイルをメモリ上でエンコードし、処理時間を記録します。
+
+    Args:
+        encode: エンコード関数（_encode_tileまたは高速エンコーダのencode）
+        encode_args: エンコード関数に渡す引数
+        stats: 処理時間の記録先
+
+    Returns:
+        (エンコードされたバイト列, エンコードの処理時間)のタプル
+    """
+    start = time.perf_counter()
+    data = encode(*encode_args)
+    seconds = time.perf_counter() - start
+    if stats is not None:
+        stats.record('encode', seconds, len(data))
+    return data, seconds
+
+
+def _save_encoded(encode, encode_args: tuple, output_path: str, stats: Optional[SplitStats] = None) -> None:
+    """
+    タイルをメモリ上でエンコードしてからファイルに書き込み、それぞれの処理時間を記録します。
+
+    Args:
+        encode: エンコード関数（_encode_tileまたは高速エンコーダのencode）
+        encode_args: エンコード関数に渡す引数
+        output_path: 出力ファイルのパス
+        stats: 処理時間の記録先
+    """
+    data, encode_seconds = _encode_measured(encode, encode_args, stats)
+    _write_file(data, output_path, encode_seconds, stats)
+
+
+def _write_file(data: bytes, output_path: str, encode_seconds: float = 0.0, stats: Optional[SplitStats] = None) -> None:
+    """
+    エンコード済みのタイルをファイルに書き込み、処理時間を記録します。
+
+    Args:
+        data: エンコードされたバイト列
+        output_path: 出力ファイルのパス
+        encode_seconds: タイルのエンコードにかかった時間（タイルごとの処理時間に含める）
+        stats: 処理時間の記録先
+    """
+    start = time.perf_counter()
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    if stats is not None:
+        write_seconds = time.perf_counter() - start
+        stats.record('write', write_seconds, len(data))
+        stats.record_tile(os.path.basename(output_path), encode_seconds + write_seconds, len(data))
+
+
+def _fsync_files(paths: List[str], stats: Optional[SplitStats] = None) -> None:
+    """
+    書き込んだファイルと、それらを含むディレクトリをまとめてディスクに同期します。
+
+    ネットワークストレージなど同期の待ち時間が長い場合に備えて、複数のスレッドで同時に同期します。
+
+    Args:
+        paths: 同期するファイルのパス
+        stats: 処理時間の記録先
+    """
+    start = time.perf_counter()
+    directories = sorted({os.path.dirname(os.path.abspath(path)) for path in paths})
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        list(executor.map(_fsync_file, paths))
+        # Windowsではディレクトリを開いて同期できないため、ファイルの同期のみ行う
+        if os.name != 'nt':
+            list(executor.map(_fsync_directory, directories))
+    if stats is not None:
+        stats.record('fsync', time.perf_counter() - start)
+
+
+def _fsync_file(path: str) -> None:
+    """ファイルをディスクに同期します。"""
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_directory(directory: str) -> None:
+    """ディレクトリのエントリ（作成したファイル名）をディスクに同期します。"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _iter_tile_regions(
+    img: Image.Image,
+    tile_size: Tuple[int, int],
+    overlap: int = 0,
+    stream: bool = False,
+    stats: Optional[SplitStats] = None,
+    scale: int = 1,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Iterator[Tuple[int, int, Tuple[int, int, int, int], Image.Image, Tuple[int, int, int, int]]]:
+    """
+    開いている画像の各タイルについて、クロップ元の画像とその中のタイルの範囲を順に返します。
+
+    scaleを指定した場合は画像を1/scaleに縮小してデコードし、タイルの範囲は
+    縮小後の画像の座標になります。
+
+    regionを指定した場合は、範囲に重なるタイルだけを返し、それらのタイルを含む
+    範囲だけをデコードします（部分デコードに対応していない形式では画像全体をデコードします）。
+
+    Args:
+        img: Image.openで開いた（未ロードの）画像
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        stream: タイル1行分の水平バンドごとにデコードするかどうか
+        stats: デコードの処理時間の記録先
+        scale: 縮小の倍率 (1, 2, 4, 8)
+        region: 元の画像の座標での範囲 (左, 上, 右, 下)。Noneの場合は画像全体
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+
+    Yields:
+        (行番号, 列番号, タイルの範囲, クロップ元の画像, クロップ元の画像の中のタイルの範囲)のタプル
+    """
+    # JPEGはDCTスケーリングで縮小デコードし、それ以外はデコード後に縮小
+    image_size = scaled_size(img.size, scale)
+    region = _scale_region(region, scale)
+    reduce_scale = draft_scale(img, scale)
+    rows, cols = _region_tiles(image_size, tile_size, overlap, region, grid_size)
+
+    # デコードする範囲（範囲に重なるタイルをすべて含む範囲。指定しない場合は画像全体）
+    window_left, window_top = 0, 0
+    window_right, window_bottom = image_size
+    if region is not None:
+        window_left, window_top, _, _ = _tile_box(rows[0], cols[0], image_size, tile_size, overlap, grid_size)
+        _, _, window_right, window_bottom = _tile_box(rows[-1], cols[-1], image_size, tile_size, overlap, grid_size)
+
+    # ストリーミングモードではタイル1行分のバンドだけをデコード
+    reader = open_band_reader(img, reduce_scale) if stream else None
+
+    source_img = img
+    if reader is None and region is not None:
+        # 範囲に重なるストリップやタイルだけを1回でデコード
+        start = time.perf_counter()
+        source_img = open_band_reader(img, reduce_scale).read(window_top, window_bottom, window_left, window_right)
+        if stats is not None:
+            stats.record('decode', time.perf_counter() - start, image_nbytes(source_img))
+    elif reader is None and (stats is not None or reduce_scale > 1):
+        # 計測する場合は最初のクロップに含まれないよう先に全体をデコード
+        start = time.perf_counter()
+        img.load()
+        source_img = reduce_image(img, reduce_scale)
+        if stats is not None:
+            stats.record('decode', time.perf_counter() - start, image_nbytes(source_img))
+
+    for row in rows:
+        # タイル行の上端と下端を計算
+        _, upper, _, lower = _tile_box(row, 0, image_size, tile_size, overlap, grid_size)
+
+        # クロップ元の画像を決定（前の行のバンドはここで解放される）
+        if reader is not None:
+            start = time.perf_counter()
+            source = reader.read(upper, lower, window_left, window_right)
+            if stats is not None:
+                stats.record('decode', time.perf_counter() - start, image_nbytes(source))
+            source_upper = upper
+        else:
+            source = source_img
+            source_upper = window_top
+
+        for col in cols:
+            box = _tile_box(row, col, image_size, tile_size, overlap, grid_size)
+            left, _, right, _ = box
+            yield row, col, box, source, (left - window_left, upper - source_upper, right - window_left,
+                                          lower - source_upper)
+
+
+def _iter_file_regions(
+    image_path: Union[str, Image.Image],
+    tile_size: Tuple[int, int],
+    overlap: int = 0,
+    stream: bool = False,
+    stats: Optional[SplitStats] = None,
+    scale: int = 1,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Iterator[Tuple[int, int, Tuple[int, int, int, int], Image.Image, Tuple[int, int, int, int]]]:
+    """
+    画像ファイルを開き、各タイルのクロップ元の画像とその中のタイルの範囲を順に返します。
+
+    Args:
+        image_path: 入力画像のパス、またはデコード済みの画像
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        stream: タイル1行分の水平バンドごとにデコードするかどうか
+        stats: 工程ごとの処理時間の記録先
+        scale: 縮小の倍率 (1, 2, 4, 8)
+        region: 元の画像の座標での範囲 (左, 上, 右, 下)。Noneの場合は画像全体
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+
+    Yields:
+        _iter_tile_regionsと同じタプル
+    """
+    # デコード済みの画像（複数フレームの画像の各フレーム）はそのまま分割（デコードは記録済み）
+    if isinstance(image_path, Image.Image):
+        yield from _iter_tile_regions(image_path, tile_size, overlap, stream, None, scale, region, grid_size)
+        return
+
+    # タイル化TIFFは格納タイル単位で、非圧縮の画像はメモリにマップして読み込む
+    start = time.perf_counter()
+    source = _open_source(image_path)
+    if source is not None:
+        with source:
+            if stats is not None:
+                stats.record('open', time.perf_counter() - start)
+            yield from _iter_source_regions(source, tile_size, overlap, stats, scale, region, grid_size=grid_size)
+        return
+
+    # 画像を開く（ヘッダーの読み込みのみ）
+    with Image.open(image_path) as img:
+        if stats is not None:
+            stats.record('open', time.perf_counter() - start)
+
+        yield from _iter_tile_regions(img, tile_size, overlap, stream, stats, scale, region, grid_size)
+
+
+def _open_source(image_path: str):
+    """
+    Pillowで画像全体をデコードせずに読み込むソースを開きます。
+
+    Args:
+        image_path: 入力画像のパス
+
+    Returns:
+        タイル化TIFFの場合はtiffsource.TiledTiff、非圧縮の画像の場合はrawsource.MappedRaster。
+        どちらでもない場合はNone（Image.openで開いてください）
+    """
+    source = open_tiled_tiff(image_path)
+    if source is None:
+        source = open_mapped_raster(image_path)
+    return source
+
+
+def _image_size(image_path: Union[str, Image.Image], source_file=None) -> Tuple[int, int]:
+    """
+    分割する画像のサイズを、画像全体をデコードせずに求めます。
+
+    Args:
+        image_path: 入力画像のパス、またはデコード済みの画像
+        source_file: _open_sourceで開いたソース
+
+    Returns:
+        画像サイズ (幅, 高さ)
+    """
+    if isinstance(image_path, Image.Image):
+        return image_path.size
+    if source_file is not None:
+        return source_file.size
+    with Image.open(image_path) as img:
+        return img.size
+
+
+def _iter_source_regions(
+    source,
+    tile_size: Tuple[int, int],
+    overlap: int = 0,
+    stats: Optional[SplitStats] = None,
+    scale: int = 1,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    jpeg_cropper=None,
+    needs_pixels: bool = False,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Iterator[Tuple[int, int, Tuple[int, int, int, int], Optional[Image.Image], Tuple[int, int, int, int]]]:
+    """
+    _open_sourceで開いたソースの各タイルについて、_iter_tile_regionsと同じタプルを順に返します。
+
+    タイルごとに、重なる格納タイル（メモリにマップした画像の場合は範囲の行）だけを読み込んでクロップ元の画像とします。
+    タイルが格納タイル1つと一致する場合は、デコードした格納タイルをそのままクロップ元にします。
+    メモリにマップした画像全体をコピーせずに参照できる場合（source.image）は、それをクロップ元にし、
+    タイル行ごとに処理済みの行のページを解放します（source.release）。
+    jpeg_cropperで再エンコードせずに書き出せるタイルは、デコードせずにクロップ元の画像をNoneとして返します。
+
+    Args:
+        source: タイル化TIFFまたはメモリにマップした画像
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        stats: 工程ごとの処理時間の記録先
+        scale: 縮小の倍率 (1, 2, 4, 8)
+        region: 元の画像の座標での範囲 (左, 上, 右, 下)。Noneの場合は画像全体
+        jpeg_cropper: JPEG圧縮の格納タイルをそのまま書き出すオブジェクト（タイル化TIFF自身）
+        needs_pixels: すべてのタイルでクロップ元の画像が必要かどうか
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+
+    Yields:
+        (行番号, 列番号, タイルの範囲, クロップ元の画像またはNone, クロップ元の画像の中のタイルの範囲)のタプル
+    """
+    image_size = scaled_size(source.size, scale)
+    mapped_image = getattr(source, 'image', None) if scale == 1 else None
+    release = getattr(source, 'release', None)
+    reader = open_band_reader(source, scale)
+    rows, cols = _region_tiles(image_size, tile_size, overlap, _scale_region(region, scale), grid_size)
+
+    for row in rows:
+        if release is not None:
+            # メモリにマップした画像は、処理済みのタイル行より上のページをプロセスのメモリから解放
+            release(_tile_box(row, cols[0], image_size, tile_size, overlap, grid_size)[1] * scale)
+        for col in cols:
+            box = _tile_box(row, col, image_size, tile_size, overlap, grid_size)
+            if jpeg_cropper is not None and not needs_pixels and jpeg_cropper.can_crop(box):
+                yield row, col, box, None, box
+                continue
+            if mapped_image is not None:
+                # マップしたデータから直接エンコードするためデコードしない
+                yield row, col, box, mapped_image, box
+                continue
+
+            left, upper, right, lower = box
+            start = time.perf_counter()
+            tile_source = reader.read(upper, lower, left, right)
+            if stats is not None:
+                stats.record('decode', time.perf_counter() - start, image_nbytes(tile_source))
+            yield row, col, box, tile_source, (0, 0, right - left, lower - upper)
+
+
+def _open_jpeg_cropper(
+    image_path: str,
+    tile_size: Tuple[int, int],
+    overlap: int = 0,
+    stats: Optional[SplitStats] = None,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None
+):
+    """
+    JPEG画像のタイルをDCT係数のまま切り出すオブジェクトを作成します。
+
+    Args:
+        image_path: 入力画像のパス
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        stats: 工程ごとの処理時間の記録先
+        region: 範囲 (左, 上, 右, 下)。指定した場合は範囲に重なるタイルだけを対象にする
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+
+    Returns:
+        jpegcrop.JpegCropper。JPEG以外の画像や、MCUの境界に揃ったタイルがない場合はNone
+    """
+    with Image.open(image_path) as img:
+        if img.format != 'JPEG':
+            return None
+        image_size = img.size
+
+    rows, cols = _region_tiles(image_size, tile_size, overlap, region, grid_size)
+    boxes = [_tile_box(row, col, image_size, tile_size, overlap, grid_size) for row in rows for col in cols]
+
+    # エントロピー符号化データの走査をデコードとして記録（バイト数はJPEGファイルの大きさ）
+    start = time.perf_counter()
+    cropper = open_jpeg_cropper(image_path, boxes)
+    if stats is not None and cropper is not None:
+        stats.record('decode', time.perf_counter() - start, os.path.getsize(image_path))
+    return cropper
+
+
+def _iter_jpeg_regions(
+    image_path: str,
+    tile_size: Tuple[int, int],
+    overlap: int,
+    jpeg_cropper,
+    needs_pixels: bool = False,
+    stats: Optional[SplitStats] = None,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Iterator[Tuple[int, int, Tuple[int, int, int, int], Optional[Image.Image], Tuple[int, int, int, int]]]:
+    """
+    JPEG画像の各タイルについて、_iter_tile_regionsと同じタプルを順に返します。
+
+    DCT係数のまま切り出せるタイルはデコードせず、クロップ元の画像をNoneとして返します。
+    切り出せないタイルがある場合と、画素が必要な場合（needs_pixels）は、
+    その時点で画像全体を1回だけデコードします。
+
+    Args:
+        image_path: 入力画像のパス
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        jpeg_cropper: _open_jpeg_cropperで作成したオブジェクト
+        needs_pixels: すべてのタイルでクロップ元の画像が必要かどうか
+        stats: 工程ごとの処理時間の記録先
+        region: 範囲 (左, 上, 右, 下)。指定した場合は範囲に重なるタイルだけを返す
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+
+    Yields:
+        (行番号, 列番号, タイルの範囲, クロップ元の画像またはNone, クロップ元の画像の中のタイルの範囲)のタプル
+    """
+    start = time.perf_counter()
+    with Image.open(image_path) as img:
+        if stats is not None:
+            stats.record('open', time.perf_counter() - start)
+
+        decoded = False
+        rows, cols = _region_tiles(img.size, tile_size, overlap, region, grid_size)
+        for row in rows:
+            for col in cols:
+                box = _tile_box(row, col, img.size, tile_size, overlap, grid_size)
+                if not needs_pixels and jpeg_cropper.can_crop(box):
+                    yield row, col, box, None, box
+                    continue
+
+                if not decoded:
+                    start = time.perf_counter()
+                    img.load()
+                    if stats is not None:
+                        stats.record('decode', time.perf_counter() - start, image_nbytes(img))
+                    decoded = True
+                yield row, col, box, img, box
+
+
+def _is_blank_tile(tile: Image.Image) -> bool:
+    """
+    タイルが単色、または完全に透明かどうかを判定します。
+
+    エンコード前のタイルの最小値・最大値だけで判定するため、高速に実行できます。
+
+    Args:
+        tile: 判定するタイル画像
+
+    Returns:
+        単色または完全に透明な場合はTrue
+    """
+    extrema = tile.getextrema()
+    if not isinstance(extrema[0], tuple):
+        # 単一チャンネルの場合
+        return extrema[0] == extrema[1]
+
+    # アルファチャンネルがすべて0の場合は完全に透明
+    if tile.mode in ('RGBA', 'LA', 'PA') and extrema[-1][1] == 0:
+        return True
+
+    return all(low == high for low, high in extrema)
+
+
+def _tile_fill(tile: Image.Image):
+    """
+    空白タイルを復元するための塗りつぶし値を取得します。
+
+    Args:
+        tile: 空白タイル
+
+    Returns:
+        タイル左上の画素値（マルチチャンネルの場合はリスト）
+    """
+    pixel = tile.getpixel((0, 0))
+    return list(pixel) if isinstance(pixel, tuple) else pixel
+
+
+def _tile_digest(tile: Image.Image) -> str:
+    """
+    タイルの画素データからハッシュ値を計算します。
+
+    Args:
+        tile: タイル画像
+
+    Returns:
+        モード・サイズ・画素データから計算したハッシュ値
+    """
+    digest = hashlib.blake2b(f"{tile.mode}:{tile.size[0]}x{tile.size[1]}:".encode("ascii"), digest_size=20)
+    digest.update(tile.tobytes())
+    return digest.hexdigest()
+
+
+def _write_tile_manifest(manifest_path: str, manifest: dict, sink=None) -> None:
+    """
+    タイルのマニフェストをJSONファイルに書き出します。
+
+    Args:
+        manifest_path: マニフェストファイルのパス
+        manifest: マニフェストの内容
+        sink: 出力先（指定した場合はファイルではなく、ファイル名をタイル名として出力先に追加）
+    """
+    if sink is not None:
+        sink.add(os.path.basename(manifest_path),
+                 json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        return
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def _overlap_windows(
+    core_tiles: List[dict],
+    tile_size: Optional[Tuple[int, int]],
+    overlap: int,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> List[dict]:
+    """
+    重ならないタイル（コアタイル）から、オーバーラップを含む各タイル（ウィンドウ）を
+    組み立てるための情報を計算します。
+
+    ウィンドウ(行, 列)の左上はコアタイル(行, 列)の左上と一致し、右と下のコアタイルの一部を含みます。
+
+    Args:
+        core_tiles: コアタイルのマニフェストのエントリ（row, col, boxを含む辞書）のリスト
+        tile_size: オーバーラップを含む分割サイズ (幅, 高さ)。grid_sizeを指定した場合はNone
+        overlap: オーバーラップサイズ (ピクセル)
+        grid_size: 分割数 (行数, 列数)
+
+    Returns:
+        ウィンドウごとの辞書（row, col, box, parts）のリスト。partsの各要素は
+        コアタイルの行・列(row, col)、コアタイルの中で使用する範囲(box)、ウィンドウの中の貼り付け位置(position)
+    """
+    cores = {(tile['row'], tile['col']): tile['box'] for tile in core_tiles}
+    rows = max(row for row, _ in cores) + 1
+    cols = max(col for _, col in cores) + 1
+    image_size = (max(box[2] for box in cores.values()), max(box[3] for box in cores.values()))
+
+    windows = []
+    for row, col in sorted(cores):
+        left, upper, right, lower = _tile_box(row, col, image_size, tile_size, overlap, grid_size)
+        parts = []
+        part_row = row
+        while part_row < rows and cores[(part_row, col)][1] < lower:
+            part_col = col
+            while part_col < cols and cores[(part_row, part_col)][0] < right:
+                core_left, core_upper, core_right, core_lower = cores[(part_row, part_col)]
+                parts.append({
+                    'row': part_row,
+                    'col': part_col,
+                    'box': [0, 0, min(core_right, right) - core_left, min(core_lower, lower) - core_upper],
+                    'position': [core_left - left, core_upper - upper]
+                })
+                part_col += 1
+            part_row += 1
+        windows.append({'row': row, 'col': col, 'box': [left, upper, right, lower], 'parts': parts})
+    return windows
+
+
+def load_overlap_window(manifest_path: str, row: int, col: int) -> Image.Image:
+    """
+    overlap_mode='shared'で書き出したコアタイルから、オーバーラップを含むタイルを組み立てます。
+
+    コンテナ（zip, mbtiles）に書き出した場合は、マニフェストと同じディレクトリにあるコンテナから
+    コアタイルを読み込みます。
+
+    Args:
+        manifest_path: 「プレフィックス_日時_windows.json」のパス（コアタイルは同じディレクトリから読み込む）
+        row: 行番号
+        col: 列番号
+
+    Returns:
+        オーバーラップを含むタイル画像
+
+    Raises:
+        ValueError: 指定した行・列のタイルがない場合
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    window = next((w for w in manifest['windows'] if w['row'] == row and w['col'] == col), None)
+    if window is None:
+        raise ValueError(f"タイルがありません: 行 {row}, 列 {col}")
+
+    tiles = {(tile['row'], tile['col']): tile for tile in manifest['tiles']}
+    tile_dir = os.path.dirname(manifest_path)
+    left, upper, right, lower = window['box']
+    pieces = []
+    with contextlib.ExitStack() as stack:
+        tile_container = None
+        if manifest.get('container'):
+            tile_container = stack.enter_context(open_tile_container(os.path.join(tile_dir, manifest['container'])))
+
+        for part in window['parts']:
+            tile = tiles[(part['row'], part['col'])]
+            part_box = tuple(part['box'])
+            if tile['file'] is None:
+                # スキップした空白タイルは塗りつぶし値から復元
+                fill = tile['fill']
+                pieces.append((fill, part_box, part['position']))
+                continue
+            if tile_container is not None:
+                core = tile_container.get_image(part['row'], part['col'])
+            else:
+                core = Image.open(os.path.join(tile_dir, tile['file']))
+            with core:
+                pieces.append((core.crop(part_box), part_box, part['position']))
+
+    # 空白タイルだけの場合は塗りつぶし値のチャンネル数からモードを決める
+    first = next((piece for piece, _, _ in pieces if isinstance(piece, Image.Image)), None)
+    if first is not None:
+        mode = first.mode
+    else:
+        fill = pieces[0][0]
+        mode = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}[len(fill) if isinstance(fill, list) else 1]
+
+    window_image = Image.new(mode, (right - left, lower - upper))
+    if mode == 'P':
+        window_image.putpalette(first.getpalette())
+    for piece, part_box, position in pieces:
+        if not isinstance(piece, Image.Image):
+            piece = Image.new(mode, (part_box[2] - part_box[0], part_box[3] - part_box[1]),
+                              tuple(piece) if isinstance(piece, list) else piece)
+        window_image.paste(piece, tuple(position))
+    return window_image
+
+
+def _file_sha256(path: str) -> str:
+    """
+    ファイル内容のSHA-256ハッシュ値を計算します。
+
+    Args:
+        path: ファイルのパス
+
+    Returns:
+        ハッシュ値の16進文字列
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_fingerprint(image_path: str, previous: Optional[dict] = None) -> dict:
+    """
+    入力画像のサイズ・更新日時・ハッシュ値を取得します。
+
+    サイズと更新日時が前回と同じ場合は、ファイルを読まずに前回のハッシュ値を使用します。
+
+    Args:
+        image_path: 入力画像のパス
+        previous: 前回記録した入力画像の情報
+
+    Returns:
+        入力画像の情報（path, size, mtime_ns, sha256）
+    """
+    stat = os.stat(image_path)
+    fingerprint = {
+        'path': os.path.abspath(image_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+    if previous and all(previous.get(key) == value for key, value in fingerprint.items()):
+        fingerprint['sha256'] = previous['sha256']
+    else:
+        fingerprint['sha256'] = _file_sha256(image_path)
+    return fingerprint
+
+
+def _load_cache_index(cache_path: str) -> Optional[dict]:
+    """
+    キャッシュのインデックスファイルを読み込みます。
+
+    Args:
+        cache_path: インデックスファイルのパス
+
+    Returns:
+        インデックスの内容（存在しない、または読み込めない場合はNone）
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def iter_tiles(
     image_path: str,
     tile_size: Tuple[int, int],
+    overlap: int = 0,
+    stream: bool = False,
+    format: Optional[str] = None,
+    quality: int = 90,
+    stats: Optional[SplitStats] = None,
+    png_level: Union[int, str, None] = None,
+    png_optimize: Optional[bool] = None,
+    png_filter: str = 'adaptive',
+    scale: int = 1,
+    region: Optional[Tuple[int, int, int, int]] = None
+) -> Iterator[Tuple[int, int, Tuple[int, int, int, int], Union[Image.Image, bytes]]]:
+    """
+    画像を指定されたタイルサイズに分割し、ファイルに書き出さずにタイルを順に返します。
+
+    タイルは必要になった時点で切り出されるため、呼び出し側で処理した
+    タイルから順にメモリを解放できます。
+
+    Args:
+        image_path: 入力画像のパス
+        tile_size: 分割サイズ (幅, 高さ)
+        overlap: オーバーラップサイズ (ピクセル)
+        stream: タイル1行分の水平バンドごとにデコードし、メモリ使用量を抑えるかどうか
+        format: エンコードするフォーマット (png, jpg, webp)。Noneの場合はPIL.Imageのまま返す
+        quality: 画像品質 (0-100)
+        stats: 工程ごとの処理時間の記録先
+        png_level: PNGの圧縮レベル (0-9)。autoの場合は数個のタイルをエンコードして
+            圧縮レベル・optimize・行フィルタを自動で選ぶ
+        png_optimize: PNGをoptimize（圧縮レベル9）で保存するかどうか。
+            Noneの場合は圧縮レベルを指定しなかったときだけoptimizeを使用
+        png_filter: PNGの行フィルタ (adaptive, none)
+        scale: 画像を1/scaleに縮小してデコードする倍率 (1, 2, 4, 8)。
+            タイルの範囲は縮小後の画像の座標になる
+        region: 元の画像の座標での範囲 (左, 上, 右, 下)。指定した場合は範囲に重なるタイルだけを返し、
+            部分デコードに対応している形式ではそのタイルを含む範囲だけをデコードする
+
+    Yields:
+        (行番号, 列番号, タイルの範囲 (左, 上, 右, 下), タイル画像またはエンコード済みのバイト列)のタプル
+    """
+    _validate_png_options(png_level, png_filter)
+    _validate_scale(scale)
+    _validate_region(region)
+    region_encoder = None
+    if format is not None:
+        region_encoder = _RegionEncoder(
+            *_get_save_options(format, quality, png_level, png_optimize), stats, png_filter, png_level == 'auto'
+        )
+
+    for row, col, box, source, source_box in _iter_file_regions(image_path, tile_size, overlap, stream, stats, scale, region):
+        if region_encoder is not None:
+            encode, encode_args, _ = region_encoder.prepare(source, source_box)
+            yield row, col, box, _encode_measured(encode, encode_args, stats)[0]
+        else:
+            yield row, col, box, _crop_tile(source, source_box, stats)
+
+
+def _grid_tile_box(
+    row: int,
+    col: int,
+    image_size: Tuple[int, int],
+    tile_size: Optional[Tuple[int, int]],
+    overlap: int = 0,
+    grid_size: Optional[Tuple[int, int]] = None
+) -> Tuple[int, int, int, int]:
+    """
+    行・列がタイルグリッドの範囲内であることを確認し、そのタイルの範囲を計算します（_tile_boxを参照）。
+
+    Raises:
+        ValueError: タイルサイズや分割数が不正な場合、または行・列がグリッドの範囲外の場合
+    """
+    rows, cols = _tile_grid(image_size, tile_size, overlap, grid_size)
+    if not (0 <= row < rows and 0 <= col < cols):
+        raise ValueError(f"タイルの位置がグリッドの範囲外です: 行 {row}, 列 {col}, グリッド {rows}x{cols}")
+    return _tile_box(row, col, image_size, tile_size, overlap, grid_size)
+
+
+def get_tile(
+    image_path: str,
+    tile_size: Optional[Tuple[int, int]],
+    overlap: int = 0,
+    row: int = 0,
+    col: int = 0,
+    grid_size: Optional[Tuple[int, int]] = None,
+    format: Optional[str] = None,
+    quality: int = 90,
+    cache: Optional[SourceCache] = None,
+    stats: Optional[SplitStats] = None
+) -> Union[Image.Image, bytes]:
+    """
+    分割したときの指定した行・列のタイルだけを切り出します。
+
+    タイルの範囲はsplit_image_by_size（grid_sizeを指定した場合はsplit_image_by_count）と同じです。
+    タイル化TIFF・非圧縮の画像・ストリップ単位で格納されたTIFFなど、任意の位置を読み込める形式では
+    タイルの範囲だけを読み込みます。それ以外の形式（JPEG、WebP、先頭から順に展開する必要があるPNGなど）は
+    画像全体をデコードしてキャッシュに保持し、同じ画像（パス・更新日時・ファイルサイズが同じ）の
+    2回目以降の呼び出しではデコードを省略します。PNGの先頭の行のタイルは、その行までだけを展開します。
+
+    Args:
+        image_path: 入力画像のパス
+        tile_size: 分割サイズ (幅, 高さ)。grid_sizeを指定した場合はNone
+        overlap: オーバーラップサイズ (ピクセル)
+        row: 行番号
+        col: 列番号
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeの代わりに使用
+        format: エンコードするフォーマット (png, jpg, webp)。Noneの場合はPIL.Imageのまま返す
+        quality: 画像品質 (0-100)
+        cache: デコード済みの画像を保持するキャッシュ。Noneの場合はモジュール共通のキャッシュ
+        stats: デコードの処理時間とバイト数の記録先（profiling.SplitStats）
+
+    Returns:
+        タイル画像またはエンコード済みのバイト列
+
+    Raises:
+        ValueError: タイルサイズや分割数、行番号・列番号が不正な場合
+        OSError: 画像を開けない場合
+    """
+    if (tile_size is None) == (grid_size is None):
+        raise ValueError("分割サイズと分割数はどちらか一方を指定してください")
+
+    tile = None
+    start = time.perf_counter()
+    source = _open_source(image_path)
+    if source is not None:
+        with source:
+            left, upper, right, lower = _grid_tile_box(row, col, source.size, tile_size, overlap, grid_size)
+            # メモリにマップしたデータを参照している場合があるため、閉じる前にコピー
+            tile = open_band_reader(source).read(upper, lower, left, right).copy()
+    else:
+        with Image.open(image_path) as img:
+            box = _grid_tile_box(row, col, img.size, tile_size, overlap, grid_size)
+            reader = open_band_reader(img)
+            # 先頭から順に展開する形式で先頭の行より下のタイルは、毎回展開し直さないよう全体をキャッシュする
+            if reader.random_access or (reader.streaming and box[1] == 0):
+                left, upper, right, lower = box
+                tile = reader.read(upper, lower, left, right)
+
+    if tile is None:
+        # 画像全体のデコードは、キャッシュにない場合だけキャッシュが記録する
+        tile = (cache if cache is not None else _source_cache).get(image_path, stats).crop(box)
+    elif stats is not None:
+        stats.record('decode', time.perf_counter() - start, image_nbytes(tile))
+
+    if format is not None:
+        return _encode_tile(tile, *_get_save_options(format, quality))
+    return tile
+
+
+def _validate_split_options(
+    *,
+    decoded: bool,
+    tile_size: Optional[Tuple[int, int]],
+    overlap: int,
+    grid_size: Optional[Tuple[int, int]],
+    overlap_mode: str,
+    region: Optional[Tuple[int, int, int, int]],
+    scale: int,
+    dedupe: bool,
+    cache: bool,
+    container: Optional[str],
+    jpeg_lossless: bool,
+    png_level: Union[int, str, None],
+    png_filter: str,
+    write_queue: int,
+    tile_sink
+) -> None:
+    """
+    split_image_by_sizeの引数の値と、同時に指定できない組み合わせを検証します。
+
+    Args:
+        decoded: 入力がデコード済みの画像かどうか
+        tile_sink: ディレクトリ以外の出力先（ディレクトリに書き出す場合はNone）
+        その他: split_image_by_sizeの同名の引数
+
+    Raises:
+        ValueError: split_image_by_sizeのRaisesに挙げた組み合わせ、または値が不正な場合
+    """
+    _validate_png_options(png_level, png_filter)
+    _validate_scale(scale)
+    _validate_region(region)
+    _validate_write_queue(write_queue)
+    if overlap_mode not in OVERLAP_MODES:
+        raise ValueError(f"無効なオーバーラップの扱い: {overlap_mode}。有効な値: {', '.join(OVERLAP_MODES)}")
+
+    if cache and dedupe:
+        raise ValueError("キャッシュ（cache）と重複排除（dedupe）は同時に指定できません")
+    if cache and container:
+        raise ValueError("キャッシュ（cache）とコンテナ出力（container）は同時に指定できません")
+    if dedupe and container:
+        # コンテナは行・列でタイルを読み出すため、参照だけのタイルを格納できない
+        raise ValueError("重複排除（dedupe）とコンテナ出力（container）は同時に指定できません")
+    if tile_sink is not None and (cache or container):
+        raise ValueError("出力先（sink）はキャッシュ（cache）、コンテナ出力（container）と同時に指定できません")
+    if jpeg_lossless and scale != 1:
+        raise ValueError("JPEGの無劣化切り出し（jpeg_lossless）と縮小（scale）は同時に指定できません")
+    if overlap_mode == 'shared' and region is not None:
+        raise ValueError("オーバーラップの共有（overlap_mode='shared'）と範囲（region）は同時に指定できません")
+    if decoded and (cache or jpeg_lossless):
+        raise ValueError("デコード済みの画像にはキャッシュ（cache）、JPEGの無劣化切り出し（jpeg_lossless）は指定できません")
+
+    # 共有モードではタイルの移動量（tile_size - overlap）でコアタイルに分割する
+    if overlap_mode == 'shared':
+        if tile_size is not None and (overlap < 0 or overlap >= min(tile_size)):
+            raise ValueError(
+                f"オーバーラップは0以上かつタイルサイズより小さい必要があります: "
+                f"タイルサイズ {tile_size[0]}x{tile_size[1]}, オーバーラップ {overlap}"
+            )
+        if grid_size is not None and overlap < 0:
+            raise ValueError(f"オーバーラップは0以上である必要があります: {overlap}")
+
+
+def split_image_by_size(
+    image_path: Union[str, Image.Image],
+    tile_size: Optional[Tuple[int, int]],
     output_dir: str = ".",
     prefix: str = "slice",
     format: str = "png",
     quality: int = 90,
-    overlap: int = 0
+    overlap: int = 0,
+    workers: int = 1,
+    stream: bool = False,
+    skip_blank: bool = False,
+    dedupe: bool = False,
+    cache: bool = False,
+    container: Optional[str] = None,
+    stats: Optional[SplitStats] = None,
+    png_level: Union[int, str, None] = None,
+    png_optimize: Optional[bool] = None,
+    png_filter: str = 'adaptive',
+    jpeg_lossless: bool = False,
+    scale: int = 1,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    write_queue: int = 0,
+    fsync: bool = False,
+    sink=None,
+    grid_size: Optional[Tuple[int, int]] = None,
+    overlap_mode: str = 'crop'
 ) -> List[str]:
     """
     画像を指定されたタイルサイズに分割します。
 
+    skip_blankまたはdedupeを指定した場合は、すべてのタイル（行, 列）と
+    保存先ファイルの対応を「プレフィックス_日時_manifest.json」に書き出します。
+
+    cacheを指定した場合は、入力画像のハッシュ値と分割パラメータ、タイルごとの
+    チェックサムを「プレフィックス_cache.json」に記録します。同じ条件で再実行すると
+    デコードせずに前回のファイル一覧を返し、入力画像が変更された場合は
+    内容が変わったタイルだけを再生成します（ファイル名の日時は前回のものを引き継ぎます）。
+
+    containerを指定した場合は、タイルを個別のファイルではなく
+    「プレフィックス_日時.zip」または「プレフィックス_日時.mbtiles」の1ファイルにまとめて書き出します。
+    読み出しにはcontainer.open_tile_containerを使用します。
+
+    sinkを指定した場合は、タイルをoutput_dirではなく出力先（sink.MemorySink、sink.TarSink、
+    sink.CallableSinkなど、add(タイル名, データ, 行, 列)を持つオブジェクト）に順に追加します。
+    辞書を渡すとタイル名からデータへの対応を格納し、関数を渡すとタイルごとに呼び出します。
+    マニフェストも同じ出力先に追加します。出力先は呼び出し側で閉じてください。
+
+    jpeg_losslessを指定し、JPEG画像をJPEGで出力する場合は、MCU（8x8または16x16など）の
+    境界に揃ったタイルを画素にデコード・再エンコードせずにDCT係数のまま切り出します
+    （画質の劣化がなく、qualityは使用しません）。揃っていないタイルは通常どおりエンコードします。
+    エントロピー符号化データをPythonで走査するため、処理時間は再エンコードより長くなります
+    （高速化ではなく、再エンコードによる画質の劣化を避けるためのオプションです）。
+    JPEG圧縮のタイル化TIFFをJPEGで出力する場合は、jpeg_losslessの指定によらず、
+    格納タイルと一致するタイルを格納されたJPEGのデータのまま書き出します（qualityは使用しません）。
+
+    scaleを指定した場合は、画像を1/2, 1/4, 1/8に縮小してデコードし、縮小後の画像を
+    tile_sizeで分割します。JPEG画像はDCTスケーリングにより縮小した解像度で直接デコードし、
+    それ以外の形式はデコード後にscale x scaleの画素の平均で縮小します。
+
+    regionを指定した場合は、画像全体を分割した場合のタイルのうち範囲に重なるものだけを出力します
+    （タイルの範囲とファイル名は画像全体を分割した場合と同じです）。非圧縮・ストリップ・タイルのTIFFや
+    非インターレースPNGなど部分デコードに対応している形式では、それらのタイルを含む範囲だけを
+    デコードします（PNGは範囲の下端までの展開が必要です）。
+
+    overlap_modeに'shared'を指定した場合は、オーバーラップ部分を複数のタイルで切り出し・エンコードせず、
+    タイル間の移動量（tile_size - overlap）の重ならないタイル（コアタイル）だけを書き出します。
+    各タイルをコアタイルから組み立てるための情報は「プレフィックス_日時_windows.json」に書き出し、
+    load_overlap_windowでオーバーラップを含むタイルを復元できます。
+
     Args:
-        image_path: 入力画像のパス
-        tile_size: 分割サイズ (幅, 高さ)
+        image_path: 入力画像のパス、またはデコード済みの画像（split_image_framesの各フレーム。
+            cacheとjpeg_losslessは使用できない）
+        tile_size: 分割サイズ (幅, 高さ)。grid_sizeを指定した場合はNone
         output_dir: 出力ディレクトリ
         prefix: 出力ファイル名のプレフィックス
         format: 出力フォーマット (png, jpg, webp)
         quality: 画像品質 (0-100)
         overlap: オーバーラップサイズ (ピクセル)
+        workers: タイルのエンコードに使用するワーカー数 (1で逐次処理, 0でCPU数)
+        stream: タイル1行分の水平バンドごとにデコードし、メモリ使用量を抑えるかどうか
+        skip_blank: 単色または完全に透明なタイルを保存しないかどうか
+        dedupe: 画素が同一のタイルを1回だけ保存するかどうか
+        cache: 前回の分割結果を再利用し、変更されたタイルだけを再生成するかどうか
+        container: タイルをまとめて書き出すコンテナ形式 (zip, mbtiles)
+        stats: 工程ごとの処理時間とバイト数の記録先（profiling.SplitStats）
+        png_level: PNGの圧縮レベル (0-9)。autoの場合は数個のタイルをエンコードして
+            圧縮レベル・optimize・行フィルタを自動で選ぶ
+        png_optimize: PNGをoptimize（圧縮レベル9）で保存するかどうか。
+            Noneの場合は圧縮レベルを指定しなかったときだけoptimizeを使用
+        png_filter: PNGの行フィルタ (adaptive, none)
+        jpeg_lossless: JPEG画像をJPEGで出力する場合に、MCUの境界に揃ったタイルをDCT係数のまま切り出すかどうか
+        scale: 画像を1/scaleに縮小してデコードする倍率 (1, 2, 4, 8)。
+            タイルの分割は縮小後の画像に対して行う
+        region: 元の画像の座標での範囲 (左, 上, 右, 下)。指定した場合は範囲に重なるタイルだけを出力する
+        write_queue: 書き込み待ちのタイル数の上限。1以上の場合はエンコードしたタイルを別のスレッドで書き込み、
+            エンコードとファイルの書き込みを並行して行う（0で書き込みキューを使用しない。コンテナでは使用しない）
+        fsync: すべてのタイルを書き込んだ後に、タイル（コンテナの場合はコンテナのファイル）と
+            出力ディレクトリをまとめてディスクに同期するかどうか
+        sink: タイルの出力先（add(name, data, row, col)を持つオブジェクト、辞書、関数）。
+            Noneまたはsink.DirectorySinkの場合はディレクトリにファイルとして書き出す
+        grid_size: 分割数 (行数, 列数)。指定した場合はtile_sizeを使用せず、画像をちょうど
+            行数×列数のタイルに分割する（split_image_by_countを参照）
+        overlap_mode: オーバーラップの扱い (crop, shared)。sharedの場合は重ならないコアタイルと
+            タイルを組み立てるためのマニフェストを書き出す（regionとは同時に指定できない）
 
     Returns:
-        生成されたファイルパスのリスト
+        生成されたファイルパスのリスト（スキップ・重複排除したタイルは含まない）。
+        コンテナの場合は「コンテナのパス/タイル名」、出力先を指定した場合はタイル名。
+        overlap_modeがsharedの場合はコアタイルのファイルパス
+
+    Raises:
+        ValueError: 引数の値または組み合わせが不正な場合。同時に指定できない組み合わせは次のとおり
+            - cacheとdedupe
+            - cacheとcontainer
+            - dedupeとcontainer
+            - sink（ディレクトリ以外）とcacheまたはcontainer
+            - jpeg_losslessとscale（1以外）
+            - overlap_modeのsharedとregion
+            - デコード済みの画像とcacheまたはjpeg_lossless
+            値の検証はPNGの圧縮設定、縮小の倍率、範囲、書き込みキューの長さ、分割数、
+            オーバーラップ、オーバーラップの扱いについて行う
     """
+    # ディレクトリの出力先は従来どおりファイルとして書き出す
+    tile_sink = as_sink(sink)
+    if isinstance(tile_sink, DirectorySink):
+        output_dir, tile_sink = tile_sink.path, None
+
+    decoded = isinstance(image_path, Image.Image)
+    _validate_split_options(
+        decoded=decoded, tile_size=tile_size, overlap=overlap, grid_size=grid_size, overlap_mode=overlap_mode,
+        region=region, scale=scale, dedupe=dedupe, cache=cache, container=container, jpeg_lossless=jpeg_lossless,
+        png_level=png_level, png_filter=png_filter, write_queue=write_queue, tile_sink=tile_sink
+    )
+    source_path = None if decoded else os.path.abspath(image_path)
+
+    # 共有モードでは重ならないコアタイルだけを切り出す（オーバーラップ部分は隣のコアタイルを参照）
+    shared = overlap_mode == 'shared'
+    split_tile_size, split_overlap = tile_size, overlap
+    if shared:
+        split_overlap = 0
+        if tile_size is not None:
+            split_tile_size = (tile_size[0] - overlap, tile_size[1] - overlap)
+
     # 出力ディレクトリが存在しない場合は作成
-    os.makedirs(output_dir, exist_ok=True)
+    if tile_sink is None:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # 画像を開く
-    with Image.open(image_path) as img:
-        # 画像のサイズを取得
-        img_width, img_height = img.size
-        tile_width, tile_height = tile_size
+    # フォーマットに応じた保存オプションを設定
+    extension = format.lower()
+    save_format, save_options = _get_save_options(format, quality, png_level, png_optimize)
 
-        # 現在の日時を取得
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    if stats is not None:
+        stats.start()
 
-        # 生成されたファイルのパスを保存するリスト
-        output_files = []
+    # マニフェストに記録する分割の条件
+    tiling = {'grid_size': list(grid_size)} if grid_size is not None else {'tile_size': list(tile_size)}
 
-        # 行と列の数を計算
-        effective_tile_width = tile_width - overlap
-        effective_tile_height = tile_height - overlap
+    # 現在の日時を取得
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        # 最後のタイルが小さすぎる場合に調整するための計算
-        cols = (img_width + effective_tile_width - 1) // effective_tile_width
-        rows = (img_height + effective_tile_height - 1) // effective_tile_height
+    # 前回の分割結果を読み込み、変更がなければそのまま返す
+    previous_tiles = {}
+    if cache:
+        cache_path = os.path.join(output_dir, f"{prefix}_cache.json")
+        cache_params = {
+            **tiling,
+            'overlap': overlap,
+            'format': extension,
+            'quality': quality,
+            'skip_blank': skip_blank
+        }
+        if save_format == 'PNG':
+            cache_params['png'] = {'level': png_level, 'optimize': png_optimize, 'filter': png_filter}
+        if jpeg_lossless:
+            cache_params['jpeg_lossless'] = True
+        if shared:
+            cache_params['overlap_mode'] = overlap_mode
+        if scale != 1:
+            cache_params['scale'] = scale
+        if region is not None:
+            cache_params['region'] = list(region)
+        cache_index = _load_cache_index(cache_path)
+        source = _source_fingerprint(image_path, cache_index.get('source') if cache_index else None)
 
-        for row in range(rows):
-            for col in range(cols):
-                # タイルの左上の座標を計算
-                left = col * effective_tile_width
-                upper = row * effective_tile_height
-
-                # タイルの右下の座標を計算（画像の境界を超えないように）
-                right = min(left + tile_width, img_width)
-                lower = min(upper + tile_height, img_height)
-
-                # タイルをクロップ
-                tile = img.crop((left, upper, right, lower))
-
-                # 出力ファイル名を生成
-                output_filename = f"{prefix}_{timestamp}_{row:03d}_{col:03d}.{format.lower()}"
-                output_path = os.path.join(output_dir, output_filename)
-
-                # フォーマットに応じた保存オプションを設定
-                save_options = {}
-                if format.lower() in ['jpg', 'jpeg']:
-                    save_options['quality'] = quality
-                    save_options['optimize'] = True
-                    if format.lower() == 'jpg':
-                        format = 'jpeg'
-                elif format.lower() == 'webp':
-                    save_options['quality'] = quality
-                elif format.lower() == 'png':
-                    save_options['optimize'] = True
-
-                # タイルを保存
-                tile.save(output_path, format=format.upper(), **save_options)
-                output_files.append(output_path)
+        if cache_index and cache_index.get('params') == cache_params:
+            previous_files = [
+                os.path.join(output_dir, tile['file']) for tile in cache_index['tiles'] if tile['file']
+            ]
+            if cache_index['source']['sha256'] == source['sha256'] and all(map(os.path.isfile, previous_files)):
+                if cache_index['source'] != source:
+                    # 内容が同じで更新日時だけが変わった場合は記録を更新
+                    cache_index['source'] = source
+                    _write_tile_manifest(cache_path, cache_index)
+                if stats is not None:
+                    stats.stop()
+                return previous_files
+
+            # ファイル名を維持するため前回の日時を引き継ぐ
+            timestamp = cache_index['timestamp']
+            previous_tiles = {(tile['row'], tile['col']): tile for tile in cache_index['tiles']}
+
+    # 生成されたファイルのパスを保存するリスト
+    output_files = []
+
+    # マニフェストに記録するタイルの一覧と、重複排除用のハッシュ値から保存先への対応
+    manifest_tiles = []
+    stored_files = {}
+
+    jpeg_cropper = None
+    start = time.perf_counter()
+    source_file = None if decoded else _open_source(image_path)
+    open_seconds = time.perf_counter() - start
+
+    # コンテナまたは出力先に書き出す場合はタイルの保存先をそれにする
+    container_writer = tile_sink
+    tile_dir = output_dir
+    if container:
+        tile_dir = os.path.join(output_dir, f"{prefix}_{timestamp}.{CONTAINER_FORMATS.get(container, container)}")
+        try:
+            # MBTilesは行番号を下から数えるため、グリッドの行数を画像のヘッダーから求める
+            rows, _ = _tile_grid(
+                scaled_size(_image_size(image_path, source_file), scale), split_tile_size, split_overlap, grid_size
+            )
+            container_writer = open_container_writer(tile_dir, container, {
+                'name': prefix,
+                'format': extension,
+                **{key: 'x'.join(map(str, value)) for key, value in tiling.items()},
+                'overlap': str(overlap),
+                'source': source_path or ''
+            }, rows)
+        except BaseException:
+            if source_file is not None:
+                source_file.close()
+            raise
+
+    if source_file is not None:
+        # タイル化TIFFは格納タイル単位で読み込み、JPEG圧縮の格納タイルはそのまま書き出す。
+        # 非圧縮の画像はメモリにマップしたデータから読み込む
+        if stats is not None:
+            stats.record('open', open_seconds)
+        if save_format == 'JPEG' and scale == 1 and source_file.jpeg_passthrough:
+            jpeg_cropper = source_file
+        regions = _iter_source_regions(
+            source_file, split_tile_size, split_overlap, stats, scale, region, jpeg_cropper,
+            cache or skip_blank or dedupe, grid_size
+        )
+    else:
+        # JPEG画像のタイルをDCT係数のまま切り出す場合は、切り出せないタイルだけデコード
+        if jpeg_lossless and save_format == 'JPEG':
+            jpeg_cropper = _open_jpeg_cropper(image_path, split_tile_size, split_overlap, stats, region, grid_size)
+        if jpeg_cropper is not None:
+            regions = _iter_jpeg_regions(
+                image_path, split_tile_size, split_overlap, jpeg_cropper, cache or skip_blank or dedupe, stats, region,
+                grid_size
+            )
+        else:
+            regions = _iter_file_regions(
+                image_path, split_tile_size, split_overlap, stream, stats, scale, region, grid_size
+            )
+
+    with contextlib.ExitStack() as stack:
+        if source_file is not None:
+            stack.callback(source_file.close)
+        if container:
+            if fsync:
+                # コンテナを閉じた後にコンテナのファイルを同期
+                stack.callback(_fsync_files, [tile_dir], stats)
+            stack.callback(container_writer.close)
+        writer = stack.enter_context(
+            _TileWriter(workers, container_writer, stats, png_filter, png_level == 'auto', jpeg_cropper,
+                        write_queue, fsync)
+        )
 
-        return output_files
+        for row, col, box, source_image, source_box in regions:
+            entry = {'row': row, 'col': col, 'box': list(box)}
+
+            # 空白判定とハッシュ値の計算が必要な場合だけクロップ
+            if cache or skip_blank or dedupe:
+                tile = _crop_tile(source_image, source_box, stats)
+            inspect_start = time.perf_counter()
+            try:
+                # 前回と内容が同じタイルは再エンコードしない
+                if cache:
+                    entry['digest'] = _tile_digest(tile)
+                    previous = previous_tiles.get((row, col))
+                    if (previous is not None and previous['digest'] == entry['digest']
+                            and previous['box'] == entry['box']
+                            and (previous['file'] is None or os.path.isfile(os.path.join(output_dir, previous['file'])))):
+                        manifest_tiles.append(previous)
+                        if previous['file']:
+                            output_files.append(os.path.join(output_dir, previous['file']))
+                        continue
+
+                manifest_tiles.append(entry)
+
+                # 空白タイルはエンコード前に判定してスキップ
+                if skip_blank and _is_blank_tile(tile):
+                    entry['file'] = None
+                    entry['fill'] = _tile_fill(tile)
+                    continue
+
+                # 同一のタイルは最初に保存したファイルを参照
+                if dedupe:
+                    digest = _tile_digest(tile)
+                    if digest in stored_files:
+                        entry['file'] = stored_files[digest]
+                        continue
+            finally:
+                # 空白判定とハッシュ値の計算の処理時間を記録
+                if stats is not None and (cache or skip_blank or dedupe):
+                    stats.record('inspect', time.perf_counter() - inspect_start)
+
+            # 出力ファイル名を生成
+            output_filename = f"{prefix}_{timestamp}_{row:03d}_{col:03d}.{extension}"
+            output_path = os.path.join(tile_dir, output_filename)
+            entry['file'] = output_filename
+            if dedupe:
+                stored_files[digest] = output_filename
+
+            # タイルを保存（コンテナの場合はタイル名で登録）
+            writer.submit(
+                source_image, output_filename if container_writer is not None else output_path,
+                save_format, save_options, position=(row, col), box=source_box, crop_box=box
+            )
+            output_files.append(output_filename if tile_sink is not None else output_path)
+
+    if cache:
+        # 今回のタイルに含まれなくなった前回のファイルを削除
+        current_files = {tile['file'] for tile in manifest_tiles if tile['file']}
+        for tile in previous_tiles.values():
+            if tile['file'] and tile['file'] not in current_files:
+                stale_path = os.path.join(output_dir, tile['file'])
+                if os.path.isfile(stale_path):
+                    os.remove(stale_path)
+
+        _write_tile_manifest(cache_path, {
+            'source': source,
+            'params': cache_params,
+            'timestamp': timestamp,
+            'tiles': manifest_tiles
+        })
+
+    if skip_blank or dedupe:
+        _write_tile_manifest(
+            os.path.join(output_dir, f"{prefix}_{timestamp}_manifest.json"),
+            {
+                'source': source_path,
+                **tiling,
+                'overlap': overlap,
+                'format': extension,
+                'tiles': manifest_tiles
+            },
+            tile_sink
+        )
+
+    if shared:
+        # コアタイルから各タイルを組み立てるためのマニフェストを書き出す
+        _write_tile_manifest(
+            os.path.join(output_dir, f"{prefix}_{timestamp}_windows.json"),
+            {
+                'source': source_path,
+                **tiling,
+                'overlap': overlap,
+                'format': extension,
+                'tiles': manifest_tiles,
+                'windows': _overlap_windows(manifest_tiles, tile_size, overlap, grid_size),
+                # コンテナに書き出した場合は、コアタイルを読み込むコンテナのファイル名
+                **({'container': os.path.basename(tile_dir)} if container else {})
+            },
+            tile_sink
+        )
+
+    if stats is not None:
+        stats.stop()
+    return output_files
 
 
 def split_image_by_count(
@@ -100,11 +1833,33 @@ def split_image_by_count(
     prefix: str = "slice",
     format: str = "png",
     quality: int = 90,
-    overlap: int = 0
+    overlap: int = 0,
+    workers: int = 1,
+    stream: bool = False,
+    skip_blank: bool = False,
+    dedupe: bool = False,
+    cache: bool = False,
+    container: Optional[str] = None,
+    stats: Optional[SplitStats] = None,
+    png_level: Union[int, str, None] = None,
+    png_optimize: Optional[bool] = None,
+    png_filter: str = 'adaptive',
+    jpeg_lossless: bool = False,
+    scale: int = 1,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    write_queue: int = 0,
+    fsync: bool = False,
+    sink=None,
+    overlap_mode: str = 'crop'
 ) -> List[str]:
     """
     画像を指定された行数と列数に分割します。
 
+    画像の幅と高さを分割数で割った余りは各タイルに1ピクセルずつ配分するため、
+    ちょうど行数×列数のタイルを出力します（タイルの大きさの差は1ピクセル以内）。
+    overlapを指定した場合は、各タイルを右と下にオーバーラップ分だけ広げます。
+    画像はsplit_image_by_sizeと同じ処理で1回だけ開いてデコードします。
+
     Args:
         image_path: 入力画像のパス
         grid_size: 分割数 (行数, 列数)
@@ -113,34 +1868,656 @@ def split_image_by_count(
         format: 出力フォーマット (png, jpg, webp)
         quality: 画像品質 (0-100)
         overlap: オーバーラップサイズ (ピクセル)
+        workers: タイルのエンコードに使用するワーカー数 (1で逐次処理, 0でCPU数)
+        stream: タイル1行分の水平バンドごとにデコードし、メモリ使用量を抑えるかどうか
+        skip_blank: 単色または完全に透明なタイルを保存しないかどうか
+        dedupe: 画素が同一のタイルを1回だけ保存するかどうか
+        cache: 前回の分割結果を再利用し、変更されたタイルだけを再生成するかどうか
+        container: タイルをまとめて書き出すコンテナ形式 (zip, mbtiles)
+        stats: 工程ごとの処理時間とバイト数の記録先（profiling.SplitStats）
+        png_level: PNGの圧縮レベル (0-9)。autoの場合は数個のタイルをエンコードして
+            圧縮レベル・optimize・行フィルタを自動で選ぶ
+        png_optimize: PNGをoptimize（圧縮レベル9）で保存するかどうか。
+            Noneの場合は圧縮レベルを指定しなかったときだけoptimizeを使用
+        png_filter: PNGの行フィルタ (adaptive, none)
+        jpeg_lossless: JPEG画像をJPEGで出力する場合に、MCUの境界に揃ったタイルをDCT係数のまま切り出すかどうか
+        scale: 画像を1/scaleに縮小してデコードする倍率 (1, 2, 4, 8)。
+            タイルの分割は縮小後の画像に対して行う
+        region: 元の画像の座標での範囲 (左, 上, 右, 下)。指定した場合は範囲に重なるタイルだけを出力する
+        write_queue: 書き込み待ちのタイル数の上限（1以上で書き込みを別のスレッドで行う）
+        fsync: すべてのタイルを書き込んだ後にまとめてディスクに同期するかどうか
+        sink: タイルの出力先（split_image_by_sizeを参照）
+        overlap_mode: オーバーラップの扱い (crop, shared)（split_image_by_sizeを参照）
 
     Returns:
         生成されたファイルパスのリスト
+
+    Raises:
+        ValueError: 分割数が1未満または画像の幅・高さより大きい場合（その他はsplit_image_by_sizeを参照）
     """
-    # 画像を開く
-    with Image.open(image_path) as img:
-        # 画像のサイズを取得
+    # 分割数を指定して分割サイズと同じ処理で分割
+    return split_image_by_size(
+        image_path=image_path,
+        tile_size=None,
+        output_dir=output_dir,
+        prefix=prefix,
+        format=format,
+        quality=quality,
+        overlap=overlap,
+        workers=workers,
+        stream=stream,
+        skip_blank=skip_blank,
+        dedupe=dedupe,
+        cache=cache,
+        container=container,
+        stats=stats,
+        png_level=png_level,
+        png_optimize=png_optimize,
+        png_filter=png_filter,
+        jpeg_lossless=jpeg_lossless,
+        scale=scale,
+        region=region,
+        write_queue=write_queue,
+        fsync=fsync,
+        sink=sink,
+        grid_size=grid_size,
+        overlap_mode=overlap_mode
+    )
+
+
+def split_image_frames(
+    image_path: str,
+    tile_size: Optional[Tuple[int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None,
+    frames: Union[str, Tuple[int, int]] = 'all',
+    prefix: str = "slice",
+    frame_workers: int = 1,
+    stats: Optional[SplitStats] = None,
+    **options
+) -> List[str]:
+    """
+    複数ページのTIFFやアニメーションGIFなど、複数のフレームを持つ画像をフレームごとに分割します。
+
+    フレームは先頭から順にシークして1回ずつデコードし（フレームごとに先頭から読み直さないため、
+    フレーム数に比例した時間で処理できます）、デコードしたフレームをframe_workers個のスレッドで
+    並列に分割します。分割待ちのフレームはframe_workersの2倍までに制限し、
+    デコード済みのフレームがメモリに溜まり続けないようにします。
+
+    各フレームのタイルは「プレフィックス_fフレーム番号」をプレフィックスとして書き出します
+    （例: slice_f0003_20250403_085000_000_001.png）。
+
+    Args:
+        image_path: 入力画像のパス
+        tile_size: 分割サイズ (幅, 高さ)
+        grid_size: 分割数 (行数, 列数)。tile_sizeとどちらか一方を指定
+        frames: 分割するフレーム。'all'ですべてのフレーム、(最初, 最後)で範囲のフレーム（0始まり、両端を含む）
+        prefix: 出力ファイル名のプレフィックス（フレーム番号が付加されます）
+        frame_workers: 同時に分割するフレームの数 (1で逐次処理, 0でCPU数)
+        stats: 工程ごとの処理時間とバイト数の記録先（profiling.SplitStats）
+        **options: split_image_by_size / split_image_by_count に渡すその他のオプション
+            （output_dir, format, quality, overlap, workers など。cacheとjpeg_losslessは使用できない）
+
+    Returns:
+        生成されたファイルパスのリスト（フレーム順）
+
+    Raises:
+        ValueError: tile_sizeとgrid_sizeの指定、フレームの範囲が不正な場合
+    """
+    if (tile_size is None) == (grid_size is None):
+        raise ValueError("分割サイズと分割数のどちらか一方を指定してください")
+    if frames == 'all':
+        first, last = 0, None
+    else:
+        first, last = frames
+        if first < 0 or first > last:
+            raise ValueError(f"フレームの範囲は0 <= 最初 <= 最後 である必要があります: {first}-{last}")
+
+    frame_workers = _resolve_workers(frame_workers)
+
+    def split_frame(frame: Image.Image, index: int) -> List[str]:
+        frame_prefix = f"{prefix}_f{index:04d}"
+        if tile_size is not None:
+            return split_image_by_size(frame, tile_size, prefix=frame_prefix, stats=stats, **options)
+        return split_image_by_count(frame, grid_size, prefix=frame_prefix, stats=stats, **options)
+
+    if stats is not None:
+        stats.start()
+
+    output_files = []
+    pending = collections.deque()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=frame_workers) as executor, \
+            Image.open(image_path) as img:
+        if stats is not None:
+            stats.record('open', time.perf_counter() - start)
+
+        index = first
+        while last is None or index <= last:
+            # 前のフレームから順にシークし、フレームを1回だけデコード
+            start = time.perf_counter()
+            try:
+                img.seek(index)
+            except EOFError:
+                break
+            frame = img.copy()
+            if stats is not None:
+                stats.record('decode', time.perf_counter() - start, image_nbytes(frame))
+
+            pending.append(executor.submit(split_frame, frame, index))
+            if len(pending) >= frame_workers * 2:
+                output_files.extend(pending.popleft().result())
+            index += 1
+
+        while pending:
+            output_files.extend(pending.popleft().result())
+
+    if index == first:
+        raise ValueError(f"フレームがありません: {first}（{image_path}）")
+
+    if stats is not None:
+        stats.stop()
+    return output_files
+
+
+def _pyramid_tile_boxes(
+    level_size: Tuple[int, int],
+    tile_size: int,
+    overlap: int = 0
+) -> Iterator[Tuple[int, int, Tuple[int, int, int, int]]]:
+    """
+    ピラミッドの1階層分のタイルの範囲を計算します。
+
+    Deep Zoomの仕様に合わせ、内側の辺だけをオーバーラップ分だけ広げます。
+
+    Args:
+        level_size: 階層の画像サイズ (幅, 高さ)
+        tile_size: タイルの一辺の長さ
+        overlap: オーバーラップサイズ (ピクセル)
+
+    Yields:
+        (行番号, 列番号, タイルの範囲)のタプル
+    """
+    level_width, level_height = level_size
+    cols = (level_width + tile_size - 1) // tile_size
+    rows = (level_height + tile_size - 1) // tile_size
+
+    for row in range(rows):
+        for col in range(cols):
+            left = col * tile_size - (overlap if col > 0 else 0)
+            upper = row * tile_size - (overlap if row > 0 else 0)
+            right = min((col + 1) * tile_size + overlap, level_width)
+            lower = min((row + 1) * tile_size + overlap, level_height)
+            yield row, col, (left, upper, right, lower)
+
+
+def _downsample_half(img: Image.Image) -> Image.Image:
+    """
+    画像を縦横1/2（端数切り上げ）に縮小します。
+
+    Args:
+        img: 縮小する画像
+
+    Returns:
+        縮小した画像
+    """
+    # 縮小に対応していないモードは変換してから縮小
+    if img.mode == '1':
+        img = img.convert('L')
+    elif img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    elif img.mode.startswith('I;16'):
+        img = img.convert('I')
+    return img.reduce(2)
+
+
+def split_image_pyramid(
+    image_path: str,
+    output_dir: str = ".",
+    prefix: str = "slice",
+    tile_size: int = 256,
+    overlap: int = 0,
+    format: str = "png",
+    quality: int = 90,
+    layout: str = "dzi",
+    workers: int = 1,
+    stats: Optional[SplitStats] = None,
+    png_level: Union[int, str, None] = None,
+    png_optimize: Optional[bool] = None,
+    png_filter: str = 'adaptive',
+    write_queue: int = 0,
+    fsync: bool = False
+) -> List[str]:
+    """
+    画像からズーム用のタイルピラミッドを作成します。
+
+    最大解像度の階層から順にタイルを書き出し、各階層は1つ上の階層を
+    縦横1/2に縮小して作成します（入力画像を階層ごとに読み直しません）。
+
+    出力レイアウト:
+        dzi: 「プレフィックス.dzi」と「プレフィックス_files/階層/列_行.拡張子」（Deep Zoom形式）
+        xyz: 「プレフィックス/z/x/y.拡張子」（zは画像全体が1タイルに収まる階層を0とする）
+
+    Args:
+        image_path: 入力画像のパス
+        output_dir: 出力ディレクトリ
+        prefix: 出力ファイル名のプレフィックス
+        tile_size: タイルの一辺の長さ (ピクセル)
+        overlap: オーバーラップサイズ (ピクセル、dziのみ)
+        format: 出力フォーマット (png, jpg, webp)
+        quality: 画像品質 (0-100)
+        layout: 出力レイアウト (dzi, xyz)
+        workers: タイルのエンコードに使用するワーカー数 (1で逐次処理, 0でCPU数)
+        stats: 工程ごとの処理時間とバイト数の記録先（profiling.SplitStats）
+        png_level: PNGの圧縮レベル (0-9)。autoの場合は数個のタイルをエンコードして
+            圧縮レベル・optimize・行フィルタを自動で選ぶ
+        png_optimize: PNGをoptimize（圧縮レベル9）で保存するかどうか。
+            Noneの場合は圧縮レベルを指定しなかったときだけoptimizeを使用
+        png_filter: PNGの行フィルタ (adaptive, none)
+        write_queue: 書き込み待ちのタイル数の上限（1以上で書き込みを別のスレッドで行う）
+        fsync: すべてのタイルを書き込んだ後にまとめてディスクに同期するかどうか
+
+    Returns:
+        生成されたタイルのファイルパスのリスト（最大解像度の階層から順）
+
+    Raises:
+        ValueError: レイアウト、タイルサイズ、オーバーラップ、PNGの圧縮設定、書き込みキューの長さが不正な場合
+    """
+    _validate_png_options(png_level, png_filter)
+    _validate_write_queue(write_queue)
+    if layout not in PYRAMID_LAYOUTS:
+        raise ValueError(f"無効なレイアウト: {layout}。有効なレイアウト: {', '.join(PYRAMID_LAYOUTS)}")
+    if tile_size <= 0:
+        raise ValueError(f"タイルサイズは1以上である必要があります: {tile_size}")
+    if overlap < 0 or (overlap > 0 and layout == 'xyz'):
+        raise ValueError(f"オーバーラップはdzi形式でのみ0以上の値を指定できます: {overlap}")
+
+    # 出力ディレクトリが存在しない場合は作成
+    os.makedirs(output_dir, exist_ok=True)
+
+    # フォーマットに応じた保存オプションを設定
+    extension = format.lower()
+    save_format, save_options = _get_save_options(format, quality, png_level, png_optimize)
+
+    # 生成されたファイルのパスを保存するリスト
+    output_files = []
+    created_dirs = set()
+
+    if stats is not None:
+        stats.start()
+
+    start = time.perf_counter()
+    with _TileWriter(workers, stats=stats, png_filter=png_filter, png_auto=png_level == 'auto',
+                     write_queue=write_queue, fsync=fsync) as writer, \
+            Image.open(image_path) as img:
         img_width, img_height = img.size
-        rows, cols = grid_size
+        if stats is not None:
+            stats.record('open', time.perf_counter() - start)
+            start = time.perf_counter()
+            img.load()
+            stats.record('decode', time.perf_counter() - start, image_nbytes(img))
+
+        # 最大解像度の階層番号（1x1ピクセルの階層を0とする）
+        max_dimension = max(img_width, img_height)
+        max_level = (max_dimension - 1).bit_length()
+
+        # xyz形式では画像全体が1タイルに収まる最大の階層から出力
+        min_level = 0
+        if layout == 'xyz':
+            reductions = 0
+            while (max_dimension + (1 << reductions) - 1) >> reductions > tile_size:
+                reductions += 1
+            min_level = max_level - reductions
+
+        level_image = img
+        for level in range(max_level, min_level - 1, -1):
+            for row, col, box in _pyramid_tile_boxes(level_image.size, tile_size, overlap):
+                if layout == 'dzi':
+                    tile_dir = os.path.join(output_dir, f"{prefix}_files", str(level))
+                    output_path = os.path.join(tile_dir, f"{col}_{row}.{extension}")
+                else:
+                    tile_dir = os.path.join(output_dir, prefix, str(level - min_level), str(col))
+                    output_path = os.path.join(tile_dir, f"{row}.{extension}")
+
+                if tile_dir not in created_dirs:
+                    os.makedirs(tile_dir, exist_ok=True)
+                    created_dirs.add(tile_dir)
+
+                # タイルを保存（階層の画像の範囲から直接エンコード）
+                writer.submit(level_image, output_path, save_format, save_options, box=box)
+                output_files.append(output_path)
+
+            # 次の階層は現在の階層を縮小して作成
+            if level > min_level:
+                start = time.perf_counter()
+                level_image = _downsample_half(level_image)
+                if stats is not None:
+                    stats.record('resize', time.perf_counter() - start, image_nbytes(level_image))
+
+    if layout == 'dzi':
+        with open(os.path.join(output_dir, f"{prefix}.dzi"), 'w', encoding='utf-8') as f:
+            f.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+                f'Format="{extension}" Overlap="{overlap}" TileSize="{tile_size}">\n'
+                f'  <Size Width="{img_width}" Height="{img_height}"/>\n'
+                '</Image>\n'
+            )
+
+    if stats is not None:
+        stats.stop()
+    return output_files
+
+
+def _quadtree_boxes(
+    measure_image: Image.Image,
+    box: Tuple[int, int, int, int],
+    min_tile_size: int,
+    threshold: float,
+    criterion: str,
+    depth: int = 0
+) -> Iterator[Tuple[Tuple[int, int, int, int], int]]:
+    """
+    タイルの範囲を内容に応じて再帰的に4分割し、分割後のタイルの範囲を左上から順に返します。
+
+    判定用の画像の範囲内の値（varianceは標準偏差、edgesはエッジの画素の割合）がthresholdを超える場合だけ、
+    縦横をそれぞれ半分に分割します。幅または高さが最小のタイルサイズの2倍未満の方向は分割しません。
+
+    Args:
+        measure_image: 判定用の画像（varianceは輝度の画像、edgesはエッジの画素を100、それ以外を0とした画像）
+        box: タイルの範囲 (左, 上, 右, 下)
+        min_tile_size: 最小のタイルサイズ (ピクセル)
+        threshold: 分割する判定のしきい値
+        criterion: 判定基準 (variance, edges)
+        depth: 最初のタイルからの分割の深さ
+
+    Yields:
+        (タイルの範囲, 分割の深さ)のタプル
+    """
+    left, upper, right, lower = box
+    split_x = right - left >= min_tile_size * 2
+    split_y = lower - upper >= min_tile_size * 2
+    if split_x or split_y:
+        stat = ImageStat.Stat(measure_image.crop(box))
+        score = stat.stddev[0] if criterion == 'variance' else stat.mean[0]
+        if score <= threshold:
+            split_x = split_y = False
+    if not split_x and not split_y:
+        yield box, depth
+        return
+
+    xs = [left, (left + right) // 2, right] if split_x else [left, right]
+    ys = [upper, (upper + lower) // 2, lower] if split_y else [upper, lower]
+    for top, bottom in zip(ys, ys[1:]):
+        for child_left, child_right in zip(xs, xs[1:]):
+            yield from _quadtree_boxes(
+                measure_image, (child_left, top, child_right, bottom), min_tile_size, threshold, criterion, depth + 1
+            )
+
+
+def split_image_quadtree(
+    image_path: str,
+    output_dir: str = ".",
+    prefix: str = "slice",
+    max_tile_size: int = 512,
+    min_tile_size: int = 64,
+    threshold: Optional[float] = None,
+    criterion: str = 'variance',
+    format: str = "png",
+    quality: int = 90,
+    workers: int = 1,
+    stats: Optional[SplitStats] = None,
+    png_level: Union[int, str, None] = None,
+    png_optimize: Optional[bool] = None,
+    png_filter: str = 'adaptive',
+    write_queue: int = 0,
+    fsync: bool = False
+) -> List[str]:
+    """
+    画像を内容に応じた大きさのタイルに分割します（四分木分割）。
+
+    画像をmax_tile_sizeの正方形のグリッドに分割し、内容の変化が大きいタイル
+    （輝度の標準偏差、またはエッジの画素の割合がthresholdを超えるタイル）だけを
+    min_tile_sizeまで縦横に4分割します。余白や単色の領域は大きなタイルのまま出力するため、
+    文書のスキャン画像や地図ではタイル数とエンコード時間を削減できます。
+
+    タイルは「プレフィックス_日時_上端_左端.拡張子」として書き出し、すべてのタイルの範囲と
+    分割の深さを「プレフィックス_日時_quadtree.json」に書き出します。
+
+    Args:
+        image_path: 入力画像のパス
+        output_dir: 出力ディレクトリ
+        prefix: 出力ファイル名のプレフィックス
+        max_tile_size: 最大のタイルの一辺の長さ (ピクセル)
+        min_tile_size: 最小のタイルの一辺の長さ (ピクセル)
+        threshold: タイルを分割するしきい値（varianceは0-255の輝度の標準偏差、edgesはエッジの画素の割合（%））。
+            Noneの場合は判定基準ごとの既定値（QUADTREE_CRITERIA）
+        criterion: 分割の判定基準 (variance, edges)
+        format: 出力フォーマット (png, jpg, webp)
+        quality: 画像品質 (0-100)
+        workers: タイルのエンコードに使用するワーカー数 (1で逐次処理, 0でCPU数)
+        stats: 工程ごとの処理時間とバイト数の記録先（profiling.SplitStats）
+        png_level: PNGの圧縮レベル (0-9)。autoの場合は数個のタイルをエンコードして
+            圧縮レベル・optimize・行フィルタを自動で選ぶ
+        png_optimize: PNGをoptimize（圧縮レベル9）で保存するかどうか。
+            Noneの場合は圧縮レベルを指定しなかったときだけoptimizeを使用
+        png_filter: PNGの行フィルタ (adaptive, none)
+        write_queue: 書き込み待ちのタイル数の上限（1以上で書き込みを別のスレッドで行う）
+        fsync: すべてのタイルを書き込んだ後にまとめてディスクに同期するかどうか
+
+    Returns:
+        生成されたタイルのファイルパスのリスト（最大のタイルごとに、分割したタイルを左上から順）
 
-        # タイルサイズを計算
-        tile_width = img_width // cols
-        tile_height = img_height // rows
-
-        # オーバーラップを考慮したタイルサイズを計算
-        tile_width_with_overlap = tile_width + overlap
-        tile_height_with_overlap = tile_height + overlap
-
-        # 分割サイズを使用して画像を分割
-        return split_image_by_size(
-            image_path=image_path,
-            tile_size=(tile_width_with_overlap, tile_height_with_overlap),
-            output_dir=output_dir,
-            prefix=prefix,
-            format=format,
-            quality=quality,
-            overlap=overlap
+    Raises:
+        ValueError: タイルサイズ、しきい値、判定基準、PNGの圧縮設定、書き込みキューの長さが不正な場合
+    """
+    _validate_png_options(png_level, png_filter)
+    _validate_write_queue(write_queue)
+    if criterion not in QUADTREE_CRITERIA:
+        raise ValueError(f"無効な判定基準: {criterion}。有効な判定基準: {', '.join(QUADTREE_CRITERIA)}")
+    if min_tile_size <= 0 or max_tile_size < min_tile_size:
+        raise ValueError(
+            f"タイルサイズは1 <= 最小のタイルサイズ <= 最大のタイルサイズ である必要があります: "
+            f"最小 {min_tile_size}, 最大 {max_tile_size}"
         )
+    if threshold is None:
+        threshold = QUADTREE_CRITERIA[criterion]
+    if threshold < 0:
+        raise ValueError(f"しきい値は0以上である必要があります: {threshold}")
+
+    # 出力ディレクトリが存在しない場合は作成
+    os.makedirs(output_dir, exist_ok=True)
+
+    # フォーマットに応じた保存オプションを設定
+    extension = format.lower()
+    save_format, save_options = _get_save_options(format, quality, png_level, png_optimize)
+
+    if stats is not None:
+        stats.start()
+
+    # 現在の日時を取得
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # 生成されたファイルのパスと、マニフェストに記録するタイルの一覧
+    output_files = []
+    manifest_tiles = []
+
+    start = time.perf_counter()
+    with _TileWriter(workers, stats=stats, png_filter=png_filter, png_auto=png_level == 'auto',
+                     write_queue=write_queue, fsync=fsync) as writer, \
+            Image.open(image_path) as img:
+        if stats is not None:
+            stats.record('open', time.perf_counter() - start)
+            start = time.perf_counter()
+            img.load()
+            stats.record('decode', time.perf_counter() - start, image_nbytes(img))
+
+        # 分割の判定に使用する輝度（またはエッジ）の画像を1回だけ作成
+        start = time.perf_counter()
+        measure_image = img.convert('L')
+        if criterion == 'edges':
+            # フィルタは画像の外周1ピクセルに元の値を残すため、外周はエッジなしとする
+            edges = ImageOps.crop(measure_image.filter(ImageFilter.FIND_EDGES), 1)
+            measure_image = ImageOps.expand(
+                edges.point(lambda value: 100 if value > QUADTREE_EDGE_LEVEL else 0), 1, 0
+            )
+        if stats is not None:
+            stats.record('inspect', time.perf_counter() - start)
+
+        max_size = (max_tile_size, max_tile_size)
+        rows, cols = _tile_grid(img.size, max_size)
+        for row in range(rows):
+            for col in range(cols):
+                start = time.perf_counter()
+                boxes = list(_quadtree_boxes(
+                    measure_image, _tile_box(row, col, img.size, max_size), min_tile_size, threshold, criterion
+                ))
+                if stats is not None:
+                    stats.record('inspect', time.perf_counter() - start)
+
+                for box, depth in boxes:
+                    left, upper, right, lower = box
+                    output_filename = f"{prefix}_{timestamp}_{upper:05d}_{left:05d}.{extension}"
+                    output_path = os.path.join(output_dir, output_filename)
+
+                    # タイルを保存（元画像の範囲から直接エンコード）
+                    writer.submit(img, output_path, save_format, save_options, box=box)
+                    output_files.append(output_path)
+                    manifest_tiles.append({'box': list(box), 'depth': depth, 'file': output_filename})
+
+        image_size = img.size
+
+    _write_tile_manifest(
+        os.path.join(output_dir, f"{prefix}_{timestamp}_quadtree.json"),
+        {
+            'source': os.path.abspath(image_path),
+            'size': list(image_size),
+            'max_tile_size': max_tile_size,
+            'min_tile_size': min_tile_size,
+            'criterion': criterion,
+            'threshold': threshold,
+            'format': extension,
+            'tiles': manifest_tiles
+        }
+    )
+
+    if stats is not None:
+        stats.stop()
+    return output_files
+
+
+def _batch_prefixes(image_paths: List[str], prefix: str) -> List[str]:
+    """
+    バッチ処理で各画像に使用するファイル名プレフィックスを決定します。
+
+    出力ディレクトリを共有しても衝突しないよう、プレフィックスに入力ファイル名を付け、
+    同名のファイルが複数ある場合は連番を付けます。
+
+    Args:
+        image_paths: 入力画像のパスのリスト
+        prefix: 出力ファイル名のプレフィックス
+
+    Returns:
+        各画像のプレフィックスのリスト
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in image_paths]
+    counts = collections.Counter(stems)
+    seen = collections.Counter()
+    prefixes = []
+    for stem in stems:
+        seen[stem] += 1
+        if counts[stem] > 1:
+            prefixes.append(f"{prefix}_{stem}_{seen[stem]}")
+        else:
+            prefixes.append(f"{prefix}_{stem}")
+    return prefixes
+
+
+def split_images(
+    image_paths: List[str],
+    tile_size: Optional[Tuple[int, int]] = None,
+    grid_size: Optional[Tuple[int, int]] = None,
+    prefix: str = "slice",
+    file_workers: int = 1,
+    pyramid: Optional[str] = None,
+    quadtree: bool = False,
+    frames: Union[str, Tuple[int, int], None] = None,
+    **options
+) -> List[dict]:
+    """
+    複数の画像をまとめて分割します。
+
+    画像単位の並列処理（file_workers）と、各画像内のタイルエンコードの
+    並列処理（workers）を組み合わせて実行します。1つの画像で失敗しても
+    残りの画像の処理は続行し、結果にエラーとして記録します。
+
+    Args:
+        image_paths: 入力画像のパスのリスト
+        tile_size: 分割サイズ (幅, 高さ)
+        grid_size: 分割数 (行数, 列数)。tile_sizeとどちらか一方を指定
+        prefix: 出力ファイル名のプレフィックス（入力ファイル名が付加されます）
+        file_workers: 同時に処理する画像の数 (1で逐次処理, 0でCPU数)
+        pyramid: ピラミッドのレイアウト (dzi, xyz)。指定した場合はsplit_image_pyramidで
+            正方形のtile_sizeのピラミッドを作成
+        quadtree: Trueの場合はsplit_image_quadtreeで正方形のtile_sizeを最大のタイルサイズとして
+            内容に応じた大きさのタイルに分割
+        frames: 分割するフレーム（'all'または(最初, 最後)）。指定した場合はsplit_image_framesで
+            フレームごとに分割（Noneの場合は最初のフレームだけを分割）
+        **options: split_image_by_size / split_image_by_count / split_image_pyramid / split_image_quadtree /
+            split_image_frames に渡す
+            その他のオプション（output_dir, format, quality, overlap, workers など）
+
+    Returns:
+        入力画像ごとの結果の辞書（path, output_files, error, elapsed）のリスト
+
+    Raises:
+        ValueError: tile_sizeとgrid_sizeの指定が不正な場合
+    """
+    if (tile_size is None) == (grid_size is None):
+        raise ValueError("分割サイズと分割数のどちらか一方を指定してください")
+    if pyramid is not None and (tile_size is None or tile_size[0] != tile_size[1]):
+        raise ValueError("ピラミッド出力では正方形の分割サイズを指定してください")
+    if quadtree and (pyramid is not None or tile_size is None or tile_size[0] != tile_size[1]):
+        raise ValueError("四分木分割では正方形の分割サイズを指定してください（ピラミッド出力とは同時に指定できません）")
+
+    file_workers = _resolve_workers(file_workers)
+    prefixes = _batch_prefixes(image_paths, prefix)
+
+    def split_one(image_path: str, file_prefix: str) -> dict:
+        start = time.perf_counter()
+        try:
+            if pyramid is not None:
+                output_files = split_image_pyramid(
+                    image_path, prefix=file_prefix, tile_size=tile_size[0], layout=pyramid, **options
+                )
+            elif quadtree:
+                output_files = split_image_quadtree(
+                    image_path, prefix=file_prefix, max_tile_size=tile_size[0], **options
+                )
+            elif frames is not None:
+                output_files = split_image_frames(
+                    image_path, tile_size, grid_size, frames, prefix=file_prefix, **options
+                )
+            elif tile_size is not None:
+                output_files = split_image_by_size(image_path, tile_size, prefix=file_prefix, **options)
+            else:
+                output_files = split_image_by_count(image_path, grid_size, prefix=file_prefix, **options)
+            error = None
+        except Exception as e:
+            # 1つの画像の失敗でバッチ全体を中断しない
+            output_files = []
+            error = str(e)
+        return {
+            'path': image_path,
+            'output_files': output_files,
+            'error': error,
+            'elapsed': time.perf_counter() - start
+        }
+
+    if file_workers == 1:
+        return [split_one(path, file_prefix) for path, file_prefix in zip(image_paths, prefixes)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=file_workers) as executor:
+        return list(executor.map(split_one, image_paths, prefixes))
 
 
 def get_image_info(image_path: str) -> dict:
@@ -153,6 +2530,18 @@ def get_image_info(image_path: str) -> dict:
     Returns:
         画像情報を含む辞書
     """
+    # タイル化TIFFは画素数の上限を超える場合もあり、.npyはPillowで開けないため、ソースのヘッダーから取得
+    source = _open_source(image_path)
+    if source is not None:
+        with source:
+            return {
+                'path': image_path,
+                'format': source.format,
+                'size': source.size,
+                'mode': source.mode,
+                'info': source.info
+            }
+
     with Image.open(image_path) as img:
         return {
             'path': image_path,
@@ -1,47 +1,319 @@
 #!/usr/bin/env python
 """
 テスト用の画像を生成するスクリプト
+
+同じ引数からは常に同じ画像が生成されるため、ベンチマークの入力としても使用できます。
 """
 
-from PIL import Image, ImageDraw
+from PIL import Image, ImageChops, ImageDraw
+import argparse
+import io
 import os
+import random
+import struct
+import zlib
+
+# ベンチマーク用のサイズのプリセット
+SIZE_PRESETS = {
+    '4k': (4096, 4096),
+    '16k': (16384, 16384),
+    '40k': (40000, 40000),
+}
+
+# 生成できる模様
+PATTERNS = ('grid', 'photo')
+
+# タイル化TIFFの圧縮方式（TIFFの圧縮方式の番号）
+TIFF_COMPRESSIONS = {'none': 1, 'deflate': 8, 'jpeg': 7}
+
+# Deflate圧縮のタイル化TIFFの予測方式（1: なし, 2: 水平差分）
+TIFF_PREDICTORS = (1, 2)
+
+
+def parse_image_size(size_str):
+    """
+    プリセット名（4k, 16k, 40k）または'WIDTHxHEIGHT'形式の文字列をタプルに変換します。
+
+    Args:
+        size_str: サイズ文字列
+
+    Returns:
+        (width, height)のタプル
+    """
+    if size_str.lower() in SIZE_PRESETS:
+        return SIZE_PRESETS[size_str.lower()]
+    width, height = size_str.lower().split('x')
+    return (int(width), int(height))
+
+
+def _noise_texture(size=512, seed=0):
+    """
+    シード値から決まるノイズのテクスチャを生成します。
+
+    Args:
+        size: テクスチャの一辺の長さ
+        seed: 乱数のシード値
+
+    Returns:
+        RGBのテクスチャ画像
+    """
+    rng = random.Random(seed)
+    length = size * size * 3
+    data = rng.getrandbits(8 * length).to_bytes(length, 'little')
+    return Image.frombytes('RGB', (size, size), data)
+
+
+def _draw_photo(img, seed=0):
+    """
+    写真に近い圧縮特性を持つ模様（グラデーション＋ノイズ）を描画します。
+
+    Args:
+        img: 描画先の画像
+        seed: 乱数のシード値
+    """
+    width, height = img.size
+
+    # 色ごとに向きの異なるグラデーションを背景にする
+    gradient = Image.linear_gradient('L')
+    red = gradient.resize((width, height))
+    green = gradient.rotate(90).resize((width, height))
+    blue = gradient.rotate(45).resize((width, height))
+    img.paste(Image.merge('RGB', (red, green, blue)))
+
+    # ノイズを弱く重ねる（テクスチャの位置をずらして繰り返しを目立たなくする）
+    texture = _noise_texture(seed=seed)
+    rng = random.Random(seed)
+    tile = texture.size[0]
+    for y in range(0, height, tile):
+        for x in range(0, width, tile):
+            offset = rng.randrange(tile)
+            shifted = Image.new('RGB', texture.size)
+            shifted.paste(texture.crop((offset, 0, tile, tile)), (0, 0))
+            shifted.paste(texture.crop((0, 0, offset, tile)), (tile - offset, 0))
+            region = (x, y, min(x + tile, width), min(y + tile, height))
+            base = img.crop(region)
+            noise = shifted.crop((0, 0, base.size[0], base.size[1]))
+            img.paste(Image.blend(base, noise, 0.25), region[:2])
+
+
+def _tiff_entry(tag, field_type, values, bigtiff, byteorder):
+    """
+    TIFFのIFDエントリと、エントリに収まらない値のデータを作成します。
+
+    Returns:
+        (エントリのbytes（値の位置は0のまま）, 値のデータ（収まる場合はNone）)のタプル
+    """
+    item_format = {3: 'H', 4: 'I', 7: 'B', 16: 'Q'}[field_type]
+    payload = values if isinstance(values, bytes) else struct.pack(f"{byteorder}{len(values)}{item_format}", *values)
+    count = len(payload) // struct.calcsize(item_format)
+    inline_size = 8 if bigtiff else 4
+    head = struct.pack(f"{byteorder}HH{'Q' if bigtiff else 'I'}", tag, field_type, count)
+    if len(payload) <= inline_size:
+        return head + payload.ljust(inline_size, b'\0'), None
+    return head + b'\0' * inline_size, payload
+
 
-def create_test_image(filename="test_image.png", size=(1000, 800), color="white"):
+def save_tiled_tiff(img, filename, tile_size=(256, 256), compression='deflate', bigtiff=False,
+                    predictor=1, byteorder='<', quality=90):
+    """
+    画像をタイル化TIFFとして保存します。
+
+    Pillowはタイル化TIFFを書き出せないため、タイルのデータとタグを直接書き込みます。
+    画像の端のタイルは格納タイルの大きさまで黒で埋めます。
+
+    Args:
+        img: 保存する画像（L, RGB, RGBA）
+        filename: 出力ファイル名
+        tile_size: 格納タイルの大きさ (幅, 高さ)（16の倍数）
+        compression: 圧縮方式 (none, deflate, jpeg)
+        bigtiff: BigTIFFで保存するかどうか
+        predictor: Deflateの予測方式 (1: なし, 2: 水平差分)。2はdeflateの場合のみ指定できる
+        byteorder: バイト順 ('<': リトルエンディアン, '>': ビッグエンディアン)
+        quality: JPEGの画像品質
+
+    Raises:
+        ValueError: 圧縮方式や予測方式が無効な場合、deflate以外の圧縮方式に水平差分を指定した場合
+    """
+    if compression not in TIFF_COMPRESSIONS:
+        raise ValueError(f"無効な圧縮方式: {compression}。有効な圧縮方式: {', '.join(TIFF_COMPRESSIONS)}")
+    if predictor not in TIFF_PREDICTORS:
+        raise ValueError(f"無効な予測方式: {predictor}。有効な予測方式: {', '.join(map(str, TIFF_PREDICTORS))}")
+    if predictor != 1 and compression != 'deflate':
+        # 予測方式のタグはdeflateの場合だけ書き込むため、他の圧縮方式では読み込めないファイルになる
+        raise ValueError(f"予測方式（水平差分）はdeflate圧縮の場合のみ指定できます: {compression}")
+    width, height = img.size
+    tile_width, tile_height = tile_size
+    samples = len(img.getbands())
+
+    tiles = []
+    for top in range(0, height, tile_height):
+        for left in range(0, width, tile_width):
+            tile = Image.new(img.mode, tile_size)
+            tile.paste(img.crop((left, top, min(left + tile_width, width), min(top + tile_height, height))))
+            if compression == 'jpeg':
+                buffer = io.BytesIO()
+                tile.save(buffer, 'JPEG', quality=quality)
+                tiles.append(buffer.getvalue())
+                continue
+            if predictor == 2:
+                # 左隣の画素との差分（左端は0との差分）
+                shifted = Image.new(img.mode, tile_size)
+                shifted.paste(tile.crop((0, 0, tile_width - 1, tile_height)), (1, 0))
+                tile = ImageChops.subtract_modulo(tile, shifted)
+            data = tile.tobytes()
+            tiles.append(zlib.compress(data) if compression == 'deflate' else data)
+
+    # 光度解釈（JPEGのカラー画像はYCbCr）
+    if img.mode == 'L':
+        photometric = 1
+    else:
+        photometric = 6 if compression == 'jpeg' else 2
+
+    header_size = 16 if bigtiff else 8
+    offsets = []
+    position = header_size
+    for data in tiles:
+        offsets.append(position)
+        position += len(data)
+
+    offset_type = 16 if bigtiff else 4
+    entries = [
+        (256, 4, (width,)), (257, 4, (height,)), (258, 3, (8,) * samples),
+        (259, 3, (TIFF_COMPRESSIONS[compression],)), (262, 3, (photometric,)), (277, 3, (samples,)),
+        (284, 3, (1,)), (322, 4, (tile_width,)), (323, 4, (tile_height,)),
+        (324, offset_type, offsets), (325, offset_type, [len(data) for data in tiles]),
+    ]
+    if predictor != 1:
+        entries.append((317, 3, (predictor,)))
+    if img.mode == 'RGBA':
+        entries.append((338, 3, (2,)))
+    if photometric == 6:
+        entries.append((530, 3, (2, 2)))
+    entries.sort()
+
+    # 値のデータをタイルのデータの後ろに置き、IFDを最後に書き込む
+    entry_data = []
+    extra = bytearray()
+    for tag, field_type, values in entries:
+        entry, payload = _tiff_entry(tag, field_type, values, bigtiff, byteorder)
+        if payload is not None:
+            value_position = position + len(extra)
+            value_format = 'Q' if bigtiff else 'I'
+            entry = entry[:-struct.calcsize(value_format)] + struct.pack(byteorder + value_format, value_position)
+            extra += payload + b'\0' * (len(payload) % 2)
+        entry_data.append(entry)
+    ifd_offset = position + len(extra)
+
+    with open(filename, 'wb') as f:
+        mark = b'II' if byteorder == '<' else b'MM'
+        if bigtiff:
+            f.write(mark + struct.pack(byteorder + 'HHHQ', 43, 8, 0, ifd_offset))
+        else:
+            f.write(mark + struct.pack(byteorder + 'HI', 42, ifd_offset))
+        for data in tiles:
+            f.write(data)
+        f.write(extra)
+        f.write(struct.pack(byteorder + ('Q' if bigtiff else 'H'), len(entry_data)))
+        f.write(b''.join(entry_data))
+        f.write(struct.pack(byteorder + ('Q' if bigtiff else 'I'), 0))
+
+
+def save_npy(img, filename):
+    """
+    画像をNumPyの.npyファイル（uint8、形状は(高さ, 幅)または(高さ, 幅, チャンネル数)）として保存します。
+
+    NumPyを使用せずにヘッダーと画素データを直接書き込みます。
+
+    Args:
+        img: 保存する画像（L, LA, RGB, RGBA）
+        filename: 出力ファイル名
+    """
+    width, height = img.size
+    channels = len(img.getbands())
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    header = f"{{'descr': '|u1', 'fortran_order': False, 'shape': {shape}, }}"
+    # ヘッダーの末尾を改行とし、画素データの開始位置を64バイト境界に揃える
+    header += " " * (-(10 + len(header) + 1) % 64) + "\n"
+    with open(filename, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        f.write(img.tobytes())
+
+
+def create_test_image(filename="test_image.png", size=(1000, 800), color="white", pattern="grid", seed=0,
+                      tile_size=None, compression="deflate", predictor=1):
     """
     テスト用の画像を生成します。
-    
+
     Args:
         filename: 出力ファイル名
         size: 画像サイズ (幅, 高さ)
         color: 背景色
+        pattern: 模様 (grid: グリッドと図形, photo: グラデーションとノイズ)
+        seed: 乱数のシード値（photoの場合）
+        tile_size: 指定した場合は、この大きさの格納タイルを持つタイル化TIFFとして保存
+        compression: タイル化TIFFの圧縮方式 (none, deflate, jpeg)
+        predictor: タイル化TIFFの予測方式 (1: なし, 2: 水平差分)。2はdeflateの場合のみ指定できる
     """
+    if pattern not in PATTERNS:
+        raise ValueError(f"無効な模様: {pattern}。有効な模様: {', '.join(PATTERNS)}")
+
     # 画像を作成
     img = Image.new('RGB', size, color)
+    if pattern == 'photo':
+        _draw_photo(img, seed)
     draw = ImageDraw.Draw(img)
-    
+
     # グリッドを描画
     grid_size = 100
     for x in range(0, size[0], grid_size):
         draw.line([(x, 0), (x, size[1])], fill="lightgray", width=1)
     for y in range(0, size[1], grid_size):
         draw.line([(0, y), (size[0], y)], fill="lightgray", width=1)
-    
+
     # 中央に十字を描画
     center_x, center_y = size[0] // 2, size[1] // 2
     draw.line([(center_x, 0), (center_x, size[1])], fill="red", width=2)
     draw.line([(0, center_y), (size[0], center_y)], fill="red", width=2)
-    
+
     # 四隅に円を描画
     radius = 50
     draw.ellipse([(0, 0), (radius*2, radius*2)], outline="blue", width=2)
     draw.ellipse([(size[0]-radius*2, 0), (size[0], radius*2)], outline="blue", width=2)
     draw.ellipse([(0, size[1]-radius*2), (radius*2, size[1])], outline="blue", width=2)
     draw.ellipse([(size[0]-radius*2, size[1]-radius*2), (size[0], size[1])], outline="blue", width=2)
-    
+
     # 画像を保存
-    img.save(filename)
+    if tile_size is not None:
+        save_tiled_tiff(img, filename, tile_size, compression=compression, predictor=predictor)
+    elif filename.lower().endswith(".npy"):
+        save_npy(img, filename)
+    else:
+        img.save(filename)
     print(f"テスト画像を作成しました: {os.path.abspath(filename)}")
     print(f"サイズ: {size[0]}x{size[1]}ピクセル")
 
+
+def main():
+    """コマンドライン引数を解析し、テスト用の画像を生成します。"""
+    parser = argparse.ArgumentParser(description="テスト用の画像を生成します")
+    parser.add_argument("filename", nargs="?", default="test_image.png", help="出力ファイル名（.npyの場合はNumPyの配列）")
+    parser.add_argument("-s", "--size", default="1000x800", help="サイズ（4k, 16k, 40k または WIDTHxHEIGHT）")
+    parser.add_argument("--pattern", default="grid", choices=PATTERNS, help="模様")
+    parser.add_argument("--seed", default=0, type=int, help="乱数のシード値")
+    parser.add_argument("--tiled", metavar="WIDTHxHEIGHT", help="指定した大きさの格納タイルを持つタイル化TIFFとして保存")
+    parser.add_argument("--compression", default="deflate", choices=list(TIFF_COMPRESSIONS),
+                        help="タイル化TIFFの圧縮方式")
+    parser.add_argument("--predictor", default=1, type=int, choices=TIFF_PREDICTORS,
+                        help="タイル化TIFFの予測方式（1: なし, 2: 水平差分。deflateのみ）")
+    args = parser.parse_args()
+
+    try:
+        create_test_image(args.filename, parse_image_size(args.size), pattern=args.pattern, seed=args.seed,
+                          tile_size=parse_image_size(args.tiled) if args.tiled else None,
+                          compression=args.compression, predictor=args.predictor)
+    except ValueError as e:
+        parser.error(str(e))
+
+
 if __name__ == "__main__":
-    create_test_image()
\ No newline at end of file
+    main()
@@ -0,0 +1,342 @@
+"""
+ChopImg - タイルエンコーダモジュール
+
+デコード済みの画像（またはバンド）から、クロップせずに指定範囲を直接エンコードする
+高速なエンコーダを提供します。
+
+Image.saveはタイルごとにプラグインの検索、保存オプションの解釈、ヘッダーの組み立てを
+行うため、小さなタイルではエンコード本体と同程度の時間がかかります。ここでは
+それらを1回の分割処理につき1回だけ行い、タイルごとにはPillowのエンコーダに
+元画像の範囲を渡してエンコードするだけにします。
+"""
+
+import io
+import struct
+import time
+import zlib
+from typing import List, Optional, Tuple
+from PIL import Image, ImageFile, JpegImagePlugin, PngImagePlugin
+
+
+# PNGファイルのシグネチャ
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 高速エンコーダの出力を検証する範囲の一辺の長さ
+CHECK_SIZE = 8
+
+# PNGの行フィルタ
+#   adaptive: 行ごとに最も圧縮しやすいフィルタを選ぶ（Pillowの既定）
+#   none: フィルタを使用しない（フィルタの計算を省くため速いが、写真などは大きくなる）
+PNG_FILTERS = ('adaptive', 'none')
+
+# PNGの自動設定で比較する候補 (保存オプション, 行フィルタ)
+PNG_AUTO_CANDIDATES = (
+    ({'optimize': True}, 'adaptive'),
+    ({'compress_level': 6}, 'adaptive'),
+    ({'compress_level': 1}, 'adaptive'),
+    ({'compress_level': 1}, 'none'),
+)
+
+# PNGの自動設定でエンコードするタイルの数（縦横それぞれ）
+PNG_AUTO_SAMPLES = 3
+
+# PNGの自動設定で許容するサイズの増加率（最小サイズに対する比）
+PNG_AUTO_SIZE_TOLERANCE = 1.1
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """PNGのチャンクを組み立てます。"""
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _read_png_chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+    """PNGファイルを(チャンク種別, データ)のリストに分解します。"""
+    chunks = []
+    position = len(PNG_SIGNATURE)
+    while position < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        chunks.append((chunk_type, data[position + 8:position + 8 + length]))
+        position += length + 12
+    return chunks
+
+
+def _box_size(box: Tuple[int, int, int, int]) -> Tuple[int, int]:
+    """範囲 (左, 上, 右, 下) の幅と高さを返します。"""
+    return box[2] - box[0], box[3] - box[1]
+
+
+class _PngTileEncoder:
+    """
+    PNGのタイルを直接エンコードするクラス
+
+    IHDR以外のヘッダーチャンクは全タイルで共通のため、見本のタイルを
+    Image.saveで保存した結果から取り出して再利用します。
+
+    行フィルタにnoneを指定した場合は、Pillowのzipエンコーダ（常にadaptive）の
+    代わりに、生の画素データへフィルタ種別0を付けてzlibで圧縮します。
+    """
+
+    def __init__(self, source: Image.Image, save_options: dict, sample: bytes, png_filter: str = 'adaptive'):
+        chunks = _read_png_chunks(sample)
+        chunk_types = [chunk_type for chunk_type, _ in chunks]
+        if chunk_types[0] != b"IHDR" or b"IDAT" not in chunk_types:
+            raise ValueError("PNGのチャンク構成が想定と異なります")
+
+        # IHDRのうちサイズ以外（ビット深度、カラータイプなど）を再利用
+        ihdr = chunks[0][1]
+        bit_depth, color_type, interlace = ihdr[8:9], ihdr[9:10], ihdr[12]
+        if interlace:
+            raise ValueError("インターレースPNGには対応していません")
+        self._ihdr_tail = ihdr[8:]
+
+        first_idat = chunk_types.index(b"IDAT")
+        last_idat = len(chunk_types) - 1 - chunk_types[::-1].index(b"IDAT")
+        self._header = b"".join(_png_chunk(chunk_type, data) for chunk_type, data in chunks[1:first_idat])
+        self._trailer = b"".join(_png_chunk(chunk_type, data) for chunk_type, data in chunks[last_idat + 1:])
+
+        # ビット深度とカラータイプに対応する生データのモードを決定
+        rawmodes = [
+            rawmode for outmode, (rawmode, depth, colortype) in PngImagePlugin._OUTMODES.items()
+            if (outmode == source.mode or outmode.startswith(source.mode + ";")) and (depth, colortype) == (bit_depth, color_type)
+        ]
+        if not rawmodes:
+            raise ValueError(f"PNGの生データのモードを決定できません: {source.mode}")
+        self._mode = source.mode
+        self._rawmode = rawmodes[0]
+
+        # Image.saveと同じ圧縮設定
+        self._encoderconfig = (
+            save_options.get("optimize", False),
+            save_options.get("compress_level", -1),
+            save_options.get("compress_type", -1),
+            save_options.get("dictionary", b""),
+        )
+        self._filter = png_filter
+        # optimizeはPillowと同様に圧縮レベル9として扱う
+        self._level = 9 if self._encoderconfig[0] else self._encoderconfig[1]
+        self._strategy = max(self._encoderconfig[2], zlib.Z_DEFAULT_STRATEGY)
+
+    def encode(self, source: Image.Image, box: Tuple[int, int, int, int]) -> bytes:
+        """
+        元画像の指定範囲をPNGにエンコードします。
+
+        Args:
+            source: デコード済みの元画像
+            box: エンコードする範囲 (左, 上, 右, 下)
+
+        Returns:
+            エンコードされたバイト列
+        """
+        width, height = _box_size(box)
+        parts = [
+            PNG_SIGNATURE,
+            _png_chunk(b"IHDR", struct.pack(">II", width, height) + self._ihdr_tail),
+            self._header
+        ]
+
+        if self._filter == 'none':
+            parts.append(_png_chunk(b"IDAT", self._compress_unfiltered(source, box)))
+        else:
+            # ImageFile._saveと同じバッファサイズで、出力ブロックごとにIDATチャンクを作成
+            parts.extend(_png_chunk(b"IDAT", data) for data in self._run_encoder("zip", self._encoderconfig, source, box))
+
+        parts.append(self._trailer)
+        return b"".join(parts)
+
+    def _run_encoder(self, name: str, config: tuple, source: Image.Image, box: Tuple[int, int, int, int]) -> List[bytes]:
+        """Pillowのエンコーダで元画像の範囲をエンコードし、出力ブロックのリストを返します。"""
+        bufsize = max(ImageFile.MAXBLOCK, _box_size(box)[0] * 4)
+        blocks = []
+        encoder = Image._getencoder(self._mode, name, self._rawmode, config)
+        try:
+            encoder.setimage(source.im, box)
+            while True:
+                _, errcode, data = encoder.encode(bufsize)
+                blocks.append(data)
+                if errcode:
+                    break
+        finally:
+            encoder.cleanup()
+        if errcode < 0:
+            raise OSError(f"PNGのエンコードに失敗しました (エラーコード {errcode})")
+        return blocks
+
+    def _compress_unfiltered(self, source: Image.Image, box: Tuple[int, int, int, int]) -> bytes:
+        """元画像の範囲を行フィルタなしでzlib圧縮します。"""
+        raw = b"".join(self._run_encoder("raw", (), source, box))
+        height = _box_size(box)[1]
+        stride = len(raw) // height
+
+        # 各行の先頭にフィルタ種別0（なし）を付ける
+        filtered = bytearray(len(raw) + height)
+        for y in range(height):
+            start = y * (stride + 1) + 1
+            filtered[start:start + stride] = raw[y * stride:(y + 1) * stride]
+
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, zlib.MAX_WBITS, 9, self._strategy)
+        return compressor.compress(filtered) + compressor.flush()
+
+
+class _JpegTileEncoder:
+    """
+    JPEGのタイルを直接エンコードするクラス
+
+    JPEGのエンコーダ設定はタイルのサイズに依存しないため、見本のタイルを
+    保存したときにPillowが組み立てた設定を再利用します。
+    """
+
+    def __init__(self, source: Image.Image, sample_tile: Image.Image):
+        if not isinstance(getattr(sample_tile, "encoderconfig", None), tuple) or not sample_tile.encoderconfig:
+            raise ValueError("JPEGのエンコーダ設定を取得できません")
+        self._mode = source.mode
+        self._rawmode = JpegImagePlugin.RAWMODE[source.mode]
+        self._encoderconfig = sample_tile.encoderconfig
+        # ヘッダー（EXIF、ICCプロファイルなど）が1ブロックに収まるバッファサイズ
+        self._extra_size = sum(len(value) for value in self._encoderconfig if isinstance(value, bytes)) + 5
+
+    def encode(self, source: Image.Image, box: Tuple[int, int, int, int]) -> bytes:
+        """
+        元画像の指定範囲をJPEGにエンコードします。
+
+        Args:
+            source: デコード済みの元画像
+            box: エンコードする範囲 (左, 上, 右, 下)
+
+        Returns:
+            エンコードされたバイト列
+        """
+        width, height = _box_size(box)
+        # 最適化ハフマン符号では画像全体を1ブロックで出力できる大きさが必要
+        bufsize = max(ImageFile.MAXBLOCK, width * height * 4 + self._extra_size, width * 4)
+
+        parts = []
+        encoder = Image._getencoder(self._mode, "jpeg", self._rawmode, self._encoderconfig)
+        try:
+            encoder.setimage(source.im, box)
+            while True:
+                _, errcode, data = encoder.encode(bufsize)
+                parts.append(data)
+                if errcode:
+                    break
+        finally:
+            encoder.cleanup()
+        if errcode < 0:
+            raise OSError(f"JPEGのエンコードに失敗しました (エラーコード {errcode})")
+
+        return b"".join(parts)
+
+
+def _save_sample(tile: Image.Image, save_format: str, save_options: dict) -> bytes:
+    """見本のタイルをImage.saveで保存し、バイト列を返します。"""
+    buffer = io.BytesIO()
+    tile.save(buffer, format=save_format, **save_options)
+    return buffer.getvalue()
+
+
+def _decoded_pixels(data: bytes) -> Tuple[str, bytes]:
+    """エンコードされた画像をデコードし、(モード, 画素データ)を返します。"""
+    with Image.open(io.BytesIO(data)) as img:
+        return img.mode, img.tobytes()
+
+
+def open_tile_encoder(source: Image.Image, save_format: str, save_options: dict, png_filter: str = 'adaptive'):
+    """
+    元画像の範囲を直接エンコードする高速エンコーダを作成します。
+
+    作成時に元画像の一部をImage.saveと高速エンコーダの両方でエンコードし、
+    結果がバイト単位で一致した場合だけ高速エンコーダを返します。
+    PNGの行フィルタにnoneを指定した場合は出力がImage.saveと異なるため、
+    デコードした画素が元画像と一致することを確認します。
+
+    Args:
+        source: デコード済みの元画像（またはストリーミング時のバンド）
+        save_format: Pillowに渡すフォーマット名 (PNG, JPEG など)
+        save_options: 保存オプション
+        png_filter: PNGの行フィルタ (adaptive, none)
+
+    Returns:
+        encode(source, box)を持つエンコーダ。対応していない場合はNone
+    """
+    if not isinstance(source, Image.Image) or save_format not in ("PNG", "JPEG"):
+        return None
+
+    try:
+        width, height = source.size
+        check_width, check_height = min(width, CHECK_SIZE), min(height, CHECK_SIZE)
+        # 原点の範囲と、原点からずらした範囲で検証
+        check_boxes = [
+            (0, 0, check_width, check_height),
+            (width - check_width, height - check_height, width, height),
+        ]
+        samples = [source.crop(box) for box in check_boxes]
+        expected = [_save_sample(sample, save_format, save_options) for sample in samples]
+
+        if save_format == "PNG":
+            encoder = _PngTileEncoder(source, save_options, expected[0], png_filter)
+        else:
+            encoder = _JpegTileEncoder(source, samples[0])
+
+        encoded = [encoder.encode(source, box) for box in check_boxes]
+        if save_format == "PNG" and png_filter == 'none':
+            if [_decoded_pixels(data) for data in encoded] != [(sample.mode, sample.tobytes()) for sample in samples]:
+                return None
+        elif encoded != expected:
+            return None
+        return encoder
+    except Exception:
+        # 高速エンコーダを使用できない場合は通常のImage.saveで保存する
+        return None
+
+
+def _sample_boxes(image_size: Tuple[int, int], tile_size: Tuple[int, int], count: int) -> List[Tuple[int, int, int, int]]:
+    """画像全体に散らばるように、タイルの大きさの範囲を縦横count個ずつ選びます。"""
+    width, height = image_size
+    tile_width, tile_height = min(tile_size[0], width), min(tile_size[1], height)
+    boxes = []
+    for i in range(count):
+        upper = (height - tile_height) * i // max(count - 1, 1)
+        for j in range(count):
+            left = (width - tile_width) * j // max(count - 1, 1)
+            box = (left, upper, left + tile_width, upper + tile_height)
+            if box not in boxes:
+                boxes.append(box)
+    return boxes
+
+
+def choose_png_options(source: Image.Image, tile_size: Tuple[int, int],
+                       candidates=PNG_AUTO_CANDIDATES) -> Tuple[dict, str]:
+    """
+    元画像から数個のタイルを候補の設定でエンコードし、PNGの設定を選びます。
+
+    最も小さくなった設定のサイズのPNG_AUTO_SIZE_TOLERANCE倍以内に収まる
+    設定のうち、エンコードが最も速いものを選びます。
+
+    Args:
+        source: デコード済みの元画像（またはストリーミング時のバンド）
+        tile_size: タイルの大きさ (幅, 高さ)
+        candidates: 比較する(保存オプション, 行フィルタ)のリスト
+
+    Returns:
+        (保存オプション, 行フィルタ)のタプル
+    """
+    boxes = _sample_boxes(source.size, tile_size, PNG_AUTO_SAMPLES)
+    results = []
+    for save_options, png_filter in candidates:
+        encoder = open_tile_encoder(source, "PNG", save_options, png_filter)
+        if encoder is None and png_filter != 'adaptive':
+            # 高速エンコーダを使用できない場合、Image.saveで指定できない行フィルタは比較しない
+            continue
+
+        start = time.perf_counter()
+        if encoder is not None:
+            nbytes = sum(len(encoder.encode(source, box)) for box in boxes)
+        else:
+            nbytes = sum(len(_save_sample(source.crop(box), "PNG", save_options)) for box in boxes)
+        results.append((nbytes, time.perf_counter() - start, dict(save_options), png_filter))
+
+    smallest = min(nbytes for nbytes, _, _, _ in results)
+    _, _, save_options, png_filter = min(
+        (result for result in results if result[0] <= smallest * PNG_AUTO_SIZE_TOLERANCE),
+        key=lambda result: result[1]
+    )
+    return save_options, png_filter
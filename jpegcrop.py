@@ -0,0 +1,499 @@
+"""
+ChopImg - JPEGの無劣化切り出しモジュール
+
+JPEG画像から、画素へのデコードと再エンコードを行わずにDCT係数のまま
+タイルを切り出す機能を提供します（jpegtran -crop と同様）。
+
+エントロピー符号化されたデータを1回だけ走査してMCU（最小符号化単位）の
+位置を記録し、タイルごとにはMCU行の範囲のビット列をそのままコピーします。
+DC係数は直前のブロックとの差分で符号化されているため、タイルの各MCU行の
+先頭のブロックだけ差分を符号化し直します。
+
+対応するのはハフマン符号化のシーケンシャルJPEG（ベースライン・拡張、8ビット、
+1スキャン）で、プログレッシブJPEGなどには対応していません。
+
+再エンコードによる画質の劣化を避けるための機能です。走査はPythonで行い、走査中はGILを
+保持するため、PillowでデコードしてエンコードするよりJPEG全体の処理時間は長くなります。
+"""
+
+import array
+import functools
+import re
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# 対応するSOFマーカー（ハフマン符号化のベースライン・拡張シーケンシャル）
+SOF_MARKERS = (0xC0, 0xC1)
+
+# フレームの種類を表すSOFマーカー（対応していないものを含む）
+ALL_SOF_MARKERS = tuple(marker for marker in range(0xC0, 0xD0) if marker not in (0xC4, 0xC8, 0xCC))
+
+# タイルにコピーしないマーカー
+#   APP1: Exif・XMP（元画像のサイズやサムネイルを含むため）
+#   DRI: リスタート間隔（タイルはリスタートマーカーなしで書き出すため）
+SKIPPED_MARKERS = (0xE1, 0xDD)
+
+# エントロピー符号化データの終端（スタッフィングとリスタートマーカー以外のマーカー）
+SCAN_END = re.compile(b"\xff(?![\x00\xd0-\xd7])")
+
+# リスタートマーカー
+RESTART_MARKER = re.compile(b"\xff[\xd0-\xd7]")
+
+
+class _HuffmanTable:
+    """
+    ハフマン符号表
+
+    復号用に16ビットの先頭部分から引く表を作成します。DC係数の表の値は
+    (符号長 | 差分のビット数 << 8)、AC係数の表の値は
+    (符号長と係数のビット数の合計 | 進める係数の数 << 8) です（0は無効な符号）。
+
+    AC係数の表には、16ビットに収まる連続した符号をまとめて読み飛ばすための表
+    （読み飛ばすビット数 | EOB以外で進める係数の数 << 5 | EOBで終わるかどうか << 12）も作成します。
+    """
+
+    def __init__(self, counts: bytes, symbols: bytes, is_ac: bool):
+        self.codes: Dict[int, Tuple[int, int]] = {}
+        self.lookup = [0] * 65536
+
+        code = 0
+        index = 0
+        for length in range(1, 17):
+            for _ in range(counts[length - 1]):
+                symbol = symbols[index]
+                index += 1
+                self.codes[symbol] = (code, length)
+                if is_ac:
+                    run, size = symbol >> 4, symbol & 15
+                    # EOB（残りがすべて0）は64係数分、ZRLは16係数分進める
+                    step = 64 if symbol == 0x00 else 16 if symbol == 0xF0 else run + 1
+                    value = (length + size) | step << 8
+                else:
+                    value = length | symbol << 8
+                shift = 16 - length
+                start = code << shift
+                self.lookup[start:start + (1 << shift)] = [value] * (1 << shift)
+                code += 1
+            code <<= 1
+
+        self.multi_lookup = self._build_multi_lookup() if is_ac else None
+
+    def _build_multi_lookup(self) -> List[int]:
+        lookup = self.lookup
+        multi_lookup = [0] * 65536
+        for window in range(65536):
+            consumed = steps = eob = 0
+            while consumed < 16:
+                value = lookup[(window << consumed) & 0xFFFF]
+                # 符号と係数のビットが16ビットに収まらない場合はここまで
+                if not value or consumed + (value & 0xFF) > 16:
+                    break
+                consumed += value & 0xFF
+                if value >> 8 == 64:
+                    eob = 1
+                    break
+                steps += value >> 8
+            multi_lookup[window] = consumed | steps << 5 | eob << 12
+        return multi_lookup
+
+
+@functools.lru_cache(maxsize=16)
+def _huffman_table(counts: bytes, symbols: bytes, is_ac: bool) -> _HuffmanTable:
+    """ハフマン符号表を作成します（多くのJPEGは標準の符号表を使用するため再利用します）。"""
+    return _HuffmanTable(counts, symbols, is_ac)
+
+
+def _byte_windows(data: bytes) -> List[array.array]:
+    """
+    各バイト位置から始まる32ビットのビッグエンディアンの値を、位置を4で割った余りごとの配列で返します。
+
+    位置iの値は windows[i % 4][i // 4] です。
+    """
+    windows = []
+    for offset in range(4):
+        words = array.array("I")
+        words.frombytes(data[offset:offset + (len(data) - offset) // 4 * 4])
+        if sys.byteorder == "little":
+            words.byteswap()
+        windows.append(words)
+    return windows
+
+
+class _BitWriter:
+    """エントロピー符号化データを組み立てるクラス"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._value = 0
+        self._bits = 0
+
+    def write(self, value: int, bits: int) -> None:
+        """下位bitsビットの値を書き込みます。"""
+        value |= self._value << bits
+        bits += self._bits
+        remaining = bits & 7
+        if bits >= 8:
+            self._parts.append((value >> remaining).to_bytes(bits >> 3, "big"))
+            value &= (1 << remaining) - 1
+        self._value = value
+        self._bits = remaining
+
+    def copy(self, data: bytes, start: int, end: int) -> None:
+        """dataの[start, end)ビット目をそのまま書き込みます。"""
+        if end <= start:
+            return
+        last = (end + 7) >> 3
+        value = int.from_bytes(data[start >> 3:last], "big") >> (last * 8 - end)
+        self.write(value & ((1 << (end - start)) - 1), end - start)
+
+    def getvalue(self) -> bytes:
+        """残りのビットを1で埋め、0xFFの後に0x00を挿入したデータを返します。"""
+        if self._bits:
+            self.write((1 << (8 - self._bits)) - 1, 8 - self._bits)
+        return b"".join(self._parts).replace(b"\xff", b"\xff\x00")
+
+
+def _read_segments(data: bytes) -> Tuple[List[Tuple[int, bytes]], int]:
+    """
+    JPEGのSOIからSOSまでのマーカーセグメントを読み込みます。
+
+    Returns:
+        ((マーカー, データ)のリスト, エントロピー符号化データの開始位置)のタプル
+
+    Raises:
+        ValueError: JPEGの構造が不正な場合
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("JPEGファイルではありません")
+
+    segments = []
+    position = 2
+    while True:
+        while data[position + 1] == 0xFF:  # フィルバイト
+            position += 1
+        if data[position] != 0xFF:
+            raise ValueError("JPEGのマーカーが見つかりません")
+        marker = data[position + 1]
+        length, = struct.unpack(">H", data[position + 2:position + 4])
+        segments.append((marker, data[position + 4:position + 2 + length]))
+        position += 2 + length
+        if marker == 0xDA:
+            return segments, position
+
+
+class JpegCropper:
+    """
+    JPEG画像からDCT係数のままタイルを切り出すクラス
+
+    作成時に、切り出すタイルの範囲から必要なMCUの位置とDC係数を記録します。
+    MCUの境界に揃っていない範囲は切り出せないため、can_cropで確認してから
+    cropを呼び出します。cropは複数のスレッドから同時に呼び出せます。
+
+    画質の劣化を避けるためのクラスで、走査はPythonで行うため再エンコードより遅くなります。
+    """
+
+    def __init__(self, data: bytes, boxes: Iterable[Tuple[int, int, int, int]]):
+        """
+        Args:
+            data: JPEGファイルの内容
+            boxes: 切り出すタイルの範囲 (左, 上, 右, 下) のリスト
+
+        Raises:
+            ValueError: 対応していないJPEGの場合
+        """
+        segments, scan_start = _read_segments(data)
+        self._header: List[Tuple[int, bytes]] = []
+        dc_tables: Dict[int, _HuffmanTable] = {}
+        ac_tables: Dict[int, _HuffmanTable] = {}
+        frame = None
+        restart_interval = 0
+
+        for marker, payload in segments:
+            if marker in ALL_SOF_MARKERS:
+                if marker not in SOF_MARKERS or payload[0] != 8:
+                    raise ValueError("ハフマン符号化の8ビットのシーケンシャルJPEGのみ対応しています")
+                frame = payload
+            elif marker == 0xC4:
+                position = 0
+                while position < len(payload):
+                    table_class, table_id = payload[position] >> 4, payload[position] & 15
+                    counts = payload[position + 1:position + 17]
+                    symbols = payload[position + 17:position + 17 + sum(counts)]
+                    tables = ac_tables if table_class else dc_tables
+                    tables[table_id] = _huffman_table(bytes(counts), bytes(symbols), bool(table_class))
+                    position += 17 + sum(counts)
+            elif marker == 0xDD:
+                restart_interval, = struct.unpack(">H", payload[:2])
+            if marker not in SKIPPED_MARKERS:
+                self._header.append((marker, payload))
+
+        if frame is None:
+            raise ValueError("JPEGのフレームヘッダーが見つかりません")
+
+        # フレームの成分 (ID, 水平サンプリング係数, 垂直サンプリング係数)
+        self.height, self.width = struct.unpack(">HH", frame[1:5])
+        frame_components = {}
+        for index in range(frame[5]):
+            component_id, sampling = frame[6 + index * 3], frame[7 + index * 3]
+            frame_components[component_id] = (sampling >> 4, sampling & 15)
+
+        # スキャンの成分 (ブロック数, DC係数の表, AC係数の表)
+        scan = segments[-1][1]
+        if scan[0] != len(frame_components) or scan[-3:] != b"\x00\x3f\x00":
+            raise ValueError("すべての成分を含む1スキャンのJPEGのみ対応しています")
+        components = []
+        for index in range(scan[0]):
+            component_id, tables = scan[1 + index * 2], scan[2 + index * 2]
+            horizontal, vertical = frame_components[component_id]
+            blocks = horizontal * vertical if scan[0] > 1 else 1
+            components.append((blocks, dc_tables[tables >> 4], ac_tables[tables & 15]))
+        self._components = components
+
+        # MCUの大きさとMCUの列数・行数
+        if len(components) > 1:
+            max_horizontal = max(sampling[0] for sampling in frame_components.values())
+            max_vertical = max(sampling[1] for sampling in frame_components.values())
+            self.mcu_size = (8 * max_horizontal, 8 * max_vertical)
+        else:
+            self.mcu_size = (8, 8)
+        self._mcu_cols = (self.width + self.mcu_size[0] - 1) // self.mcu_size[0]
+        self._mcu_rows = (self.height + self.mcu_size[1] - 1) // self.mcu_size[1]
+        self._restart_interval = restart_interval
+
+        # エントロピー符号化データからスタッフィングとリスタートマーカーを除去
+        scan_end = SCAN_END.search(data, scan_start)
+        if scan_end is None:
+            raise ValueError("JPEGのエントロピー符号化データの終端が見つかりません")
+        intervals = RESTART_MARKER.split(data[scan_start:scan_end.start()])
+        self._restart_starts = []
+        unstuffed = []
+        offset = 0
+        for interval in intervals:
+            self._restart_starts.append(offset * 8)
+            interval = interval.replace(b"\xff\x00", b"\xff")
+            unstuffed.append(interval)
+            offset += len(interval)
+        # 復号時に末尾を超えて読み込めるよう0で埋める
+        self._data = b"".join(unstuffed) + bytes(8)
+
+        # 切り出せる範囲と、そのために位置を記録するMCUの列、範囲が含むMCUの行
+        self._boxes = set()
+        columns = set()
+        rows = set()
+        for box in boxes:
+            if self._is_aligned(box):
+                self._boxes.add(tuple(box))
+                first, end = self._mcu_range(box[0], box[2], self.mcu_size[0])
+                columns.update((first, end - 1))
+                rows.update(range(*self._mcu_range(box[1], box[3], self.mcu_size[1])))
+        self._mcus = self._scan(columns, rows)
+        self._checked: Dict[Tuple[int, int, int, int], bool] = {}
+
+    def _is_aligned(self, box: Tuple[int, int, int, int]) -> bool:
+        """範囲がMCUの境界（右端と下端は画像の端も可）に揃っているかどうかを判定します。"""
+        left, upper, right, lower = box
+        mcu_width, mcu_height = self.mcu_size
+        return (left % mcu_width == 0 and upper % mcu_height == 0
+                and (right % mcu_width == 0 or right == self.width)
+                and (lower % mcu_height == 0 or lower == self.height)
+                and 0 <= left < right <= self.width and 0 <= upper < lower <= self.height)
+
+    @staticmethod
+    def _mcu_range(start: int, end: int, size: int) -> Tuple[int, int]:
+        """画素の範囲[start, end)に含まれるMCUの範囲[最初, 最後+1)を返します。"""
+        return start // size, (end + size - 1) // size
+
+    def _scan(self, columns: set, rows: set) -> Dict[int, tuple]:
+        """
+        エントロピー符号化データを走査し、指定した列とリスタート区間の端のMCUを記録します。
+
+        走査は指定した行の最後のMCUで終了します。リスタート間隔がある場合は、
+        指定した行を含まないリスタート区間を復号せずに読み飛ばします。
+
+        Returns:
+            MCUの番号から (開始ビット位置, 終了ビット位置, 成分ごとの
+            (先頭ブロックの開始位置, 先頭ブロックのDC係数の終了位置, 先頭ブロックのDC係数, 最後のブロックのDC係数)) への辞書
+
+        Raises:
+            ValueError: ハフマン符号を復号できない場合
+        """
+        data = self._data
+        windows = _byte_windows(data)
+        components = [(blocks, dc.lookup, ac.lookup, ac.multi_lookup) for blocks, dc, ac in self._components]
+        restart_interval = self._restart_interval
+        mcu_cols = self._mcu_cols
+        mcus = {}
+        predictions = [0] * len(components)
+        position = 0
+        end = (max(rows) + 1) * mcu_cols if rows else 0
+
+        mcu = -1
+        while mcu + 1 < end:
+            mcu += 1
+            restart = restart_interval and mcu % restart_interval
+            if restart_interval and restart == 0:
+                last_row = (min(mcu + restart_interval, end) - 1) // mcu_cols
+                if rows.isdisjoint(range(mcu // mcu_cols, last_row + 1)):
+                    mcu += restart_interval - 1
+                    continue
+                # リスタート区間の先頭はバイト境界から始まり、DC係数の予測値は0に戻る
+                position = self._restart_starts[mcu // restart_interval]
+                predictions = [0] * len(components)
+            record = mcu % mcu_cols in columns or (restart_interval and restart in (0, restart_interval - 1))
+
+            start = position
+            records = []
+            for index, (blocks, dc_lookup, ac_lookup, multi_lookup) in enumerate(components):
+                for block in range(blocks):
+                    block_start = position
+                    # DC係数（直前のブロックとの差分）
+                    byte = position >> 3
+                    window = int.from_bytes(data[byte:byte + 5], "big")
+                    shift = position & 7
+                    value = dc_lookup[(window >> (24 - shift)) & 0xFFFF]
+                    if not value:
+                        raise ValueError("JPEGのハフマン符号を復号できません")
+                    length, size = value & 0xFF, value >> 8
+                    if size:
+                        bits = (window >> (40 - shift - length - size)) & ((1 << size) - 1)
+                        predictions[index] += bits if bits >> (size - 1) else bits - (1 << size) + 1
+                    position += length + size
+                    if record and block == 0:
+                        records.append([block_start, position, predictions[index], 0])
+
+                    # AC係数は符号の長さだけ読み飛ばす（16ビットに収まる符号はまとめて読み飛ばす）
+                    coefficient = 1
+                    while True:
+                        byte = position >> 3
+                        window = (windows[byte & 3][byte >> 2] >> (16 - (position & 7))) & 0xFFFF
+                        value = multi_lookup[window]
+                        steps = (value >> 5) & 0x7F
+                        if value >> 12:
+                            if coefficient + steps < 64:
+                                position += value & 31
+                                break
+                        elif value & 31 and coefficient + steps <= 64:
+                            position += value & 31
+                            coefficient += steps
+                            if coefficient >= 64:
+                                break
+                            continue
+
+                        # ブロックの終わりをまたぐ場合などは1つずつ読み飛ばす
+                        value = ac_lookup[window]
+                        if not value:
+                            raise ValueError("JPEGのハフマン符号を復号できません")
+                        position += value & 0xFF
+                        coefficient += value >> 8
+                        if coefficient >= 64:
+                            break
+                if record:
+                    records[index][3] = predictions[index]
+            if record:
+                mcus[mcu] = (start, position, records)
+        return mcus
+
+    def _runs(self, box: Tuple[int, int, int, int]) -> Iterable[Tuple[int, int]]:
+        """範囲に含まれるMCUを、MCU行とリスタート区間ごとの連続した範囲[最初, 最後+1)で返します。"""
+        first_col, end_col = self._mcu_range(box[0], box[2], self.mcu_size[0])
+        first_row, end_row = self._mcu_range(box[1], box[3], self.mcu_size[1])
+        for row in range(first_row, end_row):
+            first = row * self._mcu_cols + first_col
+            end = row * self._mcu_cols + end_col
+            while first < end:
+                last = end
+                if self._restart_interval:
+                    last = min(end, (first // self._restart_interval + 1) * self._restart_interval)
+                yield first, last
+                first = last
+
+    def can_crop(self, box: Tuple[int, int, int, int]) -> bool:
+        """
+        範囲をDCT係数のまま切り出せるかどうかを判定します。
+
+        Args:
+            box: 切り出す範囲 (左, 上, 右, 下)
+
+        Returns:
+            MCUの境界に揃っていて、DC係数の差分をハフマン符号表で符号化できる場合はTrue
+        """
+        box = tuple(box)
+        if box not in self._boxes:
+            return False
+        if box not in self._checked:
+            predictions = [0] * len(self._components)
+            available = True
+            for first, last in self._runs(box):
+                records, last_records = self._mcus[first][2], self._mcus[last - 1][2]
+                for index, (_, dc, _) in enumerate(self._components):
+                    difference = records[index][2] - predictions[index]
+                    available = available and abs(difference).bit_length() in dc.codes
+                    predictions[index] = last_records[index][3]
+            self._checked[box] = available
+        return self._checked[box]
+
+    def crop(self, box: Tuple[int, int, int, int]) -> bytes:
+        """
+        範囲をDCT係数のまま切り出したJPEGを返します。
+
+        Args:
+            box: 切り出す範囲 (左, 上, 右, 下)。can_cropがTrueを返す範囲
+
+        Returns:
+            JPEGファイルのバイト列
+        """
+        left, upper, right, lower = box
+        writer = _BitWriter()
+        predictions = [0] * len(self._components)
+        for first, last in self._runs(box):
+            start_records = self._mcus[first][2]
+            last_mcu = self._mcus[last - 1]
+            for index, (_, dc, _) in enumerate(self._components):
+                block_start, dc_end, value, _ = start_records[index]
+                # 先頭ブロックのDC係数の差分を符号化し直す
+                difference = value - predictions[index]
+                size = abs(difference).bit_length()
+                code, length = dc.codes[size]
+                bits = difference if difference >= 0 else difference + (1 << size) - 1
+                writer.write(code << size | bits, length + size)
+
+                # 以降のビット列（次の成分の先頭ブロックの手前まで、最後の成分は範囲の終わりまで）はそのままコピー
+                if index + 1 < len(start_records):
+                    writer.copy(self._data, dc_end, start_records[index + 1][0])
+                else:
+                    writer.copy(self._data, dc_end, last_mcu[1])
+                predictions[index] = last_mcu[2][index][3]
+
+        parts = [b"\xff\xd8"]
+        for marker, payload in self._header:
+            if marker in ALL_SOF_MARKERS:
+                payload = payload[:1] + struct.pack(">HH", lower - upper, right - left) + payload[5:]
+            parts.append(struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload)
+        parts.append(writer.getvalue())
+        parts.append(b"\xff\xd9")
+        return b"".join(parts)
+
+
+def open_jpeg_cropper(image_path: str, boxes: Iterable[Tuple[int, int, int, int]]) -> Optional[JpegCropper]:
+    """
+    JPEG画像からDCT係数のままタイルを切り出すオブジェクトを作成します。
+
+    Args:
+        image_path: 入力画像のパス
+        boxes: 切り出すタイルの範囲 (左, 上, 右, 下) のリスト
+
+    Returns:
+        JpegCropper。JPEG以外の画像、対応していないJPEG、MCUの境界に揃った範囲がない場合はNone
+    """
+    with open(image_path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        data = b"\xff\xd8" + f.read()
+
+    try:
+        cropper = JpegCropper(data, boxes)
+    except (ValueError, KeyError, IndexError, struct.error):
+        return None
+    return cropper if cropper._boxes else None
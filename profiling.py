@@ -0,0 +1,197 @@
+"""
+ChopImg - 計測モジュール
+
+分割処理の工程（デコード・クロップ・エンコード・書き込みなど）ごとの
+処理時間とバイト数を記録する機能を提供します。
+"""
+
+import contextlib
+import heapq
+import json
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+# 記録する工程（表示順）
+STAGES = ('open', 'decode', 'crop', 'inspect', 'resize', 'encode', 'write', 'fsync')
+
+# 記録する遅いタイルの数
+SLOWEST_TILES = 10
+
+
+class SplitStats:
+    """
+    分割処理の工程ごとの処理時間とバイト数を記録するクラス
+
+    split_image_by_sizeなどの分割関数にstatsとして渡すと、各工程の
+    処理時間（秒）、回数、バイト数と、タイルごとの処理時間を記録します。
+    ワーカーのスレッドからも記録されるため、記録はスレッドセーフに行います。
+
+    各工程のバイト数は、decode・cropが展開後の画素データ、encode・writeが
+    エンコード後のデータの大きさです。
+
+    settingsには、分割処理が実際に使用した設定（PNGの自動設定で選ばれた
+    圧縮設定など）を記録します。複数の画像を処理した場合は最後に記録した設定です。
+    """
+
+    def __init__(self, callback: Optional[Callable[[str, float, int], None]] = None,
+                 slowest: int = SLOWEST_TILES):
+        """
+        Args:
+            callback: 工程を記録するたびに(工程名, 秒, バイト数)で呼び出す関数
+            slowest: 記録する遅いタイルの数
+        """
+        self.callback = callback
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.tiles = 0
+        self.settings: Dict[str, dict] = {}
+        self._slowest_count = slowest
+        self._slowest: List[tuple] = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._running = 0
+        self._elapsed = 0.0
+
+    def record(self, stage: str, seconds: float, nbytes: int = 0) -> None:
+        """
+        工程の処理時間とバイト数を記録します。
+
+        Args:
+            stage: 工程名
+            seconds: 処理時間（秒）
+            nbytes: 処理したバイト数
+        """
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0, 'bytes': 0})
+            entry['seconds'] += seconds
+            entry['count'] += 1
+            entry['bytes'] += nbytes
+        if self.callback is not None:
+            self.callback(stage, seconds, nbytes)
+
+    @contextlib.contextmanager
+    def measure(self, stage: str, nbytes: int = 0) -> Iterator[None]:
+        """
+        withブロックの処理時間を工程として記録します。
+
+        Args:
+            stage: 工程名
+            nbytes: 処理したバイト数
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, nbytes)
+
+    def record_tile(self, name: str, seconds: float, nbytes: int) -> None:
+        """
+        1タイルのエンコードと書き込みにかかった時間を記録します。
+
+        Args:
+            name: タイルのファイル名
+            seconds: 処理時間（秒）
+            nbytes: エンコード後のバイト数
+        """
+        with self._lock:
+            self.tiles += 1
+            self._sequence += 1
+            item = (seconds, self._sequence, name, nbytes)
+            if len(self._slowest) < self._slowest_count:
+                heapq.heappush(self._slowest, item)
+            elif self._slowest and item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def start(self) -> None:
+        """
+        全体の経過時間の計測を開始します。
+
+        複数の画像を並列に処理する場合など、start/stopが入れ子になった場合は
+        最初のstartから最後のstopまでを1つの区間として計測します。
+        """
+        with self._lock:
+            if self._running == 0:
+                self._started = time.perf_counter()
+            self._running += 1
+
+    def stop(self) -> None:
+        """全体の経過時間の計測を終了します。"""
+        with self._lock:
+            if self._running == 0:
+                return
+            self._running -= 1
+            if self._running == 0:
+                self._elapsed += time.perf_counter() - self._started
+                self._started = None
+
+    @property
+    def elapsed(self) -> float:
+        """全体の経過時間（秒）"""
+        started = self._started
+        if started is not None:
+            return self._elapsed + time.perf_counter() - started
+        return self._elapsed
+
+    def slowest_tiles(self) -> List[dict]:
+        """
+        処理に時間がかかったタイルを遅い順に返します。
+
+        Returns:
+            タイルの辞書（name, seconds, bytes）のリスト
+        """
+        with self._lock:
+            items = sorted(self._slowest, reverse=True)
+        return [{'name': name, 'seconds': seconds, 'bytes': nbytes} for seconds, _, name, nbytes in items]
+
+    def to_dict(self) -> dict:
+        """
+        記録した内容を辞書に変換します。
+
+        Returns:
+            elapsed, tiles, tiles_per_sec, input_bytes, output_bytes, stages, settings, slowest_tilesを含む辞書
+        """
+        elapsed = self.elapsed
+        with self._lock:
+            stages = {stage: dict(self.stages[stage]) for stage in self._ordered_stages()}
+            tiles = self.tiles
+        return {
+            'elapsed': elapsed,
+            'tiles': tiles,
+            'tiles_per_sec': tiles / elapsed if elapsed else 0.0,
+            'input_bytes': stages.get('decode', {}).get('bytes', 0),
+            'output_bytes': stages.get('write', {}).get('bytes', 0),
+            'stages': stages,
+            'settings': {name: dict(value) for name, value in self.settings.items()},
+            'slowest_tiles': self.slowest_tiles()
+        }
+
+    def write_json(self, path: str) -> None:
+        """
+        記録した内容をJSONファイルに書き出します。
+
+        Args:
+            path: 出力するJSONファイルのパス
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def _ordered_stages(self) -> List[str]:
+        known = [stage for stage in STAGES if stage in self.stages]
+        return known + sorted(stage for stage in self.stages if stage not in STAGES)
+
+
+def image_nbytes(img) -> int:
+    """
+    画像の展開後の画素データのおおよそのバイト数を返します。
+
+    Args:
+        img: PIL.Image
+
+    Returns:
+        バイト数
+    """
+    width, height = img.size
+    bits = {'1': 1, 'I;16': 16, 'I;16B': 16, 'I;16L': 16, 'I': 32, 'F': 32}.get(img.mode, 8)
+    return (width * height * len(img.getbands()) * bits + 7) // 8
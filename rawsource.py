@@ -0,0 +1,323 @@
+"""
+ChopImg - メモリマップ読み込みモジュール
+
+非圧縮の画像（BMP、PPM、非圧縮TIFF、NumPyの.npy）の画素データをメモリにマップし、
+デコーダで画像全体を展開せずにタイルを切り出す機能を提供します。
+"""
+
+import ast
+import mmap
+import struct
+from typing import Optional, Tuple
+from PIL import Image
+
+from tiffsource import check_image_pixels
+
+
+# 対応する画像モード
+MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK')
+
+# Pillowがコピーせずにメモリ上のデータを参照できるモード（Image.frombufferを参照）
+MAPPED_MODES = ('L', 'RGBA', 'CMYK')
+
+# .npyの最後の次元（チャンネル数）ごとの画像モード
+NPY_MODES = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}
+
+# 先頭のバイト列と形式の対応
+SIGNATURES = (
+    (b'BM', 'BMP'), (b'P5', 'PPM'), (b'P6', 'PPM'),
+    (b'II*\0', 'TIFF'), (b'MM\0*', 'TIFF'), (b'\x93NUMPY', 'NPY')
+)
+
+
+class MappedRaster:
+    """
+    メモリにマップした非圧縮の画素データから画像を切り出すソース
+
+    画素データの格納形式がPillowの内部形式と同じ場合（L, RGBA, CMYKで上から下に格納）は、
+    imageにマップしたデータをコピーせずに参照する画像全体を持ち、タイルはそこから直接エンコードできます。
+    それ以外の場合（RGB、BMPのBGRなど）も、readで範囲の行だけをマップしたデータから読み込むため、
+    画像全体をデコードしたバッファは作成しません。どちらもページキャッシュを直接読むため、
+    プロセスのメモリ使用量は入力の大きさによらずほぼ一定です。
+
+    streaming.open_band_readerで取得できるバンドリーダーと同じread(top, bottom, left, right)を持ちます。
+    """
+
+    streaming = True
+    jpeg_passthrough = False
+
+    def __init__(self, path: str, format: str, mode: str, size: Tuple[int, int], offset: int,
+                 rawmode: Optional[str] = None, stride: int = 0, orientation: int = 1,
+                 info: Optional[dict] = None):
+        """
+        Args:
+            path: 画像ファイルのパス
+            format: 画像の形式 (BMP, PPM, TIFF, NPY)
+            mode: 画像モード
+            size: 画像サイズ (幅, 高さ)
+            offset: ファイル内の画素データの開始位置
+            rawmode: 格納形式のモード（Noneの場合はmode）
+            stride: 1行あたりのバイト数（0の場合は行の間に余白なし）
+            orientation: 行の格納順（1: 上から下, -1: 下から上）
+            info: 画像の情報
+
+        Raises:
+            ValueError: 対応していない形式の場合、または画素データが不足している場合
+            OSError: ファイルを読み込めない場合
+        """
+        if mode not in MODES:
+            raise ValueError(f"メモリマップに対応していない画像モード: {mode}")
+        self.path = path
+        self.format = format
+        self.mode = mode
+        self.size = size
+        self.info = info or {}
+        self.rawmode = rawmode or mode
+        self.orientation = orientation
+        self.pixel_bytes = _pixel_bytes(mode, self.rawmode)
+        self.stride = stride or size[0] * self.pixel_bytes
+        self.offset = offset
+        self.image: Optional[Image.Image] = None
+
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise ValueError("画像ファイルをメモリにマップできません")
+        self._view = memoryview(self._map)
+
+        if offset + self.stride * size[1] > len(self._map):
+            self.close()
+            raise ValueError("画像ファイルの画素データが途中で終了しています")
+
+        if mode in MAPPED_MODES and self.rawmode == mode:
+            self.image = Image.frombuffer(
+                mode, size, self._view[offset:offset + self.stride * size[1]], 'raw', mode, self.stride, orientation
+            )
+
+    def read(self, top: int, bottom: int, left: int = 0, right: Optional[int] = None) -> Image.Image:
+        """
+        範囲の行だけをマップしたデータから読み込み、範囲の画像を返します。
+
+        imageがある場合、範囲の末尾が画素データの末尾を超えなければ、コピーせずにデータを参照する画像を返します。
+
+        Args:
+            top: 上端
+            bottom: 下端
+            left: 左端
+            right: 右端（Noneの場合は画像の右端）
+
+        Returns:
+            範囲の画像
+        """
+        width, height = self.size
+        if right is None:
+            right = width
+        size = (right - left, bottom - top)
+        # 下から上に格納されている場合は、範囲の最下行が先頭になる
+        first_row = top if self.orientation > 0 else height - bottom
+        start = self.offset + first_row * self.stride + left * self.pixel_bytes
+        end = self.offset + self.stride * height
+
+        if self.image is not None and start + self.stride * size[1] <= end:
+            return Image.frombuffer(self.mode, size, self._view[start:start + self.stride * size[1]],
+                                    'raw', self.rawmode, self.stride, self.orientation)
+
+        # 最終行は範囲の右端までのデータだけを渡す
+        data = self._view[start:start + (size[1] - 1) * self.stride + size[0] * self.pixel_bytes]
+        return Image.frombytes(self.mode, size, data, 'raw', self.rawmode, self.stride, self.orientation)
+
+    def release(self, top: int) -> None:
+        """
+        topより上の行の画素データを、プロセスのメモリ（マップしたページ）から解放します。
+
+        タイルを上から順に処理する場合に呼び出すと、処理済みの行がページキャッシュにだけ残り、
+        プロセスのメモリ使用量が入力の大きさに比例して増えません。解放した行を再び読み込んだ場合も、
+        ページキャッシュまたはファイルから読み直されるため結果は変わりません。
+        madviseを使用できない環境（Windowsなど）では何もしません。
+
+        Args:
+            top: 解放しない最初の行
+        """
+        if not hasattr(self._map, 'madvise') or top <= 0:
+            return
+        height = self.size[1]
+        if self.orientation > 0:
+            start, end = self.offset, self.offset + top * self.stride
+        else:
+            start, end = self.offset + (height - top) * self.stride, self.offset + height * self.stride
+        # madviseの範囲はページ境界に揃える（範囲外のページは解放しない）
+        start = -(-start // mmap.PAGESIZE) * mmap.PAGESIZE
+        end = end // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > start:
+            self._map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def close(self) -> None:
+        """ファイルを閉じます。"""
+        self.image = None
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # 呼び出し側がまだタイルの画像を参照している場合、マップはその画像の解放時に閉じられる
+            pass
+        self._file.close()
+
+    def __enter__(self) -> "MappedRaster":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _pixel_bytes(mode: str, rawmode: str) -> int:
+    """
+    格納形式の1画素あたりのバイト数を求めます。
+
+    Args:
+        mode: 画像モード
+        rawmode: 格納形式のモード
+
+    Returns:
+        バイト数
+
+    Raises:
+        ValueError: 1画素がバイト単位にならない格納形式の場合
+    """
+    try:
+        row_bytes = len(Image.new(mode, (8, 1)).tobytes('raw', rawmode))
+    except (ValueError, OSError):
+        raise ValueError(f"メモリマップに対応していない格納形式: {rawmode}")
+    if row_bytes % 8:
+        raise ValueError(f"メモリマップに対応していない格納形式: {rawmode}")
+    return row_bytes // 8
+
+
+def _raw_args(args) -> Tuple[str, int, int]:
+    """
+    非圧縮データのタイル記述子の引数を(格納形式のモード, 1行あたりのバイト数, 行の格納順)に正規化します。
+
+    Args:
+        args: タイル記述子の引数（文字列またはタプル）
+
+    Returns:
+        (格納形式のモード, 1行あたりのバイト数（0は余白なし）, 行の格納順)のタプル
+    """
+    if not isinstance(args, tuple):
+        args = (args,)
+    return (args + (0, 1))[:3]
+
+
+def _read_npy_header(path: str, max_pixels: Optional[int] = None) -> MappedRaster:
+    """
+    NumPyの.npyファイルのヘッダーを読み取り、MappedRasterを作成します。
+
+    対応するのは8ビット符号なし整数（uint8）で、形状が(高さ, 幅)または(高さ, 幅, チャンネル数)の
+    C順の配列です。NumPyはインポートしません。
+
+    Args:
+        path: .npyファイルのパス
+        max_pixels: 画素数の上限（Noneの場合はImage.MAX_IMAGE_PIXELS、0の場合は検査しない）
+
+    Returns:
+        MappedRaster
+
+    Raises:
+        ValueError: 対応していない配列の場合
+        PIL.Image.DecompressionBombError: 画素数が上限の2倍を超える場合
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(12)
+        if len(prefix) < 12:
+            raise ValueError(".npyファイルのヘッダーが途中で終了しています")
+        if prefix[6] == 1:
+            header_length, = struct.unpack('<H', prefix[8:10])
+            data_offset = 10 + header_length
+        else:
+            header_length, = struct.unpack('<I', prefix[8:12])
+            data_offset = 12 + header_length
+        f.seek(data_offset - header_length)
+        header = ast.literal_eval(f.read(header_length).decode('latin1'))
+
+    if not isinstance(header, dict) or header.get('descr') not in ('|u1', '<u1', '>u1', 'u1'):
+        raise ValueError(".npyファイルの要素の型はuint8である必要があります")
+    if header.get('fortran_order'):
+        raise ValueError(".npyファイルはC順の配列である必要があります")
+    shape = tuple(header.get('shape', ()))
+    if len(shape) == 2:
+        shape += (1,)
+    if len(shape) != 3 or shape[2] not in NPY_MODES or not shape[0] or not shape[1]:
+        raise ValueError(f"対応していない.npyファイルの形状: {header.get('shape')}")
+
+    height, width, channels = shape
+    # Image.openで開く他の形式と同じ画素数の上限を適用
+    check_image_pixels((width, height), max_pixels)
+    return MappedRaster(path, 'NPY', NPY_MODES[channels], (width, height), data_offset,
+                        info={'shape': list(header['shape'])})
+
+
+def _open_pillow_raster(path: str, max_pixels: Optional[int] = None) -> Optional[MappedRaster]:
+    """
+    Pillowでヘッダーを読み取り、画素データが連続した非圧縮データの場合はMappedRasterを作成します。
+
+    Image.openはImage.MAX_IMAGE_PIXELSの上限を適用するため、max_pixelsはそれに加えて適用します。
+
+    Args:
+        path: 画像ファイルのパス
+        max_pixels: 画素数の上限（Noneの場合はImage.MAX_IMAGE_PIXELS、0の場合は検査しない）
+
+    Returns:
+        MappedRaster（圧縮されている場合、画素データが連続していない場合はNone）
+
+    Raises:
+        PIL.Image.DecompressionBombError: 画素数が上限の2倍を超える場合
+    """
+    with Image.open(path) as img:
+        check_image_pixels(img.size, max_pixels)
+        tiles = list(img.tile)
+        if img.mode not in MODES or not tiles or any(tile[0] != 'raw' for tile in tiles):
+            return None
+        width = img.size[0]
+        rawmode, stride, orientation = _raw_args(tiles[0][3])
+        stride = stride or width * _pixel_bytes(img.mode, rawmode)
+        offset = tiles[0][2]
+
+        # 複数のストリップは、同じ格納形式で画像全体の幅を持ち、ファイル上で連続している場合だけ対応
+        if len(tiles) > 1 and orientation < 0:
+            return None
+        for _, (left, upper, right, _), tile_offset, tile_args in tiles:
+            if ((left, right) != (0, width) or _raw_args(tile_args)[::2] != (rawmode, orientation)
+                    or tile_offset != offset + upper * stride):
+                return None
+
+        return MappedRaster(path, img.format, img.mode, img.size, offset, rawmode, stride, orientation,
+                            dict(img.info))
+
+
+def open_mapped_raster(path: str, max_pixels: Optional[int] = None) -> Optional[MappedRaster]:
+    """
+    非圧縮の画像をメモリにマップして開きます。
+
+    Args:
+        path: 入力画像のパス
+        max_pixels: 画素数の上限（Noneの場合はImage.MAX_IMAGE_PIXELS、0の場合は検査しない）
+
+    Returns:
+        MappedRaster。非圧縮のBMP・PPM・TIFF、uint8の.npy以外のファイル、
+        ファイルを読み込めない場合はNone（Image.openで開いてください）
+
+    Raises:
+        PIL.Image.DecompressionBombError: 画素数が上限の2倍を超える場合
+    """
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(8)
+        format = next((name for signature, name in SIGNATURES if prefix.startswith(signature)), None)
+        if format is None:
+            return None
+        if format == 'NPY':
+            return _read_npy_header(path, max_pixels)
+        return _open_pillow_raster(path, max_pixels)
+    except (OSError, ValueError, SyntaxError):
+        return None
@@ -0,0 +1,440 @@
+"""
+ChopImg - タイルサービスモジュール
+
+プロセスを起動したまま、ローカルのHTTPまたはUnixソケットで分割ジョブを受け付けます。
+リクエストごとにPythonとPillowを起動せず、最近デコードした画像をキャッシュから再利用します。
+
+API:
+    POST /split?size=512x512 (またはcount=3x3)
+        path=入力画像のパス、またはリクエストボディに画像ファイルの内容を指定します。
+        output=ディレクトリを指定した場合はタイルをディレクトリに書き出してファイルの一覧（JSON）を、
+        指定しない場合はタイルをまとめたtar（application/x-tar）を返します。
+        その他のパラメータ: format, quality, overlap, prefix, region, skip_blank, dedupe
+        pathとoutputはルートディレクトリ（--root、省略時は起動時の作業ディレクトリ）の下のパスに限ります。
+    GET /health
+        実行中・待機中のジョブ数とキャッシュの状態（JSON）を返します。
+
+ジョブは1つのプロセスの中でスレッドとして実行します（プロセスプールは使用しません）。
+Pillowのデコードとエンコードは処理中にGILを解放するため並列に実行されますが、
+リクエストの解析、空白判定、JPEGの無劣化切り出しなどのPythonの処理はGILで直列化されるため、
+--workersを増やしてもCPUのコア数に比例して速くはなりません。
+"""
+
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Dict, Iterator, Optional, Tuple
+
+import core
+from cli import parse_size, parse_region, validate_format, validate_quality, validate_jobs
+from sink import TarSink
+from sourcecache import DEFAULT_CACHE_BYTES, SourceCache
+
+
+# 既定の待ち受けアドレスとポート
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 同時に実行するジョブ数の上限を超えた場合に待機できるジョブ数の既定値
+DEFAULT_QUEUE_SIZE = 16
+
+# リクエストボディ（画像ファイルの内容）の大きさの上限の既定値
+DEFAULT_MAX_BODY = 256 * 1024 * 1024
+
+
+class ServiceBusy(Exception):
+    """実行中と待機中のジョブ数が上限に達している場合の例外"""
+
+
+class TileService:
+    """
+    分割ジョブを同時実行数の上限つきで実行するサービス
+
+    同時に実行するジョブはworkers個までで、それを超えたジョブはqueue_size個まで待機します。
+    待機できるジョブ数も超えた場合はServiceBusyを送出します。
+    入力画像はSourceCacheでデコードし、同じ画像のジョブではデコードを省略します。
+
+    入力画像のパス（path）と出力先（output）はroot（省略時は作成時の作業ディレクトリ）以下に限ります。
+    """
+
+    def __init__(self, workers: int = 0, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 cache_bytes: int = DEFAULT_CACHE_BYTES, tile_workers: int = 1,
+                 max_body: int = DEFAULT_MAX_BODY, root: Optional[str] = None):
+        """
+        Args:
+            workers: 同時に実行するジョブ数の上限 (0でCPU数)
+            queue_size: 実行を待機できるジョブ数の上限
+            cache_bytes: キャッシュに保持するデコード済み画像の合計バイト数の上限
+            tile_workers: 各ジョブでタイルのエンコードに使用するワーカー数 (0でCPU数)
+            max_body: リクエストボディ（画像ファイルの内容）の大きさの上限（バイト）
+            root: pathとoutputに指定できるルートディレクトリ（Noneの場合は作業ディレクトリ）
+
+        Raises:
+            ValueError: ルートディレクトリが存在しない場合
+        """
+        if root is not None and not os.path.isdir(root):
+            raise ValueError(f"ルートディレクトリが見つかりません: {root}")
+        self.workers = core._resolve_workers(workers)
+        self.queue_size = queue_size
+        self.tile_workers = tile_workers
+        self.max_body = max_body
+        self.root = os.path.realpath(root if root is not None else os.getcwd())
+        self.cache = SourceCache(cache_bytes)
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+
+    def split(self, params: Dict[str, str], data: Optional[bytes] = None) -> Tuple[str, bytes]:
+        """
+        分割ジョブを実行します。
+
+        Args:
+            params: ジョブのパラメータ（APIのクエリパラメータ）
+            data: 画像ファイルの内容（pathを指定する場合はNone）
+
+        Returns:
+            (Content-Type, レスポンスの内容)のタプル
+
+        Raises:
+            ServiceBusy: 実行中と待機中のジョブ数が上限に達している場合
+            PermissionError: pathまたはoutputがルートディレクトリの外にある場合
+            ValueError: パラメータが不正な場合
+            OSError: 入力画像を開けない、またはデコードできない場合
+        """
+        with self.reserve():
+            return self.run(params, data)
+
+    @contextlib.contextmanager
+    def reserve(self) -> Iterator[None]:
+        """
+        ジョブ1つ分の実行または待機の枠を確保します。
+
+        リクエストボディを読み込む前に確保し、上限に達している場合は読み込まずに拒否できるようにします。
+        確保した枠の中でrunを呼び出してジョブを実行します。
+
+        Raises:
+            ServiceBusy: 実行中と待機中のジョブ数が上限に達している場合
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                raise ServiceBusy(f"実行中と待機中のジョブ数が上限（{self.workers + self.queue_size}）に達しています")
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def run(self, params: Dict[str, str], data: Optional[bytes] = None) -> Tuple[str, bytes]:
+        """reserveで確保した枠の中で、同時実行数の上限まで待機してからジョブを実行します（splitを参照）。"""
+        with self._slots:
+            with self._lock:
+                self._active += 1
+            try:
+                return self._run(params, data)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def status(self) -> dict:
+        """
+        サービスの状態を返します。
+
+        Returns:
+            実行中(active)・待機中(queued)のジョブ数、同時実行数の上限(workers)、待機できるジョブ数(queue_size)、
+            キャッシュの状態(cache)
+        """
+        with self._lock:
+            active, queued = self._active, self._pending - self._active
+        return {
+            'active': active,
+            'queued': queued,
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'cache': self.cache.stats()
+        }
+
+    def _run(self, params: Dict[str, str], data: Optional[bytes]) -> Tuple[str, bytes]:
+        """ジョブを実行します（splitを参照）。"""
+        tile_size, grid_size, options = _job_options(params, self.tile_workers)
+        if data:
+            image = self.cache.get_bytes(data)
+        elif params.get('path'):
+            image = self.cache.get(self._confine(params['path']))
+        else:
+            raise ValueError("入力画像のパス（path）またはリクエストボディに画像ファイルの内容を指定してください")
+
+        start = time.perf_counter()
+        output_dir = params.get('output')
+        if output_dir:
+            files = _split(image, tile_size, grid_size, output_dir=self._confine(output_dir), **options)
+            body = {'files': files, 'elapsed': time.perf_counter() - start}
+            return 'application/json', json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+        # 出力先を指定しない場合はタイルをtarにまとめて返す
+        bundle = io.BytesIO()
+        sink = TarSink(bundle)
+        try:
+            _split(image, tile_size, grid_size, sink=sink, **options)
+        finally:
+            sink.close()
+        return 'application/x-tar', bundle.getvalue()
+
+    def _confine(self, path: str) -> str:
+        """
+        パスがルートディレクトリの下にあることを確認します。
+
+        Args:
+            path: 入力画像または出力先のパス（相対パスはルートディレクトリからのパス）
+
+        Returns:
+            シンボリックリンクを解決した絶対パス
+
+        Raises:
+            PermissionError: パスがルートディレクトリの外にある場合
+        """
+        resolved = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([self.root, resolved]) != self.root:
+            raise PermissionError(f"ルートディレクトリの外のパスは指定できません: {path}")
+        return resolved
+
+
+def _split(image, tile_size: Optional[Tuple[int, int]], grid_size: Optional[Tuple[int, int]], **options):
+    """デコード済みの画像を分割サイズまたは分割数で分割します。"""
+    if tile_size is not None:
+        return core.split_image_by_size(image, tile_size, **options)
+    return core.split_image_by_count(image, grid_size, **options)
+
+
+def _job_options(params: Dict[str, str], tile_workers: int = 1) -> Tuple[Optional[Tuple[int, int]],
+                                                                          Optional[Tuple[int, int]], dict]:
+    """
+    ジョブのパラメータから分割関数の引数を組み立てます。
+
+    Args:
+        params: ジョブのパラメータ
+        tile_workers: タイルのエンコードに使用するワーカー数
+
+    Returns:
+        (分割サイズ, 分割数, その他のキーワード引数の辞書)のタプル
+
+    Raises:
+        ValueError: パラメータが不正な場合
+    """
+    if ('size' in params) == ('count' in params):
+        raise ValueError("サイズ（size）または分割数（count）のどちらか一方を指定してください")
+    tile_size = parse_size(params['size']) if 'size' in params else None
+    grid_size = parse_size(params['count']) if 'count' in params else None
+    try:
+        quality = int(params.get('quality', 90))
+        overlap = int(params.get('overlap', 0))
+    except ValueError:
+        raise ValueError("画像品質（quality）とオーバーラップ（overlap）は整数で指定してください")
+    return tile_size, grid_size, {
+        'prefix': params.get('prefix', 'slice'),
+        'format': validate_format(params.get('format', 'png')),
+        'quality': validate_quality(quality),
+        'overlap': overlap,
+        'region': parse_region(params.get('region')),
+        'skip_blank': params.get('skip_blank', '').lower() in ('1', 'true'),
+        'dedupe': params.get('dedupe', '').lower() in ('1', 'true'),
+        'workers': tile_workers,
+    }
+
+
+def _content_length(value: Optional[str]) -> int:
+    """
+    Content-Lengthヘッダーの値をバイト数に変換します。
+
+    Args:
+        value: ヘッダーの値（Noneの場合は0）
+
+    Returns:
+        リクエストボディのバイト数
+
+    Raises:
+        ValueError: 0以上の整数でない場合
+    """
+    try:
+        length = int(value or 0)
+    except ValueError:
+        raise ValueError(f"Content-Lengthが不正です: {value}")
+    if length < 0:
+        raise ValueError(f"Content-Lengthが不正です: {value}")
+    return length
+
+
+class TileRequestHandler(http.server.BaseHTTPRequestHandler):
+    """タイルサービスのAPIを処理するリクエストハンドラ（server.serviceのTileServiceでジョブを実行）"""
+
+    def do_GET(self) -> None:
+        """GET /health を処理します。"""
+        if urllib.parse.urlsplit(self.path).path != '/health':
+            self._send_error(404, f"見つかりません: {self.path}")
+            return
+        self._send(200, 'application/json', json.dumps(self.server.service.status()).encode('utf-8'))
+
+    def do_POST(self) -> None:
+        """POST /split を処理します。"""
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/split':
+            self._send_error(404, f"見つかりません: {self.path}")
+            return
+        params = dict(urllib.parse.parse_qsl(url.query))
+        service = self.server.service
+
+        try:
+            length = _content_length(self.headers.get('Content-Length'))
+            if length > service.max_body:
+                # ボディを読み込まずに応答するため、接続は閉じる
+                self.close_connection = True
+                self._send_error(413, f"リクエストボディが上限（{service.max_body}バイト）を超えています")
+                return
+            # 実行枠を確保してからボディを読み込む（混雑時は読み込まずに503を返す）
+            with service.reserve():
+                data = self.rfile.read(length) if length else None
+                content_type, body = service.run(params, data)
+        except ServiceBusy as e:
+            self.close_connection = True
+            self._send_error(503, str(e))
+        except FileNotFoundError as e:
+            self._send_error(404, str(e))
+        except PermissionError as e:
+            self._send_error(403, str(e))
+        except (ValueError, OSError) as e:
+            self._send_error(400, str(e))
+        except Exception as e:
+            self._send_error(500, f"予期しないエラーが発生しました: {str(e)}")
+        else:
+            self._send(200, content_type, body)
+
+    def address_string(self) -> str:
+        """クライアントのアドレスを返します（Unixソケットの場合はソケットのパス）。"""
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return str(self.server.server_address)
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        """レスポンスを送信します。"""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        """エラーメッセージをJSONで送信します。"""
+        self._send(status, 'application/json', json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'))
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unixソケットでリクエストごとにスレッドを起動して処理するHTTPサーバー"""
+
+    daemon_threads = True
+
+
+def create_server(service: TileService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  socket_path: Optional[str] = None) -> socketserver.BaseServer:
+    """
+    タイルサービスのHTTPサーバーを作成します。
+
+    Args:
+        service: ジョブを実行するサービス
+        host: 待ち受けるホスト
+        port: 待ち受けるポート（0で空いているポート）
+        socket_path: 指定した場合はhost・portではなくこのパスのUnixソケットで待ち受ける
+
+    Returns:
+        serve_foreverで待ち受けを開始するサーバー（serviceはserver.serviceで参照）
+    """
+    if socket_path is not None:
+        # 前回残ったソケットファイルは削除
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, TileRequestHandler)
+    else:
+        server = http.server.ThreadingHTTPServer((host, port), TileRequestHandler)
+    server.service = service
+    return server
+
+
+def main(args: Optional[list] = None) -> int:
+    """
+    chopimg serve のエントリーポイント
+
+    Args:
+        args: コマンドライン引数（Noneの場合はsys.argvを使用）
+
+    Returns:
+        終了コード
+    """
+    parser = argparse.ArgumentParser(
+        prog="chopimg serve",
+        description="ChopImg - 分割ジョブをHTTPまたはUnixソケットで受け付けるサービス"
+                    "（ジョブは1つのプロセスのスレッドで実行し、Pythonの処理はGILで直列化されます）"
+    )
+    parser.add_argument("--host", help="待ち受けるホスト", default=DEFAULT_HOST)
+    parser.add_argument("--port", help="待ち受けるポート", default=DEFAULT_PORT, type=int)
+    parser.add_argument("--socket", help="TCPの代わりに待ち受けるUnixソケットのパス", type=str, metavar="PATH")
+    parser.add_argument("--workers", help="同時に実行するジョブ数（0でCPU数、スレッドで実行する）", default=0, type=int)
+    parser.add_argument("--queue", help="実行を待機できるジョブ数", default=DEFAULT_QUEUE_SIZE, type=int)
+    parser.add_argument(
+        "--cache-size",
+        help="デコード済み画像のキャッシュの上限（MB）",
+        default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+        type=int
+    )
+    parser.add_argument("-j", "--jobs", help="各ジョブのタイルのエンコードに使用する並列ジョブ数（0でCPU数）",
+                        default=1, type=int)
+    parser.add_argument(
+        "--max-body",
+        help="リクエストボディ（画像ファイルの内容）の上限（MB）。超えた場合は413を返す",
+        default=DEFAULT_MAX_BODY // (1024 * 1024),
+        type=int
+    )
+    parser.add_argument(
+        "--root",
+        help="pathとoutputに指定できるディレクトリ（省略時は作業ディレクトリ）",
+        type=str,
+        metavar="DIR"
+    )
+    parsed_args = parser.parse_args(args)
+
+    try:
+        service = TileService(
+            workers=validate_jobs(parsed_args.workers),
+            queue_size=max(parsed_args.queue, 0),
+            cache_bytes=parsed_args.cache_size * 1024 * 1024,
+            tile_workers=validate_jobs(parsed_args.jobs),
+            max_body=max(parsed_args.max_body, 0) * 1024 * 1024,
+            root=parsed_args.root
+        )
+        server = create_server(service, parsed_args.host, parsed_args.port, parsed_args.socket)
+    except (ValueError, OSError) as e:
+        sys.stderr.write(f"エラー: {str(e)}")
+        return 1
+
+    if parsed_args.socket:
+        sys.stdout.write(f"待ち受け中: {parsed_args.socket}\n")
+    else:
+        sys.stdout.write(f"待ち受け中: http://{server.server_address[0]}:{server.server_address[1]}/\n")
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if parsed_args.socket and os.path.exists(parsed_args.socket):
+            os.remove(parsed_args.socket)
+    return 0
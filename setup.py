@@ -28,9 +28,9 @@ setup(
     author_email="your.email@example.com",
     url="https://github.com/yourusername/chopimg",
     packages=find_packages(),
-    py_modules=["__init__", "core", "cli"],
+    py_modules=["__init__", "core", "cli", "streaming", "container", "profiling", "encoder", "jpegcrop", "tiffsource", "rawsource", "sink", "sourcecache", "server"],
     install_requires=[
-        "Pillow>=9.0.0",
+        "Pillow>=9.0.0,<13",
     ],
     entry_points={
         'console_scripts': [
@@ -0,0 +1,211 @@
+"""
+ChopImg - 出力先モジュール
+
+エンコード済みのタイルの出力先（ディレクトリ、メモリ上の辞書、tarストリーム、
+呼び出し側の関数）を提供します。
+"""
+
+import io
+import os
+import sys
+import tarfile
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, Optional, Union
+
+
+# CLIで選択できる出力先の種類
+SINK_TYPES = ('dir', 'tar')
+
+# 標準出力を表す出力先のパス
+STDOUT_PATH = '-'
+
+
+class DirectorySink:
+    """
+    タイルをディレクトリにファイルとして書き出す出力先（既定の動作）
+
+    分割関数に渡した場合は、output_dirにpathを指定した場合と同じ動作になります。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 出力ディレクトリ
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def add(self, name: str, data: bytes, row: Optional[int] = None, col: Optional[int] = None) -> None:
+        """
+        タイルを書き出します。
+
+        Args:
+            name: タイル名（出力ディレクトリからの相対パス）
+            data: エンコード済みのタイルデータ
+            row: 行番号（タイル以外のデータの場合はNone）
+            col: 列番号（タイル以外のデータの場合はNone）
+        """
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+
+    def close(self) -> None:
+        """何もしません（ファイルは書き込み時に閉じています）。"""
+
+
+class MemorySink:
+    """
+    タイルをメモリ上の辞書（タイル名からエンコード済みのデータへの対応）に格納する出力先
+    """
+
+    def __init__(self, tiles: Optional[Dict[str, bytes]] = None):
+        """
+        Args:
+            tiles: 格納先の辞書（Noneの場合は新しい辞書を作成）
+        """
+        self.tiles = {} if tiles is None else tiles
+        self._lock = threading.Lock()
+
+    def add(self, name: str, data: bytes, row: Optional[int] = None, col: Optional[int] = None) -> None:
+        """
+        タイルを格納します。
+
+        Args:
+            name: タイル名
+            data: エンコード済みのタイルデータ
+            row: 行番号（タイル以外のデータの場合はNone）
+            col: 列番号（タイル以外のデータの場合はNone）
+        """
+        with self._lock:
+            self.tiles[name] = data
+
+    def close(self) -> None:
+        """何もしません（格納したタイルはtilesに残ります）。"""
+
+
+class TarSink:
+    """
+    タイルをtarアーカイブとして順に書き出す出力先
+
+    ストリーム形式（tarfileの'w|'）で書き込むため、パイプや標準出力にも書き出せます。
+    tarのメンバーは追加した順に書き込み、複数の画像から同時に追加する場合も1つずつ書き込みます。
+    """
+
+    def __init__(self, target: Union[str, BinaryIO] = STDOUT_PATH):
+        """
+        Args:
+            target: 出力するファイルのパス、書き込み可能なバイナリストリーム、
+                または'-'（標準出力）
+        """
+        self._own_file = None
+        if target == STDOUT_PATH:
+            fileobj = sys.stdout.buffer
+        elif isinstance(target, str):
+            fileobj = self._own_file = open(target, 'wb')
+        else:
+            fileobj = target
+        self._tar = tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, data: bytes, row: Optional[int] = None, col: Optional[int] = None) -> None:
+        """
+        タイルをtarのメンバーとして書き込みます。
+
+        Args:
+            name: タイル名（メンバー名）
+            data: エンコード済みのタイルデータ
+            row: 行番号（タイル以外のデータの場合はNone）
+            col: 列番号（タイル以外のデータの場合はNone）
+        """
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        with self._lock:
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        """tarの終端を書き込みます（標準出力や渡されたストリームは閉じません）。"""
+        try:
+            self._tar.close()
+        finally:
+            if self._own_file is not None:
+                self._own_file.close()
+
+
+class CallableSink:
+    """
+    タイルごとに呼び出し側の関数を呼び出す出力先
+
+    関数は(タイル名, エンコード済みのデータ, 行番号, 列番号)で呼び出します
+    （オブジェクトストレージへのアップロードなど）。
+    """
+
+    def __init__(self, function: Callable[[str, bytes, Optional[int], Optional[int]], None]):
+        """
+        Args:
+            function: タイルごとに呼び出す関数
+        """
+        self.function = function
+
+    def add(self, name: str, data: bytes, row: Optional[int] = None, col: Optional[int] = None) -> None:
+        """
+        関数を呼び出します。
+
+        Args:
+            name: タイル名
+            data: エンコード済みのタイルデータ
+            row: 行番号（タイル以外のデータの場合はNone）
+            col: 列番号（タイル以外のデータの場合はNone）
+        """
+        self.function(name, data, row, col)
+
+    def close(self) -> None:
+        """何もしません。"""
+
+
+def as_sink(target):
+    """
+    分割関数のsink引数を出力先のオブジェクトに変換します。
+
+    Args:
+        target: 出力先（add(name, data, row, col)を持つオブジェクト、辞書、関数、またはNone）
+
+    Returns:
+        出力先のオブジェクト（targetがNoneの場合はNone）
+
+    Raises:
+        ValueError: 出力先として使用できない値の場合
+    """
+    if target is None or hasattr(target, 'add'):
+        return target
+    if isinstance(target, dict):
+        return MemorySink(target)
+    if callable(target):
+        return CallableSink(target)
+    raise ValueError(f"出力先として使用できない値です: {target!r}")
+
+
+def open_sink(sink_type: Optional[str], output: str):
+    """
+    CLIの出力先の種類と出力パスから出力先を作成します。
+
+    Args:
+        sink_type: 出力先の種類 (dir, tar)。Noneの場合は出力パスが'-'ならtar、それ以外はdir
+        output: 出力ディレクトリ、tarファイルのパス、または'-'（標準出力）
+
+    Returns:
+        出力先のオブジェクト
+
+    Raises:
+        ValueError: 出力先の種類が無効な場合、または標準出力にディレクトリを指定した場合
+    """
+    if sink_type is None:
+        sink_type = 'tar' if output == STDOUT_PATH else 'dir'
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"無効な出力先: {sink_type}。有効な出力先: {', '.join(SINK_TYPES)}")
+    if sink_type == 'tar':
+        return TarSink(output)
+    if output == STDOUT_PATH:
+        raise ValueError("標準出力（-o -）にはtar形式（--sink tar）でのみ出力できます")
+    return DirectorySink(output)
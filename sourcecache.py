@@ -0,0 +1,144 @@
+"""
+ChopImg - デコード済み画像キャッシュモジュール
+
+最近デコードした入力画像をメモリに保持し、同じ画像を繰り返し分割・切り出す場合に
+デコードを省略するためのLRUキャッシュを提供します。
+"""
+
+import collections
+import hashlib
+import io
+import os
+import threading
+import time
+from typing import Optional, Tuple
+from PIL import Image
+
+from profiling import SplitStats, image_nbytes
+
+
+# キャッシュに保持するデコード済み画像の合計バイト数の既定値
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class SourceCache:
+    """
+    デコード済みの画像を合計バイト数の上限まで保持するLRUキャッシュ
+
+    ファイルはパス・更新日時・ファイルサイズ、バイト列は内容のハッシュ値をキーにするため、
+    ファイルが更新された場合は新しくデコードします。上限を超えた場合は最も長く使われていない
+    画像から破棄します（上限より大きな画像も1つだけは保持します）。
+
+    返す画像は複数のスレッドで共有するため、呼び出し側で変更しないでください。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            max_bytes: 保持するデコード済み画像の合計バイト数の上限
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, image_path: str, stats: Optional[SplitStats] = None) -> Image.Image:
+        """
+        画像ファイルをデコードした画像を返します（キャッシュにある場合はデコードしません）。
+
+        Args:
+            image_path: 入力画像のパス
+            stats: デコードした場合に処理時間を記録する先（profiling.SplitStats）
+
+        Returns:
+            デコード済みの画像
+
+        Raises:
+            OSError: ファイルを開けない、またはデコードできない場合
+        """
+        path = os.path.abspath(image_path)
+        status = os.stat(path)
+        key = ('file', path, status.st_mtime_ns, status.st_size)
+        image = self._lookup(key)
+        if image is None:
+            start = time.perf_counter()
+            with Image.open(path) as img:
+                img.load()
+            if stats is not None:
+                stats.record('decode', time.perf_counter() - start, image_nbytes(img))
+            image = self._store(key, img)
+        return image
+
+    def get_bytes(self, data: bytes) -> Image.Image:
+        """
+        画像ファイルの内容をデコードした画像を返します（同じ内容がキャッシュにある場合はデコードしません）。
+
+        Args:
+            data: 画像ファイルの内容
+
+        Returns:
+            デコード済みの画像
+
+        Raises:
+            OSError: デコードできない場合
+        """
+        key = ('bytes', hashlib.blake2b(data, digest_size=20).hexdigest())
+        image = self._lookup(key)
+        if image is None:
+            with Image.open(io.BytesIO(data)) as img:
+                img.load()
+            image = self._store(key, img)
+        return image
+
+    def stats(self) -> dict:
+        """
+        キャッシュの状態を返します。
+
+        Returns:
+            保持している画像の数(entries)、合計バイト数(bytes)、上限(max_bytes)、ヒット数(hits)、ミス数(misses)
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def clear(self) -> None:
+        """保持しているすべての画像を破棄します。"""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _lookup(self, key: Tuple) -> Optional[Image.Image]:
+        """キャッシュにある画像を最近使用したものとして返します（ない場合はNone）。"""
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def _store(self, key: Tuple, image: Image.Image) -> Image.Image:
+        """
+        デコードした画像をキャッシュに追加し、上限を超えた分を古い順に破棄します。
+
+        別のスレッドが同じ画像を先に追加していた場合は、そちらを返します。
+        """
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+            self._entries[key] = image
+            self._nbytes += image_nbytes(image)
+            while self._nbytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= image_nbytes(evicted)
+            return image
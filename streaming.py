@@ -0,0 +1,565 @@
+"""
+ChopImg - ストリーミング読み込みモジュール
+
+画像全体をメモリに展開せず、水平バンド単位でデコードする機能を提供します。
+"""
+
+import struct
+import zlib
+from typing import Iterator, Optional, Tuple
+from PIL import Image
+
+
+# PNGのカラータイプごとのチャンネル数
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# 展開済みデータを一度に取り出す最大バイト数
+DECOMPRESS_CHUNK_SIZE = 1 << 20
+
+# デコーダに一度に渡す最大バイト数
+DECODE_BLOCK_SIZE = 1 << 16
+
+# deflateの無圧縮ブロック1つに格納できる最大バイト数
+STORED_BLOCK_SIZE = 0xFFFF
+
+# 縮小デコードの倍率（JPEGのDCTスケーリングが対応する1/2, 1/4, 1/8）
+SCALES = (1, 2, 4, 8)
+
+# 部分デコードで使用するPillowの内部API（Image._getdecoder, Image.Image._new）があるかどうか。
+# ない場合やタイル記述子の形式が異なる場合は画像全体をデコードする（requirements.txtで検証済みの版に制限）
+_HAS_DECODER_API = hasattr(Image, "_getdecoder") and hasattr(Image.Image, "_new")
+
+
+def _tile_args(args) -> tuple:
+    """
+    タイル記述子の引数をタプルに正規化します。
+
+    Args:
+        args: タイル記述子の引数（文字列またはタプル）
+
+    Returns:
+        引数のタプル
+    """
+    if isinstance(args, tuple):
+        return args
+    return (args,)
+
+
+def _new_band(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """
+    元画像と同じモード・パレット・情報を持つ空のバンド画像を作成します。
+
+    Args:
+        img: 元画像
+        size: バンド画像のサイズ (幅, 高さ)
+
+    Returns:
+        バンド画像
+    """
+    band = img._new(Image.core.new(img.mode, size))
+    # パレットをコア画像に反映
+    band.load()
+    return band
+
+
+def _decode_into(img: Image.Image, target: Image.Image, codec: str, extents: Tuple[int, int, int, int],
+                 offset: int, args, data: Optional[bytes] = None) -> None:
+    """
+    タイル記述子1つ分のデータをデコードし、対象画像に書き込みます。
+
+    Args:
+        img: 元画像（ファイルとデコーダ設定の取得元）
+        target: 書き込み先の画像
+        codec: デコーダ名
+        extents: 書き込み先での範囲 (左, 上, 右, 下)
+        offset: ファイル内のデータ開始位置
+        args: デコーダ引数
+        data: デコードするデータ（Noneの場合はファイルから読み込む）
+
+    Raises:
+        OSError: デコードに失敗した場合
+    """
+    decoder = Image._getdecoder(img.mode, codec, args, getattr(img, "decoderconfig", ()))
+    n, err_code = 0, 0
+    try:
+        decoder.setimage(target.im, extents)
+        if data is not None:
+            n, err_code = decoder.decode(data)
+        elif decoder.pulls_fd:
+            img.fp.seek(offset)
+            decoder.setfd(img.fp)
+            n, err_code = decoder.decode(b"")
+        else:
+            img.fp.seek(offset)
+            buffer = b""
+            while True:
+                chunk = img.fp.read(DECODE_BLOCK_SIZE)
+                if not chunk:
+                    break
+                buffer += chunk
+                n, err_code = decoder.decode(buffer)
+                if n < 0:
+                    break
+                buffer = buffer[n:]
+        if n >= 0:
+            raise OSError("画像ファイルが途中で終了しています")
+        if err_code < 0:
+            raise OSError(f"画像データのデコードに失敗しました (エラーコード: {err_code})")
+    finally:
+        decoder.cleanup()
+
+
+class _FullBandReader:
+    """
+    画像全体を一度だけデコードし、そこからバンドを切り出すリーダー
+
+    部分デコードに対応していない形式（JPEG、圧縮TIFFなど）で使用します。
+    """
+
+    streaming = False
+    random_access = False
+
+    def __init__(self, img: Image.Image):
+        self.img = img
+
+    def read(self, top: int, bottom: int, left: int = 0, right: Optional[int] = None) -> Image.Image:
+        return self.img.crop((left, top, self.img.size[0] if right is None else right, bottom))
+
+
+class _TileListBandReader:
+    """
+    タイル記述子（TIFFのストリップやタイル、非圧縮データ）単位で
+    バンドに必要な部分だけをデコードするリーダー
+    """
+
+    streaming = True
+    random_access = True
+
+    def __init__(self, img: Image.Image, row_bytes: Optional[int] = None):
+        self.img = img
+        self.tiles = list(img.tile)
+        self.row_bytes = row_bytes
+
+    def read(self, top: int, bottom: int, left: int = 0, right: Optional[int] = None) -> Image.Image:
+        img_width = self.img.size[0]
+        if right is None:
+            right = img_width
+        band = _new_band(self.img, (right - left, bottom - top))
+
+        for codec, extents, offset, args in self.tiles:
+            tile_left, upper, tile_right, lower = extents
+            if lower <= top or upper >= bottom or tile_right <= left or tile_left >= right:
+                continue
+            clip = (max(tile_left, left), max(upper, top), min(tile_right, right), min(lower, bottom))
+
+            if codec == "raw" and tile_left == 0 and tile_right == img_width:
+                # 非圧縮データは必要な行だけをオフセット計算で読み込む
+                if left == 0 and right == img_width:
+                    self._read_raw_rows(band, extents, offset, args, top, bottom)
+                    continue
+                piece = _new_band(self.img, (img_width, clip[3] - clip[1]))
+                self._read_raw_rows(piece, extents, offset, args, clip[1], clip[3])
+                piece_origin = (0, clip[1])
+            elif clip == tuple(extents):
+                # タイル全体がバンドに収まる場合は直接デコード
+                _decode_into(self.img, band, codec, (tile_left - left, upper - top, tile_right - left, lower - top),
+                             offset, args)
+                continue
+            else:
+                # バンドをまたぐタイルは一時画像にデコードしてから貼り付け
+                piece = _new_band(self.img, (tile_right - tile_left, lower - upper))
+                _decode_into(self.img, piece, codec, (0, 0, tile_right - tile_left, lower - upper), offset, args)
+                piece_origin = (tile_left, upper)
+
+            band.paste(
+                piece.crop((clip[0] - piece_origin[0], clip[1] - piece_origin[1],
+                            clip[2] - piece_origin[0], clip[3] - piece_origin[1])),
+                (clip[0] - left, clip[1] - top)
+            )
+
+        return band
+
+    def _read_raw_rows(self, band: Image.Image, extents: Tuple[int, int, int, int], offset: int, args,
+                       top: int, bottom: int) -> None:
+        left, upper, right, lower = extents
+        rawmode, stride, orientation = (_tile_args(args) + (0, 1))[:3]
+        if stride == 0:
+            stride = self.row_bytes
+        clip_upper = max(upper, top)
+        clip_lower = min(lower, bottom)
+
+        if orientation < 0:
+            # 下から上に格納されている場合（BMPなど）
+            first_stored_row = lower - clip_lower
+        else:
+            first_stored_row = clip_upper - upper
+
+        _decode_into(
+            self.img, band, "raw",
+            (left, clip_upper - top, right, clip_lower - top),
+            offset + first_stored_row * stride,
+            (rawmode, stride, orientation)
+        )
+
+
+class _PngBandReader:
+    """
+    非インターレースPNGのIDATストリームを先頭から順に展開し、
+    バンドごとに必要な行だけをデコードするリーダー
+
+    展開したフィルタ済みの行は、無圧縮のdeflateブロックに包んでPillowのデコーダに少しずつ渡し、
+    バンド画像に直接デコードします。PNGのフィルタは直前の行を参照するため、前の行を
+    フィルタなしの参照行としてデコーダに先に渡し、バンドの参照行の位置に書き込ませます。
+    """
+
+    streaming = True
+    random_access = False
+
+    def __init__(self, img: Image.Image, row_bytes: int, rawmode: str, data_offset: int):
+        self.img = img
+        self.row_bytes = row_bytes
+        self.rawmode = rawmode
+        self._chunks = self._iter_idat(data_offset)
+        self._inflater = zlib.decompressobj()
+        self._pending = b""
+        self._next_row = 0
+        self._reference: Optional[bytes] = None
+        self._previous_band: Optional[Image.Image] = None
+        self._previous_top = 0
+
+    def _iter_idat(self, data_offset: int) -> Iterator[bytes]:
+        fp = self.img.fp
+        # 最初のIDATチャンクのヘッダ位置に移動
+        position = data_offset - 8
+        while True:
+            fp.seek(position)
+            header = fp.read(8)
+            if len(header) < 8:
+                return
+            length, chunk_type = struct.unpack(">I4s", header)
+            if chunk_type != b"IDAT":
+                return
+            yield fp.read(length)
+            # データとCRCを読み飛ばす
+            position += 12 + length
+
+    def _inflate(self, size: int) -> Iterator[bytes]:
+        # 必要なバイト数を超えて展開しないよう、展開する長さを制限して少しずつ取り出す
+        while size > 0:
+            if not self._pending:
+                if self._inflater.eof:
+                    raise OSError("PNGの画像データが途中で終了しています")
+                self._pending = next(self._chunks, b"")
+                if not self._pending:
+                    raise OSError("PNGの画像データが途中で終了しています")
+            chunk = self._inflater.decompress(self._pending, min(size, DECOMPRESS_CHUNK_SIZE))
+            self._pending = self._inflater.unconsumed_tail
+            if chunk:
+                size -= len(chunk)
+                yield chunk
+
+    def read(self, top: int, bottom: int, left: int = 0, right: Optional[int] = None) -> Image.Image:
+        band = self._read_rows(top, bottom)
+        if left == 0 and right in (None, band.size[0]):
+            return band
+        return band.crop((left, 0, band.size[0] if right is None else right, bottom - top))
+
+    def _read_rows(self, top: int, bottom: int) -> Image.Image:
+        if top < self._previous_top:
+            raise ValueError("ストリーミング読み込みではバンドを上から順に読み込む必要があります")
+
+        img_width = self.img.size[0]
+        band = _new_band(self.img, (img_width, bottom - top))
+
+        # 前のバンドと重なる行はコピーで再利用
+        decode_from = max(top, self._next_row)
+        if self._previous_band is not None and decode_from > top:
+            band.paste(
+                self._previous_band.crop((0, top - self._previous_top, img_width, decode_from - self._previous_top)),
+                (0, 0)
+            )
+
+        if decode_from > self._next_row:
+            # オーバーラップがないため読み飛ばす行がある場合
+            self._skip_rows(decode_from - self._next_row, band)
+
+        count = bottom - decode_from
+        y = decode_from - top
+        if count > 0:
+            if self._reference is None or y > 0:
+                # 参照行は前のバンドからコピーした行と同じ内容のため、その位置に書き込ませる
+                self._decode_rows(band, y - (self._reference is not None), count)
+            else:
+                # バンドの先頭行は参照行と一緒に2行の一時画像にデコードしてから貼り付け、
+                # 残りの行はその先頭行を参照行にしてデコード
+                first = _new_band(self.img, (img_width, 2))
+                self._decode_rows(first, 0, 1)
+                band.paste(first.crop((0, 1, img_width, 2)), (0, 0))
+                if count > 1:
+                    self._decode_rows(band, 0, count - 1)
+
+        self._previous_band = band
+        self._previous_top = top
+        return band
+
+    def _skip_rows(self, count: int, work: Image.Image) -> None:
+        # 読み飛ばす行も次の行のフィルタの復元に必要なため、作業用の画像に少しずつデコードし、
+        # 最後の行だけを参照行として残す
+        if work.size[1] < 2:
+            work = _new_band(self.img, (self.img.size[0], 2))
+        while count > 0:
+            rows = min(count, work.size[1] - (self._reference is not None))
+            self._decode_rows(work, 0, rows)
+            count -= rows
+
+    def _decode_rows(self, target: Image.Image, y: int, count: int) -> None:
+        """
+        次のcount行をtargetのy行目からデコードします（参照行がある場合は参照行をy行目に書き込み、続く行をその下に）。
+        """
+        img_width = self.img.size[0]
+        lower = y + count + (self._reference is not None)
+        decoder = Image._getdecoder(self.img.mode, "zip", self.rawmode, getattr(self.img, "decoderconfig", ()))
+        finished = False
+        try:
+            decoder.setimage(target.im, (0, y, img_width, lower))
+            # zlibヘッダと、参照行・フィルタ済みの行を包んだ無圧縮ブロック
+            _feed_decoder(decoder, b"\x78\x01")
+            if self._reference is not None:
+                _feed_stored_block(decoder, self._reference)
+            for chunk in self._inflate(count * self.row_bytes):
+                finished = _feed_stored_block(decoder, chunk)
+        finally:
+            decoder.cleanup()
+        if not finished:
+            raise OSError("PNGの画像データのデコードに失敗しました")
+
+        self._next_row += count
+        self._reference = b"\x00" + target.crop((0, lower - 1, img_width, lower)).tobytes("raw", self.rawmode)
+
+
+def _feed_decoder(decoder, data) -> bool:
+    """
+    デコーダにデータを渡します。
+
+    Returns:
+        デコーダが書き込み先の範囲をすべてデコードした場合はTrue
+
+    Raises:
+        OSError: デコードに失敗した場合
+    """
+    n, err_code = decoder.decode(data)
+    if err_code < 0:
+        raise OSError(f"画像データのデコードに失敗しました (エラーコード: {err_code})")
+    return n < 0
+
+
+def _feed_stored_block(decoder, data: bytes) -> bool:
+    """
+    データをコピーせずに無圧縮のdeflateブロック（最大65535バイトずつ）としてデコーダに渡します。
+
+    Returns:
+        デコーダが書き込み先の範囲をすべてデコードした場合はTrue
+    """
+    view = memoryview(data)
+    finished = False
+    for start in range(0, len(view), STORED_BLOCK_SIZE):
+        block = view[start:start + STORED_BLOCK_SIZE]
+        _feed_decoder(decoder, struct.pack("<BHH", 0, len(block), len(block) ^ 0xFFFF))
+        finished = _feed_decoder(decoder, block)
+    return finished
+
+
+def _read_png_header(img: Image.Image) -> Optional[Tuple[int, int, int]]:
+    """
+    PNGのIHDRチャンクからビット深度・カラータイプ・インターレースを読み取ります。
+
+    Args:
+        img: PNG画像
+
+    Returns:
+        (ビット深度, カラータイプ, インターレース)のタプル（読み取れない場合はNone）
+    """
+    img.fp.seek(8)
+    header = img.fp.read(8 + 13)
+    if len(header) < 21 or header[4:8] != b"IHDR":
+        return None
+    bit_depth, color_type, _, _, interlace = struct.unpack(">BBBBB", header[16:21])
+    return bit_depth, color_type, interlace
+
+
+def _raw_row_bytes(mode: str, rawmode: str, width: int) -> Optional[int]:
+    """
+    非圧縮データの1行あたりのバイト数を求めます。
+
+    Args:
+        mode: 画像モード
+        rawmode: 格納形式のモード
+        width: 画像の幅
+
+    Returns:
+        1行あたりのバイト数（求められない場合はNone）
+    """
+    try:
+        return len(Image.new(mode, (width, 1)).tobytes("raw", rawmode))
+    except (ValueError, OSError):
+        return None
+
+
+class _ReducedBandReader:
+    """
+    元の解像度のバンドを読み込み、1/scaleに縮小して返すリーダー
+
+    バンドの上端と左端は常にscaleの倍数の位置になるため、縮小結果は
+    画像全体を縮小した場合と一致します。
+    """
+
+    def __init__(self, reader, scale: int, size: Tuple[int, int]):
+        self.reader = reader
+        self.streaming = reader.streaming
+        self.random_access = getattr(reader, 'random_access', True)
+        self.scale = scale
+        self.size = size
+
+    def read(self, top: int, bottom: int, left: int = 0, right: Optional[int] = None) -> Image.Image:
+        width, height = self.size
+        right = width if right is None else min(right * self.scale, width)
+        band = self.reader.read(top * self.scale, min(bottom * self.scale, height), left * self.scale, right)
+        return reduce_image(band, self.scale)
+
+
+def scaled_size(size: Tuple[int, int], scale: int) -> Tuple[int, int]:
+    """
+    1/scaleに縮小した画像のサイズを求めます（端数は切り上げ）。
+
+    Args:
+        size: 元の画像のサイズ (幅, 高さ)
+        scale: 縮小の倍率
+
+    Returns:
+        縮小後のサイズ (幅, 高さ)
+    """
+    width, height = size
+    return (width + scale - 1) // scale, (height + scale - 1) // scale
+
+
+def reduce_image(img: Image.Image, scale: int) -> Image.Image:
+    """
+    デコード済みの画像を1/scaleに縮小します。
+
+    scale x scaleの画素の平均を取り、平均を取れないモード（1, P, I;16など）では
+    最近傍の画素を使用します。
+
+    Args:
+        img: 縮小する画像
+        scale: 縮小の倍率
+
+    Returns:
+        縮小した画像
+    """
+    if scale == 1:
+        return img
+    try:
+        return img.reduce(scale)
+    except ValueError:
+        return img.resize(scaled_size(img.size, scale), Image.NEAREST)
+
+
+def draft_scale(img: Image.Image, scale: int) -> int:
+    """
+    デコーダで縮小できる形式（JPEGのDCTスケーリング）の場合は、縮小デコードを設定します。
+
+    設定した場合はimg.sizeが縮小後のサイズに変わります。
+
+    Args:
+        img: Image.openで開いた（未ロードの）画像
+        scale: 縮小の倍率
+
+    Returns:
+        デコード後にreduce_imageで縮小する必要がある倍率（デコーダで縮小する場合は1）
+    """
+    if scale == 1:
+        return 1
+    # draftは要求したサイズ以上になる最大の縮小率を選ぶため、切り捨てたサイズを要求する
+    width, height = img.size
+    result = img.draft(img.mode, (max(width // scale, 1), max(height // scale, 1)))
+    if result is None:
+        return scale
+    # 画像が小さく縮小率が足りない場合は残りをデコード後に縮小
+    return scale // max(round(width / result[1][2]), 1)
+
+
+def open_band_reader(img: Image.Image, scale: int = 1):
+    """
+    画像に適したバンドリーダーを作成します。
+
+    部分デコードに対応している形式（非インターレースPNG、非圧縮データ、
+    複数のストリップやタイルを持つTIFF）ではバンドごとに必要な部分だけを
+    デコードし、それ以外の形式では画像全体を一度だけデコードします。
+
+    read(top, bottom, left, right)のように左端と右端を指定した場合は、その列の範囲だけを返し、
+    部分デコードに対応している形式ではその範囲に重なるストリップやタイルだけをデコードします。
+
+    scaleを指定した場合、readの範囲は1/scaleに縮小した画像の座標で指定し、
+    元の解像度でデコードしたバンドを縮小して返します。
+
+    Args:
+        img: Image.openで開いた（未ロードの）画像、またはtiffsource.TiledTiff、rawsource.MappedRaster
+        scale: デコード後に縮小する倍率（draft_scaleの戻り値）
+
+    Returns:
+        read(top, bottom[, left, right])でバンド画像を返すリーダー
+    """
+    try:
+        reader = _open_band_reader(img)
+    except (AttributeError, TypeError, ValueError):
+        # Pillowのタイル記述子の形式が想定と異なる場合は画像全体をデコード
+        reader = _FullBandReader(img)
+    if scale > 1:
+        return _ReducedBandReader(reader, scale, img.size)
+    return reader
+
+
+def _open_band_reader(img: Image.Image):
+    """元の解像度のバンドを返すリーダーを作成します（open_band_readerを参照）。"""
+    # タイル化TIFFやメモリにマップした画像は、ソース自体がリーダー
+    if not isinstance(img, Image.Image):
+        return img
+
+    tiles = list(getattr(img, "tile", None) or [])
+    if not tiles or getattr(img, "fp", None) is None or not _HAS_DECODER_API:
+        return _FullBandReader(img)
+
+    img_width, img_height = img.size
+
+    if len(tiles) == 1:
+        codec, extents, offset, args = tiles[0]
+        if tuple(extents) != (0, 0, img_width, img_height):
+            return _FullBandReader(img)
+        rawmode = _tile_args(args)[0]
+
+        if codec == "zip" and img.format == "PNG":
+            header = _read_png_header(img)
+            if header is None or header[2]:
+                return _FullBandReader(img)
+            bit_depth, color_type, _ = header
+            if color_type not in PNG_CHANNELS or _raw_row_bytes(img.mode, rawmode, 1) is None:
+                return _FullBandReader(img)
+            row_bytes = 1 + (img_width * PNG_CHANNELS[color_type] * bit_depth + 7) // 8
+            return _PngBandReader(img, row_bytes, rawmode, offset)
+
+        if codec == "raw":
+            args = _tile_args(args)
+            stride = args[1] if len(args) > 1 else 0
+            row_bytes = stride or _raw_row_bytes(img.mode, rawmode, img_width)
+            if row_bytes is None:
+                return _FullBandReader(img)
+            return _TileListBandReader(img, row_bytes)
+
+        return _FullBandReader(img)
+
+    # 複数のストリップやタイルを持つ場合は重なる記述子だけをデコード
+    rawmode = _tile_args(tiles[0][3])[0]
+    row_bytes = _raw_row_bytes(img.mode, rawmode, img_width)
+    if row_bytes is None:
+        return _FullBandReader(img)
+    return _TileListBandReader(img, row_bytes)
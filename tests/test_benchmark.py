@@ -0,0 +1,111 @@
+"""
+ChopImg - benchmark.pyのテスト
+"""
+
+import unittest
+import os
+import json
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmark import build_cases, compare_results, main, run_case, run_service_case
+from create_test_image import create_test_image, parse_image_size
+
+
+class TestBenchmark(unittest.TestCase):
+    """benchmark.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, "input.png")
+        with redirect_stdout(StringIO()):
+            create_test_image(self.image_path, (300, 200), pattern="photo")
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def test_parse_image_size(self):
+        """サイズ文字列の変換のテスト"""
+        self.assertEqual(parse_image_size("16k"), (16384, 16384))
+        self.assertEqual(parse_image_size("640x480"), (640, 480))
+
+    def test_create_test_image_is_deterministic(self):
+        """同じ引数から同じ画像が生成されることのテスト"""
+        other_path = os.path.join(self.temp_dir.name, "other.png")
+        with redirect_stdout(StringIO()):
+            create_test_image(other_path, (300, 200), pattern="photo")
+
+        with open(self.image_path, "rb") as f1, open(other_path, "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+    def test_build_cases(self):
+        """計測条件の組み合わせのテスト"""
+        cases = build_cases(["a.png"], ["size", "count"], ["png", "jpg"], [64, 128], [0, 100], [1])
+
+        # sizeはオーバーラップ以下のタイルサイズを除外し、countはタイルサイズを持たない
+        self.assertEqual(len([case for case in cases if case["function"] == "size"]), 6)
+        self.assertEqual(len([case for case in cases if case["function"] == "count"]), 4)
+
+    def test_run_case(self):
+        """1つの計測条件の実行のテスト"""
+        case = {"image": self.image_path, "function": "size", "format": "png",
+                "overlap": 10, "workers": 2, "tile_size": 100}
+
+        result = run_case(case)
+
+        self.assertEqual(result["tiles"], 12)
+        self.assertEqual(result["image_size"], [300, 200])
+        self.assertGreater(result["output_bytes"], 0)
+        self.assertTrue({"decode", "encode", "write"} <= set(result["stages"]))
+
+    def test_run_service_case(self):
+        """タイルサービスのジョブをスレッドプールとプロセスプールで実行するテスト"""
+        results = []
+        for pool in ("thread", "process"):
+            case = {"image": self.image_path, "pool": pool, "workers": 2, "jobs": 3,
+                    "tile_size": 100, "format": "png"}
+            results.append(run_service_case(case))
+
+        # どちらのプールでも同じタイルを生成する
+        self.assertEqual(results[0]["output_bytes"], results[1]["output_bytes"])
+        self.assertGreater(results[0]["output_bytes"], 0)
+        self.assertGreater(results[1]["jobs_per_sec"], 0)
+
+    def test_compare_results(self):
+        """以前の結果との比較のテスト"""
+        case = {"image": "a.png", "function": "size", "format": "png", "overlap": 0,
+                "workers": 1, "tile_size": 256}
+        previous = {"cases": [dict(case, tiles_per_sec=100.0)]}
+        current = {"cases": [dict(case, tiles_per_sec=150.0)]}
+
+        lines = compare_results(previous, current)
+
+        self.assertEqual(len(lines), 1)
+        self.assertIn("1.50x", lines[0])
+
+    def test_main_writes_json(self):
+        """結果をJSONに書き出すことのテスト"""
+        json_path = os.path.join(self.temp_dir.name, "result.json")
+
+        with redirect_stdout(StringIO()):
+            exit_code = main([
+                "--sizes", "128x128", "--functions", "count", "--formats", "png",
+                "--overlaps", "0", "--workers", "1", "--data-dir", self.temp_dir.name,
+                "--json", json_path, "--no-isolate"
+            ])
+
+        self.assertEqual(exit_code, 0)
+        with open(json_path, encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(len(report["cases"]), 1)
+        self.assertEqual(report["cases"][0]["tiles"], 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,10 +7,15 @@ from unittest.mock import patch, MagicMock
 import sys
 import os
 import argparse
+import io
+import json
+import tarfile
+import tempfile
+from PIL import Image
 
 # テスト対象のモジュールをインポート
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from cli import parse_size, validate_format, validate_quality, main
+from cli import parse_size, parse_region, parse_frames, validate_format, validate_quality, validate_jobs, collect_input_files, main
 
 
 class TestCLI(unittest.TestCase):
@@ -41,6 +46,25 @@ class TestCLI(unittest.TestCase):
         with self.assertRaises(ValueError):
             parse_size("512x256x128")
 
+    def test_parse_region(self):
+        """parse_region関数のテスト"""
+        self.assertEqual(parse_region("100,50,612,562"), (100, 50, 612, 562))
+        self.assertIsNone(parse_region(None))
+        # 形式が正しくない、または空の範囲
+        for region_str in ["100,50,612", "a,b,c,d", "100,50,100,562", "-1,0,10,10"]:
+            with self.assertRaises(ValueError):
+                parse_region(region_str)
+
+    def test_parse_frames(self):
+        """parse_frames関数のテスト"""
+        self.assertEqual(parse_frames("all"), "all")
+        self.assertEqual(parse_frames("2-5"), (2, 5))
+        self.assertEqual(parse_frames("3"), (3, 3))
+        self.assertIsNone(parse_frames(None))
+        for frames_str in ["a-b", "5-2", "-1", "1-"]:
+            with self.assertRaises(ValueError):
+                parse_frames(frames_str)
+
     def test_validate_format_valid(self):
         """validate_format関数の有効な入力のテスト"""
         # 有効なフォーマット
@@ -84,6 +108,137 @@ class TestCLI(unittest.TestCase):
         with self.assertRaises(ValueError):
             validate_quality(200)
 
+    def test_validate_jobs(self):
+        """validate_jobs関数のテスト"""
+        # 有効なジョブ数
+        self.assertEqual(validate_jobs(0), 0)
+        self.assertEqual(validate_jobs(1), 1)
+        self.assertEqual(validate_jobs(8), 8)
+        # 無効なジョブ数
+        with self.assertRaises(ValueError):
+            validate_jobs(-1)
+
+    def test_collect_input_files(self):
+        """collect_input_files関数のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用のファイルを作成
+            for name in ["b.png", "a.jpg", "notes.txt"]:
+                open(os.path.join(temp_dir, name), "w").close()
+            manifest_path = os.path.join(temp_dir, "manifest.txt")
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                f.write("# コメント\n\n")
+                f.write(os.path.join(temp_dir, "b.png") + "\n")
+                f.write("extra.png\n")
+
+            # ディレクトリは画像ファイルのみを名前順に展開
+            self.assertEqual(
+                collect_input_files([temp_dir]),
+                [os.path.join(temp_dir, "a.jpg"), os.path.join(temp_dir, "b.png")]
+            )
+
+            # ワイルドカードを展開
+            self.assertEqual(
+                collect_input_files([os.path.join(temp_dir, "*.png")]),
+                [os.path.join(temp_dir, "b.png")]
+            )
+
+            # マニフェストを読み込み、重複を除く
+            self.assertEqual(
+                collect_input_files([os.path.join(temp_dir, "b.png")], manifest_path),
+                [os.path.join(temp_dir, "b.png"), "extra.png"]
+            )
+
+    @patch('cli.split_images')
+    def test_main_batch(self, mock_split_images):
+        """main関数の複数ファイル指定のテスト"""
+        # split_imagesの戻り値を設定
+        mock_split_images.return_value = [
+            {'path': 'a.png', 'output_files': ['a1.png', 'a2.png'], 'error': None, 'elapsed': 0.5},
+            {'path': 'b.png', 'output_files': [], 'error': 'broken', 'elapsed': 0.1},
+        ]
+
+        # 標準出力をキャプチャ
+        with patch('sys.stdout') as mock_stdout:
+            # 関数を実行
+            result = main(['a.png', 'b.png', '--size', '256x256', '--jobs', '2', '--file-jobs', '4', '--cache'])
+
+            # 失敗した画像があるため終了コードが1であることを確認
+            self.assertEqual(result, 1)
+
+            # split_imagesが正しく呼び出されたことを確認
+            args, kwargs = mock_split_images.call_args
+            self.assertEqual(kwargs['image_paths'], ['a.png', 'b.png'])
+            self.assertEqual(kwargs['tile_size'], (256, 256))
+            self.assertIsNone(kwargs['grid_size'])
+            self.assertEqual(kwargs['workers'], 2)
+            self.assertEqual(kwargs['file_workers'], 4)
+            self.assertTrue(kwargs['cache'])
+
+            # 画像ごとの結果と集計が出力されたことを確認
+            mock_stdout.write.assert_any_call("成功: a.png: 2個のタイル (0.50秒)\n")
+            mock_stdout.write.assert_any_call("失敗: b.png: broken\n")
+            mock_stdout.write.assert_any_call("1/2個の画像を2個のタイルに分割しました。\n")
+
+    def test_main_profile(self):
+        """main関数の--profileオプションのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.new("RGB", (200, 100), "red").save(image_path)
+            json_path = os.path.join(temp_dir, "profile.json")
+
+            # 標準出力をキャプチャ
+            with patch('sys.stdout') as mock_stdout:
+                result = main([image_path, '--size', '100x100', '--output', temp_dir, '--profile-json', json_path])
+
+            self.assertEqual(result, 0)
+            output = "".join(call.args[0] for call in mock_stdout.write.call_args_list)
+            self.assertIn("工程別の処理時間:", output)
+            self.assertIn("遅いタイル:", output)
+
+            # 計測結果がJSONに書き出されたことを確認
+            with open(json_path, encoding='utf-8') as f:
+                profile = json.load(f)
+            self.assertEqual(profile['tiles'], 2)
+            self.assertIn('encode', profile['stages'])
+
+    def test_main_png_options(self):
+        """main関数のPNGの圧縮設定のオプションのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.new("RGB", (200, 100), "red").save(image_path)
+
+            # --profileを指定した場合は選ばれた設定と出力の速度が表示されることを確認
+            with patch('sys.stdout') as mock_stdout:
+                result = main([image_path, '--size', '100x100', '--output', temp_dir,
+                               '--png-level', '2', '--png-filter', 'none', '--profile'])
+
+            self.assertEqual(result, 0)
+            output = "".join(call.args[0] for call in mock_stdout.write.call_args_list)
+            self.assertIn("PNG設定: 圧縮レベル 2, optimize なし, 行フィルタ none, 出力", output)
+
+            # --profileを指定しない場合は計測しない
+            with patch('cli.SplitStats') as mock_stats, patch('sys.stdout') as mock_stdout:
+                result = main([image_path, '--size', '100x100', '--output', temp_dir, '--png-level', '2'])
+
+            self.assertEqual(result, 0)
+            mock_stats.assert_not_called()
+            output = "".join(call.args[0] for call in mock_stdout.write.call_args_list)
+            self.assertNotIn("PNG設定", output)
+
+            with patch('sys.stdout') as mock_stdout:
+                result = main([image_path, '--size', '100x100', '--output', temp_dir, '--png-level', 'auto',
+                               '--profile'])
+
+            self.assertEqual(result, 0)
+            output = "".join(call.args[0] for call in mock_stdout.write.call_args_list)
+            self.assertIn("（自動選択）", output)
+
+            # 無効な圧縮レベル
+            with patch('sys.stderr'):
+                self.assertEqual(main([image_path, '--size', '100x100', '--png-level', '10']), 1)
+
     @patch('cli.os.path.isfile')
     @patch('cli.get_image_info')
     def test_main_info_option(self, mock_get_image_info, mock_isfile):
@@ -117,6 +272,42 @@ class TestCLI(unittest.TestCase):
             mock_stdout.write.assert_any_call("サイズ: 1000x800ピクセル\n")
             mock_stdout.write.assert_any_call("モード: RGB\n")
 
+    def test_main_max_pixels(self):
+        """main関数の--max-pixelsオプションのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.new("RGB", (100, 100)).save(image_path)
+
+            with patch('PIL.Image.MAX_IMAGE_PIXELS', 1000):
+                # 上限の2倍を超える画像はエラー
+                with patch('sys.stdout'), patch('sys.stderr'):
+                    self.assertEqual(main([image_path, '--size', '50x50', '-o', temp_dir]), 1)
+                    self.assertEqual(main([image_path, '--size', '50x50', '--max-pixels', '-1']), 1)
+
+                # 0で上限を無効にする（実行後はPillowの上限を元に戻す）
+                with patch('sys.stdout'):
+                    self.assertEqual(main([image_path, '--size', '50x50', '-o', temp_dir, '--max-pixels', '0']), 0)
+                self.assertEqual(Image.MAX_IMAGE_PIXELS, 1000)
+
+                # エラーで終了した場合も元に戻す
+                with patch('sys.stdout'), patch('sys.stderr'):
+                    self.assertEqual(main([image_path, '--size', '50x50', '-o', temp_dir, '--max-pixels', '10']), 1)
+                self.assertEqual(Image.MAX_IMAGE_PIXELS, 1000)
+
+    def test_main_max_pixels_restores_pillow_limit(self):
+        """--max-pixelsを指定して実行した後にPillowの上限が変わらないことのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.new("RGB", (100, 100)).save(image_path)
+            limit = Image.MAX_IMAGE_PIXELS
+
+            for max_pixels in ['20000', '0']:
+                with self.subTest(max_pixels=max_pixels):
+                    with patch('sys.stdout'):
+                        result = main([image_path, '--size', '50x50', '-o', temp_dir, '--max-pixels', max_pixels])
+                    self.assertEqual(result, 0)
+                    self.assertEqual(Image.MAX_IMAGE_PIXELS, limit)
+
     @patch('cli.os.path.isfile')
     def test_main_file_not_found(self, mock_isfile):
         """main関数のファイルが見つからない場合のテスト"""
@@ -159,6 +350,19 @@ class TestCLI(unittest.TestCase):
             self.assertEqual(kwargs['tile_size'], (512, 512))
             self.assertEqual(kwargs['format'], 'png')
             self.assertEqual(kwargs['quality'], 90)
+            self.assertEqual(kwargs['workers'], 1)
+            self.assertFalse(kwargs['stream'])
+            self.assertFalse(kwargs['skip_blank'])
+            self.assertFalse(kwargs['dedupe'])
+            self.assertFalse(kwargs['cache'])
+            self.assertIsNone(kwargs['container'])
+            self.assertFalse(kwargs['jpeg_lossless'])
+            self.assertEqual(kwargs['scale'], 1)
+            self.assertIsNone(kwargs['region'])
+            self.assertEqual(kwargs['write_queue'], 0)
+            self.assertFalse(kwargs['fsync'])
+            self.assertIsNone(kwargs['sink'])
+            self.assertEqual(kwargs['overlap_mode'], 'crop')
 
             # 標準出力に正しい情報が出力されたことを確認
             mock_stdout.write.assert_any_call("画像を4個のタイルに分割しました。\n")
@@ -176,7 +380,9 @@ class TestCLI(unittest.TestCase):
         # 標準出力をキャプチャ
         with patch('sys.stdout') as mock_stdout:
             # 関数を実行
-            result = main(['test.png', '--count', '2x2', '--format', 'jpg', '--quality', '80'])
+            result = main(['test.png', '--count', '2x2', '--format', 'jpg', '--quality', '80', '--jobs', '4', '--stream',
+                           '--skip-blank', '--dedupe', '--container', 'zip', '--jpeg-lossless', '--region', '0,0,800,600',
+                           '--write-queue', '16', '--fsync'])
 
             # 終了コードが0であることを確認
             self.assertEqual(result, 0)
@@ -188,10 +394,143 @@ class TestCLI(unittest.TestCase):
             self.assertEqual(kwargs['grid_size'], (2, 2))
             self.assertEqual(kwargs['format'], 'jpg')
             self.assertEqual(kwargs['quality'], 80)
+            self.assertEqual(kwargs['workers'], 4)
+            self.assertTrue(kwargs['stream'])
+            self.assertTrue(kwargs['skip_blank'])
+            self.assertTrue(kwargs['dedupe'])
+            self.assertEqual(kwargs['container'], 'zip')
+            self.assertTrue(kwargs['jpeg_lossless'])
+            self.assertEqual(kwargs['region'], (0, 0, 800, 600))
+            self.assertEqual(kwargs['write_queue'], 16)
+            self.assertTrue(kwargs['fsync'])
 
             # 標準出力に正しい情報が出力されたことを確認
             mock_stdout.write.assert_any_call("画像を4個のタイルに分割しました。\n")
 
+    @patch('cli.os.path.isfile')
+    @patch('cli.split_image_pyramid')
+    def test_main_pyramid(self, mock_split_image_pyramid, mock_isfile):
+        """main関数の--pyramidオプションのテスト"""
+        # ファイルが存在することを確認
+        mock_isfile.return_value = True
+
+        # split_image_pyramidの戻り値を設定
+        mock_split_image_pyramid.return_value = ['0_0.png', '0_1.png', '0_0.png']
+
+        # 標準出力をキャプチャ
+        with patch('sys.stdout') as mock_stdout:
+            # 関数を実行
+            result = main(['test.png', '--pyramid', 'dzi', '--overlap', '1'])
+
+            # 終了コードが0であることを確認
+            self.assertEqual(result, 0)
+
+            # 省略時は256x256のタイルで作成されることを確認
+            args, kwargs = mock_split_image_pyramid.call_args
+            self.assertEqual(kwargs['tile_size'], 256)
+            self.assertEqual(kwargs['layout'], 'dzi')
+            self.assertEqual(kwargs['overlap'], 1)
+
+            # 標準出力に正しい情報が出力されたことを確認
+            mock_stdout.write.assert_any_call("3個のタイルからなるピラミッドを作成しました。\n")
+
+        # 正方形でないサイズはエラー
+        with patch('sys.stderr'):
+            self.assertEqual(main(['test.png', '--pyramid', 'xyz', '--size', '256x128']), 1)
+
+        # 縮小デコードは指定できない
+        with patch('sys.stderr'):
+            self.assertEqual(main(['test.png', '--pyramid', 'xyz', '--scale', '2']), 1)
+
+    @patch('cli.os.path.isfile')
+    @patch('cli.split_image_quadtree')
+    def test_main_quadtree(self, mock_split_image_quadtree, mock_isfile):
+        """main関数の--quadtreeオプションのテスト"""
+        mock_isfile.return_value = True
+        mock_split_image_quadtree.return_value = ['a.png', 'b.png']
+
+        with patch('sys.stdout') as mock_stdout:
+            result = main(['test.png', '--quadtree', '32', '--quadtree-criterion', 'edges'])
+
+            # 省略時は512x512を最大のタイルサイズとして分割
+            self.assertEqual(result, 0)
+            args, kwargs = mock_split_image_quadtree.call_args
+            self.assertEqual(kwargs['max_tile_size'], 512)
+            self.assertEqual(kwargs['min_tile_size'], 32)
+            self.assertIsNone(kwargs['threshold'])
+            self.assertEqual(kwargs['criterion'], 'edges')
+            mock_stdout.write.assert_any_call("画像を内容に応じて2個のタイルに分割しました。\n")
+
+        # 正方形でないサイズ、分割数、ピラミッド出力とは同時に指定できない
+        for options in [['--size', '256x128'], ['--count', '2x2'], ['--pyramid', 'dzi']]:
+            with patch('sys.stdout'), patch('sys.stderr'):
+                self.assertEqual(main(['test.png', '--quadtree', '32'] + options), 1)
+
+    @patch('cli.os.path.isfile')
+    @patch('cli.split_image_frames')
+    def test_main_frames(self, mock_split_image_frames, mock_isfile):
+        """main関数の--framesオプションのテスト"""
+        mock_isfile.return_value = True
+        mock_split_image_frames.return_value = ['a.png', 'b.png', 'c.png']
+
+        with patch('sys.stdout') as mock_stdout:
+            result = main(['stack.tif', '--count', '1x1', '--frames', '0-2', '--frame-jobs', '2'])
+
+            self.assertEqual(result, 0)
+            args, kwargs = mock_split_image_frames.call_args
+            self.assertEqual(kwargs['image_path'], 'stack.tif')
+            self.assertIsNone(kwargs['tile_size'])
+            self.assertEqual(kwargs['grid_size'], (1, 1))
+            self.assertEqual(kwargs['frames'], (0, 2))
+            self.assertEqual(kwargs['frame_workers'], 2)
+            mock_stdout.write.assert_any_call("画像を3個のタイルに分割しました。\n")
+
+        # ピラミッド出力とは同時に指定できない
+        with patch('sys.stdout'), patch('sys.stderr'):
+            self.assertEqual(main(['stack.tif', '--pyramid', 'dzi', '--frames', 'all']), 1)
+
+    @patch('server.main')
+    def test_main_serve(self, mock_serve_main):
+        """main関数のserveサブコマンドのテスト"""
+        mock_serve_main.return_value = 0
+
+        self.assertEqual(main(['serve', '--port', '9000', '--workers', '2']), 0)
+        mock_serve_main.assert_called_once_with(['--port', '9000', '--workers', '2'])
+
+    def test_main_tar_stdout(self):
+        """main関数の標準出力へのtar出力（-o -）のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.new("RGB", (200, 100), (255, 0, 0)).save(image_path)
+
+            # タイルはtarとして標準出力に、メッセージは標準エラー出力に書き出す
+            stdout = MagicMock()
+            stdout.buffer = io.BytesIO()
+            with patch('sys.stdout', stdout), patch('sys.stderr') as mock_stderr:
+                result = main([image_path, '--size', '100x100', '--prefix', 'tile', '-o', '-'])
+
+            self.assertEqual(result, 0)
+            stdout.write.assert_not_called()
+            mock_stderr.write.assert_any_call("出力先: 標準出力（tar）\n")
+            stdout.buffer.seek(0)
+            with tarfile.open(fileobj=stdout.buffer) as tar:
+                names = tar.getnames()
+            self.assertEqual(len(names), 2)
+            self.assertTrue(all(name.startswith("tile_") and name.endswith(".png") for name in names))
+
+            # tarファイルへの出力
+            tar_path = os.path.join(temp_dir, "tiles.tar")
+            with patch('sys.stdout'):
+                self.assertEqual(main([image_path, '--size', '100x100', '-o', tar_path, '--sink', 'tar']), 0)
+            with tarfile.open(tar_path) as tar:
+                self.assertEqual(len(tar.getnames()), 2)
+
+            # 標準出力にディレクトリ、ピラミッドはtarに出力できない
+            with patch('sys.stderr'):
+                self.assertEqual(main([image_path, '--size', '100x100', '-o', '-', '--sink', 'dir']), 1)
+            with patch('sys.stdout'), patch('sys.stderr'):
+                self.assertEqual(main([image_path, '--pyramid', 'xyz', '-o', tar_path, '--sink', 'tar']), 1)
+
     @patch('cli.os.path.isfile')
     def test_main_no_size_or_count(self, mock_isfile):
         """main関数のサイズも分割数も指定されていない場合のテスト"""
@@ -0,0 +1,108 @@
+"""
+ChopImg - container.pyのテスト
+"""
+
+import unittest
+import os
+import sqlite3
+import tempfile
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from container import open_container_writer, open_tile_container
+
+
+class TestContainer(unittest.TestCase):
+    """container.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def write_container(self, container_format):
+        """2x2のタイルを持つコンテナを書き出す"""
+        path = os.path.join(self.temp_dir.name, f"tiles.{container_format}")
+        writer = open_container_writer(path, container_format, {'format': 'png', 'tile_size': '10x10'}, rows=2)
+        for row in range(2):
+            for col in range(2):
+                writer.add(f"slice_{row:03d}_{col:03d}.png", f"tile-{row}-{col}".encode("ascii"), row, col)
+        writer.close()
+        return path
+
+    def test_round_trip(self):
+        """書き出したタイルを行・列で読み出すテスト"""
+        for container_format in ["zip", "mbtiles"]:
+            with self.subTest(container_format=container_format):
+                path = self.write_container(container_format)
+
+                with open_tile_container(path) as container:
+                    # メタデータとタイルの位置を確認
+                    metadata = {'format': 'png', 'tile_size': '10x10'}
+                    if container_format == "mbtiles":
+                        metadata['rows'] = '2'
+                    self.assertEqual(container.metadata, metadata)
+                    self.assertEqual(container.positions(), [(0, 0), (0, 1), (1, 0), (1, 1)])
+
+                    # ランダムアクセスで読み出せることを確認
+                    self.assertEqual(container.get(1, 0), b"tile-1-0")
+                    self.assertEqual(container.get(0, 1), b"tile-0-1")
+                    with self.assertRaises(KeyError):
+                        container.get(5, 5)
+
+                    # 順に読み出せることを確認
+                    self.assertEqual(len(list(container)), 4)
+
+    def test_mbtiles_tms_rows(self):
+        """MBTilesのtile_rowが下から数えた行番号で格納されるテスト"""
+        path = self.write_container("mbtiles")
+
+        # 最上段のタイルはtile_rowが最大になる
+        connection = sqlite3.connect(path)
+        try:
+            rows = dict(connection.execute("SELECT tile_name, tile_row FROM tiles"))
+        finally:
+            connection.close()
+        self.assertEqual(rows["slice_000_000.png"], 1)
+        self.assertEqual(rows["slice_001_001.png"], 0)
+
+        # 行数を指定しない場合はエラー
+        with self.assertRaises(ValueError):
+            open_container_writer(os.path.join(self.temp_dir.name, "norows.mbtiles"), "mbtiles")
+
+    def test_get_image(self):
+        """タイルを画像としてデコードするテスト"""
+        path = os.path.join(self.temp_dir.name, "tiles.zip")
+        image_path = os.path.join(self.temp_dir.name, "tile.png")
+        Image.new("RGB", (10, 10), "red").save(image_path)
+        with open(image_path, "rb") as f:
+            data = f.read()
+
+        writer = open_container_writer(path, "zip")
+        writer.add("slice_000_000.png", data, 0, 0)
+        writer.close()
+
+        with open_tile_container(path) as container:
+            tile = container.get_image(0, 0)
+            self.assertEqual(tile.size, (10, 10))
+            self.assertEqual(tile.getpixel((0, 0)), (255, 0, 0))
+
+    def test_invalid_format(self):
+        """無効なコンテナ形式のテスト"""
+        with self.assertRaises(ValueError):
+            open_container_writer(os.path.join(self.temp_dir.name, "tiles.tar"), "tar")
+
+        path = os.path.join(self.temp_dir.name, "unknown.bin")
+        with open(path, "wb") as f:
+            f.write(b"not a container")
+        with self.assertRaises(ValueError):
+            open_tile_container(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,13 +6,26 @@ import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import os
 import datetime
+import json
+import tempfile
+import threading
+import time
 from PIL import Image
 
 # テスト対象のモジュールをインポート
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from core import split_image_by_size, split_image_by_count, get_image_info
+from container import open_tile_container
+from create_test_image import save_npy, save_tiled_tiff
+from profiling import SplitStats
+from streaming import _PngBandReader
+from tiffsource import TiledTiff
+import core
+from core import (
+    split_image_by_size, split_image_by_count, split_image_frames, split_image_pyramid, split_image_quadtree,
+    split_images, get_image_info, iter_tiles, load_overlap_window
+)
 
 
 class TestCore(unittest.TestCase):
@@ -79,15 +92,736 @@ class TestCore(unittest.TestCase):
         for filename in expected_filenames:
             self.assertIn(filename, result)
 
-    @patch('core.split_image_by_size')
+    def test_split_image_by_size_workers(self):
+        """split_image_by_size関数の並列エンコードのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB").save(image_path)
+
+            # 逐次処理と並列処理で分割
+            serial_files = split_image_by_size(
+                image_path, (64, 64), output_dir=os.path.join(temp_dir, "serial"), format="jpg", overlap=8
+            )
+            parallel_files = split_image_by_size(
+                image_path, (64, 64), output_dir=os.path.join(temp_dir, "parallel"), format="jpg", overlap=8,
+                workers=4
+            )
+
+            # ファイル名と順序が一致することを確認
+            self.assertEqual(
+                [os.path.basename(path) for path in serial_files],
+                [os.path.basename(path) for path in parallel_files]
+            )
+            self.assertTrue(all(path.endswith(".jpg") for path in parallel_files))
+
+            # 出力内容がバイト単位で一致することを確認
+            for serial_path, parallel_path in zip(serial_files, parallel_files):
+                with open(serial_path, "rb") as f1, open(parallel_path, "rb") as f2:
+                    self.assertEqual(f1.read(), f2.read())
+
+    def test_split_image_by_size_stream(self):
+        """split_image_by_size関数のストリーミングモードのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB").save(image_path)
+
+            # 通常モードとストリーミングモードで分割
+            normal_files = split_image_by_size(
+                image_path, (64, 48), output_dir=os.path.join(temp_dir, "normal"), overlap=10
+            )
+            stream_files = split_image_by_size(
+                image_path, (64, 48), output_dir=os.path.join(temp_dir, "stream"), overlap=10, stream=True
+            )
+
+            # 出力内容が一致することを確認
+            self.assertEqual(len(normal_files), len(stream_files))
+            for normal_path, stream_path in zip(normal_files, stream_files):
+                with Image.open(normal_path) as normal_tile, Image.open(stream_path) as stream_tile:
+                    self.assertEqual(normal_tile.size, stream_tile.size)
+                    self.assertEqual(normal_tile.tobytes(), stream_tile.tobytes())
+
+    def test_split_image_by_size_stats(self):
+        """split_image_by_size関数の工程ごとの計測のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB").save(image_path)
+
+            for index, options in enumerate([{}, {'workers': 2}, {'stream': True}, {'container': 'zip'}]):
+                with self.subTest(options=options):
+                    stats = SplitStats()
+                    output_files = split_image_by_size(
+                        image_path, (64, 64), output_dir=os.path.join(temp_dir, f"case{index}"),
+                        stats=stats, **options
+                    )
+
+                    profile = stats.to_dict()
+                    self.assertEqual(profile['tiles'], len(output_files))
+                    self.assertEqual(profile['stages']['encode']['count'], len(output_files))
+                    self.assertEqual(profile['input_bytes'], 300 * 200 * 3)
+                    self.assertGreater(profile['output_bytes'], 0)
+                    self.assertGreater(profile['elapsed'], 0)
+                    self.assertEqual(len(profile['slowest_tiles']), 10)
+
+    def test_split_image_by_size_png_options(self):
+        """split_image_by_size関数のPNGの圧縮設定のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image = Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB")
+            image_path = os.path.join(temp_dir, "input.png")
+            image.save(image_path)
+
+            for index, (options, expected) in enumerate([
+                ({}, {'level': 9, 'optimize': True, 'filter': 'adaptive', 'auto': False}),
+                ({'png_level': 1}, {'level': 1, 'optimize': False, 'filter': 'adaptive', 'auto': False}),
+                ({'png_level': 3, 'png_filter': 'none', 'stream': True},
+                 {'level': 3, 'optimize': False, 'filter': 'none', 'auto': False}),
+                ({'png_level': 'auto'}, None),
+            ]):
+                with self.subTest(options=options):
+                    stats = SplitStats()
+                    output_files = split_image_by_size(
+                        image_path, (64, 64), output_dir=os.path.join(temp_dir, f"case{index}"),
+                        stats=stats, **options
+                    )
+
+                    # 設定によらず画素は元画像と一致
+                    self.assertEqual(len(output_files), 20)
+                    with Image.open(output_files[6]) as tile:
+                        self.assertEqual(tile.tobytes(), image.crop((64, 64, 128, 128)).tobytes())
+
+                    if expected is not None:
+                        self.assertEqual(stats.settings['png'], expected)
+                    else:
+                        self.assertTrue(stats.settings['png']['auto'])
+
+    def test_split_image_by_size_invalid_png_options(self):
+        """split_image_by_size関数の無効なPNGの圧縮設定のテスト"""
+        with self.assertRaises(ValueError):
+            split_image_by_size("test.png", (100, 100), png_level=10)
+        with self.assertRaises(ValueError):
+            split_image_by_size("test.png", (100, 100), png_filter="paeth")
+
+    def test_split_image_by_size_jpeg_lossless(self):
+        """split_image_by_size関数のJPEGの無劣化切り出しのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 色差信号を間引かないJPEG画像を作成
+            image_path = os.path.join(temp_dir, "input.jpg")
+            Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB").save(
+                image_path, quality=90, subsampling=0
+            )
+            with Image.open(image_path) as source:
+                source.load()
+
+                # 64はMCUの境界に揃い、100は揃わない（すべて再エンコード）
+                for index, (tile_size, lossless_tiles) in enumerate([(64, 20), (100, 0)]):
+                    with self.subTest(tile_size=tile_size):
+                        stats = SplitStats()
+                        output_files = split_image_by_size(
+                            image_path, (tile_size, tile_size), output_dir=os.path.join(temp_dir, f"case{index}"),
+                            format="jpg", quality=50, jpeg_lossless=True, stats=stats, workers=2
+                        )
+
+                        # 切り出したタイルはデコードした元画像と一致し、それ以外は再エンコードされる
+                        exact = 0
+                        for output_file, (row, col) in zip(output_files, [
+                            (row, col) for row in range(-(-200 // tile_size)) for col in range(-(-300 // tile_size))
+                        ]):
+                            box = (col * tile_size, row * tile_size,
+                                   min((col + 1) * tile_size, 300), min((row + 1) * tile_size, 200))
+                            with Image.open(output_file) as tile:
+                                exact += tile.tobytes() == source.crop(box).tobytes()
+                        self.assertEqual(exact, lossless_tiles)
+                        self.assertEqual(stats.tiles, len(output_files))
+
+    def test_split_image_by_size_scale(self):
+        """split_image_by_size関数の縮小デコードのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+            png_path = os.path.join(temp_dir, "input.png")
+            jpeg_path = os.path.join(temp_dir, "input.jpg")
+            image.save(png_path)
+            image.save(jpeg_path, quality=90)
+
+            # JPEGはDCTスケーリングでデコードした画像、PNGは平均で縮小した画像と一致する
+            with Image.open(jpeg_path) as drafted:
+                drafted.draft("RGB", (301 // 4, 203 // 4))
+                drafted.load()
+                jpeg_expected = drafted.copy()
+            cases = [
+                (jpeg_path, 4, False, jpeg_expected),
+                (png_path, 2, False, image.reduce(2)),
+                (png_path, 2, True, image.reduce(2)),
+            ]
+            for index, (image_path, scale, stream, expected) in enumerate(cases):
+                with self.subTest(image_path=os.path.basename(image_path), scale=scale, stream=stream):
+                    stats = SplitStats()
+                    output_files = split_image_by_size(
+                        image_path, (32, 32), output_dir=os.path.join(temp_dir, f"case{index}"),
+                        scale=scale, stream=stream, stats=stats
+                    )
+
+                    # タイルの分割は縮小後の画像に対して行う
+                    width, height = -(-301 // scale), -(-203 // scale)
+                    self.assertEqual(expected.size, (width, height))
+                    self.assertEqual(len(output_files), -(-width // 32) * -(-height // 32))
+                    self.assertEqual(stats.stages['decode']['bytes'], width * height * 3)
+                    with Image.open(output_files[-1]) as tile:
+                        left, upper = (-(-width // 32) - 1) * 32, (-(-height // 32) - 1) * 32
+                        self.assertEqual(tile.tobytes(), expected.crop((left, upper, width, height)).tobytes())
+
+            # 対応していない倍率と、無劣化切り出しとの組み合わせはエラー
+            with self.assertRaises(ValueError):
+                split_image_by_size(png_path, (32, 32), output_dir=temp_dir, scale=3)
+            with self.assertRaises(ValueError):
+                split_image_by_size(jpeg_path, (32, 32), output_dir=temp_dir, format="jpg", jpeg_lossless=True,
+                                    scale=2)
+
+    def test_split_image_by_size_region(self):
+        """split_image_by_size関数の範囲を指定した分割のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+            region = (100, 50, 180, 120)
+
+            for index, (extension, stream) in enumerate([("png", False), ("tif", False), ("tif", True), ("jpg", False)]):
+                with self.subTest(extension=extension, stream=stream):
+                    image_path = os.path.join(temp_dir, f"input.{extension}")
+                    image.save(image_path)
+                    with Image.open(image_path) as reference:
+                        reference.load()
+
+                        stats = SplitStats()
+                        output_files = split_image_by_size(
+                            image_path, (64, 64), output_dir=os.path.join(temp_dir, f"case{index}"),
+                            overlap=4, stream=stream, stats=stats, region=region
+                        )
+
+                        # 範囲に重なるタイル（行0-1、列1-2）だけを、画像全体を分割した場合と同じ範囲で出力
+                        names = [os.path.basename(path).rsplit("_", 2)[1:] for path in output_files]
+                        self.assertEqual(names, [["000", "001.png"], ["000", "002.png"],
+                                                 ["001", "001.png"], ["001", "002.png"]])
+                        with Image.open(output_files[-1]) as tile:
+                            self.assertEqual(tile.tobytes(), reference.crop((120, 60, 184, 124)).tobytes())
+
+                        # 非圧縮のTIFFはメモリにマップし、範囲に重なる4つのタイルだけを読み込む
+                        if extension == "tif":
+                            self.assertLessEqual(stats.stages['decode']['bytes'], 4 * 64 * 64 * 3)
+
+            # 画像と重ならない範囲、不正な範囲はエラー
+            with self.assertRaises(ValueError):
+                split_image_by_size(image_path, (64, 64), output_dir=temp_dir, region=(400, 0, 500, 10))
+            with self.assertRaises(ValueError):
+                split_image_by_size(image_path, (64, 64), output_dir=temp_dir, region=(10, 10, 5, 20))
+
+    def test_split_image_by_size_region_png_bottom(self):
+        """split_image_by_size関数のPNGの下端付近の範囲を指定した分割のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((301, 403), (-2, -1, 1, 1), 50).convert("RGB")
+            image_path = os.path.join(temp_dir, "input.png")
+            image.save(image_path)
+
+            stats = SplitStats()
+            with patch.object(_PngBandReader, '_decode_rows', autospec=True,
+                              side_effect=_PngBandReader._decode_rows) as decode_rows:
+                output_files = split_image_by_size(image_path, (64, 64), output_dir=temp_dir, stats=stats,
+                                                   region=(200, 330, 260, 390))
+
+            # 範囲に重なるタイル（行5-6、列3-4）だけが全体を分割した場合と同じ内容で出力される
+            names = [os.path.basename(path).rsplit("_", 2)[1:] for path in output_files]
+            self.assertEqual(names, [["005", "003.png"], ["005", "004.png"], ["006", "003.png"], ["006", "004.png"]])
+            with Image.open(output_files[-1]) as tile:
+                self.assertEqual(tile.tobytes(), image.crop((256, 384, 301, 403)).tobytes())
+
+            # 読み飛ばす320行も含め、範囲の行数（83行）ずつデコードし、範囲の列だけを残す
+            self.assertTrue(all(call.args[3] <= 83 for call in decode_rows.call_args_list))
+            self.assertEqual(stats.stages['decode']['bytes'], (301 - 192) * 83 * 3)
+
+    def test_split_image_by_size_tiled_tiff(self):
+        """split_image_by_size関数のタイル化TIFFの分割のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+            tiff_path = os.path.join(temp_dir, "tiled.tif")
+            save_tiled_tiff(image, tiff_path, (64, 64), compression="deflate")
+            png_path = os.path.join(temp_dir, "input.png")
+            image.save(png_path)
+
+            # 格納タイルと大きさの異なるタイルでも、PNGを分割した場合と同じタイルを出力
+            for tile_size, overlap in [((64, 64), 0), ((50, 40), 5)]:
+                with self.subTest(tile_size=tile_size, overlap=overlap):
+                    stats = SplitStats()
+                    tiff_files = split_image_by_size(tiff_path, tile_size, output_dir=os.path.join(temp_dir, "tif"),
+                                                     overlap=overlap, stats=stats)
+                    png_files = split_image_by_size(png_path, tile_size, output_dir=os.path.join(temp_dir, "png"),
+                                                    overlap=overlap)
+                    self.assertEqual(len(tiff_files), len(png_files))
+                    for tiff_file, png_file in zip(tiff_files, png_files):
+                        with Image.open(tiff_file) as tiff_tile, Image.open(png_file) as png_tile:
+                            self.assertEqual(tiff_tile.tobytes(), png_tile.tobytes())
+                    self.assertEqual(stats.stages['decode']['count'], len(tiff_files))
+
+            # Pillowの画素数の上限はタイル化TIFFにも適用し、上限を外した場合だけ分割
+            with patch('PIL.Image.MAX_IMAGE_PIXELS', 1000):
+                with self.assertRaises(Image.DecompressionBombError):
+                    split_image_by_size(tiff_path, (64, 64), output_dir=os.path.join(temp_dir, "bomb"))
+            with patch('PIL.Image.MAX_IMAGE_PIXELS', None):
+                self.assertEqual(get_image_info(tiff_path)['size'], (301, 203))
+                region_files = split_image_by_size(tiff_path, (64, 64), output_dir=os.path.join(temp_dir, "region"),
+                                                   region=(0, 0, 64, 64))
+            self.assertEqual(len(region_files), 1)
+
+    def test_split_image_by_size_tiled_tiff_jpeg_passthrough(self):
+        """split_image_by_size関数のJPEG圧縮のタイル化TIFFの格納タイルをそのまま書き出すテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+            tiff_path = os.path.join(temp_dir, "tiled.tif")
+            save_tiled_tiff(image, tiff_path, (64, 64), compression="jpeg")
+
+            # 格納タイルと同じ分割でJPEGを出力する場合は、指定なしでそのまま書き出す
+            stats = SplitStats()
+            output_files = split_image_by_size(tiff_path, (64, 64), output_dir=os.path.join(temp_dir, "jpg"),
+                                               format="jpg", quality=50, stats=stats)
+
+            self.assertEqual(len(output_files), 20)
+            # 端数のない格納タイル（4列x3行）はそのまま書き出し、端のタイルだけをデコード
+            self.assertEqual(stats.stages['decode']['count'], 8)
+            with TiledTiff(tiff_path) as tiff:
+                with open(output_files[6], "rb") as f:
+                    self.assertEqual(f.read(), tiff.crop((64, 64, 128, 128)))
+
+            # 分割が格納タイルと一致しない場合、縮小する場合、画素が必要な場合はすべてデコード
+            for name, tile_size, options in [("size", (50, 40), {}), ("scale", (64, 64), {'scale': 2}),
+                                             ("skip", (64, 64), {'skip_blank': True}),
+                                             ("png", (64, 64), {'format': "png"})]:
+                with self.subTest(name=name):
+                    stats = SplitStats()
+                    files = split_image_by_size(tiff_path, tile_size, output_dir=os.path.join(temp_dir, name),
+                                                **{'format': "jpg", 'stats': stats, **options})
+                    self.assertEqual(stats.stages['decode']['count'], len(files))
+
+    def test_split_image_by_size_mapped_raster(self):
+        """split_image_by_size関数のメモリにマップした非圧縮画像の分割のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+
+            for index, (filename, mode) in enumerate([("gray.tif", "L"), ("rgb.npy", "RGB"), ("rgb.bmp", "RGB")]):
+                with self.subTest(filename=filename):
+                    source = image.convert(mode)
+                    image_path = os.path.join(temp_dir, filename)
+                    if filename.endswith(".npy"):
+                        save_npy(source, image_path)
+                    else:
+                        source.save(image_path)
+                    png_path = os.path.join(temp_dir, f"{mode}.png")
+                    source.save(png_path)
+
+                    stats = SplitStats()
+                    mapped_files = split_image_by_size(
+                        image_path, (64, 48), output_dir=os.path.join(temp_dir, f"case{index}"), overlap=6, workers=2,
+                        stats=stats
+                    )
+                    png_files = split_image_by_size(
+                        png_path, (64, 48), output_dir=os.path.join(temp_dir, f"png{index}"), overlap=6
+                    )
+                    self.assertEqual(len(mapped_files), len(png_files))
+                    for mapped_file, png_file in zip(mapped_files, png_files):
+                        with Image.open(mapped_file) as mapped_tile, Image.open(png_file) as png_tile:
+                            self.assertEqual(mapped_tile.tobytes(), png_tile.tobytes())
+
+                    # Lはマップしたデータから直接エンコードし、RGBはタイルの範囲だけを読み込む
+                    if mode == "L":
+                        self.assertNotIn('decode', stats.stages)
+                    else:
+                        self.assertEqual(stats.stages['decode']['count'], len(mapped_files))
+
+            # Pillowで開けない.npyも情報を取得し、個数を指定して分割できる
+            npy_path = os.path.join(temp_dir, "rgb.npy")
+            info = get_image_info(npy_path)
+            self.assertEqual((info['format'], info['size'], info['mode']), ("NPY", (301, 203), "RGB"))
+            self.assertEqual(
+                len(split_image_by_count(npy_path, (3, 2), output_dir=os.path.join(temp_dir, "count_npy"))),
+                len(split_image_by_count(os.path.join(temp_dir, "RGB.png"), (3, 2),
+                                         output_dir=os.path.join(temp_dir, "count_png")))
+            )
+
+    def test_split_image_by_size_write_queue(self):
+        """split_image_by_size関数の書き込みキューとディスクへの同期のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB").save(image_path)
+            serial_files = split_image_by_size(image_path, (64, 64), output_dir=os.path.join(temp_dir, "serial"))
+
+            # 書き込み中のタイル数を記録する遅い書き込み
+            write_file = core._write_file
+            lock = threading.Lock()
+            writing = [0, 0]
+
+            def slow_write(*args):
+                with lock:
+                    writing[0] += 1
+                    writing[1] = max(writing)
+                time.sleep(0.005)
+                write_file(*args)
+                with lock:
+                    writing[0] -= 1
+
+            for index, workers in enumerate([1, 3]):
+                with self.subTest(workers=workers):
+                    writing[1] = 0
+                    stats = SplitStats()
+                    with patch('core._write_file', side_effect=slow_write), \
+                            patch('core.os.fsync', wraps=os.fsync) as mock_fsync:
+                        queued_files = split_image_by_size(
+                            image_path, (64, 64), output_dir=os.path.join(temp_dir, f"queue{index}"),
+                            workers=workers, stats=stats, write_queue=2, fsync=True
+                        )
+
+                    # 出力内容は書き込みキューを使用しない場合と一致
+                    self.assertEqual([os.path.basename(path) for path in queued_files],
+                                     [os.path.basename(path) for path in serial_files])
+                    for serial_path, queued_path in zip(serial_files, queued_files):
+                        with open(serial_path, "rb") as f1, open(queued_path, "rb") as f2:
+                            self.assertEqual(f1.read(), f2.read())
+
+                    # 書き込み待ちはキューの長さまで、同期はすべてのタイルの後にまとめて1回
+                    self.assertGreater(writing[1], 1)
+                    self.assertLessEqual(writing[1], 2)
+                    self.assertEqual(stats.stages['write']['count'], len(queued_files))
+                    self.assertEqual(stats.stages['fsync']['count'], 1)
+                    self.assertEqual(mock_fsync.call_count, len(queued_files) + (os.name != 'nt'))
+
+            with self.assertRaises(ValueError):
+                split_image_by_size(image_path, (64, 64), output_dir=temp_dir, write_queue=-1)
+
+    def test_split_image_by_size_shared_overlap(self):
+        """split_image_by_size関数のオーバーラップの共有のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((250, 170), (-2, -1, 1, 1), 50).convert("RGB")
+            image.paste((0, 0, 0), (0, 0, 120, 60))
+            image_path = os.path.join(temp_dir, "input.png")
+            image.save(image_path)
+
+            crop_dir = os.path.join(temp_dir, "crop")
+            crop_files = split_image_by_size(image_path, (100, 100), output_dir=crop_dir, overlap=40)
+
+            # コンテナに書き出した場合も、マニフェストと同じディレクトリのコンテナから復元
+            for index, options in enumerate([{}, {'skip_blank': True}, {'container': 'zip'},
+                                             {'container': 'mbtiles', 'skip_blank': True}]):
+                with self.subTest(options=options):
+                    shared_dir = os.path.join(temp_dir, f"shared_{index}")
+                    files = split_image_by_size(
+                        image_path, (100, 100), output_dir=shared_dir, overlap=40, overlap_mode='shared', **options
+                    )
+
+                    # 重ならない60x60のコアタイルだけをエンコード（画素数の合計は画像と同じ）
+                    if options == {'container': 'zip'}:
+                        self.assertEqual(len(files), 5 * 3)
+                    elif not options:
+                        self.assertEqual(len(files), 5 * 3)
+                        area = 0
+                        for path in files:
+                            with Image.open(path) as tile:
+                                area += tile.width * tile.height
+                        self.assertEqual(area, 250 * 170)
+                    else:
+                        self.assertLess(len(files), 5 * 3)
+
+                    # マニフェストからすべてのタイルを復元でき、切り出した場合と一致
+                    manifest_path = os.path.join(shared_dir, "slice_20250403_085000_windows.json")
+                    with open(manifest_path, encoding="utf-8") as f:
+                        windows = json.load(f)['windows']
+                    self.assertEqual(len(windows), len(crop_files))
+                    for window, crop_file in zip(windows, crop_files):
+                        with Image.open(crop_file) as expected:
+                            actual = load_overlap_window(manifest_path, window['row'], window['col'])
+                            self.assertEqual(actual.size, expected.size)
+                            self.assertEqual(actual.tobytes(), expected.convert(actual.mode).tobytes())
+
+            # 分割数を指定した場合も右と下にオーバーラップを広げたタイルを復元
+            count_dir = os.path.join(temp_dir, "count")
+            split_image_by_count(image_path, (2, 3), output_dir=count_dir, overlap=10, overlap_mode='shared')
+            window = load_overlap_window(os.path.join(count_dir, "slice_20250403_085000_windows.json"), 0, 1)
+            self.assertEqual(window.tobytes(), image.crop((83, 0, 176, 95)).tobytes())
+
+            with self.assertRaises(ValueError):
+                split_image_by_size(image_path, (100, 100), output_dir=temp_dir, overlap_mode='share')
+            with self.assertRaises(ValueError):
+                split_image_by_size(image_path, (100, 100), output_dir=temp_dir, overlap=100, overlap_mode='shared')
+            with self.assertRaises(ValueError):
+                split_image_by_size(image_path, (100, 100), output_dir=temp_dir, overlap_mode='shared',
+                                    region=(0, 0, 10, 10))
+
+    def test_split_image_by_size_sink(self):
+        """split_image_by_size関数の出力先（辞書、関数）のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.new("RGB", (300, 200), (255, 255, 255))
+            image.paste(Image.effect_mandelbrot((150, 200), (-2, -1, 1, 1), 50).convert("RGB"))
+            image_path = os.path.join(temp_dir, "input.png")
+            image.save(image_path)
+            output_dir = os.path.join(temp_dir, "output")
+            with patch('core.datetime') as mock_datetime:
+                mock_datetime.datetime.now.return_value = datetime.datetime(2024, 1, 1)
+                files = split_image_by_size(image_path, (100, 100), output_dir=output_dir, skip_blank=True)
+
+                for workers in [1, 3]:
+                    with self.subTest(workers=workers):
+                        tiles = {}
+                        names = split_image_by_size(
+                            image_path, (100, 100), output_dir=os.path.join(temp_dir, "unused"),
+                            skip_blank=True, workers=workers, sink=tiles
+                        )
+
+                        # 出力内容はディレクトリへの出力と一致し、マニフェストも出力先に追加
+                        self.assertEqual(names, [os.path.basename(path) for path in files])
+                        self.assertEqual(sorted(tiles), sorted(os.listdir(output_dir)))
+                        for name in tiles:
+                            with open(os.path.join(output_dir, name), "rb") as f:
+                                self.assertEqual(tiles[name], f.read())
+                        self.assertFalse(os.path.exists(os.path.join(temp_dir, "unused")))
+
+                calls = []
+                split_image_by_size(image_path, (100, 100), sink=lambda *args: calls.append(args))
+                self.assertEqual([(row, col) for _, _, row, col in calls],
+                                 [(row, col) for row in range(2) for col in range(3)])
+
+            for options in [{'cache': True}, {'container': 'zip'}]:
+                with self.subTest(options=options):
+                    with self.assertRaises(ValueError):
+                        split_image_by_size(image_path, (100, 100), output_dir=temp_dir, sink={}, **options)
+
+    def test_split_image_by_size_skip_blank_and_dedupe(self):
+        """split_image_by_size関数の空白タイルのスキップと重複排除のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 透明な余白、単色の領域、同一の模様を持つ画像を作成
+            image = Image.new("RGBA", (400, 100), (0, 0, 0, 0))
+            image.paste((255, 255, 255, 255), (100, 0, 200, 100))
+            pattern = Image.effect_mandelbrot((100, 100), (-2, -1, 1, 1), 50).convert("RGBA")
+            image.paste(pattern, (200, 0))
+            image.paste(pattern, (300, 0))
+            image_path = os.path.join(temp_dir, "input.png")
+            image.save(image_path)
+            output_dir = os.path.join(temp_dir, "output")
+
+            # 空白タイルをスキップし、重複を排除して分割
+            result = split_image_by_size(
+                image_path, (100, 100), output_dir=output_dir, prefix="test", skip_blank=True, dedupe=True
+            )
+
+            # 模様のタイルだけが1回保存されることを確認
+            self.assertEqual(result, [os.path.join(output_dir, f"test_{self.test_timestamp}_000_002.png")])
+
+            # マニフェストにすべてのタイルが記録されることを確認
+            manifest_path = os.path.join(output_dir, f"test_{self.test_timestamp}_manifest.json")
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            tiles = {(tile["row"], tile["col"]): tile for tile in manifest["tiles"]}
+            self.assertEqual(len(tiles), 4)
+            self.assertIsNone(tiles[(0, 0)]["file"])
+            self.assertEqual(tiles[(0, 0)]["fill"], [0, 0, 0, 0])
+            self.assertIsNone(tiles[(0, 1)]["file"])
+            self.assertEqual(tiles[(0, 1)]["fill"], [255, 255, 255, 255])
+            self.assertEqual(tiles[(0, 2)]["file"], f"test_{self.test_timestamp}_000_002.png")
+            self.assertEqual(tiles[(0, 3)]["file"], f"test_{self.test_timestamp}_000_002.png")
+            self.assertEqual(tiles[(0, 3)]["box"], [300, 0, 400, 100])
+
+    def test_split_image_by_size_cache(self):
+        """split_image_by_size関数のキャッシュモードのテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            image = Image.effect_mandelbrot((200, 200), (-2, -1, 1, 1), 50).convert("RGB")
+            image.save(image_path)
+            output_dir = os.path.join(temp_dir, "output")
+
+            # 1回目の分割
+            first_files = split_image_by_size(image_path, (100, 100), output_dir=output_dir, cache=True)
+            self.assertEqual(len(first_files), 4)
+            self.assertTrue(os.path.isfile(os.path.join(output_dir, "slice_cache.json")))
+
+            # 出力ファイルの更新日時を過去に設定
+            for path in first_files:
+                os.utime(path, ns=(0, 0))
+
+            # 同じ条件で再実行した場合はデコードせずに前回の結果を返す
+            with patch('core.iter_tiles') as mock_iter_tiles:
+                second_files = split_image_by_size(image_path, (100, 100), output_dir=output_dir, cache=True)
+                mock_iter_tiles.assert_not_called()
+            self.assertEqual(second_files, first_files)
+
+            # 画像の下半分だけを変更
+            image.paste((255, 0, 0), (0, 150, 200, 200))
+            image.save(image_path)
+
+            # 変更されたタイルだけが再生成されることを確認
+            third_files = split_image_by_size(image_path, (100, 100), output_dir=output_dir, cache=True)
+            self.assertEqual(third_files, first_files)
+            mtimes = [os.stat(path).st_mtime_ns for path in third_files]
+            self.assertEqual(mtimes[:2], [0, 0])
+            self.assertNotEqual(mtimes[2], 0)
+            self.assertNotEqual(mtimes[3], 0)
+
+            # パラメータが変わった場合は全体を再生成
+            fourth_files = split_image_by_size(image_path, (50, 50), output_dir=output_dir, cache=True)
+            self.assertEqual(len(fourth_files), 16)
+
+    def test_split_image_by_size_cache_with_dedupe(self):
+        """split_image_by_size関数のキャッシュと重複排除の同時指定のテスト"""
+        with self.assertRaises(ValueError):
+            split_image_by_size("test.png", (100, 100), cache=True, dedupe=True)
+
+    def test_split_image_by_size_container(self):
+        """split_image_by_size関数のコンテナ出力のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            image = Image.effect_mandelbrot((200, 100), (-2, -1, 1, 1), 50).convert("RGB")
+            image.save(image_path)
+            output_dir = os.path.join(temp_dir, "output")
+
+            for container_format in ["zip", "mbtiles"]:
+                with self.subTest(container_format=container_format):
+                    # コンテナに書き出す
+                    result = split_image_by_size(
+                        image_path, (100, 100), output_dir=output_dir, container=container_format, workers=2
+                    )
+
+                    # 出力ディレクトリにはコンテナファイルだけが作成されることを確認
+                    container_path = os.path.join(output_dir, f"slice_{self.test_timestamp}.{container_format}")
+                    self.assertTrue(os.path.isfile(container_path))
+                    self.assertEqual(result[1], os.path.join(container_path, f"slice_{self.test_timestamp}_000_001.png"))
+
+                    # 行・列を指定してタイルを読み出せることを確認
+                    with open_tile_container(container_path) as container:
+                        self.assertEqual(container.positions(), [(0, 0), (0, 1)])
+                        tile = container.get_image(0, 1)
+                        self.assertEqual(tile.tobytes(), image.crop((100, 0, 200, 100)).tobytes())
+
+                    # 重複排除したタイルはコンテナから読み出せないためエラー
+                    with self.assertRaises(ValueError):
+                        split_image_by_size(
+                            image_path, (100, 100), output_dir=output_dir, container=container_format, dedupe=True
+                        )
+
+    def test_split_image_by_size_invalid_workers(self):
+        """split_image_by_size関数の無効なワーカー数のテスト"""
+        with self.assertRaises(ValueError):
+            split_image_by_size("test.png", (100, 100), workers=-1)
+
+    def test_iter_tiles(self):
+        """iter_tiles関数のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            image = Image.effect_mandelbrot((250, 180), (-2, -1, 1, 1), 50).convert("RGB")
+            image.save(image_path)
+
+            # タイルを画像として取得
+            tiles = list(iter_tiles(image_path, (100, 100), overlap=20))
+
+            # 3行x4列のタイルが行優先で返されることを確認
+            self.assertEqual([(row, col) for row, col, _, _ in tiles], [(r, c) for r in range(3) for c in range(4)])
+            self.assertEqual(tiles[0][2], (0, 0, 100, 100))
+            self.assertEqual(tiles[-1][2], (240, 160, 250, 180))
+
+            # タイルの内容が元画像のクロップと一致することを確認
+            for _, _, box, tile in tiles:
+                self.assertEqual(tile.tobytes(), image.crop(box).tobytes())
+
+            # ストリーミングモードでも同じタイルが得られることを確認
+            for (_, _, box, tile), (_, _, stream_box, stream_tile) in zip(
+                tiles, iter_tiles(image_path, (100, 100), overlap=20, stream=True)
+            ):
+                self.assertEqual(box, stream_box)
+                self.assertEqual(tile.tobytes(), stream_tile.tobytes())
+
+            # フォーマットを指定した場合はエンコード済みのバイト列が返されることを確認
+            row, col, box, data = next(iter_tiles(image_path, (100, 100), format="png"))
+            self.assertIsInstance(data, bytes)
+            self.assertTrue(data.startswith(b"\x89PNG"))
+
+    def test_get_tile(self):
+        """get_tile関数のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image = Image.effect_mandelbrot((250, 180), (-2, -1, 1, 1), 50).convert("RGB")
+            paths = {
+                'png': os.path.join(temp_dir, "input.png"),
+                'tif': os.path.join(temp_dir, "input.tif"),
+                'npy': os.path.join(temp_dir, "input.npy"),
+            }
+            image.save(paths['png'])
+            save_tiled_tiff(image, paths['tif'], tile_size=(64, 64))
+            save_npy(image, paths['npy'])
+
+            # 分割したときと同じ範囲のタイルが得られることを確認
+            tiles = {(row, col): (box, tile) for row, col, box, tile in iter_tiles(paths['png'], (100, 100), overlap=20)}
+            cache = core.SourceCache()
+            for name, path in paths.items():
+                for (row, col), (box, tile) in tiles.items():
+                    with self.subTest(format=name, row=row, col=col):
+                        result = core.get_tile(path, (100, 100), 20, row, col, cache=cache)
+                        self.assertEqual(result.size, (box[2] - box[0], box[3] - box[1]))
+                        self.assertEqual(result.tobytes(), tile.tobytes())
+
+            # 任意の位置を読み込める形式はキャッシュを使用せず、PNGは先頭の行より下のタイルで全体をキャッシュ
+            self.assertEqual(cache.stats()['entries'], 1)
+
+            # 分割数を指定した場合の範囲がsplit_image_by_countと同じになることを確認
+            tile = core.get_tile(paths['png'], None, row=2, col=1, grid_size=(3, 3))
+            self.assertEqual(tile.tobytes(), image.crop((83, 120, 166, 180)).tobytes())
+
+            # 部分的に読み込めない形式は画像全体をデコードしてキャッシュし、2回目以降は再利用
+            jpeg_path = os.path.join(temp_dir, "input.jpg")
+            image.save(jpeg_path, quality=95)
+            with Image.open(jpeg_path) as decoded:
+                expected = decoded.convert("RGB").crop((160, 0, 250, 100))
+            jpeg_cache = core.SourceCache()
+            jpeg_stats = SplitStats()
+            for _ in range(3):
+                tile = core.get_tile(jpeg_path, (100, 100), 20, 0, 2, cache=jpeg_cache, stats=jpeg_stats)
+                self.assertEqual(tile.tobytes(), expected.tobytes())
+            stats = jpeg_cache.stats()
+            self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (1, 2, 1))
+            # 2回目以降の呼び出しではデコードしない
+            self.assertEqual(jpeg_stats.stages['decode']['count'], 1)
+
+            # PNGの下端のタイルを繰り返し取得する場合はキャッシュを使用し、先頭の行のタイルは展開しない
+            png_cache = core.SourceCache()
+            png_stats = SplitStats()
+            for _ in range(2):
+                tile = core.get_tile(paths['png'], (100, 100), 20, 2, 3, cache=png_cache, stats=png_stats)
+                self.assertEqual(tile.tobytes(), image.crop((240, 160, 250, 180)).tobytes())
+            self.assertEqual(png_stats.stages['decode']['count'], 1)
+            core.get_tile(paths['png'], (100, 100), 20, 0, 1, cache=png_cache, stats=png_stats)
+            stats = png_cache.stats()
+            self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (1, 1, 1))
+            self.assertEqual(png_stats.stages['decode']['count'], 2)
+
+            # フォーマットを指定した場合はエンコード済みのバイト列が返されることを確認
+            data = core.get_tile(paths['png'], (100, 100), row=1, col=1, format="webp")
+            self.assertTrue(data.startswith(b"RIFF"))
+
+            # グリッドの範囲外やサイズと分割数の同時指定はエラー
+            with self.assertRaises(ValueError):
+                core.get_tile(paths['png'], (100, 100), 20, 3, 0)
+            with self.assertRaises(ValueError):
+                core.get_tile(paths['png'], (100, 100), row=0, col=0, grid_size=(2, 2))
+
     @patch('core.Image.open')
-    def test_split_image_by_count(self, mock_image_open, mock_split_by_size):
-        """split_image_by_count関数のテスト"""
+    def test_iter_tiles_invalid_overlap(self, mock_image_open):
+        """iter_tiles関数の無効なオーバーラップのテスト"""
         # モック画像の設定
         mock_img = MagicMock()
         mock_img.size = (1000, 800)
         mock_image_open.return_value.__enter__.return_value = mock_img
 
+        with self.assertRaises(ValueError):
+            next(iter_tiles("test.png", (100, 100), overlap=100))
+
+    @patch('core.split_image_by_size')
+    @patch('core.Image.open')
+    def test_split_image_by_count(self, mock_image_open, mock_split_by_size):
+        """split_image_by_count関数のテスト"""
         # split_image_by_sizeの戻り値を設定
         expected_result = ["file1.png", "file2.png", "file3.png", "file4.png"]
         mock_split_by_size.return_value = expected_result
@@ -103,14 +837,15 @@ class TestCore(unittest.TestCase):
             overlap=0
         )
 
-        # 画像が開かれたことを確認
-        mock_image_open.assert_called_once_with("test.png")
+        # サイズを取得するために画像を開かないことを確認
+        mock_image_open.assert_not_called()
 
-        # split_image_by_sizeが正しく呼び出されたことを確認
+        # split_image_by_sizeに分割数がそのまま渡されたことを確認
         mock_split_by_size.assert_called_once()
         args, kwargs = mock_split_by_size.call_args
         self.assertEqual(kwargs["image_path"], "test.png")
-        self.assertEqual(kwargs["tile_size"], (500, 400))  # 1000/2, 800/2
+        self.assertIsNone(kwargs["tile_size"])
+        self.assertEqual(kwargs["grid_size"], (2, 2))
         self.assertEqual(kwargs["output_dir"], "output")
         self.assertEqual(kwargs["prefix"], "test")
         self.assertEqual(kwargs["format"], "png")
@@ -120,6 +855,198 @@ class TestCore(unittest.TestCase):
         # 結果が正しいことを確認
         self.assertEqual(result, expected_result)
 
+    def test_split_image_by_count_exact_grid(self):
+        """split_image_by_count関数の余りを配分した分割のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "input.png")
+            image = Image.effect_mandelbrot((1001, 200), (-2, -1, 1, 1), 50).convert("RGB")
+            image.save(image_path)
+
+            for overlap in [0, 5]:
+                with self.subTest(overlap=overlap):
+                    output_dir = os.path.join(temp_dir, f"overlap_{overlap}")
+                    files = split_image_by_count(image_path, (3, 3), output_dir=output_dir, overlap=overlap)
+
+                    # 端の細いタイルを作らず、ちょうど3x3のタイルを出力
+                    self.assertEqual(len(files), 9)
+                    widths = []
+                    for path in files[:3]:
+                        with Image.open(path) as tile:
+                            widths.append(tile.width)
+                    self.assertEqual(widths, [333 + overlap, 334 + overlap, 334])
+
+                    # 各タイルは元の画像の対応する範囲と一致
+                    with Image.open(files[4]) as tile:
+                        self.assertEqual(tile.tobytes(), image.crop((333, 66, 667 + overlap, 133 + overlap)).tobytes())
+
+            with self.assertRaises(ValueError):
+                split_image_by_count(image_path, (3, 1002), output_dir=temp_dir)
+
+    def test_split_image_frames(self):
+        """split_image_frames関数の複数フレームの分割のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
+            pages = [Image.new("RGB", (200, 100), color) for color in colors]
+            tiff_path = os.path.join(temp_dir, "stack.tif")
+            pages[0].save(tiff_path, save_all=True, append_images=pages[1:])
+
+            for frame_workers in [1, 3]:
+                with self.subTest(frame_workers=frame_workers):
+                    output_dir = os.path.join(temp_dir, f"workers_{frame_workers}")
+                    stats = SplitStats()
+                    files = split_image_frames(
+                        tiff_path, (100, 100), output_dir=output_dir, prefix="page",
+                        frame_workers=frame_workers, stats=stats
+                    )
+
+                    # フレーム番号を含むファイル名でフレーム順に出力し、各フレームを1回だけデコード
+                    self.assertEqual(len(files), 8)
+                    self.assertEqual(stats.stages['decode']['count'], 4)
+                    for index, color in enumerate(colors):
+                        for path in files[index * 2:index * 2 + 2]:
+                            self.assertTrue(os.path.basename(path).startswith(f"page_f{index:04d}_"))
+                            with Image.open(path) as tile:
+                                self.assertEqual(tile.convert("RGB").getpixel((0, 0)), color)
+
+            # 範囲を指定した場合はそのフレームだけを分割（範囲が枚数を超える場合は最後まで）
+            files = split_image_frames(tiff_path, grid_size=(1, 1), frames=(2, 9),
+                                       output_dir=os.path.join(temp_dir, "range"))
+            self.assertEqual([os.path.basename(path)[:11] for path in files], ["slice_f0002", "slice_f0003"])
+
+            with self.assertRaises(ValueError):
+                split_image_frames(tiff_path, (100, 100), frames=(4, 5), output_dir=temp_dir)
+            with self.assertRaises(ValueError):
+                split_image_frames(tiff_path, (100, 100), output_dir=temp_dir, cache=True)
+
+    def test_split_image_quadtree(self):
+        """split_image_quadtree関数のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 左上の128x128だけに模様がある白い画像
+            image = Image.new("RGB", (512, 300), (255, 255, 255))
+            image.paste(Image.effect_mandelbrot((128, 128), (-2, -1, 1, 1), 50).convert("RGB"))
+            image_path = os.path.join(temp_dir, "input.png")
+            image.save(image_path)
+
+            for criterion in ['variance', 'edges']:
+                with self.subTest(criterion=criterion):
+                    output_dir = os.path.join(temp_dir, criterion)
+                    files = split_image_quadtree(
+                        image_path, output_dir, max_tile_size=256, min_tile_size=32, criterion=criterion
+                    )
+                    with open(os.path.join(output_dir, "slice_20250403_085000_quadtree.json"), encoding="utf-8") as f:
+                        manifest = json.load(f)
+
+                    # 模様のある部分だけを最小のタイルまで分割し、余白は大きなタイルのまま
+                    boxes = [tuple(tile['box']) for tile in manifest['tiles']]
+                    self.assertEqual(len(files), len(boxes))
+                    self.assertIn((256, 0, 512, 256), boxes)
+                    self.assertIn((0, 256, 256, 300), boxes)
+                    self.assertIn((0, 0, 32, 32), boxes)
+                    self.assertLess(len(boxes), (512 // 32) * (300 // 32))
+
+                    # タイルは重ならずに画像全体を覆い、各タイルは元の画像の範囲と一致
+                    self.assertEqual(sum((r - l) * (b - u) for l, u, r, b in boxes), 512 * 300)
+                    for path, box in zip(files, boxes):
+                        with Image.open(path) as tile:
+                            self.assertEqual(tile.tobytes(), image.crop(box).tobytes())
+
+            with self.assertRaises(ValueError):
+                split_image_quadtree(image_path, temp_dir, max_tile_size=32, min_tile_size=64)
+            with self.assertRaises(ValueError):
+                split_image_quadtree(image_path, temp_dir, criterion='entropy')
+
+    def test_split_image_pyramid(self):
+        """split_image_pyramid関数のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成
+            image_path = os.path.join(temp_dir, "input.png")
+            Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("P").save(image_path)
+
+            # Deep Zoom形式で出力
+            dzi_files = split_image_pyramid(image_path, temp_dir, prefix="zoom", tile_size=128, overlap=1)
+
+            # 最大解像度の階層（9: 2^9 >= 300）から1x1の階層0まで出力されることを確認
+            tiles_dir = os.path.join(temp_dir, "zoom_files")
+            self.assertEqual(sorted(os.listdir(tiles_dir), key=int), [str(level) for level in range(10)])
+            self.assertEqual(sorted(os.listdir(os.path.join(tiles_dir, "9"))), sorted(
+                f"{col}_{row}.png" for row in range(2) for col in range(3)
+            ))
+            self.assertEqual(dzi_files[0], os.path.join(tiles_dir, "9", "0_0.png"))
+
+            # 内側の辺だけがオーバーラップ分広がることを確認
+            with Image.open(os.path.join(tiles_dir, "9", "1_0.png")) as tile:
+                self.assertEqual(tile.size, (130, 129))
+            with Image.open(os.path.join(tiles_dir, "8", "0_0.png")) as tile:
+                self.assertEqual(tile.size, (129, 100))
+            with Image.open(os.path.join(tiles_dir, "0", "0_0.png")) as tile:
+                self.assertEqual(tile.size, (1, 1))
+
+            # 記述ファイルが作成されることを確認
+            with open(os.path.join(temp_dir, "zoom.dzi"), encoding="utf-8") as f:
+                descriptor = f.read()
+            self.assertIn('TileSize="128"', descriptor)
+            self.assertIn('<Size Width="300" Height="200"/>', descriptor)
+
+            # XYZ形式では画像全体が1タイルに収まる階層をz=0として出力
+            xyz_files = split_image_pyramid(image_path, temp_dir, prefix="xyz", tile_size=128, layout="xyz")
+            self.assertEqual(sorted(os.listdir(os.path.join(temp_dir, "xyz"))), ["0", "1", "2"])
+            self.assertEqual(xyz_files[-1], os.path.join(temp_dir, "xyz", "0", "0", "0.png"))
+            with Image.open(xyz_files[-1]) as tile:
+                self.assertEqual(tile.size, (75, 50))
+
+    def test_split_image_pyramid_invalid_options(self):
+        """split_image_pyramid関数の無効なオプションのテスト"""
+        with self.assertRaises(ValueError):
+            split_image_pyramid("test.png", layout="invalid")
+        with self.assertRaises(ValueError):
+            split_image_pyramid("test.png", tile_size=0)
+        with self.assertRaises(ValueError):
+            split_image_pyramid("test.png", overlap=1, layout="xyz")
+
+    def test_split_images(self):
+        """split_images関数のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # テスト用の画像を作成（同名ファイルを含む）
+            os.makedirs(os.path.join(temp_dir, "sub"))
+            image_paths = [
+                os.path.join(temp_dir, "a.png"),
+                os.path.join(temp_dir, "missing.png"),
+                os.path.join(temp_dir, "sub", "a.png"),
+            ]
+            Image.new("RGB", (200, 100), "red").save(image_paths[0])
+            Image.new("RGB", (100, 100), "blue").save(image_paths[2])
+            output_dir = os.path.join(temp_dir, "output")
+
+            # 画像単位とタイル単位で並列に分割
+            results = split_images(
+                image_paths, tile_size=(100, 100), output_dir=output_dir, workers=2, file_workers=2
+            )
+
+            # 入力順に結果が返されることを確認
+            self.assertEqual([result["path"] for result in results], image_paths)
+
+            # 成功した画像のタイル数を確認
+            self.assertIsNone(results[0]["error"])
+            self.assertEqual(len(results[0]["output_files"]), 2)
+            self.assertIsNone(results[2]["error"])
+            self.assertEqual(len(results[2]["output_files"]), 1)
+
+            # 失敗した画像がエラーとして記録されることを確認
+            self.assertIsNotNone(results[1]["error"])
+            self.assertEqual(results[1]["output_files"], [])
+
+            # 同名の入力ファイルの出力が衝突しないことを確認
+            self.assertEqual(len(os.listdir(output_dir)), 3)
+            self.assertTrue(os.path.basename(results[0]["output_files"][0]).startswith("slice_a_1_"))
+            self.assertTrue(os.path.basename(results[2]["output_files"][0]).startswith("slice_a_2_"))
+
+    def test_split_images_requires_size_or_count(self):
+        """split_images関数のサイズと分割数の指定のテスト"""
+        with self.assertRaises(ValueError):
+            split_images(["test.png"])
+        with self.assertRaises(ValueError):
+            split_images(["test.png"], tile_size=(100, 100), grid_size=(2, 2))
+
     @patch('core.Image.open')
     def test_get_image_info(self, mock_image_open):
         """get_image_info関数のテスト"""
@@ -0,0 +1,79 @@
+"""
+ChopImg - encoder.pyのテスト
+"""
+
+import unittest
+import os
+import io
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core import _get_save_options
+from encoder import PNG_AUTO_CANDIDATES, choose_png_options, open_tile_encoder
+
+
+class TestEncoder(unittest.TestCase):
+    """encoder.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+        # 端数のある範囲と、左上以外の範囲
+        self.boxes = [(0, 0, 64, 64), (250, 150, 301, 203), (17, 33, 81, 57)]
+
+    def assert_same_as_save(self, image, format):
+        """高速エンコーダの出力がクロップしてImage.saveで保存した結果と一致することを確認"""
+        save_format, save_options = _get_save_options(format, 80)
+        encoder = open_tile_encoder(image, save_format, save_options)
+        self.assertIsNotNone(encoder)
+
+        for box in self.boxes:
+            buffer = io.BytesIO()
+            image.crop(box).save(buffer, format=save_format, **save_options)
+            self.assertEqual(encoder.encode(image, box), buffer.getvalue())
+
+    def test_png(self):
+        """PNGの高速エンコードのテスト"""
+        palette_image = self.image.quantize(6)
+        palette_image.info["transparency"] = 2
+        for mode, image in [("RGB", self.image), ("RGBA", self.image.convert("RGBA")), ("L", self.image.convert("L")),
+                            ("1", self.image.convert("1")), ("P", palette_image)]:
+            with self.subTest(mode=mode):
+                self.assert_same_as_save(image, "png")
+
+    def test_png_filter_none(self):
+        """行フィルタなしのPNGのエンコードのテスト"""
+        for mode in ["RGB", "RGBA", "L", "1"]:
+            with self.subTest(mode=mode):
+                image = self.image.convert(mode)
+                encoder = open_tile_encoder(image, "PNG", {"compress_level": 1}, "none")
+                self.assertIsNotNone(encoder)
+
+                for box in self.boxes:
+                    with Image.open(io.BytesIO(encoder.encode(image, box))) as tile:
+                        self.assertEqual(tile.mode, mode)
+                        self.assertEqual(tile.tobytes(), image.crop(box).tobytes())
+
+    def test_choose_png_options(self):
+        """PNGの圧縮設定の自動選択のテスト"""
+        save_options, png_filter = choose_png_options(self.image, (64, 64))
+        self.assertIn((save_options, png_filter), PNG_AUTO_CANDIDATES)
+
+    def test_jpeg(self):
+        """JPEGの高速エンコードのテスト"""
+        for mode in ["RGB", "L", "CMYK"]:
+            with self.subTest(mode=mode):
+                self.assert_same_as_save(self.image.convert(mode), "jpg")
+
+    def test_unsupported(self):
+        """高速エンコーダを使用できない場合のテスト"""
+        # WebPは対象外
+        self.assertIsNone(open_tile_encoder(self.image, *_get_save_options("webp", 80)))
+        # JPEGで保存できないモード
+        self.assertIsNone(open_tile_encoder(self.image.convert("RGBA"), *_get_save_options("jpg", 80)))
+
+
+if __name__ == '__main__':
+    unittest.main()
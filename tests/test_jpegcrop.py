@@ -0,0 +1,255 @@
+"""
+ChopImg - jpegcrop.pyのテスト
+"""
+
+import unittest
+import os
+import io
+import re
+import struct
+import tempfile
+from PIL import Image, ImageChops
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from jpegcrop import JpegCropper, open_jpeg_cropper
+
+
+def _read_coefficients(data):
+    """
+    ハフマン符号化のシーケンシャルJPEG（1スキャン）を量子化されたDCT係数まで復号します。
+
+    jpegcropとは独立に、ビット単位で素直に復号します。
+
+    Returns:
+        {'size': (幅, 高さ), 'mcu_size': (幅, 高さ),
+         'components': {成分ID: (水平サンプリング係数, 垂直サンプリング係数, ブロックの係数の2次元リスト)}}
+    """
+    position = 2
+    tables = {}
+    restart_interval = 0
+    while True:
+        marker = data[position + 1]
+        length, = struct.unpack(">H", data[position + 2:position + 4])
+        payload = data[position + 4:position + 2 + length]
+        position += 2 + length
+        if marker in (0xC0, 0xC1):
+            height, width = struct.unpack(">HH", payload[1:5])
+            sampling = {payload[6 + i * 3]: (payload[7 + i * 3] >> 4, payload[7 + i * 3] & 15) for i in range(payload[5])}
+        elif marker == 0xC4:
+            offset = 0
+            while offset < len(payload):
+                counts = payload[offset + 1:offset + 17]
+                symbols = iter(payload[offset + 17:offset + 17 + sum(counts)])
+                codes = {}
+                code = 0
+                for code_length in range(1, 17):
+                    for _ in range(counts[code_length - 1]):
+                        codes[code_length, code] = next(symbols)
+                        code += 1
+                    code <<= 1
+                tables[payload[offset] >> 4, payload[offset] & 15] = codes
+                offset += 17 + sum(counts)
+        elif marker == 0xDD:
+            restart_interval, = struct.unpack(">H", payload[:2])
+        elif marker == 0xDA:
+            scan = [(payload[1 + i * 2], payload[2 + i * 2] >> 4, payload[2 + i * 2] & 15) for i in range(payload[0])]
+            break
+
+    end = re.compile(b"\xff(?![\x00\xd0-\xd7])").search(data, position).start()
+    intervals = [
+        "".join(f"{byte:08b}" for byte in interval.replace(b"\xff\x00", b"\xff"))
+        for interval in re.split(b"\xff[\xd0-\xd7]", data[position:end])
+    ]
+
+    if len(scan) == 1:
+        sampling = {scan[0][0]: (1, 1)}
+    max_horizontal = max(h for h, _ in sampling.values())
+    max_vertical = max(v for _, v in sampling.values())
+    mcu_cols = -(-width // (8 * max_horizontal))
+    mcu_rows = -(-height // (8 * max_vertical))
+    blocks = {
+        component_id: [[None] * (mcu_cols * h) for _ in range(mcu_rows * v)]
+        for component_id, (h, v) in sampling.items()
+    }
+
+    state = {"bits": "", "position": 0}
+
+    def read(count):
+        value = int(state["bits"][state["position"]:state["position"] + count] or "0", 2)
+        state["position"] += count
+        return value
+
+    def decode(codes):
+        code = 0
+        for code_length in range(1, 17):
+            code = code << 1 | read(1)
+            if (code_length, code) in codes:
+                return codes[code_length, code]
+        raise ValueError("invalid Huffman code")
+
+    def extend(size):
+        value = read(size)
+        return value if size == 0 or value >> (size - 1) else value - (1 << size) + 1
+
+    predictions = {}
+    for mcu in range(mcu_rows * mcu_cols):
+        if mcu == 0 or (restart_interval and mcu % restart_interval == 0):
+            state["bits"] = intervals[mcu // restart_interval if restart_interval else 0]
+            state["position"] = 0
+            predictions = {component_id: 0 for component_id, _, _ in scan}
+        mcu_row, mcu_col = divmod(mcu, mcu_cols)
+        for component_id, dc_table, ac_table in scan:
+            h, v = sampling[component_id]
+            for y in range(v):
+                for x in range(h):
+                    coefficients = [0] * 64
+                    predictions[component_id] += extend(decode(tables[0, dc_table]))
+                    coefficients[0] = predictions[component_id]
+                    index = 1
+                    while index < 64:
+                        symbol = decode(tables[1, ac_table])
+                        if symbol == 0x00:
+                            break
+                        index += symbol >> 4
+                        coefficients[index] = extend(symbol & 15)
+                        index += 1
+                    blocks[component_id][mcu_row * v + y][mcu_col * h + x] = coefficients
+
+    return {
+        'size': (width, height),
+        'mcu_size': (8 * max_horizontal, 8 * max_vertical),
+        'components': {component_id: (*sampling[component_id], blocks[component_id]) for component_id in blocks}
+    }
+
+
+class TestJpegCrop(unittest.TestCase):
+    """jpegcrop.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.image = Image.effect_mandelbrot((300, 200), (-2, -1, 1, 1), 50).convert("RGB")
+        # 画像の端で終わる範囲を含むタイル
+        self.boxes = [(x, y, min(x + 64, 300), min(y + 64, 200)) for y in range(0, 200, 64) for x in range(0, 300, 64)]
+
+    def encode(self, image, **options):
+        """画像をJPEGにエンコード"""
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90, **options)
+        return buffer.getvalue()
+
+    def test_crop_matches_decoded_pixels(self):
+        """色差信号を間引かないJPEGは、切り出したタイルがデコードした画像と一致することのテスト"""
+        for mode, options in [("L", {}), ("RGB", {"subsampling": 0}), ("CMYK", {}),
+                              ("RGB", {"subsampling": 0, "restart_marker_blocks": 5})]:
+            with self.subTest(mode=mode, options=options):
+                data = self.encode(self.image.convert(mode), **options)
+                cropper = JpegCropper(data, self.boxes)
+                with Image.open(io.BytesIO(data)) as source:
+                    source.load()
+                    for box in self.boxes:
+                        self.assertTrue(cropper.can_crop(box))
+                        with Image.open(io.BytesIO(cropper.crop(box))) as tile:
+                            self.assertEqual(tile.size, (box[2] - box[0], box[3] - box[1]))
+                            self.assertEqual(tile.tobytes(), source.crop(box).tobytes())
+
+    def test_crop_keeps_coefficients(self):
+        """切り出したタイルのDCT係数と量子化テーブルが元画像と一致することのテスト"""
+        for mode, options in [("L", {}), ("RGB", {"subsampling": 0}), ("RGB", {"subsampling": 1}),
+                              ("RGB", {"subsampling": 2, "restart_marker_blocks": 7}), ("CMYK", {}),
+                              ("RGB", {"subsampling": 2, "optimize": True})]:
+            with self.subTest(mode=mode, options=options):
+                data = self.encode(self.image.convert(mode), **options)
+                source = _read_coefficients(data)
+                mcu_width, mcu_height = source['mcu_size']
+                boxes = [(x, y, min(x + 48, 300), min(y + 48, 200)) for y in range(0, 200, 48) for x in range(0, 300, 48)]
+                cropper = JpegCropper(data, boxes)
+                with Image.open(io.BytesIO(data)) as source_image:
+                    quantization = source_image.quantization
+
+                cropped = 0
+                for box in boxes:
+                    if not cropper.can_crop(box):
+                        continue
+                    cropped += 1
+                    tile_data = cropper.crop(box)
+                    tile = _read_coefficients(tile_data)
+                    with Image.open(io.BytesIO(tile_data)) as tile_image:
+                        self.assertEqual(tile_image.quantization, quantization)
+                    self.assertEqual(tile['size'], (box[2] - box[0], box[3] - box[1]))
+
+                    # タイルの各ブロックが元画像の同じ位置のブロックと一致
+                    for component_id, (horizontal, vertical, blocks) in tile['components'].items():
+                        source_blocks = source['components'][component_id][2]
+                        top = box[1] // mcu_height * vertical
+                        left = box[0] // mcu_width * horizontal
+                        for y, row in enumerate(blocks):
+                            self.assertEqual(row, source_blocks[top + y][left:left + len(row)])
+                # 最適化したハフマン符号表以外はすべてのタイルを切り出せる
+                self.assertGreater(cropped, 0)
+                if not options.get("optimize"):
+                    self.assertEqual(cropped, len(boxes))
+
+    def test_crop_part_of_image(self):
+        """一部の範囲だけを切り出す場合（リスタート区間の読み飛ばし）のテスト"""
+        for options in [{}, {"restart_marker_rows": 1}, {"restart_marker_blocks": 3}]:
+            with self.subTest(options=options):
+                data = self.encode(self.image, subsampling=2, **options)
+                source = _read_coefficients(data)
+                boxes = [(64, 96, 128, 160), (256, 192, 300, 200)]
+                cropper = JpegCropper(data, boxes)
+                for box in boxes:
+                    tile = _read_coefficients(cropper.crop(box))
+                    for component_id, (horizontal, vertical, blocks) in tile['components'].items():
+                        source_blocks = source['components'][component_id][2]
+                        top, left = box[1] // 16 * vertical, box[0] // 16 * horizontal
+                        for y, row in enumerate(blocks):
+                            self.assertEqual(row, source_blocks[top + y][left:left + len(row)])
+
+    def test_crop_subsampled(self):
+        """色差信号を間引いたJPEGの切り出しのテスト"""
+        data = self.encode(self.image, subsampling=2, restart_marker_rows=1)
+        boxes = [(0, 0, 64, 64), (64, 64, 128, 128), (256, 192, 300, 200)]
+        cropper = JpegCropper(data, boxes)
+        self.assertEqual(cropper.mcu_size, (16, 16))
+
+        with Image.open(io.BytesIO(data)) as source:
+            source.load()
+            for box in boxes:
+                with Image.open(io.BytesIO(cropper.crop(box))) as tile:
+                    # 色差信号の補間がタイルの端で異なるため内側だけを比較
+                    inner = (2, 2, tile.size[0] - 2, tile.size[1] - 2)
+                    difference = ImageChops.difference(tile.crop(inner), source.crop(box).crop(inner))
+                    self.assertEqual(max(high for _, high in difference.getextrema()), 0)
+
+    def test_unaligned_boxes(self):
+        """MCUの境界に揃っていない範囲は切り出せないことのテスト"""
+        data = self.encode(self.image, subsampling=2)
+        cropper = JpegCropper(data, [(0, 0, 64, 64), (8, 0, 72, 64), (0, 0, 100, 64)])
+
+        self.assertTrue(cropper.can_crop((0, 0, 64, 64)))
+        self.assertFalse(cropper.can_crop((8, 0, 72, 64)))
+        self.assertFalse(cropper.can_crop((0, 0, 100, 64)))
+        # 作成時に指定しなかった範囲
+        self.assertFalse(cropper.can_crop((64, 0, 128, 64)))
+
+    def test_open_jpeg_cropper(self):
+        """対応していない画像の場合のテスト"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            png_path = os.path.join(temp_dir, "input.png")
+            self.image.save(png_path)
+            progressive_path = os.path.join(temp_dir, "progressive.jpg")
+            self.image.save(progressive_path, progressive=True)
+            jpeg_path = os.path.join(temp_dir, "input.jpg")
+            self.image.save(jpeg_path)
+
+            self.assertIsNone(open_jpeg_cropper(png_path, self.boxes))
+            self.assertIsNone(open_jpeg_cropper(progressive_path, self.boxes))
+            # 揃った範囲がない場合
+            self.assertIsNone(open_jpeg_cropper(jpeg_path, [(1, 1, 65, 65)]))
+            self.assertIsNotNone(open_jpeg_cropper(jpeg_path, self.boxes))
+
+
+if __name__ == '__main__':
+    unittest.main()
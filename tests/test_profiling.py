@@ -0,0 +1,82 @@
+"""
+ChopImg - profiling.pyのテスト
+"""
+
+import unittest
+import os
+import json
+import tempfile
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from profiling import SplitStats, image_nbytes
+
+
+class TestProfiling(unittest.TestCase):
+    """profiling.pyの関数をテストするクラス"""
+
+    def test_record(self):
+        """工程の記録と集計のテスト"""
+        calls = []
+        stats = SplitStats(callback=lambda stage, seconds, nbytes: calls.append(stage))
+
+        stats.record('encode', 0.5, 100)
+        stats.record('encode', 0.25, 50)
+        with stats.measure('decode', 1000):
+            pass
+
+        self.assertEqual(stats.stages['encode'], {'seconds': 0.75, 'count': 2, 'bytes': 150})
+        self.assertEqual(stats.stages['decode']['bytes'], 1000)
+        self.assertEqual(calls, ['encode', 'encode', 'decode'])
+
+        # 工程は処理順に並ぶ
+        self.assertEqual(list(stats.to_dict()['stages']), ['decode', 'encode'])
+
+    def test_slowest_tiles(self):
+        """遅いタイルの記録のテスト"""
+        stats = SplitStats(slowest=2)
+        for index, seconds in enumerate([0.1, 0.4, 0.2, 0.3]):
+            stats.record_tile(f"tile_{index}.png", seconds, 10)
+
+        self.assertEqual(stats.tiles, 4)
+        self.assertEqual([tile['name'] for tile in stats.slowest_tiles()], ["tile_1.png", "tile_3.png"])
+
+    def test_nested_start_stop(self):
+        """入れ子になったstart/stopのテスト"""
+        stats = SplitStats()
+        stats.start()
+        stats.start()
+        stats.stop()
+        self.assertIsNotNone(stats._started)
+        stats.stop()
+        elapsed = stats.elapsed
+        self.assertGreaterEqual(elapsed, 0.0)
+        self.assertEqual(stats.elapsed, elapsed)
+
+    def test_write_json(self):
+        """JSONへの書き出しのテスト"""
+        stats = SplitStats()
+        stats.record('write', 0.1, 2048)
+        stats.record_tile("tile.png", 0.1, 2048)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "profile.json")
+            stats.write_json(path)
+            with open(path, encoding='utf-8') as f:
+                profile = json.load(f)
+
+        self.assertEqual(profile['tiles'], 1)
+        self.assertEqual(profile['output_bytes'], 2048)
+        self.assertEqual(profile['slowest_tiles'][0]['name'], "tile.png")
+
+    def test_image_nbytes(self):
+        """画素データのバイト数のテスト"""
+        self.assertEqual(image_nbytes(Image.new('RGB', (10, 10))), 300)
+        self.assertEqual(image_nbytes(Image.new('1', (10, 10))), 13)
+        self.assertEqual(image_nbytes(Image.new('I;16', (10, 10))), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+ChopImg - rawsource.pyのテスト
+"""
+
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rawsource import MappedRaster, open_mapped_raster
+from create_test_image import save_npy
+
+
+class TestRawSource(unittest.TestCase):
+    """rawsource.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+        # 画像全体、中央の範囲、右下の端（画素データの末尾）、右上の端
+        self.windows = [(0, 203, 0, 301), (10, 150, 30, 200), (150, 203, 100, 301), (0, 10, 290, 301)]
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def test_read_matches_image(self):
+        """範囲の読み込み結果が元の画像のクロップと一致することのテスト"""
+        cases = [
+            ("rgb.bmp", "RGB", False), ("gray.bmp", "L", True), ("rgb.ppm", "RGB", False),
+            ("gray.pgm", "L", True), ("rgb.tif", "RGB", False), ("rgba.tif", "RGBA", True),
+            ("cmyk.tif", "CMYK", True), ("la.tif", "LA", False), ("rgb.npy", "RGB", False),
+            ("gray.npy", "L", True), ("rgba.npy", "RGBA", True),
+        ]
+        for filename, mode, mapped in cases:
+            with self.subTest(filename=filename):
+                image = self.image.convert(mode)
+                path = os.path.join(self.temp_dir.name, filename)
+                if filename.endswith(".npy"):
+                    save_npy(image, path)
+                else:
+                    image.save(path)
+
+                with open_mapped_raster(path) as raster:
+                    self.assertIsInstance(raster, MappedRaster)
+                    self.assertEqual(raster.size, image.size)
+                    self.assertEqual(raster.mode, mode)
+                    # Pillowの内部形式と同じ格納形式の場合は画像全体をコピーせずに参照
+                    self.assertEqual(raster.image is not None, mapped)
+                    if mapped:
+                        self.assertTrue(raster.image.readonly)
+                        self.assertEqual(raster.image.tobytes(), image.tobytes())
+                    for top, bottom, left, right in self.windows:
+                        band = raster.read(top, bottom, left, right)
+                        self.assertEqual(band.tobytes(), image.crop((left, top, right, bottom)).tobytes())
+
+    def test_npy_header(self):
+        """.npyファイルのヘッダーの読み取りのテスト"""
+        path = os.path.join(self.temp_dir.name, "image.npy")
+        save_npy(self.image, path)
+
+        with open_mapped_raster(path) as raster:
+            self.assertEqual(raster.format, "NPY")
+            self.assertEqual(raster.info, {'shape': [203, 301, 3]})
+            self.assertEqual(raster.offset % 64, 0)
+
+        # Image.openで開く形式と同じ画素数の上限を適用
+        with patch('PIL.Image.MAX_IMAGE_PIXELS', 1000):
+            with self.assertRaises(Image.DecompressionBombError):
+                open_mapped_raster(path)
+            with open_mapped_raster(path, max_pixels=0) as raster:
+                self.assertEqual(raster.size, (301, 203))
+        with self.assertRaises(Image.DecompressionBombError):
+            open_mapped_raster(path, max_pixels=1000)
+
+        # uint8以外の配列、Fortran順の配列には対応しない
+        for header in ["{'descr': '<u2', 'fortran_order': False, 'shape': (2, 2), }",
+                       "{'descr': '|u1', 'fortran_order': True, 'shape': (2, 2), }",
+                       "{'descr': '|u1', 'fortran_order': False, 'shape': (2, 2, 5), }"]:
+            with self.subTest(header=header):
+                with open(path, "wb") as f:
+                    f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode() + bytes(40))
+                self.assertIsNone(open_mapped_raster(path))
+
+    def test_open_mapped_raster_fallback(self):
+        """メモリにマップできないファイルでNoneを返すことのテスト"""
+        paths = {}
+        for filename, options in [("lzw.tif", {'compression': 'tiff_lzw'}), ("image.png", {}),
+                                  ("image.jpg", {}), ("palette.bmp", {})]:
+            paths[filename] = os.path.join(self.temp_dir.name, filename)
+            image = self.image.convert("P") if filename == "palette.bmp" else self.image
+            image.save(paths[filename], **options)
+
+        for filename, path in paths.items():
+            with self.subTest(filename=filename):
+                self.assertIsNone(open_mapped_raster(path))
+        self.assertIsNone(open_mapped_raster(os.path.join(self.temp_dir.name, "missing.bmp")))
+
+        # 画素データが途中で終了しているファイル
+        truncated_path = os.path.join(self.temp_dir.name, "truncated.ppm")
+        self.image.save(truncated_path)
+        with open(truncated_path, "r+b") as f:
+            f.truncate(1000)
+        self.assertIsNone(open_mapped_raster(truncated_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
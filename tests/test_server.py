@@ -0,0 +1,240 @@
+"""
+ChopImg - server.pyのテスト
+"""
+
+import unittest
+import os
+import io
+import json
+import socket
+import tarfile
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from server import ServiceBusy, TileService, create_server, _job_options
+
+
+class TestServer(unittest.TestCase):
+    """server.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, "test.png")
+        Image.new('RGB', (100, 80), color='red').save(self.image_path)
+        self.service = TileService(workers=2, queue_size=2, root=self.temp_dir.name)
+        self.server = create_server(self.service, port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        self.base_url = f"http://{host}:{port}"
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def _request(self, path, data=b"", method="POST"):
+        """リクエストを送信し、(ステータス, Content-Type, 内容)を返します。"""
+        request = urllib.request.Request(self.base_url + path, data=data if method == "POST" else None,
+                                         method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers['Content-Type'], response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers['Content-Type'], e.read()
+
+    def _raw_request(self, request):
+        """ヘッダーを加工したリクエストをそのまま送信し、応答のステータスコードを返します。"""
+        host, port = self.server.server_address[:2]
+        with socket.create_connection((host, port), timeout=5) as client:
+            client.sendall(request)
+            status_line = client.makefile("rb").readline()
+        return int(status_line.split()[1])
+
+    def test_split_path_returns_tar(self):
+        """パスを指定した分割でタイルのtarを返し、2回目はキャッシュを使うテスト"""
+        query = urllib.parse.quote(self.image_path)
+        status, content_type, body = self._request(f"/split?size=50x40&path={query}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, 'application/x-tar')
+        with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+            names = sorted(tar.getnames())
+            self.assertEqual(len(names), 4)
+            self.assertTrue(all(name.startswith("slice_") for name in names))
+            with Image.open(tar.extractfile(names[0])) as tile:
+                self.assertEqual(tile.size, (50, 40))
+
+        self._request(f"/split?count=2x2&format=jpg&path={query}")
+        stats = self.service.status()['cache']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_split_body_to_output_dir(self):
+        """リクエストボディの画像を出力先ディレクトリに分割するテスト"""
+        with open(self.image_path, "rb") as f:
+            data = f.read()
+        output_dir = os.path.join(self.temp_dir.name, "tiles")
+        query = urllib.parse.urlencode({'size': '60x60', 'prefix': 'part', 'output': output_dir})
+        status, content_type, body = self._request(f"/split?{query}", data)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, 'application/json')
+        files = json.loads(body)['files']
+        self.assertEqual(len(files), 4)
+        self.assertEqual(sorted(os.listdir(output_dir)), sorted(os.path.basename(f) for f in files))
+
+    def test_errors(self):
+        """不正なリクエストのテスト"""
+        missing = urllib.parse.quote(os.path.join(self.temp_dir.name, "missing.png"))
+        self.assertEqual(self._request(f"/split?size=50x50&path={missing}")[0], 404)
+        status, _, body = self._request("/split?size=50x50")
+        self.assertEqual(status, 400)
+        self.assertIn('error', json.loads(body))
+        self.assertEqual(self._request("/split?size=50x50&count=2x2", b"x")[0], 400)
+        self.assertEqual(self._request("/split?size=50x50", b"not an image")[0], 400)
+        self.assertEqual(self._request("/unknown")[0], 404)
+
+    def test_request_body_limits(self):
+        """Content-Lengthが不正な場合と、リクエストボディが上限を超える場合のテスト"""
+        for length in [b"abc", b"-5"]:
+            with self.subTest(length=length):
+                request = b"POST /split?size=50x50 HTTP/1.0\r\nContent-Length: " + length + b"\r\n\r\n"
+                self.assertEqual(self._raw_request(request), 400)
+
+        with open(self.image_path, "rb") as f:
+            data = f.read()
+        self.service.max_body = len(data) - 1
+        self.assertEqual(self._request("/split?size=50x50", data)[0], 413)
+        self.service.max_body = len(data)
+        self.assertEqual(self._request("/split?size=50x50", data)[0], 200)
+
+    def test_busy_before_body(self):
+        """混雑時はリクエストボディを読み込まずに503を返すテスト"""
+        started, release = threading.Event(), threading.Event()
+
+        def blocking_run(params, data):
+            started.set()
+            release.wait(5)
+            return 'application/json', b"{}"
+
+        self.service.queue_size = 0
+        with patch.object(self.service, '_run', side_effect=blocking_run):
+            workers = [threading.Thread(target=self.service.split, args=({},)) for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            started.wait(5)
+            # ボディを送らなくても、ヘッダーだけで応答する
+            request = b"POST /split?size=50x50 HTTP/1.0\r\nContent-Length: 1000000\r\n\r\n"
+            self.assertEqual(self._raw_request(request), 503)
+            release.set()
+            for worker in workers:
+                worker.join()
+
+    def test_root(self):
+        """ルートディレクトリの外のパスを拒否するテスト"""
+        root = os.path.join(self.temp_dir.name, "root")
+        os.makedirs(root)
+        Image.new('RGB', (100, 80), color='blue').save(os.path.join(root, "inside.png"))
+        self.service.root = os.path.realpath(root)
+
+        # ルートからの相対パスと、ルート以下の出力先は使用できる
+        query = urllib.parse.urlencode({'size': '50x40', 'path': "inside.png", 'output': "tiles"})
+        status, _, body = self._request(f"/split?{query}")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(os.listdir(os.path.join(root, "tiles"))), 4)
+
+        for params in [{'path': self.image_path}, {'path': "../test.png"},
+                       {'path': "inside.png", 'output': self.temp_dir.name}]:
+            with self.subTest(params=params):
+                query = urllib.parse.urlencode({'size': '50x40', **params})
+                self.assertEqual(self._request(f"/split?{query}")[0], 403)
+
+        with self.assertRaises(ValueError):
+            TileService(root=os.path.join(self.temp_dir.name, "missing"))
+
+        # 指定しない場合は作業ディレクトリ以下に限る
+        self.assertEqual(TileService().root, os.path.realpath(os.getcwd()))
+
+    def test_health(self):
+        """サービスの状態を返すテスト"""
+        status, content_type, body = self._request("/health", method="GET")
+        self.assertEqual(status, 200)
+        health = json.loads(body)
+        self.assertEqual((health['active'], health['queued'], health['workers']), (0, 0, 2))
+        self.assertEqual(health['cache']['entries'], 0)
+
+    def test_busy(self):
+        """実行中と待機中のジョブ数が上限に達した場合のテスト"""
+        service = TileService(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+
+        def blocking_run(params, data):
+            started.set()
+            release.wait(5)
+            return 'application/json', b"{}"
+
+        with patch.object(service, '_run', side_effect=blocking_run):
+            worker = threading.Thread(target=service.split, args=({},))
+            worker.start()
+            started.wait(5)
+            self.assertEqual(service.status()['active'], 1)
+            with self.assertRaises(ServiceBusy):
+                service.split({})
+            release.set()
+            worker.join()
+        self.assertEqual(service.status()['active'], 0)
+
+    def test_job_options(self):
+        """ジョブのパラメータの変換のテスト"""
+        tile_size, grid_size, options = _job_options(
+            {'count': '3x2', 'format': 'jpg', 'quality': '80', 'region': '0,0,50,50', 'skip_blank': 'true'})
+        self.assertIsNone(tile_size)
+        self.assertEqual(grid_size, (3, 2))
+        self.assertEqual((options['format'], options['quality']), ('jpg', 80))
+        self.assertEqual(options['region'], (0, 0, 50, 50))
+        self.assertTrue(options['skip_blank'])
+        self.assertFalse(options['dedupe'])
+
+        with self.assertRaises(ValueError):
+            _job_options({'size': '10x10', 'quality': 'high'})
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Unixソケットが使用できない環境")
+    def test_unix_socket(self):
+        """Unixソケットで待ち受けるテスト"""
+        socket_path = os.path.join(self.temp_dir.name, "chopimg.sock")
+        server = create_server(self.service, socket_path=socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                client.sendall(b"GET /health HTTP/1.0\r\n\r\n")
+                response = b""
+                while True:
+                    chunk = client.recv(65536)
+                    if not chunk:
+                        break
+                    response += chunk
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertTrue(head.startswith(b"HTTP/1.0 200"))
+        self.assertIn('cache', json.loads(body))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+ChopImg - sink.pyのテスト
+"""
+
+import unittest
+import os
+import io
+import tarfile
+import tempfile
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sink import CallableSink, DirectorySink, MemorySink, TarSink, as_sink, open_sink
+
+
+class TestSink(unittest.TestCase):
+    """sink.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tiles = [("tile_000_000.png", b"first", 0, 0), ("tile_000_001.png", b"second", 0, 1)]
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def test_directory_and_memory_sink(self):
+        """ディレクトリとメモリ上の辞書への出力のテスト"""
+        path = os.path.join(self.temp_dir.name, "tiles")
+        directory = DirectorySink(path)
+        memory = MemorySink()
+        for tile in self.tiles:
+            directory.add(*tile)
+            memory.add(*tile)
+
+        self.assertEqual(sorted(os.listdir(path)), [name for name, *_ in self.tiles])
+        with open(os.path.join(path, "tile_000_001.png"), "rb") as f:
+            self.assertEqual(f.read(), b"second")
+        self.assertEqual(memory.tiles, {name: data for name, data, *_ in self.tiles})
+
+    def test_tar_sink(self):
+        """tarストリームへの出力のテスト"""
+        stream = io.BytesIO()
+        sink = TarSink(stream)
+        for tile in self.tiles:
+            sink.add(*tile)
+        sink.close()
+
+        # 渡されたストリームは閉じず、追加した順にメンバーを書き込む
+        self.assertFalse(stream.closed)
+        stream.seek(0)
+        with tarfile.open(fileobj=stream) as tar:
+            self.assertEqual(tar.getnames(), [name for name, *_ in self.tiles])
+            self.assertEqual(tar.extractfile("tile_000_000.png").read(), b"first")
+
+        # パスを指定した場合はファイルを作成して閉じる
+        path = os.path.join(self.temp_dir.name, "tiles.tar")
+        sink = open_sink('tar', path)
+        sink.add(*self.tiles[0])
+        sink.close()
+        with tarfile.open(path) as tar:
+            self.assertEqual(tar.getnames(), ["tile_000_000.png"])
+
+    def test_as_sink(self):
+        """分割関数のsink引数の変換のテスト"""
+        self.assertIsNone(as_sink(None))
+        memory = MemorySink()
+        self.assertIs(as_sink(memory), memory)
+
+        tiles = {}
+        sink = as_sink(tiles)
+        self.assertIsInstance(sink, MemorySink)
+        sink.add(*self.tiles[0])
+        self.assertEqual(tiles, {"tile_000_000.png": b"first"})
+
+        calls = []
+        sink = as_sink(lambda *args: calls.append(args))
+        self.assertIsInstance(sink, CallableSink)
+        sink.add(*self.tiles[1])
+        self.assertEqual(calls, [self.tiles[1]])
+
+        with self.assertRaises(ValueError):
+            as_sink("output")
+
+    def test_open_sink(self):
+        """CLIの出力先の作成のテスト"""
+        path = os.path.join(self.temp_dir.name, "tiles")
+        self.assertIsInstance(open_sink(None, path), DirectorySink)
+        self.assertTrue(os.path.isdir(path))
+
+        with self.assertRaises(ValueError):
+            open_sink('dir', '-')
+        with self.assertRaises(ValueError):
+            open_sink('s3', path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+ChopImg - sourcecache.pyのテスト
+"""
+
+import unittest
+import os
+import io
+import tempfile
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sourcecache import SourceCache
+
+
+class TestSourceCache(unittest.TestCase):
+    """sourcecache.pyのクラスをテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, "test.png")
+        Image.new('RGB', (100, 80), color='red').save(self.image_path)
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def test_get_reuses_decoded_image(self):
+        """同じファイルはデコードせずに再利用するテスト"""
+        cache = SourceCache()
+        first = cache.get(self.image_path)
+        second = cache.get(self.image_path)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.size, (100, 80))
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (1, 1, 1))
+        self.assertEqual(stats['bytes'], 100 * 80 * 3)
+
+    def test_get_reloads_modified_file(self):
+        """ファイルが更新された場合は新しくデコードするテスト"""
+        cache = SourceCache()
+        first = cache.get(self.image_path)
+        Image.new('RGB', (50, 40), color='blue').save(self.image_path)
+        os.utime(self.image_path, ns=(0, os.stat(self.image_path).st_mtime_ns + 1_000_000_000))
+
+        second = cache.get(self.image_path)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.size, (50, 40))
+
+    def test_eviction(self):
+        """上限を超えた場合に最も長く使われていない画像から破棄するテスト"""
+        paths = []
+        for index in range(3):
+            path = os.path.join(self.temp_dir.name, f"image_{index}.png")
+            Image.new('RGB', (10, 10), color=(index, 0, 0)).save(path)
+            paths.append(path)
+        cache = SourceCache(max_bytes=10 * 10 * 3 * 2)
+
+        first = cache.get(paths[0])
+        cache.get(paths[1])
+        cache.get(paths[0])
+        cache.get(paths[2])
+
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes']), (2, 600))
+        self.assertIs(cache.get(paths[0]), first)
+        self.assertEqual(cache.stats()['misses'], 3)
+        cache.get(paths[1])
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    def test_keeps_single_oversized_image(self):
+        """上限より大きな画像も1つは保持するテスト"""
+        cache = SourceCache(max_bytes=1)
+        image = cache.get(self.image_path)
+        self.assertIs(cache.get(self.image_path), image)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+        cache.clear()
+        self.assertEqual((cache.stats()['entries'], cache.stats()['bytes']), (0, 0))
+
+    def test_get_bytes(self):
+        """画像ファイルの内容を内容のハッシュ値でキャッシュするテスト"""
+        with open(self.image_path, "rb") as f:
+            data = f.read()
+        cache = SourceCache()
+        image = cache.get_bytes(data)
+        self.assertIs(cache.get_bytes(bytes(data)), image)
+        self.assertEqual(image.size, (100, 80))
+
+        with self.assertRaises(OSError):
+            cache.get_bytes(b"not an image")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+"""
+ChopImg - streaming.pyのテスト
+"""
+
+import unittest
+from unittest.mock import patch
+import os
+import json
+import subprocess
+import tempfile
+from PIL import Image
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from streaming import _PngBandReader, open_band_reader
+from core import split_image_by_size
+
+
+class TestStreaming(unittest.TestCase):
+    """streaming.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+        # 重なりのあるバンドと端数のあるバンド
+        self.bands = [(0, 64), (50, 120), (120, 184), (170, 203)]
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def assert_bands_equal(self, filename, image, expected_reader, **save_options):
+        """バンドごとの読み込み結果が全体デコードのクロップと一致することを確認"""
+        path = os.path.join(self.temp_dir.name, filename)
+        image.save(path, **save_options)
+
+        with Image.open(path) as reference:
+            reference.load()
+            with Image.open(path) as img:
+                reader = open_band_reader(img)
+                self.assertEqual(type(reader).__name__, expected_reader)
+
+                for top, bottom in self.bands:
+                    band = reader.read(top, bottom)
+                    expected = reference.crop((0, top, reference.size[0], bottom))
+                    self.assertEqual(band.mode, expected.mode)
+                    self.assertEqual(band.size, expected.size)
+                    self.assertEqual(band.tobytes(), expected.tobytes())
+                    if band.mode == "P":
+                        self.assertEqual(band.getpalette(), expected.getpalette())
+
+    def test_png_band_reader(self):
+        """PNGのバンド読み込みのテスト"""
+        for mode in ["RGB", "RGBA", "L", "P", "1"]:
+            with self.subTest(mode=mode):
+                self.assert_bands_equal(f"input_{mode}.png", self.image.convert(mode), "_PngBandReader")
+
+    def test_raw_band_reader(self):
+        """非圧縮データ（TIFF, 下から上に格納されたBMP, PPM）のバンド読み込みのテスト"""
+        for extension in ["tif", "bmp", "ppm"]:
+            with self.subTest(extension=extension):
+                self.assert_bands_equal(f"input.{extension}", self.image, "_TileListBandReader")
+
+    def test_jpeg_falls_back(self):
+        """JPEGは全体デコードにフォールバックすることのテスト"""
+        self.assert_bands_equal("input.jpg", self.image, "_FullBandReader")
+
+    def test_unsupported_strips_fall_back(self):
+        """ストリップの1行のバイト数やPillowの内部APIを使用できない場合のテスト"""
+        path = os.path.join(self.temp_dir.name, "input.tif")
+        # 16行ごとのストリップ
+        self.image.save(path, tiffinfo={278: 16})
+
+        with Image.open(path) as img:
+            self.assertEqual(type(open_band_reader(img)).__name__, "_TileListBandReader")
+            with patch('streaming._raw_row_bytes', return_value=None):
+                self.assertEqual(type(open_band_reader(img)).__name__, "_FullBandReader")
+            with patch('streaming._HAS_DECODER_API', False):
+                self.assertEqual(type(open_band_reader(img)).__name__, "_FullBandReader")
+            with patch.object(img, 'tile', [("raw", (0, 0, 301, 203))]):
+                self.assertEqual(type(open_band_reader(img)).__name__, "_FullBandReader")
+
+    def test_fallback_output_identical(self):
+        """Pillowの内部APIを使用できずに全体デコードした場合も同じタイルが出力されることのテスト"""
+        for filename, save_options in [("input.png", {}), ("input.tif", {'tiffinfo': {278: 16}}), ("input.bmp", {})]:
+            path = os.path.join(self.temp_dir.name, filename)
+            self.image.save(path, **save_options)
+
+            for options in [{}, {'region': (40, 30, 250, 150)}]:
+                with self.subTest(filename=filename, options=options):
+                    outputs = []
+                    for fallback in [False, True]:
+                        output_dir = os.path.join(self.temp_dir.name, f"{filename}_{len(options)}_{fallback}")
+                        # 非圧縮のTIFF・BMPもメモリマップではなくバンドリーダーで読み込む
+                        with patch('core.open_mapped_raster', return_value=None), \
+                                patch('streaming._HAS_DECODER_API', not fallback):
+                            files = split_image_by_size(path, (64, 64), output_dir=output_dir, stream=True, **options)
+                        contents = []
+                        for tile_path in files:
+                            with open(tile_path, 'rb') as f:
+                                contents.append(f.read())
+                        outputs.append(contents)
+
+                    self.assertTrue(outputs[0])
+                    self.assertEqual(outputs[0], outputs[1])
+
+    def test_band_reader_columns(self):
+        """列の範囲を指定したバンド読み込みと縮小したバンド読み込みのテスト"""
+        for extension in ["png", "tif", "bmp", "jpg"]:
+            path = os.path.join(self.temp_dir.name, f"input.{extension}")
+            self.image.save(path)
+
+            with Image.open(path) as reference:
+                reference.load()
+                for scale in [1, 2]:
+                    with self.subTest(extension=extension, scale=scale), Image.open(path) as img:
+                        reader = open_band_reader(img, scale)
+                        expected_image = reference.reduce(scale)
+                        for top, bottom in [(0, 30), (25, 64), (80, 102)]:
+                            band = reader.read(top, bottom, 40, 151 // scale)
+                            expected = expected_image.crop((40, top, 151 // scale, bottom))
+                            self.assertEqual(band.size, expected.size)
+                            self.assertEqual(band.tobytes(), expected.tobytes())
+
+    def test_png_band_reader_requires_order(self):
+        """PNGのバンドを逆順に読み込んだ場合のテスト"""
+        path = os.path.join(self.temp_dir.name, "input.png")
+        self.image.save(path)
+
+        with Image.open(path) as img:
+            reader = open_band_reader(img)
+            reader.read(100, 150)
+            with self.assertRaises(ValueError):
+                reader.read(0, 50)
+
+    def test_png_band_reader_skip(self):
+        """PNGの行を読み飛ばすバンド読み込みのテスト"""
+        images = {
+            "RGB": self.image,
+            "LA": self.image.convert("LA"),
+            "P4": self.image.quantize(16),
+            "I;16": self.image.convert("I").point(lambda value: value * 200).convert("I;16"),
+        }
+        for name, image in images.items():
+            path = os.path.join(self.temp_dir.name, "skip.png")
+            image.save(path, **({"bits": 4} if name == "P4" else {}))
+
+            with self.subTest(mode=name), Image.open(path) as reference:
+                reference.load()
+                with Image.open(path) as img:
+                    reader = open_band_reader(img)
+                    with patch.object(_PngBandReader, '_decode_rows', autospec=True,
+                                      side_effect=_PngBandReader._decode_rows) as decode_rows:
+                        # 先頭から190行を読み飛ばす場合も、バンドの行数ずつデコードする
+                        for top, bottom, left, right in [(190, 194, 0, 301), (196, 199, 10, 80), (198, 203, 0, 301)]:
+                            band = reader.read(top, bottom, left, right)
+                            self.assertEqual(band.tobytes(), reference.crop((left, top, right, bottom)).tobytes())
+                    self.assertTrue(all(call.args[3] <= 4 for call in decode_rows.call_args_list))
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"), "最大メモリ使用量を取得できない環境")
+    def test_png_band_reader_memory(self):
+        """PNGのバンド読み込みの最大メモリ使用量がバンドの大きさに比例することのテスト"""
+        path = os.path.join(self.temp_dir.name, "large.png")
+        size = (4000, 3000)
+        Image.merge("RGB", [Image.effect_noise(size, 30)] * 3).save(path, compress_level=1)
+        # Pillowは RGB を1画素4バイトで保持する
+        band_bytes = {height: size[0] * height * 4 for height in (64, 256)}
+
+        peaks = {height: self.measure_peak(path, f"""
+with Image.open(path) as img:
+    reader = open_band_reader(img)
+    for top in range(0, {size[1]}, {height}):
+        reader.read(top, min(top + {height}, {size[1]}))
+""") for height in band_bytes}
+        full = self.measure_peak(path, """
+with Image.open(path) as img:
+    img.load()
+""")
+
+        # バンドと前のバンド、展開用のバッファ程度に収まり、画像全体のデコードより十分に小さい
+        for height, peak in peaks.items():
+            self.assertLess(peak, 3 * band_bytes[height] + (8 << 20), f"バンドの高さ {height}")
+        self.assertLess(peaks[64], peaks[256])
+        self.assertLess(peaks[256], full / 2)
+
+        # 下端付近の範囲を指定した分割も、読み飛ばす行を含めて範囲の行数分のメモリで済む
+        region = self.measure_peak(path, f"""
+import core
+for _ in core.iter_tiles(path, (256, 256), region=(3000, 2600, 3256, 2856)):
+    pass
+""")
+        self.assertLess(region, 3 * band_bytes[256] + (8 << 20))
+
+    def measure_peak(self, path, code):
+        """別のプロセスでコードを実行し、開始時からの最大メモリ使用量（VmHWM）の増加（バイト）を返します。"""
+        script = f"""
+import json, sys
+sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})
+from PIL import Image
+from streaming import open_band_reader
+
+def peak():
+    with open("/proc/self/status") as status:
+        return next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmHWM:"))
+
+path = {path!r}
+before = peak()
+{code}
+print(json.dumps(peak() - before))
+"""
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        return json.loads(output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+ChopImg - tiffsource.pyのテスト
+"""
+
+import unittest
+import os
+import io
+import tempfile
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from PIL import Image, ImageChops
+
+# テスト対象のモジュールをインポート
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tiffsource import TiledTiff, open_tiled_tiff
+from create_test_image import create_test_image, save_tiled_tiff
+
+
+class TestTiffSource(unittest.TestCase):
+    """tiffsource.pyの関数をテストするクラス"""
+
+    def setUp(self):
+        """テストの前処理"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image = Image.effect_mandelbrot((301, 203), (-2, -1, 1, 1), 50).convert("RGB")
+        # 画像全体、複数の格納タイルにまたがる範囲、格納タイルと一致する範囲、端数のある範囲
+        self.windows = [(0, 203, 0, 301), (10, 150, 30, 200), (64, 128, 64, 128), (192, 203, 256, 301)]
+
+    def tearDown(self):
+        """テストの後処理"""
+        self.temp_dir.cleanup()
+
+    def save(self, filename, image, **options):
+        """タイル化TIFFを保存してパスを返す"""
+        path = os.path.join(self.temp_dir.name, filename)
+        save_tiled_tiff(image, path, (64, 64), **options)
+        return path
+
+    def test_read_matches_image(self):
+        """範囲の読み込み結果が元の画像のクロップと一致することのテスト"""
+        cases = [
+            ("none.tif", self.image, {'compression': 'none'}),
+            ("deflate.tif", self.image, {'compression': 'deflate'}),
+            ("predictor.tif", self.image, {'compression': 'deflate', 'predictor': 2}),
+            ("big_be.tif", self.image, {'compression': 'none', 'bigtiff': True, 'byteorder': '>'}),
+            ("big_le.tif", self.image, {'compression': 'deflate', 'bigtiff': True}),
+            ("gray.tif", self.image.convert("L"), {'compression': 'deflate'}),
+            ("rgba.tif", self.image.convert("RGBA"), {'compression': 'none'}),
+        ]
+        for filename, image, options in cases:
+            with self.subTest(filename=filename):
+                with TiledTiff(self.save(filename, image, **options)) as tiff:
+                    self.assertEqual(tiff.size, image.size)
+                    self.assertEqual(tiff.mode, image.mode)
+                    self.assertEqual(tiff.tile_size, (64, 64))
+                    self.assertEqual(tiff.grid, (5, 4))
+                    self.assertEqual(tiff.bigtiff, options.get('bigtiff', False))
+                    for top, bottom, left, right in self.windows:
+                        band = tiff.read(top, bottom, left, right)
+                        self.assertEqual(band.tobytes(), image.crop((left, top, right, bottom)).tobytes())
+
+    def test_save_tiled_tiff_predictor(self):
+        """テスト用のタイル化TIFFの予測方式の指定のテスト"""
+        # 水平差分はdeflate以外の圧縮方式では予測方式のタグを書き込めないためエラー
+        for compression in ['none', 'jpeg']:
+            with self.subTest(compression=compression), self.assertRaises(ValueError):
+                self.save("invalid.tif", self.image, compression=compression, predictor=2)
+        with self.assertRaises(ValueError):
+            self.save("invalid.tif", self.image, predictor=3)
+
+        # ベンチマーク用の画像生成からも予測方式を指定でき、Pillowでも同じ内容に読み込める
+        path = os.path.join(self.temp_dir.name, "benchmark.tif")
+        with redirect_stdout(io.StringIO()):
+            create_test_image(path, (301, 203), tile_size=(64, 64), compression='deflate', predictor=2)
+        with Image.open(path) as expected, TiledTiff(path) as tiff:
+            self.assertEqual(tiff.read(0, 203).tobytes(), expected.convert("RGB").tobytes())
+
+    def test_jpeg_passthrough(self):
+        """JPEG圧縮の格納タイルをそのまま取り出せることのテスト"""
+        path = self.save("jpeg.tif", self.image, compression='jpeg')
+
+        with TiledTiff(path) as tiff:
+            self.assertTrue(tiff.jpeg_passthrough)
+            band = tiff.read(0, 203, 0, 301)
+            self.assertLess(max(high for _, high in ImageChops.difference(band, self.image).getextrema()), 48)
+
+            # 格納タイルと一致する範囲だけを書き出せる
+            self.assertTrue(tiff.can_crop((64, 128, 128, 192)))
+            self.assertFalse(tiff.can_crop((32, 0, 96, 64)))
+            self.assertFalse(tiff.can_crop((256, 0, 320, 64)))
+
+            with Image.open(io.BytesIO(tiff.crop((64, 128, 128, 192)))) as tile:
+                self.assertEqual(tile.format, "JPEG")
+                self.assertEqual(tile.convert("RGB").tobytes(), tiff.read(128, 192, 64, 128).tobytes())
+
+        with TiledTiff(self.save("deflate.tif", self.image)) as tiff:
+            self.assertFalse(tiff.jpeg_passthrough)
+            self.assertFalse(tiff.can_crop((0, 0, 64, 64)))
+
+    def test_cache_is_bounded(self):
+        """デコード済みの格納タイルの保持数が制限されることのテスト"""
+        path = self.save("deflate.tif", self.image)
+
+        with TiledTiff(path) as tiff:
+            self.assertEqual(tiff._cache_tiles, 6)
+            tiff.read(0, 203, 0, 301)
+            self.assertEqual(len(tiff._cache), 6)
+
+            # 同じ格納タイルは再デコードしない
+            tile = tiff.tile(4, 3)
+            self.assertIs(tiff.tile(4, 3), tile)
+            self.assertIs(tiff.read(192, 256, 256, 320), tile)
+
+        with TiledTiff(path, cache_tiles=2) as tiff:
+            tiff.read(0, 203, 0, 301)
+            self.assertEqual(len(tiff._cache), 2)
+
+    def test_pixel_limit(self):
+        """Pillowの画素数の上限を適用し、check_sizeで無効にできることのテスト"""
+        path = self.save("deflate.tif", self.image)
+
+        with patch('PIL.Image.MAX_IMAGE_PIXELS', 1000):
+            with self.assertRaises(Image.DecompressionBombError):
+                TiledTiff(path)
+            with self.assertRaises(Image.DecompressionBombError):
+                open_tiled_tiff(path)
+            with TiledTiff(path, check_size=False) as tiff:
+                self.assertEqual(tiff.size, (301, 203))
+            # 上限を明示した場合はImage.MAX_IMAGE_PIXELSを使用しない（0で検査しない）
+            for max_pixels in (0, 100000):
+                with open_tiled_tiff(path, max_pixels=max_pixels) as tiff:
+                    self.assertEqual(tiff.size, (301, 203))
+
+        with self.assertRaises(Image.DecompressionBombError):
+            open_tiled_tiff(path, max_pixels=1000)
+        with self.assertWarns(Image.DecompressionBombWarning):
+            open_tiled_tiff(path, max_pixels=40000).close()
+
+    def test_open_tiled_tiff_fallback(self):
+        """タイル化TIFFとして読み込めないファイルでNoneを返すことのテスト"""
+        striped_path = os.path.join(self.temp_dir.name, "striped.tif")
+        self.image.save(striped_path)
+        png_path = os.path.join(self.temp_dir.name, "image.png")
+        self.image.save(png_path)
+
+        self.assertIsNone(open_tiled_tiff(striped_path))
+        self.assertIsNone(open_tiled_tiff(png_path))
+        self.assertIsNone(open_tiled_tiff(os.path.join(self.temp_dir.name, "missing.tif")))
+
+        with self.assertRaises(ValueError):
+            TiledTiff(striped_path)
+
+        tiff = open_tiled_tiff(self.save("deflate.tif", self.image))
+        self.assertIsInstance(tiff, TiledTiff)
+        tiff.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
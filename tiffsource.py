@@ -0,0 +1,480 @@
+"""
+ChopImg - タイル化TIFF読み込みモジュール
+
+タイル化TIFF（BigTIFFを含む）のタイルのオフセット表を読み込み、
+出力するタイルに重なる格納タイルだけをmmap経由で読み込んでデコードする機能を提供します。
+
+画像全体をPillowで開かないため、巨大な画像（100k x 100kのスライド画像など）も、
+格納タイル1行分程度のメモリで分割できます（Pillowの画素数の上限 Image.MAX_IMAGE_PIXELS は適用します）。
+JPEG圧縮の格納タイルは、再エンコードせずにそのままJPEGファイルとして書き出せます。
+"""
+
+import collections
+import io
+import mmap
+import struct
+import sys
+import threading
+import warnings
+import zlib
+from array import array
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+# 使用するTIFFのタグ
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_PLANAR_CONFIGURATION = 284
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+TAG_EXTRA_SAMPLES = 338
+TAG_SAMPLE_FORMAT = 339
+TAG_JPEG_TABLES = 347
+TAG_YCBCR_SUBSAMPLING = 530
+
+# 圧縮方式
+COMPRESSION_NONE = 1
+COMPRESSION_JPEG = 7
+COMPRESSION_DEFLATE = (8, 32946)
+
+# 格納タイルのデコードに引き継ぐタグ（タイルごとに1つのタイルだけを持つTIFFを作ってPillowでデコードする場合）
+DECODE_TAGS = (
+    TAG_BITS_PER_SAMPLE, TAG_COMPRESSION, TAG_PHOTOMETRIC, TAG_SAMPLES_PER_PIXEL, TAG_PREDICTOR,
+    TAG_EXTRA_SAMPLES, TAG_SAMPLE_FORMAT, TAG_JPEG_TABLES, TAG_YCBCR_SUBSAMPLING,
+)
+
+# フィールドの型ごとの (structの書式, バイト数)
+FIELD_TYPES = {
+    1: ('B', 1), 2: ('B', 1), 3: ('H', 2), 4: ('I', 4), 5: ('I', 8), 6: ('b', 1), 7: ('B', 1),
+    8: ('h', 2), 9: ('i', 4), 10: ('i', 8), 11: ('f', 4), 12: ('d', 8), 13: ('I', 4),
+    16: ('Q', 8), 17: ('q', 8), 18: ('Q', 8),
+}
+
+# オフセット表の型ごとのarrayの型コード
+ARRAY_TYPECODES = {3: 'H', 4: 'I', 13: 'I', 16: 'Q', 18: 'Q'}
+
+# (光度解釈, サンプル数) ごとの画像モード
+#   1: BlackIsZero, 2: RGB, 5: CMYK（インクセット）, 6: YCbCr（JPEG圧縮の場合のみ。RGBにデコード）
+MODES = {(1, 1): 'L', (1, 2): 'LA', (2, 3): 'RGB', (2, 4): 'RGBA', (5, 4): 'CMYK', (6, 3): 'RGB'}
+
+
+def check_image_pixels(size: Tuple[int, int], max_pixels: Optional[int] = None) -> None:
+    """
+    Image.openと同じ基準で画素数の上限（解凍爆弾の検査）を適用します。
+
+    画素数が上限を超える場合は警告（Image.DecompressionBombWarning）を出し、
+    上限の2倍を超える場合は例外を送出します。
+
+    Args:
+        size: 画像サイズ (幅, 高さ)
+        max_pixels: 画素数の上限（Noneの場合はImage.MAX_IMAGE_PIXELS、0の場合は検査しない）
+
+    Raises:
+        PIL.Image.DecompressionBombError: 画素数が上限の2倍を超える場合
+    """
+    if max_pixels is None:
+        max_pixels = Image.MAX_IMAGE_PIXELS
+    if not max_pixels:
+        return
+    pixels = size[0] * size[1]
+    if pixels > 2 * max_pixels:
+        raise Image.DecompressionBombError(
+            f"画像の画素数 {pixels} が上限 {max_pixels} の2倍を超えています（解凍爆弾の可能性があります）"
+        )
+    if pixels > max_pixels:
+        warnings.warn(
+            f"画像の画素数 {pixels} が上限 {max_pixels} を超えています（解凍爆弾の可能性があります）",
+            Image.DecompressionBombWarning
+        )
+
+
+class TiledTiff:
+    """
+    タイル化TIFFの格納タイルを直接読み込むソース
+
+    最初のIFD（最も解像度が高い画像）の格納タイルを対象にします。
+    対応するのは1サンプル8ビット・チャンキー形式（PlanarConfiguration=1）の画像で、
+    非圧縮とDeflate（予測なし）はPythonで、JPEGはJPEGとしてPillowで、
+    それ以外の圧縮方式（LZW、予測ありのDeflateなど）は格納タイル1つだけのTIFFを
+    作成してPillowでデコードします。
+
+    デコードした格納タイルは、格納タイル1行分と1つまで保持し、
+    出力するタイルが格納タイルの途中で区切られる場合も同じ格納タイルを再デコードしません。
+
+    streaming.open_band_readerで取得できるバンドリーダーと同じread(top, bottom, left, right)を持ちます。
+    """
+
+    format = 'TIFF'
+    streaming = True
+
+    def __init__(self, path: str, cache_tiles: Optional[int] = None, check_size: bool = True,
+                 max_pixels: Optional[int] = None):
+        """
+        Args:
+            path: TIFFファイルのパス
+            cache_tiles: 保持するデコード済みの格納タイルの数（Noneの場合は格納タイル1行分と1つ）
+            check_size: 画素数の上限（解凍爆弾の検査）を適用するかどうか
+            max_pixels: 画素数の上限（Noneの場合はImage.MAX_IMAGE_PIXELS、0の場合は検査しない）
+
+        Raises:
+            ValueError: タイル化TIFFでない場合、または対応していない形式の場合
+            OSError: ファイルを読み込めない場合
+            PIL.Image.DecompressionBombError: check_sizeがTrueで、画素数が上限の2倍を超える場合
+        """
+        self.path = path
+        self._cache: Dict[Tuple[int, int], Image.Image] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise ValueError("TIFFファイルをメモリにマップできません")
+        try:
+            self._setup()
+            if check_size:
+                # 画像全体はデコードしないが、Image.openと同じ画素数の上限を適用
+                check_image_pixels(self.size, max_pixels)
+        except (ValueError, struct.error, IndexError, Image.DecompressionBombError):
+            self.close()
+            raise
+
+        self._cache_tiles = self.grid[0] + 1 if cache_tiles is None else cache_tiles
+
+    def _setup(self) -> None:
+        header = self._map[:16]
+        if header[:2] == b'II':
+            self._byteorder = '<'
+        elif header[:2] == b'MM':
+            self._byteorder = '>'
+        else:
+            raise ValueError("TIFFファイルではありません")
+
+        version = struct.unpack_from(self._byteorder + 'H', header, 2)[0]
+        if version == 42:
+            self.bigtiff = False
+            ifd_offset = struct.unpack_from(self._byteorder + 'I', header, 4)[0]
+        elif version == 43:
+            self.bigtiff = True
+            ifd_offset = struct.unpack_from(self._byteorder + 'Q', header, 8)[0]
+        else:
+            raise ValueError("TIFFファイルではありません")
+
+        self._fields = self._read_ifd(ifd_offset)
+        if TAG_TILE_OFFSETS not in self._fields or TAG_TILE_WIDTH not in self._fields:
+            raise ValueError("タイル化TIFFではありません")
+
+        self.size = (self._value(TAG_IMAGE_WIDTH), self._value(TAG_IMAGE_LENGTH))
+        self.tile_size = (self._value(TAG_TILE_WIDTH), self._value(TAG_TILE_LENGTH))
+        self.grid = (-(-self.size[0] // self.tile_size[0]), -(-self.size[1] // self.tile_size[1]))
+        self.compression = self._value(TAG_COMPRESSION, COMPRESSION_NONE)
+        self.photometric = self._value(TAG_PHOTOMETRIC)
+        self.predictor = self._value(TAG_PREDICTOR, 1)
+        samples = self._value(TAG_SAMPLES_PER_PIXEL, 1)
+
+        if self._value(TAG_PLANAR_CONFIGURATION, 1) != 1:
+            raise ValueError("プレーン形式のTIFFには対応していません")
+        if any(bits != 8 for bits in self._values(TAG_BITS_PER_SAMPLE, (8,))):
+            raise ValueError("1サンプル8ビット以外のTIFFには対応していません")
+        if any(sample_format != 1 for sample_format in self._values(TAG_SAMPLE_FORMAT, (1,))):
+            raise ValueError("符号なし整数以外のサンプル形式には対応していません")
+        if self.photometric == 6 and self.compression != COMPRESSION_JPEG:
+            raise ValueError("JPEG圧縮以外のYCbCrのTIFFには対応していません")
+        if samples == 4 and self.photometric == 2 and tuple(self._values(TAG_EXTRA_SAMPLES, (2,))) != (2,):
+            raise ValueError("乗算済みのアルファチャンネルには対応していません")
+        self.mode = MODES.get((self.photometric, samples))
+        if self.mode is None:
+            raise ValueError(f"対応していない色空間です: 光度解釈 {self.photometric}, サンプル数 {samples}")
+
+        self._offsets = self._array(TAG_TILE_OFFSETS)
+        self._byte_counts = self._array(TAG_TILE_BYTE_COUNTS)
+        if len(self._offsets) < self.grid[0] * self.grid[1] or len(self._byte_counts) < len(self._offsets):
+            raise ValueError("タイルのオフセット表が不足しています")
+
+        self._jpeg_tables = self._bytes(TAG_JPEG_TABLES)
+        # JPEGのまま書き出せるのはYCbCrとグレースケール（RGBのままのJPEGは色空間の指定がないため除く）
+        self.jpeg_passthrough = self.compression == COMPRESSION_JPEG and self.photometric in (1, 6)
+
+    @property
+    def info(self) -> dict:
+        """画像の情報（格納タイルの大きさ、圧縮方式、BigTIFFかどうか）"""
+        return {'tile_size': self.tile_size, 'compression': self.compression, 'bigtiff': self.bigtiff}
+
+    def _read_ifd(self, offset: int) -> Dict[int, Tuple[int, int, int]]:
+        """IFDのエントリを読み込み、タグから(型, 個数, データの位置)への辞書を返します。"""
+        if self.bigtiff:
+            count_format, entry_format, entry_size, inline_size = 'Q', 'HHQ', 20, 8
+        else:
+            count_format, entry_format, entry_size, inline_size = 'H', 'HHI', 12, 4
+        count = struct.unpack_from(self._byteorder + count_format, self._map, offset)[0]
+        position = offset + struct.calcsize(count_format)
+
+        fields = {}
+        for index in range(count):
+            entry = position + index * entry_size
+            tag, field_type, value_count = struct.unpack_from(self._byteorder + entry_format, self._map, entry)
+            if field_type not in FIELD_TYPES:
+                continue
+            value_offset = entry + entry_size - inline_size
+            if FIELD_TYPES[field_type][1] * value_count > inline_size:
+                value_offset = struct.unpack_from(
+                    self._byteorder + ('Q' if self.bigtiff else 'I'), self._map, value_offset
+                )[0]
+            fields[tag] = (field_type, value_count, value_offset)
+        return fields
+
+    def _values(self, tag: int, default: tuple = ()) -> tuple:
+        if tag not in self._fields:
+            return default
+        field_type, count, offset = self._fields[tag]
+        item_format, _ = FIELD_TYPES[field_type]
+        if field_type in (5, 10):
+            count *= 2
+        return struct.unpack_from(f"{self._byteorder}{count}{item_format}", self._map, offset)
+
+    def _value(self, tag: int, default: Optional[int] = None) -> int:
+        values = self._values(tag)
+        if not values:
+            if default is None:
+                raise ValueError(f"TIFFのタグ {tag} がありません")
+            return default
+        return values[0]
+
+    def _array(self, tag: int) -> array:
+        field_type, count, offset = self._fields[tag]
+        if field_type not in ARRAY_TYPECODES:
+            raise ValueError(f"TIFFのタグ {tag} の型が正しくありません")
+        values = array(ARRAY_TYPECODES[field_type])
+        values.frombytes(self._map[offset:offset + count * values.itemsize])
+        if (self._byteorder == '<') != (sys.byteorder == 'little'):
+            values.byteswap()
+        return values
+
+    def _bytes(self, tag: int) -> Optional[bytes]:
+        if tag not in self._fields:
+            return None
+        field_type, count, offset = self._fields[tag]
+        return self._map[offset:offset + count * FIELD_TYPES[field_type][1]]
+
+    def _tile_data(self, col: int, row: int) -> bytes:
+        index = row * self.grid[0] + col
+        offset = self._offsets[index]
+        return self._map[offset:offset + self._byte_counts[index]]
+
+    def _jpeg_stream(self, data: bytes) -> bytes:
+        """格納タイルのJPEGデータに共通のテーブル（JPEGTables）を結合し、単独のJPEGデータにします。"""
+        if self._jpeg_tables and len(self._jpeg_tables) > 4 and data[:2] == b'\xff\xd8':
+            # テーブルのSOI...EOIからEOIを除き、タイルのSOIを除いて結合
+            return self._jpeg_tables[:-2] + data[2:]
+        return data
+
+    def _single_tile_tiff(self, data: bytes) -> bytes:
+        """格納タイル1つだけを持つリトルエンディアンのTIFFを作成します。"""
+        tile_width, tile_height = self.tile_size
+        entries = [
+            (TAG_IMAGE_WIDTH, 4, (tile_width,)), (TAG_IMAGE_LENGTH, 4, (tile_height,)),
+            (TAG_PLANAR_CONFIGURATION, 3, (1,)),
+            (TAG_TILE_WIDTH, 4, (tile_width,)), (TAG_TILE_LENGTH, 4, (tile_height,)),
+            (TAG_TILE_OFFSETS, 4, (0,)), (TAG_TILE_BYTE_COUNTS, 4, (len(data),)),
+        ]
+        for tag in DECODE_TAGS:
+            if tag in self._fields:
+                field_type = self._fields[tag][0]
+                if tag == TAG_JPEG_TABLES:
+                    entries.append((tag, 7, self._jpeg_tables))
+                else:
+                    entries.append((tag, 4 if field_type in (16, 18) else field_type, self._values(tag)))
+        entries.sort()
+
+        # 4バイトを超える値はIFDの後ろに、タイルのデータは最後に置く
+        payloads = [
+            values if isinstance(values, bytes)
+            else struct.pack(f"<{len(values)}{FIELD_TYPES[field_type][0]}", *values)
+            for _, field_type, values in entries
+        ]
+        extra_offset = 8 + 2 + len(entries) * 12 + 4
+        data_offset = extra_offset + sum(len(payload) + len(payload) % 2 for payload in payloads if len(payload) > 4)
+
+        ifd = bytearray(struct.pack('<H', len(entries)))
+        extra = bytearray()
+        for (tag, field_type, _), payload in zip(entries, payloads):
+            if tag == TAG_TILE_OFFSETS:
+                payload = struct.pack('<I', data_offset)
+            count = len(payload) // FIELD_TYPES[field_type][1]
+            if len(payload) <= 4:
+                ifd += struct.pack('<HHI', tag, field_type, count) + payload.ljust(4, b'\0')
+            else:
+                ifd += struct.pack('<HHII', tag, field_type, count, extra_offset + len(extra))
+                extra += payload + b'\0' * (len(payload) % 2)
+        ifd += b'\0\0\0\0'
+        return b'II*\0' + struct.pack('<I', 8) + bytes(ifd) + bytes(extra) + data
+
+    def _decode(self, col: int, row: int) -> Image.Image:
+        """格納タイル1つをデコードします（画像の端でも格納タイルの大きさのまま返します）。"""
+        tile_size = self.tile_size
+        index = row * self.grid[0] + col
+        data = self._tile_data(col, row)
+        if not self._byte_counts[index] or not self._offsets[index]:
+            # 書き込まれていない（疎な）タイル
+            return Image.new(self.mode, tile_size)
+
+        if self.compression == COMPRESSION_NONE:
+            return Image.frombytes(self.mode, tile_size, data)
+        if self.compression in COMPRESSION_DEFLATE and self.predictor == 1:
+            return Image.frombytes(self.mode, tile_size, zlib.decompress(data))
+
+        if self.jpeg_passthrough:
+            tile = Image.open(io.BytesIO(self._jpeg_stream(data)))
+        else:
+            tile = Image.open(io.BytesIO(self._single_tile_tiff(data)))
+        tile.load()
+        if tile.mode != self.mode:
+            tile = tile.convert(self.mode)
+        if tile.size != tile_size:
+            tile = tile.crop((0, 0) + tile_size)
+        return tile
+
+    def tile(self, col: int, row: int) -> Image.Image:
+        """
+        デコードした格納タイルを返します（最近使用したものは再利用します）。
+
+        Args:
+            col: 格納タイルの列番号
+            row: 格納タイルの行番号
+
+        Returns:
+            格納タイルの大きさの画像（共有されるため変更しないでください）
+        """
+        key = (col, row)
+        with self._lock:
+            tile = self._cache.get(key)
+            if tile is not None:
+                self._cache.move_to_end(key)
+                return tile
+
+        tile = self._decode(col, row)
+        with self._lock:
+            self._cache[key] = tile
+            while len(self._cache) > self._cache_tiles:
+                self._cache.popitem(last=False)
+        return tile
+
+    def read(self, top: int, bottom: int, left: int = 0, right: Optional[int] = None) -> Image.Image:
+        """
+        範囲に重なる格納タイルだけをデコードし、範囲の画像を返します。
+
+        範囲が1つの格納タイルと一致する場合は、デコードした格納タイルをそのまま返します。
+
+        Args:
+            top: 上端
+            bottom: 下端
+            left: 左端
+            right: 右端（Noneの場合は画像の右端）
+
+        Returns:
+            範囲の画像
+        """
+        if right is None:
+            right = self.size[0]
+        tile_width, tile_height = self.tile_size
+        first_col, last_col = left // tile_width, (right - 1) // tile_width
+        first_row, last_row = top // tile_height, (bottom - 1) // tile_height
+
+        if first_col == last_col and first_row == last_row:
+            tile = self.tile(first_col, first_row)
+            box = (left - first_col * tile_width, top - first_row * tile_height,
+                   right - first_col * tile_width, bottom - first_row * tile_height)
+            return tile if box == (0, 0) + self.tile_size else tile.crop(box)
+
+        band = Image.new(self.mode, (right - left, bottom - top))
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                tile_left, tile_top = col * tile_width, row * tile_height
+                clip = (max(left, tile_left), max(top, tile_top),
+                        min(right, tile_left + tile_width), min(bottom, tile_top + tile_height))
+                piece = self.tile(col, row).crop(
+                    (clip[0] - tile_left, clip[1] - tile_top, clip[2] - tile_left, clip[3] - tile_top)
+                )
+                band.paste(piece, (clip[0] - left, clip[1] - top))
+        return band
+
+    def can_crop(self, box: Tuple[int, int, int, int]) -> bool:
+        """
+        範囲がJPEG圧縮の格納タイル1つと一致し、再エンコードせずに書き出せるかどうかを判定します。
+
+        画像の端で格納タイルの一部だけを使う場合は書き出せません。
+
+        Args:
+            box: タイルの範囲 (左, 上, 右, 下)
+
+        Returns:
+            書き出せる場合はTrue
+        """
+        if not self.jpeg_passthrough:
+            return False
+        left, top, right, bottom = box
+        tile_width, tile_height = self.tile_size
+        if left % tile_width or top % tile_height or right - left != tile_width or bottom - top != tile_height:
+            return False
+        if right > self.size[0] or bottom > self.size[1]:
+            return False
+        index = top // tile_height * self.grid[0] + left // tile_width
+        return bool(self._byte_counts[index] and self._offsets[index])
+
+    def crop(self, box: Tuple[int, int, int, int]) -> bytes:
+        """
+        JPEG圧縮の格納タイルをJPEGファイルのデータとして返します（can_cropがTrueの範囲のみ）。
+
+        Args:
+            box: タイルの範囲 (左, 上, 右, 下)
+
+        Returns:
+            JPEGファイルのデータ
+        """
+        tile_width, tile_height = self.tile_size
+        return self._jpeg_stream(self._tile_data(box[0] // tile_width, box[1] // tile_height))
+
+    def close(self) -> None:
+        """ファイルを閉じます。"""
+        self._cache.clear()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "TiledTiff":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def open_tiled_tiff(path: str, max_pixels: Optional[int] = None) -> Optional[TiledTiff]:
+    """
+    タイル化TIFFを開きます。
+
+    Args:
+        path: 入力画像のパス
+        max_pixels: 画素数の上限（Noneの場合はImage.MAX_IMAGE_PIXELS、0の場合は検査しない）
+
+    Returns:
+        TiledTiff。TIFF以外のファイル、ストリップ形式のTIFF、対応していない形式の場合、
+        ファイルを読み込めない場合はNone（Image.openで開いてください）
+
+    Raises:
+        PIL.Image.DecompressionBombError: 画素数が上限の2倍を超える場合
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(4) not in (b'II*\0', b'MM\0*', b'II+\0', b'MM\0+'):
+                return None
+        return TiledTiff(path, max_pixels=max_pixels)
+    except (OSError, ValueError):
+        return None